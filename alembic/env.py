@@ -18,6 +18,17 @@ target_metadata = schema.meta
 database_settings = DatabaseSettings()
 
 
+def include_object(object_, name, type_, reflected, compare_to) -> bool:
+    """Ignore schema objects which are restricted to other database dialects (using `ddl_if`)."""
+
+    ddl_if = getattr(object_, "_ddl_if", None)
+    if ddl_if is None or ddl_if.dialect is None:
+        return True
+
+    dialects = {ddl_if.dialect} if isinstance(ddl_if.dialect, str) else set(ddl_if.dialect)
+    return context.get_context().dialect.name in dialects
+
+
 def run_migrations_offline() -> None:
     """Run migrations in 'offline' mode.
 
@@ -33,6 +44,7 @@ def run_migrations_offline() -> None:
     context.configure(
         url=database_settings.url.get_secret_value(),
         target_metadata=target_metadata,
+        include_object=include_object,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
     )
@@ -42,7 +54,7 @@ def run_migrations_offline() -> None:
 
 
 def do_run_migrations(connection: Connection) -> None:
-    context.configure(connection=connection, target_metadata=target_metadata)
+    context.configure(connection=connection, target_metadata=target_metadata, include_object=include_object)
 
     with context.begin_transaction():
         context.run_migrations()
@@ -0,0 +1,27 @@
+"""add indexes for filtering the incarnation inventory
+
+Revision ID: 3e7a9c2b5d14
+Revises: 8d2f4a6c1e93
+Create Date: 2026-10-19 16:48:05.113472+00:00
+
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "3e7a9c2b5d14"
+down_revision = "8d2f4a6c1e93"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_incarnation_template_repository", "incarnation", ["template_repository"])
+    op.create_index("ix_incarnation_latest_change_id", "incarnation", ["latest_change_id"])
+    op.create_index("ix_change_requested_version", "change", ["requested_version"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_change_requested_version", table_name="change")
+    op.drop_index("ix_incarnation_latest_change_id", table_name="incarnation")
+    op.drop_index("ix_incarnation_template_repository", table_name="incarnation")
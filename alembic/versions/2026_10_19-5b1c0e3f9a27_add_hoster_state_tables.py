@@ -0,0 +1,44 @@
+"""add tables for merge request and commit states reported by hoster webhooks
+
+Revision ID: 5b1c0e3f9a27
+Revises: 00ee97d0b7a3
+Create Date: 2026-10-19 09:12:41.205113+00:00
+
+"""
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "5b1c0e3f9a27"
+down_revision = "00ee97d0b7a3"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "merge_request_state",
+        sa.Column("repository", sa.String(), nullable=False),
+        sa.Column("merge_request_id", sa.String(), nullable=False),
+        sa.Column("state", sa.String(), nullable=False),
+        sa.Column("merge_status", sa.String(), nullable=True),
+        sa.Column("sha", sa.String(), nullable=True),
+        sa.Column("merge_commit_sha", sa.String(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint("repository", "merge_request_id"),
+    )
+    op.create_table(
+        "commit_status",
+        sa.Column("repository", sa.String(), nullable=False),
+        sa.Column("commit_sha", sa.String(), nullable=False),
+        sa.Column("status", sa.String(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint("repository", "commit_sha"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("commit_status")
+    op.drop_table("merge_request_state")
@@ -0,0 +1,47 @@
+"""add table for asynchronously executed change jobs
+
+Revision ID: 7f4c2a9e1b36
+Revises: e5a3d1f8b602
+Create Date: 2026-10-19 15:03:27.518204+00:00
+
+"""
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "7f4c2a9e1b36"
+down_revision = "e5a3d1f8b602"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "job",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("type", sa.String(), nullable=False),
+        sa.Column("incarnation_id", sa.Integer(), nullable=False),
+        sa.Column("arguments", sa.JSON().with_variant(postgresql.JSONB(), "postgresql"), nullable=False),
+        sa.Column("status", sa.String(), nullable=False),
+        sa.Column("progress", sa.String(), nullable=True),
+        sa.Column("error", sa.String(), nullable=True),
+        sa.Column("change_id", sa.Integer(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("started_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("finished_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("heartbeat_at", sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(["change_id"], ["change.id"], ondelete="SET NULL"),
+        sa.ForeignKeyConstraint(["incarnation_id"], ["incarnation.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_job_status", "job", ["status"])
+    op.create_index("ix_job_incarnation_id", "job", ["incarnation_id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_job_incarnation_id", table_name="job")
+    op.drop_index("ix_job_status", table_name="job")
+    op.drop_table("job")
@@ -0,0 +1,32 @@
+"""add latest change id to incarnation
+
+Revision ID: 8d2f4a6c1e93
+Revises: 5b1c0e3f9a27
+Create Date: 2026-10-19 14:03:27.519844+00:00
+
+"""
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "8d2f4a6c1e93"
+down_revision = "5b1c0e3f9a27"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("incarnation", sa.Column("latest_change_id", sa.Integer(), nullable=True))
+    op.execute(
+        "UPDATE incarnation SET latest_change_id = ("
+        "SELECT change.id FROM change WHERE change.incarnation_id = incarnation.id "
+        "ORDER BY change.revision DESC LIMIT 1"
+        ")"
+    )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("incarnation") as batch_op:
+        batch_op.drop_column("latest_change_id")
@@ -0,0 +1,31 @@
+"""add table for leases which serialize changes of the same repository
+
+Revision ID: a3d9e6c41f27
+Revises: 7f4c2a9e1b36
+Create Date: 2026-10-19 17:41:09.284613+00:00
+
+"""
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "a3d9e6c41f27"
+down_revision = "7f4c2a9e1b36"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "repository_lock",
+        sa.Column("repository", sa.String(), nullable=False),
+        sa.Column("holder", sa.String(), nullable=False),
+        sa.Column("expires_at", sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint("repository"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("repository_lock")
@@ -0,0 +1,57 @@
+"""store template data as json
+
+Revision ID: c41b7e9d2a58
+Revises: 3e7a9c2b5d14
+Create Date: 2026-10-19 19:21:36.842107+00:00
+
+"""
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "c41b7e9d2a58"
+down_revision = "3e7a9c2b5d14"
+branch_labels = None
+depends_on = None
+
+COLUMNS = ("requested_data", "template_data_full")
+
+
+def upgrade() -> None:
+    if op.get_context().dialect.name == "postgresql":
+        for column in COLUMNS:
+            op.alter_column(
+                "change",
+                column,
+                type_=postgresql.JSONB(),
+                existing_type=sa.String(),
+                existing_nullable=False,
+                postgresql_using=f"{column}::jsonb",
+            )
+        op.create_index("ix_change_template_data_full", "change", ["template_data_full"], postgresql_using="gin")
+    else:
+        # the JSON documents are stored as text, so the existing values can be kept as they are
+        with op.batch_alter_table("change") as batch_op:
+            for column in COLUMNS:
+                batch_op.alter_column(column, type_=sa.JSON(), existing_type=sa.String(), existing_nullable=False)
+
+
+def downgrade() -> None:
+    if op.get_context().dialect.name == "postgresql":
+        op.drop_index("ix_change_template_data_full", table_name="change", postgresql_using="gin")
+        for column in COLUMNS:
+            op.alter_column(
+                "change",
+                column,
+                type_=sa.String(),
+                existing_type=postgresql.JSONB(),
+                existing_nullable=False,
+                postgresql_using=f"{column}::text",
+            )
+    else:
+        with op.batch_alter_table("change") as batch_op:
+            for column in COLUMNS:
+                batch_op.alter_column(column, type_=sa.String(), existing_type=sa.JSON(), existing_nullable=False)
@@ -0,0 +1,132 @@
+"""store template data deduplicated by content hash
+
+Revision ID: e5a3d1f8b602
+Revises: c41b7e9d2a58
+Create Date: 2026-10-19 21:37:52.408319+00:00
+
+"""
+
+import hashlib
+import json
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "e5a3d1f8b602"
+down_revision = "c41b7e9d2a58"
+branch_labels = None
+depends_on = None
+
+
+def _is_postgresql() -> bool:
+    return op.get_context().dialect.name == "postgresql"
+
+
+def _json_type() -> sa.types.TypeEngine:
+    return postgresql.JSONB() if _is_postgresql() else sa.JSON()
+
+
+def _template_data_hash(data) -> str:
+    # must match `foxops.database.repositories.change.repository.template_data_hash`
+    return hashlib.sha256(
+        json.dumps(data, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode()
+    ).hexdigest()
+
+
+def upgrade() -> None:
+    op.create_table(
+        "template_data_blob",
+        sa.Column("hash", sa.String(), nullable=False),
+        sa.Column("data", _json_type(), nullable=False),
+        sa.PrimaryKeyConstraint("hash"),
+    )
+    if _is_postgresql():
+        op.create_index("ix_template_data_blob_data", "template_data_blob", ["data"], postgresql_using="gin")
+        op.drop_index("ix_change_template_data_full", table_name="change", postgresql_using="gin")
+
+    op.add_column("change", sa.Column("requested_data_hash", sa.String(), nullable=True))
+    op.add_column("change", sa.Column("template_data_full_hash", sa.String(), nullable=True))
+
+    # move the template data of all changes into the (deduplicated) blob table
+    change = sa.table(
+        "change",
+        sa.column("id", sa.Integer()),
+        sa.column("requested_data", _json_type()),
+        sa.column("template_data_full", _json_type()),
+        sa.column("requested_data_hash", sa.String()),
+        sa.column("template_data_full_hash", sa.String()),
+    )
+    blob = sa.table("template_data_blob", sa.column("hash", sa.String()), sa.column("data", _json_type()))
+
+    connection = op.get_bind()
+    blobs = {}
+    hashes = []
+    for id_, requested_data, template_data_full in connection.execute(
+        sa.select(change.c.id, change.c.requested_data, change.c.template_data_full)
+    ):
+        requested_data_hash = _template_data_hash(requested_data)
+        template_data_full_hash = _template_data_hash(template_data_full)
+        blobs[requested_data_hash] = requested_data
+        blobs[template_data_full_hash] = template_data_full
+        hashes.append(
+            {
+                "id_": id_,
+                "requested_data_hash_": requested_data_hash,
+                "template_data_full_hash_": template_data_full_hash,
+            }
+        )
+
+    if blobs:
+        connection.execute(sa.insert(blob), [{"hash": hash_, "data": data} for hash_, data in blobs.items()])
+    if hashes:
+        connection.execute(
+            sa.update(change)
+            .where(change.c.id == sa.bindparam("id_"))
+            .values(
+                requested_data_hash=sa.bindparam("requested_data_hash_"),
+                template_data_full_hash=sa.bindparam("template_data_full_hash_"),
+            ),
+            hashes,
+        )
+
+    with op.batch_alter_table("change") as batch_op:
+        batch_op.alter_column("requested_data_hash", existing_type=sa.String(), nullable=False)
+        batch_op.alter_column("template_data_full_hash", existing_type=sa.String(), nullable=False)
+        batch_op.create_foreign_key(
+            "fk_change_requested_data_hash", "template_data_blob", ["requested_data_hash"], ["hash"]
+        )
+        batch_op.create_foreign_key(
+            "fk_change_template_data_full_hash", "template_data_blob", ["template_data_full_hash"], ["hash"]
+        )
+        batch_op.drop_column("requested_data")
+        batch_op.drop_column("template_data_full")
+        batch_op.create_index("ix_change_requested_data_hash", ["requested_data_hash"])
+        batch_op.create_index("ix_change_template_data_full_hash", ["template_data_full_hash"])
+
+
+def downgrade() -> None:
+    op.add_column("change", sa.Column("requested_data", _json_type(), nullable=True))
+    op.add_column("change", sa.Column("template_data_full", _json_type(), nullable=True))
+    op.execute(
+        "UPDATE change SET "
+        "requested_data = (SELECT data FROM template_data_blob WHERE hash = change.requested_data_hash), "
+        "template_data_full = (SELECT data FROM template_data_blob WHERE hash = change.template_data_full_hash)"
+    )
+
+    with op.batch_alter_table("change") as batch_op:
+        batch_op.drop_index("ix_change_template_data_full_hash")
+        batch_op.drop_index("ix_change_requested_data_hash")
+        batch_op.drop_constraint("fk_change_template_data_full_hash", type_="foreignkey")
+        batch_op.drop_constraint("fk_change_requested_data_hash", type_="foreignkey")
+        batch_op.drop_column("template_data_full_hash")
+        batch_op.drop_column("requested_data_hash")
+        batch_op.alter_column("requested_data", existing_type=_json_type(), nullable=False)
+        batch_op.alter_column("template_data_full", existing_type=_json_type(), nullable=False)
+
+    if _is_postgresql():
+        op.create_index("ix_change_template_data_full", "change", ["template_data_full"], postgresql_using="gin")
+        op.drop_index("ix_template_data_blob_data", table_name="template_data_blob", postgresql_using="gin")
+    op.drop_table("template_data_blob")
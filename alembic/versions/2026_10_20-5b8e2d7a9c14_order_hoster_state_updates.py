@@ -0,0 +1,33 @@
+"""add columns to ignore webhook events which arrive out of order
+
+Revision ID: 5b8e2d7a9c14
+Revises: a3d9e6c41f27
+Create Date: 2026-10-20 08:12:37.519204+00:00
+
+"""
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "5b8e2d7a9c14"
+down_revision = "a3d9e6c41f27"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("merge_request_state") as batch_op:
+        batch_op.add_column(sa.Column("hoster_updated_at", sa.DateTime(timezone=True), nullable=True))
+
+    with op.batch_alter_table("commit_status") as batch_op:
+        batch_op.add_column(sa.Column("pipeline_id", sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("commit_status") as batch_op:
+        batch_op.drop_column("pipeline_id")
+
+    with op.batch_alter_table("merge_request_state") as batch_op:
+        batch_op.drop_column("hoster_updated_at")
@@ -0,0 +1,112 @@
+"""Measures the effect of the database configuration on the throughput of concurrent repository operations.
+
+Runs the same workload (creating incarnations, followed by a mix of reads and new changes, as caused by the API)
+against a SQLite database with the default foxops tuning and with the SQLite defaults. Run it from the repository
+root, e.g.:
+
+    python -m benchmarks.database --incarnations 200 --operations 2000 --concurrency 20
+"""
+
+import argparse
+import asyncio
+import random
+import tempfile
+from pathlib import Path
+
+from pydantic import SecretStr
+
+from benchmarks.phases import run_phase
+from foxops.database.engine import create_engine
+from foxops.database.repositories.change.model import ChangeType
+from foxops.database.repositories.change.repository import ChangeRepository
+from foxops.database.schema import meta
+from foxops.logger import setup_logging
+from foxops.settings import DatabaseSettings
+
+#: Holds the SQLite settings to compare, by name
+CONFIGURATIONS = {
+    "tuned": {},
+    "untuned": {
+        "sqlite_journal_mode": "DELETE",
+        "sqlite_synchronous": "FULL",
+        "sqlite_cache_size_kib": 2000,
+        "sqlite_mmap_size_bytes": 0,
+    },
+}
+
+
+async def benchmark(args: argparse.Namespace, directory: Path, name: str) -> None:
+    url = f"sqlite+aiosqlite:///{directory}/{name}.db"
+    settings = DatabaseSettings(url=SecretStr(url), pool_size=args.concurrency, **CONFIGURATIONS[name])
+    engine = create_engine(url, settings)
+    async with engine.begin() as connection:
+        await connection.run_sync(meta.create_all)
+
+    change_repository = ChangeRepository(engine)
+    rng = random.Random(args.seed)
+    template_data = {f"variable_{index}": f"value {index}" for index in range(20)}
+    incarnation_ids: list[int] = []
+    revisions: dict[int, int] = {}
+
+    async def _create(index: int) -> None:
+        change = await change_repository.create_incarnation_with_first_change(
+            incarnation_repository=f"incarnations/service-{index}",
+            target_directory=".",
+            template_repository="templates/service",
+            commit_sha="0" * 40,
+            requested_version_hash="0" * 40,
+            requested_version="v1.0.0",
+            requested_data=template_data,
+            template_data_full=template_data,
+        )
+        incarnation_ids.append(change.incarnation_id)
+        revisions[change.incarnation_id] = 1
+
+    async def _mixed(index: int) -> None:
+        incarnation_id = rng.choice(incarnation_ids)
+        if rng.random() < args.write_ratio:
+            revisions[incarnation_id] += 1
+            await change_repository.create_change(
+                incarnation_id=incarnation_id,
+                revision=revisions[incarnation_id],
+                change_type=ChangeType.DIRECT,
+                commit_sha="1" * 40,
+                commit_pushed=True,
+                requested_version_hash="1" * 40,
+                requested_version=f"v1.{index}.0",
+                requested_data=template_data,
+                template_data_full=template_data | {"revision": revisions[incarnation_id]},
+            )
+        elif rng.random() < 0.5:
+            await change_repository.get_latest_change_with_incarnation(incarnation_id)
+        else:
+            async for _ in change_repository.list_incarnations_with_changes_summary(after=incarnation_id, limit=50):
+                pass
+
+    print(f"{name}:")
+    await run_phase("create", _create, args.incarnations, args.concurrency)
+    await run_phase("mixed", _mixed, args.operations, args.concurrency)
+    print()
+
+    await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--incarnations", type=int, default=200)
+    parser.add_argument("--operations", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--write-ratio", type=float, default=0.2, help="fraction of operations creating a change")
+    parser.add_argument("--configuration", choices=CONFIGURATIONS, action="append")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    setup_logging(level="WARNING")
+
+    with tempfile.TemporaryDirectory() as directory:
+        for name in args.configuration or CONFIGURATIONS:
+            asyncio.run(benchmark(args, Path(directory), name))
+
+
+if __name__ == "__main__":
+    main()
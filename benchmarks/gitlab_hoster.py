@@ -0,0 +1,122 @@
+"""Measures the throughput and latency of foxops operations against a simulated GitLab.
+
+Creates a number of incarnations, updates all of them with (automerged) merge requests and reads their details,
+each with the given concurrency. Run it from the repository root, e.g.:
+
+    python -m benchmarks.gitlab_hoster --incarnations 50 --concurrency 10 --latency 0.05 --rate-limit 100
+"""
+
+import argparse
+import asyncio
+import tempfile
+from pathlib import Path
+
+from benchmarks.phases import run_phase
+from foxops.database.engine import create_engine
+from foxops.database.repositories.change.repository import ChangeRepository
+from foxops.database.repositories.incarnation.repository import IncarnationRepository
+from foxops.database.schema import meta
+from foxops.hosters.gitlab import GitlabHoster
+from foxops.logger import setup_logging
+from foxops.services.change import ChangeService
+from tests._plugins.gitlab_simulator import GitlabSimulator, Latency, SimulatorConfig
+
+TEMPLATE_CONFIG = b"""
+variables:
+  name:
+    type: str
+    description: The name of the incarnation
+"""
+
+
+async def benchmark(args: argparse.Namespace, directory: Path) -> None:
+    simulator = GitlabSimulator(
+        directory / "gitlab",
+        SimulatorConfig(
+            latency=Latency(median=args.latency, sigma=args.latency_sigma),
+            rate_limit=args.rate_limit,
+            server_error_probability=args.server_errors,
+            mergeability_check_duration=args.mergeability_check_duration,
+            pipeline_duration=Latency(median=args.pipeline_duration, sigma=args.latency_sigma),
+            seed=args.seed,
+        ),
+    )
+
+    simulator.create_project(
+        "templates/service",
+        {
+            "fengine.yaml": TEMPLATE_CONFIG,
+            "template/README.md": b"# {{ name }}\n",
+            "template/.gitlab-ci.yml": b"build:\n  script: [echo {{ name }}]\n",
+        },
+    )
+    simulator.create_tag("templates/service", "v1.0.0")
+    simulator.commit_files("templates/service", {"template/README.md": b"# {{ name }}\n\nUpdated.\n"})
+    simulator.create_tag("templates/service", "v1.1.0")
+    for index in range(args.incarnations):
+        simulator.create_project(f"incarnations/service-{index}", {"CODEOWNERS": b"* @team\n"})
+
+    engine = create_engine(f"sqlite+aiosqlite:///{directory}/foxops.db")
+    async with engine.begin() as connection:
+        await connection.run_sync(meta.create_all)
+
+    with simulator.serve() as address:
+        hoster = GitlabHoster(address, simulator.config.token, max_concurrent_requests=args.concurrency * 4)
+        change_service = ChangeService(
+            hoster=hoster,
+            incarnation_repository=IncarnationRepository(engine),
+            change_repository=ChangeRepository(engine),
+        )
+        incarnation_ids: dict[int, int] = {}
+
+        async def _create(index: int) -> None:
+            change = await change_service.create_incarnation(
+                f"incarnations/service-{index}", "templates/service", "v1.0.0", {"name": f"service-{index}"}
+            )
+            incarnation_ids[index] = change.incarnation_id
+
+        async def _update(index: int) -> None:
+            await change_service.create_change_merge_request(
+                incarnation_ids[index],
+                "v1.1.0",
+                {"name": f"service-{index}"},
+                automerge=True,
+                automerge_in_background=True,
+            )
+
+        async def _read(index: int) -> None:
+            await change_service.get_incarnation_with_details(incarnation_ids[index])
+
+        created = await run_phase("create", _create, args.incarnations, args.concurrency)
+        await run_phase("update", lambda i: _update(created[i]), len(created), args.concurrency)
+        await run_phase("read", lambda i: _read(created[i]), len(created), args.concurrency)
+
+        await asyncio.gather(*hoster._background_tasks, return_exceptions=True)
+
+    print()
+    print("GitLab requests:", dict(simulator.requests.most_common()))
+    print("Rate limiting:", hoster.rate_limit.metrics)
+    await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--incarnations", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.02, help="median latency of GitLab requests in seconds")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="spread of the (log-normal) latency")
+    parser.add_argument("--rate-limit", type=int, default=None, help="GitLab API requests per second")
+    parser.add_argument("--server-errors", type=float, default=0.0, help="probability of 5xx responses")
+    parser.add_argument("--mergeability-check-duration", type=float, default=0.5)
+    parser.add_argument("--pipeline-duration", type=float, default=2.0)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    setup_logging(level="WARNING")
+
+    with tempfile.TemporaryDirectory() as directory:
+        asyncio.run(benchmark(args, Path(directory)))
+
+
+if __name__ == "__main__":
+    main()
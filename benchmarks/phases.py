@@ -0,0 +1,40 @@
+import asyncio
+import statistics
+import time
+from typing import Awaitable, Callable
+
+
+async def run_phase(
+    name: str, operation: Callable[[int], Awaitable[object]], count: int, concurrency: int
+) -> list[int]:
+    semaphore = asyncio.Semaphore(concurrency)
+    durations: list[float] = []
+    errors: list[BaseException] = []
+    succeeded: list[int] = []
+
+    async def _run(index: int) -> None:
+        async with semaphore:
+            started_at = time.perf_counter()
+            try:
+                await operation(index)
+            except Exception as e:
+                errors.append(e)
+            else:
+                succeeded.append(index)
+            finally:
+                durations.append(time.perf_counter() - started_at)
+
+    started_at = time.perf_counter()
+    await asyncio.gather(*[_run(index) for index in range(count)])
+    elapsed = time.perf_counter() - started_at
+
+    quantiles = statistics.quantiles(durations, n=100, method="inclusive") if len(durations) > 1 else durations * 99
+    print(
+        f"{name:<8} {count:>6} ops  {len(errors):>4} errors  {count / elapsed:>8.2f} ops/s  "
+        f"p50 {quantiles[49]:>7.3f}s  p95 {quantiles[94]:>7.3f}s  p99 {quantiles[98]:>7.3f}s  "
+        f"max {max(durations):>7.3f}s"
+    )
+    for error in errors[:3]:
+        print(f"         {type(error).__name__}: {error}")
+
+    return sorted(succeeded)
@@ -1,14 +1,20 @@
+from contextlib import asynccontextmanager
+
 from fastapi import APIRouter, Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from starlette.responses import FileResponse
 
-from foxops.dependencies import get_settings, static_token_auth_scheme
+from foxops.dependencies import (
+    get_settings,
+    start_job_worker_pool,
+    static_token_auth_scheme,
+)
 from foxops.error_handlers import __error_handlers__
 from foxops.logger import get_logger, setup_logging
 from foxops.middlewares import request_id_middleware, request_time_middleware
 from foxops.openapi import custom_openapi
-from foxops.routers import auth, incarnations, not_found, version
+from foxops.routers import auth, incarnations, jobs, not_found, version, webhooks
 
 #: Holds the module logger instance
 logger = get_logger(__name__)
@@ -19,11 +25,25 @@ logger = get_logger(__name__)
 FRONTEND_SUBDIRS = ["assets", "favicons"]
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # pending jobs (e.g. left over by a previous process) are executed without waiting for a request
+    start_job_worker_pool(app.state, get_settings())
+
+    yield
+
+    # stop background tasks (jobs which are still running are queued again)
+    if hasattr(app.state, "reconciliation_status_tracker"):
+        await app.state.reconciliation_status_tracker.stop()
+    if hasattr(app.state, "job_worker_pool"):
+        await app.state.job_worker_pool.stop()
+
+
 def create_app():
     settings = get_settings()
     setup_logging(level=settings.log_level)
 
-    app = FastAPI()
+    app = FastAPI(lifespan=lifespan)
 
     # Add middlewares
     app.middleware("http")(request_id_middleware)
@@ -44,10 +64,13 @@ def create_app():
     public_router = APIRouter()
     public_router.include_router(version.router)
     public_router.include_router(auth.router)
+    # webhooks are authenticated by their secret token
+    public_router.include_router(webhooks.router)
 
     # Add routes to the protected router (authentication required)
     protected_router = APIRouter(dependencies=[Depends(static_token_auth_scheme)])
     protected_router.include_router(incarnations.router)
+    protected_router.include_router(jobs.router)
 
     app.include_router(public_router)
     app.include_router(protected_router)
@@ -1,17 +1,90 @@
-from sqlalchemy import Pool
+import random
+from typing import Any, Sequence
+
+from sqlalchemy import make_url
 from sqlalchemy.event import listen
 from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
 
+from foxops.settings import DatabaseSettings
+
+
+def create_engine(connection_string: str, settings: DatabaseSettings | None = None) -> AsyncEngine:
+    """Create the database engine, configured (pooling, timeouts, SQLite pragmas) by the given settings."""
+
+    if settings is None:
+        settings = DatabaseSettings.model_construct()
+
+    url = make_url(connection_string)
+    engine_options: dict[str, Any] = {}
+    connect_args: dict[str, Any] = {}
+
+    is_sqlite = url.get_backend_name() == "sqlite"
+    is_in_memory_sqlite = is_sqlite and url.database in (None, "", ":memory:")
+    # in-memory SQLite databases use a single, static connection instead of a pool
+    if not is_in_memory_sqlite:
+        engine_options |= {
+            "pool_size": settings.pool_size,
+            "max_overflow": settings.max_overflow,
+            "pool_timeout": settings.pool_timeout.total_seconds(),
+            "pool_recycle": -1 if settings.pool_recycle is None else int(settings.pool_recycle.total_seconds()),
+        }
+
+    if url.get_backend_name() == "postgresql" and settings.statement_timeout is not None:
+        statement_timeout_ms = int(settings.statement_timeout.total_seconds() * 1000)
+        connect_args["server_settings"] = {"statement_timeout": str(statement_timeout_ms)}
+
+    engine = create_async_engine(
+        connection_string, future=True, echo=False, pool_pre_ping=True, connect_args=connect_args, **engine_options
+    )
+
+    if is_sqlite:
+        listen(engine.sync_engine, "connect", _sqlite_pragma_listener(settings, in_memory=is_in_memory_sqlite))
+
+    return engine
 
-def create_engine(connection_string: str) -> AsyncEngine:
-    # enforce foreign key constraints on SQLite:
-    # https://docs.sqlalchemy.org/en/20/dialects/sqlite.html#foreign-key-support
-    def set_sqlite_pragma(dbapi_connection, connection_record):
+
+def _sqlite_pragma_listener(settings: DatabaseSettings, in_memory: bool):
+    pragmas = [
+        # enforce foreign key constraints:
+        # https://docs.sqlalchemy.org/en/20/dialects/sqlite.html#foreign-key-support
+        "PRAGMA foreign_keys=ON",
+        f"PRAGMA synchronous={settings.sqlite_synchronous}",
+        f"PRAGMA busy_timeout={int(settings.sqlite_busy_timeout.total_seconds() * 1000)}",
+        # negative values are interpreted as KiB (instead of pages)
+        f"PRAGMA cache_size=-{settings.sqlite_cache_size_kib}",
+        f"PRAGMA mmap_size={settings.sqlite_mmap_size_bytes}",
+    ]
+    if not in_memory:
+        pragmas.append(f"PRAGMA journal_mode={settings.sqlite_journal_mode}")
+
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
         cursor = dbapi_connection.cursor()
-        cursor.execute("PRAGMA foreign_keys=ON")
+        for pragma in pragmas:
+            cursor.execute(pragma)
         cursor.close()
 
-    if connection_string.startswith("sqlite+"):
-        listen(Pool, "connect", set_sqlite_pragma)
+    return set_sqlite_pragmas
+
+
+class EngineRouter:
+    """Routes the queries of a single request either to the primary database or to one of its read replicas.
+
+    Reads go to a (randomly chosen) replica, until the first write was routed to the primary. From then on,
+    all reads go to the primary as well, so that they see the written data regardless of the replication lag.
+    """
+
+    def __init__(self, primary: AsyncEngine, replicas: Sequence[AsyncEngine] = ()) -> None:
+        self.primary = primary
+        self.replicas = list(replicas)
+
+        self._has_written = False
+
+    def for_read(self) -> AsyncEngine:
+        if self._has_written or not self.replicas:
+            return self.primary
+
+        return random.choice(self.replicas)
 
-    return create_async_engine(connection_string, future=True, echo=False, pool_pre_ping=True)
+    def for_write(self) -> AsyncEngine:
+        self._has_written = True
+        return self.primary
@@ -1,9 +1,12 @@
 import enum
+import json
 from datetime import datetime, timezone
-from typing import Self
+from typing import Literal, Self
 
 from pydantic import BaseModel, ConfigDict
 
+from foxops.engine.models.incarnation_state import TemplateData
+
 
 class ChangeType(enum.Enum):
     DIRECT = "direct"
@@ -24,9 +27,11 @@ class ChangeInDB(BaseModel):
 
     requested_version_hash: str
     requested_version: str
-    requested_data: str
+    requested_data: TemplateData
+    requested_data_hash: str
 
-    template_data_full: str
+    template_data_full: TemplateData
+    template_data_full_hash: str
 
     merge_request_id: str | None
     merge_request_branch_name: str | None
@@ -40,6 +45,19 @@ class ChangeInDB(BaseModel):
         return change_in_db
 
 
+class ChangeWithIncarnationRepositoryInDB(ChangeInDB):
+    """A change, together with the repository of its incarnation (which is needed e.g. to look up MR statuses)."""
+
+    incarnation_repository: str
+
+
+class ChangeWithIncarnationInDB(ChangeWithIncarnationRepositoryInDB):
+    """A change, together with all properties of its incarnation."""
+
+    target_directory: str
+    template_repository: str
+
+
 class IncarnationWithChangesSummary(BaseModel):
     """Represents an incarnation combined with information about its latest change."""
 
@@ -56,3 +74,47 @@ class IncarnationWithChangesSummary(BaseModel):
     merge_request_id: str | None
     created_at: datetime
     model_config = ConfigDict(from_attributes=True)
+
+
+class TemplateDataCondition(BaseModel):
+    """A condition on a single (possibly nested) variable of the full template data of an incarnation."""
+
+    path: list[str]
+    operator: Literal["eq", "ne", "lt", "le", "gt", "ge"]
+    value: str | bool | int | float
+
+    @classmethod
+    def parse(cls, expression: str) -> Self:
+        """Parse a condition in the form `<path>:<operator>:<value>`, e.g. `java.version:lt:21`.
+
+        Nested variables are separated by dots in the path. The value is interpreted as JSON if possible
+        (e.g. `21` is a number and `true` a boolean), otherwise as a string.
+        """
+
+        try:
+            path, operator, raw_value = expression.split(":", 2)
+        except ValueError:
+            raise ValueError(f"invalid template data condition '{expression}', expected '<path>:<operator>:<value>'")
+
+        try:
+            value = json.loads(raw_value)
+        except json.JSONDecodeError:
+            value = raw_value
+        if not isinstance(value, (str, bool, int, float)):
+            value = raw_value
+
+        return cls.model_validate({"path": path.split("."), "operator": operator, "value": value})
+
+
+class IncarnationSummaryFilter(BaseModel):
+    """Restricts the incarnations returned by `ChangeRepository.list_incarnations_with_changes_summary`.
+
+    All given criteria must match. The version, type and template data criteria refer to the latest change
+    of an incarnation.
+    """
+
+    incarnation_repository_prefix: str | None = None
+    template_repository: str | None = None
+    requested_version: str | None = None
+    type: ChangeType | None = None
+    template_data: list[TemplateDataCondition] = []
@@ -1,10 +1,28 @@
+import hashlib
+import json
+import operator
 from datetime import datetime, timezone
-from typing import AsyncIterator
-
-from sqlalchemy import and_, delete, desc, insert, select, update
+from typing import Any, AsyncIterator
+
+from sqlalchemy import (
+    and_,
+    case,
+    delete,
+    desc,
+    exists,
+    func,
+    insert,
+    select,
+    type_coerce,
+    update,
+)
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.engine import Row
 from sqlalchemy.exc import IntegrityError, NoResultFound
-from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
 
+from foxops.database.engine import EngineRouter
 from foxops.database.repositories.change.errors import (
     ChangeCommitAlreadyPushedError,
     ChangeConflictError,
@@ -14,16 +32,31 @@ from foxops.database.repositories.change.errors import (
 from foxops.database.repositories.change.model import (
     ChangeInDB,
     ChangeType,
+    ChangeWithIncarnationInDB,
+    ChangeWithIncarnationRepositoryInDB,
+    IncarnationSummaryFilter,
     IncarnationWithChangesSummary,
+    TemplateDataCondition,
+)
+from foxops.database.repositories.incarnation.errors import (
+    IncarnationNotFoundError as IncarnationNotFoundInDBError,
 )
-from foxops.database.schema import change, incarnations
+from foxops.database.schema import change, incarnations, template_data_blob
+from foxops.engine.models.incarnation_state import TemplateData
 from foxops.errors import IncarnationNotFoundError
 from foxops.logger import get_logger
 
+#: Holds how often a change is inserted, if its template data is deleted concurrently (see `_insert_change`)
+TEMPLATE_DATA_STORE_ATTEMPTS = 2
+
+requested_data_blob = template_data_blob.alias("requested_data_blob")
+template_data_full_blob = template_data_blob.alias("template_data_full_blob")
+
 
 class ChangeRepository:
-    def __init__(self, engine: AsyncEngine) -> None:
+    def __init__(self, engine: AsyncEngine, router: EngineRouter | None = None) -> None:
         self.engine = engine
+        self.router = router or EngineRouter(engine)
 
         self.log = get_logger(component=self.__class__.__name__)
 
@@ -36,8 +69,8 @@ class ChangeRepository:
         commit_pushed: bool,
         requested_version_hash: str,
         requested_version: str,
-        requested_data: str,
-        template_data_full: str,
+        requested_data: TemplateData,
+        template_data_full: TemplateData,
         merge_request_id: str | None = None,
         merge_request_branch_name: str | None = None,
     ) -> ChangeInDB:
@@ -51,34 +84,32 @@ class ChangeRepository:
         This is a useful mechanism to prevent conflicting changes.
         """
 
-        async with self.engine.connect() as conn:
-            query = (
-                insert(change)
-                .values(
+        async with self.router.for_write().connect() as conn:
+            try:
+                row = await _insert_change(
+                    conn,
+                    requested_data,
+                    template_data_full,
                     incarnation_id=incarnation_id,
                     revision=revision,
                     type=change_type.value,
                     created_at=datetime.now(timezone.utc),
                     requested_version_hash=requested_version_hash,
                     requested_version=requested_version,
-                    requested_data=requested_data,
-                    template_data_full=template_data_full,
                     commit_sha=commit_sha,
                     commit_pushed=commit_pushed,
                     merge_request_id=merge_request_id,
                     merge_request_branch_name=merge_request_branch_name,
                 )
-                .returning(*change.columns)
-            )
-            try:
-                result = await conn.execute(query)
             except IntegrityError:
                 raise ChangeConflictError(incarnation_id, revision)
 
-            row = result.one()
+            await conn.execute(self._update_latest_change_id_query(incarnation_id))
             await conn.commit()
 
-        return ChangeInDB.model_validate(row)
+        return ChangeInDB.model_validate(
+            {**row._mapping, "requested_data": requested_data, "template_data_full": template_data_full}
+        )
 
     async def create_incarnation_with_first_change(
         self,
@@ -88,8 +119,8 @@ class ChangeRepository:
         commit_sha: str,
         requested_version_hash: str,
         requested_version: str,
-        requested_data: str,
-        template_data_full: str,
+        requested_data: TemplateData,
+        template_data_full: TemplateData,
     ) -> ChangeInDB:
         logger = self.log.bind(function="create_incarnation_with_first_change")
         logger.debug(
@@ -99,7 +130,7 @@ class ChangeRepository:
             template_repository=template_repository,
         )
 
-        async with self.engine.begin() as conn:
+        async with self.router.for_write().begin() as conn:
             query_insert_incarnation = (
                 insert(incarnations)
                 .values(
@@ -114,37 +145,44 @@ class ChangeRepository:
 
             logger.debug("inserted incarnation", incarnation_id=incarnation_id)
 
-            query_insert_change = (
-                insert(change)
-                .values(
-                    incarnation_id=incarnation_id,
-                    revision=1,
-                    type=ChangeType.DIRECT.value,
-                    created_at=datetime.now(timezone.utc),
-                    requested_version_hash=requested_version_hash,
-                    requested_version=requested_version,
-                    requested_data=requested_data,
-                    template_data_full=template_data_full,
-                    commit_sha=commit_sha,
-                    commit_pushed=False,
-                )
-                .returning(*change.columns)
+            row = await _insert_change(
+                conn,
+                requested_data,
+                template_data_full,
+                incarnation_id=incarnation_id,
+                revision=1,
+                type=ChangeType.DIRECT.value,
+                created_at=datetime.now(timezone.utc),
+                requested_version_hash=requested_version_hash,
+                requested_version=requested_version,
+                commit_sha=commit_sha,
+                commit_pushed=False,
             )
-            result = await conn.execute(query_insert_change)
 
-            row = result.one()
+            await conn.execute(self._update_latest_change_id_query(incarnation_id))
             await conn.commit()
 
-        return ChangeInDB.model_validate(row)
+        return ChangeInDB.model_validate(
+            {**row._mapping, "requested_data": requested_data, "template_data_full": template_data_full}
+        )
 
     async def delete_incarnation(self, id_: int) -> None:
-        async with self.engine.connect() as conn:
+        async with self.router.for_write().connect() as conn:
+            # the changes are deleted by the cascade, so their template data is looked up beforehand
+            result = await conn.execute(
+                select(change.c.requested_data_hash, change.c.template_data_full_hash).where(
+                    change.c.incarnation_id == id_
+                )
+            )
+            template_data_hashes = {hash_ for row in result for hash_ in row}
+
             await conn.execute(delete(incarnations).where(incarnations.c.id == id_))
+            await _delete_unreferenced_template_data(conn, template_data_hashes)
             await conn.commit()
 
     async def get_change_by_revision(self, incarnation_id: int, revision: int) -> ChangeInDB:
-        query = select(change).where(and_(change.c.incarnation_id == incarnation_id, change.c.revision == revision))
-        async with self.engine.connect() as conn:
+        query = _changes_query().where(and_(change.c.incarnation_id == incarnation_id, change.c.revision == revision))
+        async with self.router.for_read().connect() as conn:
             result = await conn.execute(query)
 
             try:
@@ -155,22 +193,17 @@ class ChangeRepository:
         return ChangeInDB.from_database_row(row)
 
     async def get_change(self, id_: int) -> ChangeInDB:
-        query = select(change).where(change.c.id == id_)
-        async with self.engine.connect() as conn:
-            result = await conn.execute(query)
-
-            try:
-                row = result.one()
-            except NoResultFound:
-                raise ChangeNotFoundError(id_)
-
-        return ChangeInDB.from_database_row(row)
+        async with self.router.for_read().connect() as conn:
+            return await _get_change(conn, id_)
 
     async def get_latest_change_for_incarnation(self, incarnation_id: int) -> ChangeInDB:
         query = (
-            select(change).where(change.c.incarnation_id == incarnation_id).order_by(change.c.revision.desc()).limit(1)
+            _changes_query()
+            .where(change.c.incarnation_id == incarnation_id)
+            .order_by(change.c.revision.desc())
+            .limit(1)
         )
-        async with self.engine.connect() as conn:
+        async with self.router.for_read().connect() as conn:
             result = await conn.execute(query)
 
             try:
@@ -180,9 +213,41 @@ class ChangeRepository:
             else:
                 return ChangeInDB.model_validate(row)
 
+    async def get_latest_change_with_incarnation(self, incarnation_id: int) -> ChangeWithIncarnationInDB:
+        """Returns the latest change of the given incarnation, joined with the incarnation itself."""
+
+        query = _latest_changes_with_incarnation_query().where(incarnations.c.id == incarnation_id)
+        async with self.router.for_read().connect() as conn:
+            result = await conn.execute(query)
+
+            try:
+                row = result.one()
+            except NoResultFound:
+                raise IncarnationNotFoundInDBError(f"could not find incarnation in DB with id: {incarnation_id}")
+
+        if row.id is None:
+            raise IncarnationHasNoChangesError(incarnation_id)
+
+        return ChangeWithIncarnationInDB.from_database_row(row)
+
+    async def list_latest_changes_with_incarnation(self, incarnation_ids: list[int]) -> list[ChangeWithIncarnationInDB]:
+        """Like `get_latest_change_with_incarnation`, but for several incarnations (in the given order) at once."""
+
+        query = _latest_changes_with_incarnation_query().where(incarnations.c.id.in_(incarnation_ids))
+        async with self.router.for_read().connect() as conn:
+            result = await conn.execute(query)
+
+            changes = {
+                row.incarnation_id: ChangeWithIncarnationInDB.from_database_row(row)
+                for row in result
+                if row.id is not None
+            }
+
+        # raises the appropriate error for incarnations which don't exist or don't have changes
+        return [changes.get(id_) or await self.get_latest_change_with_incarnation(id_) for id_ in incarnation_ids]
+
     def _incarnations_with_changes_summary_query(self):
         alias_change = change.alias("change")
-        alias_change_newer = change.alias("change_newer")
 
         return (
             incarnations.c,
@@ -202,26 +267,55 @@ class ChangeRepository:
                 )
                 .select_from(incarnations)
                 # join incarnations with the corresponding latest change
-                .join(alias_change, alias_change.c.incarnation_id == incarnations.c.id)
-                .join(
-                    alias_change_newer,
-                    and_(
-                        alias_change_newer.c.incarnation_id == incarnations.c.id,
-                        alias_change.c.revision < alias_change_newer.c.revision,
-                    ),
-                    isouter=True,
-                )
-                # filter out all combinations where a newer change exists - to only leave those
-                # where the joined `change` is already the latest one
-                .where(alias_change_newer.c.id.is_(None))
+                .join(alias_change, alias_change.c.id == incarnations.c.latest_change_id)
                 .order_by(incarnations.c.id)
             ),
         )
 
-    async def list_incarnations_with_changes_summary(self) -> AsyncIterator[IncarnationWithChangesSummary]:
-        _, _, query = self._incarnations_with_changes_summary_query()
+    async def list_incarnations_with_changes_summary(
+        self,
+        filter_: IncarnationSummaryFilter | None = None,
+        after: int | None = None,
+        limit: int | None = None,
+        descending: bool = False,
+    ) -> AsyncIterator[IncarnationWithChangesSummary]:
+        """List the incarnations with their latest change, sorted by their ID.
+
+        Pagination is keyset based: `after` is the ID of the last incarnation of the previous page.
+        """
+
+        incarnation_c, change_c, query = self._incarnations_with_changes_summary_query()
 
-        async with self.engine.connect() as conn:
+        if filter_ is not None:
+            if filter_.incarnation_repository_prefix is not None:
+                query = query.where(
+                    incarnation_c.incarnation_repository.startswith(
+                        filter_.incarnation_repository_prefix, autoescape=True
+                    )
+                )
+            if filter_.template_repository is not None:
+                query = query.where(incarnation_c.template_repository == filter_.template_repository)
+            if filter_.requested_version is not None:
+                query = query.where(change_c.requested_version == filter_.requested_version)
+            if filter_.type is not None:
+                query = query.where(change_c.type == filter_.type.value)
+            if filter_.template_data:
+                query = query.join(
+                    template_data_full_blob, template_data_full_blob.c.hash == change_c.template_data_full_hash
+                )
+            for condition in filter_.template_data:
+                query = query.where(
+                    _template_data_condition(template_data_full_blob.c.data, condition, self.engine.dialect.name)
+                )
+
+        if descending:
+            query = query.order_by(None).order_by(incarnation_c.id.desc())
+        if after is not None:
+            query = query.where(incarnation_c.id < after if descending else incarnation_c.id > after)
+        if limit is not None:
+            query = query.limit(limit)
+
+        async with self.router.for_read().connect() as conn:
             for row in await conn.execute(query):
                 yield IncarnationWithChangesSummary.model_validate(row)
 
@@ -233,7 +327,7 @@ class ChangeRepository:
             incarnation_c.target_directory == target_directory
         )
 
-        async with self.engine.connect() as conn:
+        async with self.router.for_read().connect() as conn:
             result = await conn.execute(query)
             try:
                 row = result.one()
@@ -242,25 +336,50 @@ class ChangeRepository:
 
         return IncarnationWithChangesSummary.model_validate(row)
 
-    async def list_changes(self, incarnation_id: int) -> list[ChangeInDB]:
-        query = select(change).where(change.c.incarnation_id == incarnation_id).order_by(desc(change.c.revision))
-        async with self.engine.connect() as conn:
+    async def list_changes(self, incarnation_id: int) -> list[ChangeWithIncarnationRepositoryInDB]:
+        query = (
+            _changes_query(incarnations.c.incarnation_repository)
+            .join(incarnations, incarnations.c.id == change.c.incarnation_id)
+            .where(change.c.incarnation_id == incarnation_id)
+            .order_by(desc(change.c.revision))
+        )
+        async with self.router.for_read().connect() as conn:
             result = await conn.execute(query)
 
-            return [ChangeInDB.from_database_row(row) for row in result]
+            return [ChangeWithIncarnationRepositoryInDB.from_database_row(row) for row in result]
 
     async def delete_change(self, id_: int) -> None:
-        async with self.engine.connect() as conn:
-            result = await conn.execute(delete(change).where(change.c.id == id_))
-            await conn.commit()
+        async with self.router.for_write().begin() as conn:
+            result = await conn.execute(
+                delete(change)
+                .where(change.c.id == id_)
+                .returning(change.c.incarnation_id, change.c.requested_data_hash, change.c.template_data_full_hash)
+            )
+            try:
+                incarnation_id, *template_data_hashes = result.one()
+            except NoResultFound:
+                raise ChangeNotFoundError(id_)
 
-        if result.rowcount == 0:
-            raise ChangeNotFoundError(id_)
+            await conn.execute(self._update_latest_change_id_query(incarnation_id))
+            await _delete_unreferenced_template_data(conn, set(template_data_hashes))
+
+    @staticmethod
+    def _update_latest_change_id_query(incarnation_id: int):
+        """Points the `latest_change_id` of the given incarnation to its change with the highest revision."""
+
+        latest_change_id = (
+            select(change.c.id)
+            .where(change.c.incarnation_id == incarnation_id)
+            .order_by(change.c.revision.desc())
+            .limit(1)
+            .scalar_subquery()
+        )
+        return update(incarnations).values(latest_change_id=latest_change_id).where(incarnations.c.id == incarnation_id)
 
     async def update_commit_sha(self, id_: int, commit_sha: str) -> ChangeInDB:
         query_select_change_commit_pushed = select(change.c.commit_pushed).where(change.c.id == id_)
 
-        async with self.engine.begin() as conn:
+        async with self.router.for_write().begin() as conn:
             # verify that the change exists and the referenced commit was not yet pushed
             # NOTE: Maybe it makes sense to move this into the business service, to also verify that the commit
             #       referenced in the DB does NOT exist in the target repo
@@ -274,13 +393,8 @@ class ChangeRepository:
                 raise ChangeCommitAlreadyPushedError(id_)
 
             # all good, let's update the commit sha
-            result = await conn.execute(
-                update(change).values(commit_sha=commit_sha).where(change.c.id == id_).returning(*change.columns)
-            )
-            row = result.one()
-            await conn.commit()
-
-        return ChangeInDB.model_validate(row)
+            await conn.execute(update(change).values(commit_sha=commit_sha).where(change.c.id == id_))
+            return await _get_change(conn, id_)
 
     async def update_commit_pushed(self, id_: int, commit_pushed: bool) -> ChangeInDB:
         return await self._update_one(id_, commit_pushed=commit_pushed)
@@ -289,11 +403,177 @@ class ChangeRepository:
         return await self._update_one(id_, merge_request_id=merge_request_id)
 
     async def _update_one(self, id_: int, **kwargs) -> ChangeInDB:
-        query = update(change).values(**kwargs).where(change.c.id == id_).returning(*change.columns)
-        async with self.engine.connect() as conn:
+        query = update(change).values(**kwargs).where(change.c.id == id_).returning(change.c.id)
+        async with self.router.for_write().connect() as conn:
             result = await conn.execute(query)
 
-            row = result.one()
+            result.one()
+            change_in_db = await _get_change(conn, id_)
             await conn.commit()
 
-        return ChangeInDB.model_validate(row)
+        return change_in_db
+
+
+def template_data_hash(data: TemplateData) -> str:
+    """Returns the hash by which the given template data is stored (independent of the order of the keys)."""
+
+    return hashlib.sha256(
+        json.dumps(data, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode()
+    ).hexdigest()
+
+
+def _changes_query(*columns):
+    """Select changes, together with their template data."""
+
+    return (
+        select(
+            change,
+            requested_data_blob.c.data.label("requested_data"),
+            template_data_full_blob.c.data.label("template_data_full"),
+            *columns,
+        )
+        .join(requested_data_blob, requested_data_blob.c.hash == change.c.requested_data_hash)
+        .join(template_data_full_blob, template_data_full_blob.c.hash == change.c.template_data_full_hash)
+    )
+
+
+def _latest_changes_with_incarnation_query():
+    return (
+        select(
+            change,
+            requested_data_blob.c.data.label("requested_data"),
+            template_data_full_blob.c.data.label("template_data_full"),
+            incarnations.c.incarnation_repository,
+            incarnations.c.target_directory,
+            incarnations.c.template_repository,
+        )
+        .select_from(incarnations)
+        .join(change, change.c.id == incarnations.c.latest_change_id, isouter=True)
+        .join(requested_data_blob, requested_data_blob.c.hash == change.c.requested_data_hash, isouter=True)
+        .join(
+            template_data_full_blob,
+            template_data_full_blob.c.hash == change.c.template_data_full_hash,
+            isouter=True,
+        )
+    )
+
+
+async def _get_change(conn: AsyncConnection, id_: int) -> ChangeInDB:
+    result = await conn.execute(_changes_query().where(change.c.id == id_))
+
+    try:
+        row = result.one()
+    except NoResultFound:
+        raise ChangeNotFoundError(id_)
+
+    return ChangeInDB.from_database_row(row)
+
+
+async def _insert_change(
+    conn: AsyncConnection, requested_data: TemplateData, template_data_full: TemplateData, **values: Any
+) -> Row:
+    """Insert a change with the given values, storing its template data first.
+
+    Template data is deleted together with the last change referencing it, which may happen concurrently
+    (between storing it and inserting the change), so the insert is retried once if the data is missing.
+    Other integrity errors (e.g. a conflicting revision) are raised.
+    """
+
+    hashes = {template_data_hash(requested_data), template_data_hash(template_data_full)}
+
+    attempt = 1
+    while True:
+        try:
+            async with conn.begin_nested():
+                result = await conn.execute(
+                    insert(change)
+                    .values(
+                        **values,
+                        requested_data_hash=await _store_template_data(conn, requested_data),
+                        template_data_full_hash=await _store_template_data(conn, template_data_full),
+                    )
+                    .returning(*change.columns)
+                )
+                return result.one()
+        except IntegrityError:
+            stored = await conn.execute(select(func.count()).where(template_data_blob.c.hash.in_(hashes)))
+            if attempt >= TEMPLATE_DATA_STORE_ATTEMPTS or stored.scalar_one() == len(hashes):
+                raise
+            attempt += 1
+
+
+async def _store_template_data(conn: AsyncConnection, data: TemplateData) -> str:
+    hash_ = template_data_hash(data)
+
+    query: postgresql.Insert | sqlite.Insert
+    match conn.dialect.name:
+        case "postgresql":
+            query = postgresql.insert(template_data_blob)
+        case "sqlite":
+            query = sqlite.insert(template_data_blob)
+        case _:
+            raise NotImplementedError(f"upserts are not supported for database dialect {conn.dialect.name}")
+
+    await conn.execute(query.values(hash=hash_, data=data).on_conflict_do_nothing(index_elements=["hash"]))
+    return hash_
+
+
+async def _delete_unreferenced_template_data(conn: AsyncConnection, hashes: set[str]) -> None:
+    """Delete the given template data (of deleted changes), unless other changes still reference it."""
+
+    if not hashes:
+        return
+
+    query = delete(template_data_blob).where(
+        template_data_blob.c.hash.in_(hashes),
+        ~exists().where(change.c.requested_data_hash == template_data_blob.c.hash),
+        ~exists().where(change.c.template_data_full_hash == template_data_blob.c.hash),
+    )
+    try:
+        async with conn.begin_nested():
+            await conn.execute(query)
+    except IntegrityError:
+        # a concurrently created change references the data again, so it's kept (and collected with that change)
+        pass
+
+
+def _template_data_condition(column, condition: TemplateDataCondition, dialect: str):
+    """Build the condition on the template data column.
+
+    Values only match variables of the same JSON type (e.g. `21` doesn't match the string `"21"`), on all databases.
+    """
+
+    value = condition.value
+
+    # equality checks can make use of the GIN index on PostgreSQL, by querying for containment
+    if dialect == "postgresql" and condition.operator == "eq":
+        document: Any = value
+        for key in reversed(condition.path):
+            document = {key: document}
+        return type_coerce(column, JSONB).contains(document)
+
+    element = column[tuple(condition.path)]
+    if isinstance(value, bool):
+        element, json_types = element.as_boolean(), _JSON_TYPES[dialect]["boolean"]
+    elif isinstance(value, (int, float)):
+        element, json_types = element.as_float(), _JSON_TYPES[dialect]["number"]
+    else:
+        element, json_types = element.as_string(), _JSON_TYPES[dialect]["string"]
+
+    # the type is checked in a `CASE`, as the database may evaluate the operands of an `AND` in any order
+    # (and casting e.g. a string to a number fails on PostgreSQL)
+    typed_element = case((_json_type(column, condition.path, dialect).in_(json_types), element))
+    return getattr(operator, condition.operator)(typed_element, value)
+
+
+#: Holds the names of the JSON types (as returned by `json_type` / `jsonb_typeof`) per dialect
+_JSON_TYPES = {
+    "postgresql": {"boolean": ["boolean"], "number": ["number"], "string": ["string"]},
+    "sqlite": {"boolean": ["true", "false"], "number": ["integer", "real"], "string": ["text"]},
+}
+
+
+def _json_type(column, path: list[str], dialect: str):
+    if dialect == "postgresql":
+        return func.jsonb_typeof(type_coerce(column, JSONB)[tuple(path)])
+    return func.json_type(column, "$" + "".join(f".{json.dumps(key)}" for key in path))
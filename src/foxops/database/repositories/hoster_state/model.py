@@ -0,0 +1,45 @@
+from datetime import datetime, timezone
+from typing import Self
+
+from pydantic import BaseModel, ConfigDict
+
+
+class MergeRequestStateInDB(BaseModel):
+    repository: str
+    merge_request_id: str
+
+    state: str
+    merge_status: str | None
+    sha: str | None
+    merge_commit_sha: str | None
+
+    hoster_updated_at: datetime | None = None
+    updated_at: datetime
+    model_config = ConfigDict(from_attributes=True)
+
+    @classmethod
+    def from_database_row(cls, obj) -> Self:
+        state = cls.model_validate(obj)
+        state.updated_at = state.updated_at.replace(tzinfo=timezone.utc)
+        if state.hoster_updated_at is not None:
+            state.hoster_updated_at = state.hoster_updated_at.replace(tzinfo=timezone.utc)
+
+        return state
+
+
+class CommitStatusInDB(BaseModel):
+    repository: str
+    commit_sha: str
+
+    status: str
+    pipeline_id: int | None = None
+
+    updated_at: datetime
+    model_config = ConfigDict(from_attributes=True)
+
+    @classmethod
+    def from_database_row(cls, obj) -> Self:
+        status = cls.model_validate(obj)
+        status.updated_at = status.updated_at.replace(tzinfo=timezone.utc)
+
+        return status
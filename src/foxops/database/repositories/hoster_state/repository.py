@@ -0,0 +1,147 @@
+from datetime import datetime, timezone
+from typing import Any, Callable
+
+from sqlalchemy import ColumnElement, Table, and_, or_, select, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from foxops.database.repositories.hoster_state.model import (
+    CommitStatusInDB,
+    MergeRequestStateInDB,
+)
+from foxops.database.schema import commit_status, merge_request_state
+
+#: Holds the pipeline statuses which (apart from retries of single jobs) don't change anymore
+FINISHED_PIPELINE_STATUSES = ("success", "failed", "canceled", "skipped")
+
+
+class HosterStateRepository:
+    """Stores the latest known state of merge requests and commits in the hoster (as reported by webhooks).
+
+    Webhook events can be delivered late or out of order, so a state is only replaced by a newer one: merge requests
+    are ordered by the time they were updated in the hoster, commit statuses by their pipeline (and finished pipelines
+    are never replaced by an unfinished state of the same pipeline). `updated_at` is when the state was last confirmed.
+    """
+
+    def __init__(self, engine: AsyncEngine) -> None:
+        self.engine = engine
+
+    async def upsert_merge_request_state(
+        self,
+        repository: str,
+        merge_request_id: str,
+        state: str,
+        merge_status: str | None,
+        sha: str | None,
+        merge_commit_sha: str | None,
+        hoster_updated_at: datetime | None = None,
+    ) -> None:
+        async with self.engine.begin() as conn:
+            await _upsert(
+                conn,
+                merge_request_state,
+                _is_newer_merge_request_state,
+                repository=repository,
+                merge_request_id=merge_request_id,
+                state=state,
+                merge_status=merge_status,
+                sha=sha,
+                merge_commit_sha=merge_commit_sha,
+                hoster_updated_at=hoster_updated_at,
+                updated_at=datetime.now(timezone.utc),
+            )
+
+    async def upsert_commit_status(
+        self, repository: str, commit_sha: str, status: str, pipeline_id: int | None = None
+    ) -> None:
+        async with self.engine.begin() as conn:
+            await _upsert(
+                conn,
+                commit_status,
+                _is_newer_commit_status,
+                repository=repository,
+                commit_sha=commit_sha,
+                status=status,
+                pipeline_id=pipeline_id,
+                updated_at=datetime.now(timezone.utc),
+            )
+
+    async def get_merge_request_state(self, repository: str, merge_request_id: str) -> MergeRequestStateInDB | None:
+        states = await self.get_merge_request_states([(repository, merge_request_id)])
+        return states.get((repository, merge_request_id))
+
+    async def get_merge_request_states(
+        self, merge_requests: list[tuple[str, str]]
+    ) -> dict[tuple[str, str], MergeRequestStateInDB]:
+        if not merge_requests:
+            return {}
+
+        query = select(merge_request_state).where(
+            tuple_(merge_request_state.c.repository, merge_request_state.c.merge_request_id).in_(merge_requests)
+        )
+
+        async with self.engine.connect() as conn:
+            states = [MergeRequestStateInDB.from_database_row(row) for row in await conn.execute(query)]
+
+        return {(state.repository, state.merge_request_id): state for state in states}
+
+    async def get_commit_status(self, repository: str, commit_sha: str) -> CommitStatusInDB | None:
+        query = select(commit_status).where(
+            commit_status.c.repository == repository, commit_status.c.commit_sha == commit_sha
+        )
+
+        async with self.engine.connect() as conn:
+            row = (await conn.execute(query)).one_or_none()
+
+        return None if row is None else CommitStatusInDB.from_database_row(row)
+
+
+def _is_newer_merge_request_state(stored: Any, excluded: Any) -> ColumnElement[bool]:
+    # states without a time (e.g. from events of older GitLab versions) can't be ordered and are always taken
+    return or_(
+        stored.hoster_updated_at.is_(None),
+        excluded.hoster_updated_at.is_(None),
+        stored.hoster_updated_at <= excluded.hoster_updated_at,
+    )
+
+
+def _is_newer_commit_status(stored: Any, excluded: Any) -> ColumnElement[bool]:
+    return or_(
+        stored.pipeline_id.is_(None),
+        excluded.pipeline_id.is_(None),
+        stored.pipeline_id < excluded.pipeline_id,
+        and_(
+            stored.pipeline_id == excluded.pipeline_id,
+            or_(
+                stored.status.not_in(FINISHED_PIPELINE_STATUSES),
+                excluded.status.in_(FINISHED_PIPELINE_STATUSES),
+            ),
+        ),
+    )
+
+
+async def _upsert(
+    conn: AsyncConnection,
+    table: Table,
+    is_newer: Callable[[Any, Any], ColumnElement[bool]],
+    **values: Any,
+) -> None:
+    """Insert the given row, or update the existing one if `is_newer`."""
+
+    query: postgresql.Insert | sqlite.Insert
+    match conn.dialect.name:
+        case "postgresql":
+            query = postgresql.insert(table).values(**values)
+        case "sqlite":
+            query = sqlite.insert(table).values(**values)
+        case _:
+            raise NotImplementedError(f"upserts are not supported for database dialect {conn.dialect.name}")
+
+    primary_key = [c.name for c in table.primary_key.columns]
+    await conn.execute(
+        query.on_conflict_do_update(
+            index_elements=primary_key,
+            set_={name: query.excluded[name] for name in values if name not in primary_key},
+            where=is_newer(table.c, query.excluded),
+        )
+    )
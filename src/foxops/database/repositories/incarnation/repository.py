@@ -4,6 +4,7 @@ from sqlalchemy import delete, insert, select
 from sqlalchemy.exc import IntegrityError, NoResultFound
 from sqlalchemy.ext.asyncio import AsyncEngine
 
+from foxops.database.engine import EngineRouter
 from foxops.database.repositories.incarnation.errors import (
     IncarnationAlreadyExistsError,
     IncarnationNotFoundError,
@@ -13,8 +14,9 @@ from foxops.database.schema import incarnations
 
 
 class IncarnationRepository:
-    def __init__(self, engine: AsyncEngine) -> None:
+    def __init__(self, engine: AsyncEngine, router: EngineRouter | None = None) -> None:
         self.engine = engine
+        self.router = router or EngineRouter(engine)
 
     async def create(
         self,
@@ -22,7 +24,7 @@ class IncarnationRepository:
         target_directory: str,
         template_repository: str,
     ) -> IncarnationInDB:
-        async with self.engine.begin() as conn:
+        async with self.router.for_write().begin() as conn:
             query = (
                 insert(incarnations)
                 .values(
@@ -46,14 +48,14 @@ class IncarnationRepository:
     async def list(self) -> AsyncIterator[IncarnationInDB]:
         query = select(incarnations)
 
-        async with self.engine.begin() as conn:
+        async with self.router.for_read().begin() as conn:
             for row in await conn.execute(query):
                 yield IncarnationInDB.model_validate(row)
 
     async def get_by_id(self, id_: int) -> IncarnationInDB:
         query = select(incarnations).where(incarnations.c.id == id_)
 
-        async with self.engine.begin() as conn:
+        async with self.router.for_read().begin() as conn:
             result = await conn.execute(query)
 
             try:
@@ -66,7 +68,7 @@ class IncarnationRepository:
     async def delete_by_id(self, id_: int) -> None:
         query = delete(incarnations).where(incarnations.c.id == id_)
 
-        async with self.engine.begin() as conn:
+        async with self.router.for_write().begin() as conn:
             result = await conn.execute(query)
 
             if result.rowcount == 0:
@@ -0,0 +1,6 @@
+from foxops.errors import FoxopsError
+
+
+class JobNotFoundError(FoxopsError):
+    def __init__(self, id_: int) -> None:
+        super().__init__(f"Job with id {id_} not found")
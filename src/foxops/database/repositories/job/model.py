@@ -0,0 +1,46 @@
+import enum
+from datetime import datetime, timezone
+from typing import Any, Self
+
+from pydantic import BaseModel, ConfigDict
+
+
+class JobType(enum.Enum):
+    CHANGE = "change"
+    RESET = "reset"
+
+
+class JobStatus(enum.Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+class JobInDB(BaseModel):
+    id: int
+    type: JobType
+    incarnation_id: int
+    arguments: dict[str, Any]
+
+    status: JobStatus
+    progress: str | None
+    error: str | None
+    change_id: int | None
+    # only set when a single job is read (see `JobRepository.get`)
+    change_revision: int | None = None
+
+    created_at: datetime
+    started_at: datetime | None
+    finished_at: datetime | None
+    heartbeat_at: datetime | None
+    model_config = ConfigDict(from_attributes=True)
+
+    @classmethod
+    def from_database_row(cls, obj) -> Self:
+        job = cls.model_validate(obj)
+        for field in ("created_at", "started_at", "finished_at", "heartbeat_at"):
+            if (value := getattr(job, field)) is not None:
+                setattr(job, field, value.replace(tzinfo=timezone.utc))
+
+        return job
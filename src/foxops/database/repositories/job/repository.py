@@ -0,0 +1,131 @@
+from datetime import datetime, timezone
+from typing import Any
+
+from sqlalchemy import exists, insert, select, update
+from sqlalchemy.exc import NoResultFound
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from foxops.database.repositories.job.errors import JobNotFoundError
+from foxops.database.repositories.job.model import JobInDB, JobStatus, JobType
+from foxops.database.schema import change, job
+
+
+class JobRepository:
+    """Stores the jobs which are queued for (or executed by) the job workers.
+
+    Jobs are claimed in the order they were created, but only one job per incarnation is running at any time.
+    """
+
+    def __init__(self, engine: AsyncEngine) -> None:
+        self.engine = engine
+
+    async def create(self, type_: JobType, incarnation_id: int, arguments: dict[str, Any]) -> JobInDB:
+        query = (
+            insert(job)
+            .values(
+                type=type_.value,
+                incarnation_id=incarnation_id,
+                arguments=arguments,
+                status=JobStatus.PENDING.value,
+                created_at=datetime.now(timezone.utc),
+            )
+            .returning(*job.columns)
+        )
+
+        async with self.engine.begin() as conn:
+            row = (await conn.execute(query)).one()
+
+        return JobInDB.from_database_row(row)
+
+    async def get(self, id_: int) -> JobInDB:
+        query = (
+            select(job, change.c.revision.label("change_revision"))
+            .select_from(job)
+            .join(change, change.c.id == job.c.change_id, isouter=True)
+            .where(job.c.id == id_)
+        )
+
+        async with self.engine.connect() as conn:
+            result = await conn.execute(query)
+
+            try:
+                row = result.one()
+            except NoResultFound:
+                raise JobNotFoundError(id_)
+
+        return JobInDB.from_database_row(row)
+
+    async def claim_next(self) -> JobInDB | None:
+        """Marks the oldest pending job (of an incarnation without a running job) as running and returns it.
+
+        Returns `None` if there is no such job, or if another worker claimed it at the same time.
+        """
+
+        pending_job = job.alias("pending_job")
+        running_job = job.alias("running_job")
+        next_job_id = (
+            select(pending_job.c.id)
+            .where(pending_job.c.status == JobStatus.PENDING.value)
+            .where(
+                ~exists().where(
+                    running_job.c.incarnation_id == pending_job.c.incarnation_id,
+                    running_job.c.status == JobStatus.RUNNING.value,
+                )
+            )
+            .order_by(pending_job.c.id)
+            .limit(1)
+            .scalar_subquery()
+        )
+
+        now = datetime.now(timezone.utc)
+        query = (
+            update(job)
+            # checking the status again prevents two workers from claiming the same job
+            .where(job.c.id == next_job_id, job.c.status == JobStatus.PENDING.value)
+            .values(status=JobStatus.RUNNING.value, started_at=now, heartbeat_at=now)
+            .returning(*job.columns)
+        )
+
+        async with self.engine.begin() as conn:
+            row = (await conn.execute(query)).one_or_none()
+
+        return None if row is None else JobInDB.from_database_row(row)
+
+    async def update_progress(self, id_: int, progress: str) -> None:
+        await self._update_one(id_, progress=progress, heartbeat_at=datetime.now(timezone.utc))
+
+    async def heartbeat(self, id_: int) -> None:
+        await self._update_one(id_, heartbeat_at=datetime.now(timezone.utc))
+
+    async def finish(
+        self, id_: int, status: JobStatus, error: str | None = None, change_id: int | None = None
+    ) -> JobInDB:
+        return await self._update_one(
+            id_, status=status.value, error=error, change_id=change_id, finished_at=datetime.now(timezone.utc)
+        )
+
+    async def fail_stale_jobs(self, heartbeat_before: datetime, error: str) -> list[JobInDB]:
+        """Marks running jobs as failed if their worker didn't send a heartbeat since the given time."""
+
+        query = (
+            update(job)
+            .where(job.c.status == JobStatus.RUNNING.value, job.c.heartbeat_at < heartbeat_before)
+            .values(status=JobStatus.FAILED.value, error=error, finished_at=datetime.now(timezone.utc))
+            .returning(*job.columns)
+        )
+
+        async with self.engine.begin() as conn:
+            return [JobInDB.from_database_row(row) for row in await conn.execute(query)]
+
+    async def _update_one(self, id_: int, **kwargs) -> JobInDB:
+        query = update(job).values(**kwargs).where(job.c.id == id_).returning(*job.columns)
+
+        async with self.engine.begin() as conn:
+            result = await conn.execute(query)
+
+            try:
+                row = result.one()
+            except NoResultFound:
+                raise JobNotFoundError(id_)
+
+        return JobInDB.from_database_row(row)
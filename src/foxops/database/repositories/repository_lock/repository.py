@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from foxops.database.schema import repository_lock
+
+
+class RepositoryLockRepository:
+    """Stores leases on repositories, which are held while a change is pushed to the repository.
+
+    A lease expires if it isn't renewed by its holder, so that a stopped process doesn't block the repository forever.
+    """
+
+    def __init__(self, engine: AsyncEngine) -> None:
+        self.engine = engine
+
+    async def acquire(self, repository: str, holder: str, lease: timedelta) -> bool:
+        """Takes the lease on the given repository, if nobody else holds an unexpired lease on it."""
+
+        now = datetime.now(timezone.utc)
+        values = {"repository": repository, "holder": holder, "expires_at": now + lease}
+
+        async with self.engine.begin() as conn:
+            insert: postgresql.Insert | sqlite.Insert
+            match conn.dialect.name:
+                case "postgresql":
+                    insert = postgresql.insert(repository_lock).values(**values)
+                case "sqlite":
+                    insert = sqlite.insert(repository_lock).values(**values)
+                case _:
+                    raise NotImplementedError(f"repository locks are not supported for {conn.dialect.name}")
+
+            query = insert.on_conflict_do_update(
+                index_elements=[repository_lock.c.repository],
+                set_={"holder": insert.excluded.holder, "expires_at": insert.excluded.expires_at},
+                # only take over leases which expired
+                where=repository_lock.c.expires_at < now,
+            ).returning(repository_lock.c.holder)
+
+            return (await conn.execute(query)).one_or_none() is not None
+
+    async def renew(self, repository: str, holder: str, lease: timedelta) -> bool:
+        """Extends the lease of the given holder. Returns `False` if the lease was lost in the meantime."""
+
+        query = (
+            update(repository_lock)
+            .where(repository_lock.c.repository == repository, repository_lock.c.holder == holder)
+            .values(expires_at=datetime.now(timezone.utc) + lease)
+        )
+
+        async with self.engine.begin() as conn:
+            return (await conn.execute(query)).rowcount > 0
+
+    async def release(self, repository: str, holder: str) -> None:
+        query = delete(repository_lock).where(
+            repository_lock.c.repository == repository, repository_lock.c.holder == holder
+        )
+
+        async with self.engine.begin() as conn:
+            await conn.execute(query)
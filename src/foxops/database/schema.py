@@ -1,17 +1,23 @@
 from sqlalchemy import (
+    JSON,
     Boolean,
     Column,
     DateTime,
     ForeignKey,
+    Index,
     Integer,
     MetaData,
     String,
     Table,
     UniqueConstraint,
 )
+from sqlalchemy.dialects.postgresql import JSONB
 
 meta = MetaData()
 
+#: JSON documents are stored as JSONB on PostgreSQL (to be able to index and query them efficiently)
+JSONDocument = JSON().with_variant(JSONB(), "postgresql")
+
 # Database schemas
 incarnations = Table(
     "incarnation",
@@ -20,7 +26,23 @@ incarnations = Table(
     Column("incarnation_repository", String, nullable=False),
     Column("target_directory", String, nullable=False),
     Column("template_repository", String, nullable=False),
+    # points to the change with the highest revision of this incarnation (maintained by the ChangeRepository).
+    # Not declared as a foreign key, to avoid a cyclic dependency between the two tables.
+    Column("latest_change_id", Integer),
     UniqueConstraint("incarnation_repository", "target_directory", name="incarnation_identity"),
+    # support filtering the inventory (prefix filters on `incarnation_repository` use the unique constraint)
+    Index("ix_incarnation_template_repository", "template_repository"),
+    Index("ix_incarnation_latest_change_id", "latest_change_id"),
+)
+
+# template data documents, stored once per distinct content and referenced by their hash
+template_data_blob = Table(
+    "template_data_blob",
+    meta,
+    Column("hash", String, primary_key=True),
+    Column("data", JSONDocument, nullable=False),
+    # supports containment queries (`@>`) on the template data
+    Index("ix_template_data_blob_data", "data", postgresql_using="gin").ddl_if(dialect="postgresql"),
 )
 
 change = Table(
@@ -33,12 +55,84 @@ change = Table(
     Column("created_at", DateTime(timezone=True), nullable=False),
     Column("requested_version_hash", String, nullable=False),
     Column("requested_version", String, nullable=False),
-    Column("requested_data", String, nullable=False),
-    Column("template_data_full", String, nullable=False),
+    Column(
+        "requested_data_hash",
+        String,
+        ForeignKey("template_data_blob.hash", name="fk_change_requested_data_hash"),
+        nullable=False,
+    ),
+    Column(
+        "template_data_full_hash",
+        String,
+        ForeignKey("template_data_blob.hash", name="fk_change_template_data_full_hash"),
+        nullable=False,
+    ),
     Column("commit_sha", String, nullable=False),
     Column("commit_pushed", Boolean, nullable=False),
     # fields for merge request changes
     Column("merge_request_id", String),
     Column("merge_request_branch_name", String),
     UniqueConstraint("incarnation_id", "revision", name="change_incarnation_revision"),
+    Index("ix_change_requested_version", "requested_version"),
+    Index("ix_change_requested_data_hash", "requested_data_hash"),
+    Index("ix_change_template_data_full_hash", "template_data_full_hash"),
+)
+
+# state of merge requests and commits in the hoster, as reported by webhooks
+merge_request_state = Table(
+    "merge_request_state",
+    meta,
+    Column("repository", String, primary_key=True),
+    Column("merge_request_id", String, primary_key=True),
+    Column("state", String, nullable=False),
+    Column("merge_status", String),
+    Column("sha", String),
+    Column("merge_commit_sha", String),
+    # when the merge request was last updated in the hoster (to ignore events which arrive out of order)
+    Column("hoster_updated_at", DateTime(timezone=True)),
+    Column("updated_at", DateTime(timezone=True), nullable=False),
+)
+
+commit_status = Table(
+    "commit_status",
+    meta,
+    Column("repository", String, primary_key=True),
+    Column("commit_sha", String, primary_key=True),
+    Column("status", String, nullable=False),
+    # the pipeline which reported the status (to ignore events which arrive out of order)
+    Column("pipeline_id", Integer),
+    Column("updated_at", DateTime(timezone=True), nullable=False),
+)
+
+# changes which were requested asynchronously and are (or will be) executed by a worker
+job = Table(
+    "job",
+    meta,
+    Column("id", Integer, primary_key=True),
+    Column("type", String, nullable=False),
+    Column("incarnation_id", Integer, ForeignKey("incarnation.id", ondelete="CASCADE"), nullable=False),
+    Column("arguments", JSONDocument, nullable=False),
+    Column("status", String, nullable=False),
+    # human-readable description of the step the job is currently executing
+    Column("progress", String),
+    Column("error", String),
+    # the change which was created by the job
+    Column("change_id", Integer, ForeignKey("change.id", ondelete="SET NULL")),
+    Column("created_at", DateTime(timezone=True), nullable=False),
+    Column("started_at", DateTime(timezone=True)),
+    Column("finished_at", DateTime(timezone=True)),
+    # regularly updated by the worker running the job, to detect jobs of workers which stopped unexpectedly
+    Column("heartbeat_at", DateTime(timezone=True)),
+    Index("ix_job_status", "status"),
+    Index("ix_job_incarnation_id", "incarnation_id"),
+)
+
+# leases which serialize changes that push to the same repository (across all foxops processes)
+repository_lock = Table(
+    "repository_lock",
+    meta,
+    Column("repository", String, primary_key=True),
+    # identifies the process (and lock acquisition) that holds the lease
+    Column("holder", String, nullable=False),
+    Column("expires_at", DateTime(timezone=True), nullable=False),
 )
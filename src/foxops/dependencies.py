@@ -4,16 +4,29 @@ from fastapi import Depends, HTTPException, Request, status
 from fastapi.openapi.models import APIKey, APIKeyIn
 from fastapi.security.base import SecurityBase
 from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.datastructures import State
 
-from foxops.database.engine import create_engine
+from foxops.database.engine import EngineRouter, create_engine
 from foxops.database.repositories.change.repository import ChangeRepository
+from foxops.database.repositories.hoster_state.repository import HosterStateRepository
 from foxops.database.repositories.incarnation.repository import IncarnationRepository
+from foxops.database.repositories.job.repository import JobRepository
+from foxops.database.repositories.repository_lock.repository import (
+    RepositoryLockRepository,
+)
 from foxops.hosters import Hoster
 from foxops.hosters.gitlab import GitlabHoster
+from foxops.hosters.http_cache import HttpCache
 from foxops.hosters.local import LocalHoster
+from foxops.hosters.template_archive import TemplateArchiveCache
 from foxops.logger import get_logger
-from foxops.services.change import ChangeService
+from foxops.services.change import ChangeService, ProgressCallback
+from foxops.services.diff_cache import ChangePreviewCache, IncarnationDiffCache
+from foxops.services.hoster_state import HosterStateService
 from foxops.services.incarnation import IncarnationService
+from foxops.services.job import JobService, JobWorkerPool
+from foxops.services.reconciliation_status import ReconciliationStatusTracker
+from foxops.services.repository_lock import RepositoryLocks
 from foxops.settings import (
     DatabaseSettings,
     GitlabHosterSettings,
@@ -39,20 +52,32 @@ def get_database_settings() -> DatabaseSettings:
 
 
 def get_database_engine(request: Request, settings: DatabaseSettings = Depends(get_database_settings)) -> AsyncEngine:
-    if hasattr(request.app.state, "database"):
-        return request.app.state.database
+    return _database_engine(request.app.state, settings)
+
+
+def _database_engine(state: State, settings: DatabaseSettings) -> AsyncEngine:
+    if hasattr(state, "database"):
+        return state.database
 
-    async_engine = create_engine(settings.url.get_secret_value())
+    async_engine = create_engine(settings.url.get_secret_value(), settings)
 
-    request.app.state.database = async_engine
+    state.database = async_engine
     return async_engine
 
 
-def get_hoster(request: Request, settings: Annotated[Settings, Depends(get_settings)]) -> Hoster:
-    if hasattr(request.app.state, "hoster"):
-        return request.app.state.hoster
+def get_database_replica_engines(
+    request: Request, settings: DatabaseSettings = Depends(get_database_settings)
+) -> list[AsyncEngine]:
+    if hasattr(request.app.state, "database_replicas"):
+        return request.app.state.database_replicas
+
+    replica_engines = [create_engine(url.get_secret_value(), settings) for url in settings.read_replica_urls]
 
-    hoster: Hoster
+    request.app.state.database_replicas = replica_engines
+    return replica_engines
+
+
+def create_hoster(settings: Settings) -> Hoster:
     match settings.hoster_type:
         case HosterType.LOCAL:
             local_settings = LocalHosterSettings()
@@ -61,30 +86,157 @@ def get_hoster(request: Request, settings: Annotated[Settings, Depends(get_setti
                 "Using local hoster. This is for DEVELOPMENT use only!", directory=str(local_settings.directory)
             )
 
-            hoster = LocalHoster(local_settings.directory)
+            return LocalHoster(local_settings.directory)
         case HosterType.GITLAB:
             gitlab_settings = GitlabHosterSettings()
             logger.info("Using GitLab hoster", address=gitlab_settings.address)
 
-            hoster = GitlabHoster(gitlab_settings.address, gitlab_settings.token.get_secret_value())
+            return GitlabHoster(
+                gitlab_settings.address,
+                gitlab_settings.token.get_secret_value(),
+                cache=HttpCache(
+                    max_entries=gitlab_settings.cache_max_entries,
+                    directory=gitlab_settings.cache_directory,
+                    max_disk_entries=gitlab_settings.cache_max_disk_entries,
+                ),
+                max_concurrent_requests=gitlab_settings.max_concurrent_requests,
+                max_retries=gitlab_settings.max_retries,
+                mergeability_check_timeout=gitlab_settings.mergeability_check_timeout,
+                template_archives=TemplateArchiveCache(max_entries=gitlab_settings.template_archive_cache_max_entries),
+            )
         case _:
             raise NotImplementedError(f"Unknown hoster type {settings.hoster_type}")
 
-    request.app.state.hoster = hoster
+
+def get_hoster(request: Request, settings: Annotated[Settings, Depends(get_settings)]) -> Hoster:
+    return _hoster(request.app.state, settings)
+
+
+def _hoster(state: State, settings: Settings) -> Hoster:
+    if hasattr(state, "hoster"):
+        return state.hoster
+
+    hoster = create_hoster(settings)
+
+    state.hoster = hoster
     return hoster
 
 
+def get_repository_locks(
+    request: Request, database_engine: AsyncEngine = Depends(get_database_engine)
+) -> RepositoryLocks:
+    return _repository_locks(request.app.state, database_engine)
+
+
+def _repository_locks(state: State, engine: AsyncEngine) -> RepositoryLocks:
+    if hasattr(state, "repository_locks"):
+        return state.repository_locks
+
+    locks = RepositoryLocks(RepositoryLockRepository(engine))
+
+    state.repository_locks = locks
+    return locks
+
+
+def get_incarnation_diff_cache(request: Request) -> IncarnationDiffCache:
+    if hasattr(request.app.state, "incarnation_diff_cache"):
+        return request.app.state.incarnation_diff_cache
+
+    diff_cache = IncarnationDiffCache()
+
+    request.app.state.incarnation_diff_cache = diff_cache
+    return diff_cache
+
+
+def get_change_preview_cache(request: Request) -> ChangePreviewCache:
+    return _change_preview_cache(request.app.state)
+
+
+def _change_preview_cache(state: State) -> ChangePreviewCache:
+    if hasattr(state, "change_preview_cache"):
+        return state.change_preview_cache
+
+    preview_cache = ChangePreviewCache()
+
+    state.change_preview_cache = preview_cache
+    return preview_cache
+
+
 ######
 # Per-Request Dependencies
 ######
 
 
-def get_incarnation_repository(database_engine: AsyncEngine = Depends(get_database_engine)) -> IncarnationRepository:
-    return IncarnationRepository(database_engine)
+def get_database_engine_router(
+    request: Request,
+    database_engine: AsyncEngine = Depends(get_database_engine),
+    replica_engines: list[AsyncEngine] = Depends(get_database_replica_engines),
+) -> EngineRouter:
+    # reads of requests which modify data (e.g. determining the next change revision) must not lag behind
+    if request.method not in ("GET", "HEAD"):
+        replica_engines = []
+
+    return EngineRouter(database_engine, replica_engines)
+
+
+def get_incarnation_repository(
+    database_engine: AsyncEngine = Depends(get_database_engine),
+    engine_router: EngineRouter = Depends(get_database_engine_router),
+) -> IncarnationRepository:
+    return IncarnationRepository(database_engine, engine_router)
 
 
-def get_change_repository(database_engine: AsyncEngine = Depends(get_database_engine)) -> ChangeRepository:
-    return ChangeRepository(database_engine)
+def get_change_repository(
+    database_engine: AsyncEngine = Depends(get_database_engine),
+    engine_router: EngineRouter = Depends(get_database_engine_router),
+) -> ChangeRepository:
+    return ChangeRepository(database_engine, engine_router)
+
+
+def get_hoster_state_repository(database_engine: AsyncEngine = Depends(get_database_engine)) -> HosterStateRepository:
+    return HosterStateRepository(database_engine)
+
+
+def get_job_repository(database_engine: AsyncEngine = Depends(get_database_engine)) -> JobRepository:
+    return JobRepository(database_engine)
+
+
+def get_hoster_state_service(
+    settings: Annotated[Settings, Depends(get_settings)],
+    hoster: Hoster = Depends(get_hoster),
+    hoster_state_repository: HosterStateRepository = Depends(get_hoster_state_repository),
+) -> HosterStateService:
+    return HosterStateService(
+        hoster=hoster,
+        hoster_state_repository=hoster_state_repository,
+        max_age=settings.hoster_state_max_age,
+        webhooks_enabled=settings.webhook_secret_token is not None,
+    )
+
+
+def get_reconciliation_status_tracker(
+    request: Request,
+    settings: Annotated[Settings, Depends(get_settings)],
+    hoster_state_service: HosterStateService = Depends(get_hoster_state_service),
+) -> ReconciliationStatusTracker:
+    return _reconciliation_status_tracker(request.app.state, settings, hoster_state_service)
+
+
+def _reconciliation_status_tracker(
+    state: State, settings: Settings, hoster_state_service: HosterStateService
+) -> ReconciliationStatusTracker:
+    if hasattr(state, "reconciliation_status_tracker"):
+        return state.reconciliation_status_tracker
+
+    tracker = ReconciliationStatusTracker(
+        hoster_state_service,
+        workers=settings.reconciliation_status_workers,
+        refresh_interval=settings.reconciliation_status_refresh_interval,
+        max_age=settings.hoster_state_max_age,
+    )
+
+    state.reconciliation_status_tracker = tracker
+    return tracker
 
 
 def get_incarnation_service(
@@ -95,15 +247,129 @@ def get_incarnation_service(
 
 
 def get_change_service(
+    settings: Annotated[Settings, Depends(get_settings)],
     hoster: Hoster = Depends(get_hoster),
     change_repository: ChangeRepository = Depends(get_change_repository),
     incarnation_repository: IncarnationRepository = Depends(get_incarnation_repository),
+    hoster_state_service: HosterStateService = Depends(get_hoster_state_service),
+    reconciliation_status_tracker: ReconciliationStatusTracker = Depends(get_reconciliation_status_tracker),
+    repository_locks: RepositoryLocks = Depends(get_repository_locks),
+    incarnation_diff_cache: IncarnationDiffCache = Depends(get_incarnation_diff_cache),
+    change_preview_cache: ChangePreviewCache = Depends(get_change_preview_cache),
 ) -> ChangeService:
     return ChangeService(
-        hoster=hoster, incarnation_repository=incarnation_repository, change_repository=change_repository
+        hoster=hoster,
+        incarnation_repository=incarnation_repository,
+        change_repository=change_repository,
+        hoster_state_service=hoster_state_service,
+        reconciliation_status_tracker=reconciliation_status_tracker,
+        commit_via_hoster_api=settings.commit_via_hoster_api,
+        repository_locks=repository_locks,
+        diff_cache=incarnation_diff_cache,
+        preview_cache=change_preview_cache,
     )
 
 
+def get_job_worker_pool(
+    request: Request,
+    settings: Annotated[Settings, Depends(get_settings)],
+    hoster: Hoster = Depends(get_hoster),
+    incarnation_repository: IncarnationRepository = Depends(get_incarnation_repository),
+    hoster_state_service: HosterStateService = Depends(get_hoster_state_service),
+    reconciliation_status_tracker: ReconciliationStatusTracker = Depends(get_reconciliation_status_tracker),
+    repository_locks: RepositoryLocks = Depends(get_repository_locks),
+    change_preview_cache: ChangePreviewCache = Depends(get_change_preview_cache),
+) -> JobWorkerPool | None:
+    if settings.job_workers == 0:
+        return None
+
+    return _job_worker_pool(
+        request.app.state,
+        settings,
+        hoster=hoster,
+        # jobs outlive the request, so they get their own repositories (which don't read from replicas)
+        engine=incarnation_repository.engine,
+        hoster_state_service=hoster_state_service,
+        reconciliation_status_tracker=reconciliation_status_tracker,
+        repository_locks=repository_locks,
+        change_preview_cache=change_preview_cache,
+    )
+
+
+def _job_worker_pool(
+    state: State,
+    settings: Settings,
+    hoster: Hoster,
+    engine: AsyncEngine,
+    hoster_state_service: HosterStateService,
+    reconciliation_status_tracker: ReconciliationStatusTracker,
+    repository_locks: RepositoryLocks,
+    change_preview_cache: ChangePreviewCache,
+) -> JobWorkerPool:
+    if hasattr(state, "job_worker_pool"):
+        return state.job_worker_pool
+
+    def create_change_service(progress: ProgressCallback) -> ChangeService:
+        return ChangeService(
+            hoster=hoster,
+            incarnation_repository=IncarnationRepository(engine),
+            change_repository=ChangeRepository(engine),
+            hoster_state_service=hoster_state_service,
+            reconciliation_status_tracker=reconciliation_status_tracker,
+            commit_via_hoster_api=settings.commit_via_hoster_api,
+            progress=progress,
+            repository_locks=repository_locks,
+            preview_cache=change_preview_cache,
+        )
+
+    worker_pool = JobWorkerPool(
+        JobRepository(engine),
+        create_change_service,
+        workers=settings.job_workers,
+        poll_interval=settings.job_poll_interval,
+        heartbeat_timeout=settings.job_heartbeat_timeout,
+        shutdown_timeout=settings.job_shutdown_timeout,
+    )
+
+    state.job_worker_pool = worker_pool
+    return worker_pool
+
+
+def start_job_worker_pool(state: State, settings: Settings) -> None:
+    """Starts the job workers of the server process, outside of a request (i.e. when the app starts)."""
+
+    if settings.job_workers == 0:
+        return
+
+    engine = _database_engine(state, get_database_settings())
+    hoster = _hoster(state, settings)
+    hoster_state_service = HosterStateService(
+        hoster=hoster,
+        hoster_state_repository=HosterStateRepository(engine),
+        max_age=settings.hoster_state_max_age,
+        webhooks_enabled=settings.webhook_secret_token is not None,
+    )
+
+    _job_worker_pool(
+        state,
+        settings,
+        hoster=hoster,
+        engine=engine,
+        hoster_state_service=hoster_state_service,
+        reconciliation_status_tracker=_reconciliation_status_tracker(state, settings, hoster_state_service),
+        repository_locks=_repository_locks(state, engine),
+        change_preview_cache=_change_preview_cache(state),
+    ).start()
+
+
+def get_job_service(
+    job_repository: JobRepository = Depends(get_job_repository),
+    incarnation_repository: IncarnationRepository = Depends(get_incarnation_repository),
+    job_worker_pool: JobWorkerPool | None = Depends(get_job_worker_pool),
+) -> JobService:
+    return JobService(job_repository, incarnation_repository, job_worker_pool)
+
+
 class StaticTokenHeaderAuth(SecurityBase):
     def __init__(self):
         self.model = APIKey(**{"in": APIKeyIn.header}, name="Authorization")
@@ -19,12 +19,16 @@ async def initialize_incarnation(
     template_repository_version: str,
     template_data: TemplateData,
     incarnation_root_dir: Path,
+    template_repository_version_hash: str | None = None,
 ) -> IncarnationState:
     """Initialize an incarnation repository with a version of a template.
 
     The initialization process consists of the following steps:
         * validate the provided template data against the required template variables
         * render template directory file system contents into incarnation directory
+
+    If the template root directory is not a git repository (e.g. an unpacked archive of the template),
+    the commit it was taken from must be given as `template_repository_version_hash`.
     """
 
     # verify that the template data match the required template variables
@@ -56,7 +60,8 @@ async def initialize_incarnation(
     )
 
     # save the incarnation state to a file in the incarnation repo
-    template_repository_version_hash = await GitRepository(template_root_dir).head()
+    if template_repository_version_hash is None:
+        template_repository_version_hash = await GitRepository(template_root_dir).head()
 
     incarnation_state = IncarnationState(
         template_repository=template_repository,
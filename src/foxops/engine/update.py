@@ -1,6 +1,8 @@
+import asyncio
 from copy import deepcopy
 from pathlib import Path
 from tempfile import TemporaryDirectory
+from weakref import WeakValueDictionary
 
 from foxops import utils
 from foxops.engine import initialize_incarnation
@@ -11,6 +13,10 @@ from foxops.logger import get_logger
 #: Holds the module logger
 logger = get_logger(__name__)
 
+#: Holds a lock per template repository, as git fails to add several worktrees to a repository at the same time
+#  (which happens if the template repository is shared by concurrent updates)
+_worktree_locks: WeakValueDictionary[Path, asyncio.Lock] = WeakValueDictionary()
+
 
 def _patch_template_data(data: TemplateData, patch: TemplateData) -> None:
     """Patch the template data with the patch data (in-place).
@@ -58,30 +64,33 @@ async def update_incarnation_from_git_template_repository(
     current_incarnation_state = IncarnationState.from_file(incarnation_root_dir / ".fengine.yaml")
 
     with TemporaryDirectory() as original_template_root_dir, TemporaryDirectory() as updated_template_root_dir:
-        logger.debug(
-            f"creating git worktree from current template repository "
-            f"(version: {current_incarnation_state.template_repository_version_hash}) at {original_template_root_dir}"
-        )
-        await utils.check_call(
-            "git",
-            "worktree",
-            "add",
-            original_template_root_dir,
-            current_incarnation_state.template_repository_version_hash,
-            cwd=template_git_repository,
-        )
-        logger.debug(
-            f"creating git worktree from updated template repository "
-            f"(version: {update_template_repository_version}) at {updated_template_root_dir}"
-        )
-        await utils.check_call(
-            "git",
-            "worktree",
-            "add",
-            updated_template_root_dir,
-            update_template_repository_version,
-            cwd=template_git_repository,
-        )
+        async with _worktree_locks.setdefault(template_git_repository.resolve(), asyncio.Lock()):
+            logger.debug(
+                f"creating git worktree from current template repository "
+                f"(version: {current_incarnation_state.template_repository_version_hash}) at {original_template_root_dir}"
+            )
+            await utils.check_call(
+                "git",
+                "worktree",
+                "add",
+                original_template_root_dir,
+                current_incarnation_state.template_repository_version_hash,
+                cwd=template_git_repository,
+            )
+            logger.debug(
+                f"creating git worktree from updated template repository "
+                f"(version: {update_template_repository_version}) at {updated_template_root_dir}"
+            )
+            await utils.check_call(
+                "git",
+                "worktree",
+                "add",
+                # allows to check out the same branch in several worktrees (e.g. when the template repository is shared)
+                "--detach",
+                updated_template_root_dir,
+                update_template_repository_version,
+                cwd=template_git_repository,
+            )
 
         return await update_incarnation(
             original_template_root_dir=Path(original_template_root_dir),
@@ -48,3 +48,7 @@ class IncarnationAlreadyInitializedError(ReconciliationUserError):
         super().__init__(
             f"Incarnation at '{incarnation_repository}' and target directory '{target_directory}' already initialized."
         )
+
+
+class CommitConflictError(RetryableError):
+    """Exception raised when the hoster rejects a commit because its base is outdated"""
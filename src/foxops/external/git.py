@@ -1,6 +1,9 @@
 import asyncio
+import os
 import re
+from dataclasses import dataclass
 from pathlib import Path
+from tempfile import TemporaryDirectory
 from urllib.parse import quote, urlparse, urlunparse
 
 from foxops.errors import FoxopsError, FoxopsUserError, RetryableError
@@ -72,6 +75,22 @@ def add_authentication_to_git_clone_url(source: str, username: str, password: st
     return urlunparse(url_parts)
 
 
+@dataclass(frozen=True)
+class ChangedFile:
+    """A file which differs between two commits (as reported by `git diff --raw`)."""
+
+    #: one of `A` (added), `C` (copied), `D` (deleted), `M` (modified), `R` (renamed) or `T` (type changed)
+    status: str
+    path: str
+    #: the previous path of renamed and copied files
+    old_path: str | None
+    #: the git file modes (e.g. `100644`), which are `000000` for the missing side of added and deleted files
+    old_mode: str
+    new_mode: str
+    old_sha: str
+    new_sha: str
+
+
 class GitRepository:
     def __init__(self, directory: Path, push_delay_seconds: int = 0):
         """
@@ -148,6 +167,107 @@ class GitRepository:
 
         return stdout.decode()
 
+    async def create_patch(self, ref_old: str, ref_new: str) -> bytes:
+        """Returns the (binary) diff between the given refs, which can be applied with `apply_patch`."""
+
+        cmdline = ["git", "--no-pager", "diff", "--binary", f"{ref_old}..{ref_new}"]
+        proc = await asyncio.create_subprocess_exec(
+            *cmdline,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            stdin=asyncio.subprocess.PIPE,
+            cwd=str(self.directory),
+        )
+        stdout, stderr = await proc.communicate()
+
+        if proc.returncode != 0:
+            raise CalledProcessError(
+                proc.returncode if proc.returncode is not None else -1,
+                cmdline,
+                stdout,
+                stderr,
+            )
+
+        return stdout
+
+    async def apply_patch(self, patch: bytes) -> None:
+        with TemporaryDirectory() as tmpdir:
+            patch_path = Path(tmpdir) / "changes.patch"
+            patch_path.write_bytes(patch)
+
+            await self._run("apply", str(patch_path))
+
+    async def changed_files(self, ref_old: str, ref_new: str) -> list["ChangedFile"]:
+        """Returns the files which differ between the given refs (detecting renames), without reading any blobs."""
+
+        output = await self._output("diff", "--raw", "-z", "-M", "--no-abbrev", ref_old, ref_new)
+
+        fields = output.decode().split("\0")
+        changed_files = []
+        index = 0
+        while index < len(fields) and fields[index]:
+            old_mode, new_mode, old_sha, new_sha, status = fields[index].lstrip(":").split(" ")
+            if status.startswith(("R", "C")):
+                old_path, path = fields[index + 1], fields[index + 2]
+                index += 3
+            else:
+                old_path, path = None, fields[index + 1]
+                index += 2
+
+            changed_files.append(
+                ChangedFile(
+                    status=status[0],
+                    path=path,
+                    old_path=old_path,
+                    old_mode=old_mode,
+                    new_mode=new_mode,
+                    old_sha=old_sha,
+                    new_sha=new_sha,
+                )
+            )
+
+        return changed_files
+
+    async def read_blobs(self, shas: list[str]) -> dict[str, bytes]:
+        """Returns the contents of the given blobs, which are read with a single git process."""
+
+        if not shas:
+            return {}
+
+        output = await self._output("cat-file", "--batch", input="".join(f"{sha}\n" for sha in shas).encode())
+
+        blobs = {}
+        offset = 0
+        for sha in shas:
+            header_end = output.index(b"\n", offset)
+            object_sha, object_type, size = output[offset:header_end].decode().split(" ")
+            if object_type != "blob":
+                raise GitError(f"object {sha} is a {object_type}, not a blob")
+
+            blobs[object_sha] = output[header_end + 1 : header_end + 1 + int(size)]
+            # the content is followed by a newline
+            offset = header_end + 1 + int(size) + 1
+
+        return blobs
+
+    async def _output(self, *args: str, input: bytes | None = None) -> bytes:
+        """Runs git with the given arguments and returns its (possibly large) output."""
+
+        cmdline = ["git", "--no-pager", *args]
+        proc = await asyncio.create_subprocess_exec(
+            *cmdline,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            stdin=asyncio.subprocess.PIPE,
+            cwd=str(self.directory),
+        )
+        stdout, stderr = await proc.communicate(input)
+
+        if proc.returncode != 0:
+            raise GitError(stderr.decode())
+
+        return stdout
+
     @staticmethod
     async def diff_directory(directory1, directory2) -> str:
         cmdline = f"git --no-pager diff --no-index {directory1} {directory2}".split()
@@ -172,6 +292,54 @@ class GitRepository:
 
         return stdout.decode("unicode_escape")
 
+    async def write_tree(self, directory: Path) -> str:
+        """Store the files of the given directory (outside of the repository) as a tree object and return its SHA.
+
+        Neither the index nor the working tree of the repository are touched.
+        """
+        with TemporaryDirectory() as tmpdir:
+            env = {**os.environ, "GIT_INDEX_FILE": str(Path(tmpdir) / "index")}
+            git_dir = ("--git-dir", str(self.directory / ".git"), "--work-tree", str(directory))
+
+            await git_exec(*git_dir, "add", "--all", "--force", ".", cwd=directory, env=env, timeout=30)
+            proc = await git_exec(*git_dir, "write-tree", cwd=directory, env=env, timeout=30)
+            if proc.stdout is None:
+                raise GitError(f"unable to write the tree of {directory}")
+            return (await proc.stdout.read()).decode().strip()
+
+    async def diff_trees(self, tree_old: str, tree_new: str, path_prefix: str = "") -> str:
+        """Diff two tree objects, which only compares the contents of blobs whose hashes differ."""
+
+        cmdline = [
+            "git",
+            "-c",
+            "core.quotePath=false",
+            "--no-pager",
+            "diff",
+            f"--src-prefix=a/{path_prefix}",
+            f"--dst-prefix=b/{path_prefix}",
+            tree_old,
+            tree_new,
+        ]
+        proc = await asyncio.create_subprocess_exec(
+            *cmdline,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            stdin=asyncio.subprocess.PIPE,
+            cwd=str(self.directory),
+        )
+        stdout, stderr = await proc.communicate()
+
+        if proc.returncode != 0:
+            raise CalledProcessError(
+                proc.returncode if proc.returncode is not None else -1,
+                cmdline,
+                stdout,
+                stderr,
+            )
+
+        return stdout.decode(errors="replace")
+
     async def origin_default_branch(self) -> str | None:
         """Returns "main" if the remote repo is empty."""
         try:
@@ -233,6 +401,12 @@ class GitRepository:
             raise GitError("unable to determine the current git HEAD")
         return (await proc.stdout.read()).decode().strip()
 
+    async def rev_parse(self, ref: str) -> str:
+        proc = await self._run("rev-parse", ref)
+        if proc.stdout is None:
+            raise GitError(f"unable to resolve {ref}")
+        return (await proc.stdout.read()).decode().strip()
+
     async def fetch(self, refspec: str | None = None) -> None:
         args = []
         if refspec is not None:
@@ -0,0 +1,83 @@
+from pathlib import PurePosixPath
+
+from foxops.external.git import ChangedFile, GitRepository
+from foxops.hosters.types import CommitAction
+
+#: Holds the git file modes of the files which can be committed through the API of the hoster
+REGULAR_FILE_MODES = frozenset({"100644", "100755"})
+EXECUTABLE_FILE_MODE = "100755"
+
+
+class UnsupportedCommitAction(Exception):
+    """Raised for changes which can't be committed through the API of the hoster (e.g. symlinks or submodules)."""
+
+
+async def compute_commit_actions(
+    git: GitRepository, ref_old: str, ref_new: str, path_prefix: str = ""
+) -> list[CommitAction]:
+    """Compute the file actions that turn the `ref_old` commit into the `ref_new` commit of the given repository.
+
+    Only the changed files are considered, and only the blobs of created and updated files are read. Renamed files
+    are turned into `move` actions. `path_prefix` is prepended to the paths of all actions.
+    """
+
+    changed_files = await git.changed_files(ref_old, ref_new)
+    for changed_file in changed_files:
+        if changed_file.status != "D" and changed_file.new_mode not in REGULAR_FILE_MODES:
+            raise UnsupportedCommitAction(f"'{changed_file.path}' is not a regular file (mode {changed_file.new_mode})")
+        if changed_file.status == "T":
+            raise UnsupportedCommitAction(f"the type of '{changed_file.path}' changed")
+
+    contents = await git.read_blobs(
+        sorted({f.new_sha for f in changed_files if f.status in ("A", "C", "M") or _is_modified_rename(f)})
+    )
+
+    actions = []
+    for changed_file in changed_files:
+        file_path = _join(path_prefix, changed_file.path)
+        executable = changed_file.new_mode == EXECUTABLE_FILE_MODE
+
+        match changed_file.status:
+            case "A" | "C":
+                actions.append(
+                    CommitAction(
+                        action="create",
+                        file_path=file_path,
+                        content=contents[changed_file.new_sha],
+                        executable=executable,
+                    )
+                )
+            case "M":
+                actions.append(
+                    CommitAction(
+                        action="update",
+                        file_path=file_path,
+                        content=contents[changed_file.new_sha],
+                        executable=executable,
+                    )
+                )
+            case "D":
+                actions.append(CommitAction(action="delete", file_path=file_path))
+            case "R":
+                assert changed_file.old_path is not None
+                actions.append(
+                    CommitAction(
+                        action="move",
+                        file_path=file_path,
+                        previous_path=_join(path_prefix, changed_file.old_path),
+                        content=contents[changed_file.new_sha] if _is_modified_rename(changed_file) else None,
+                        executable=executable,
+                    )
+                )
+            case status:
+                raise UnsupportedCommitAction(f"unknown change '{status}' of '{changed_file.path}'")
+
+    return sorted(actions, key=lambda a: a.file_path)
+
+
+def _is_modified_rename(changed_file: ChangedFile) -> bool:
+    return changed_file.status == "R" and changed_file.old_sha != changed_file.new_sha
+
+
+def _join(path_prefix: str, path: str) -> str:
+    return str(PurePosixPath(path_prefix, path)) if path_prefix not in ("", ".") else path
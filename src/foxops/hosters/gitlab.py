@@ -1,13 +1,15 @@
 import asyncio
 import base64
 import shutil
+import time
+from collections import OrderedDict
 from contextlib import asynccontextmanager
 from datetime import timedelta
 from http import HTTPStatus
 from pathlib import Path
 from ssl import SSLZeroReturnError
-from tempfile import mkdtemp
-from typing import Any, AsyncIterator, TypedDict
+from tempfile import SpooledTemporaryFile, mkdtemp
+from typing import Any, AsyncIterator, TypedDict, TypeVar
 from urllib.parse import quote_plus
 
 import httpx
@@ -17,25 +19,38 @@ from tenacity.stop import stop_after_delay
 from tenacity.wait import wait_fixed
 
 from foxops.engine import IncarnationState
-from foxops.errors import IncarnationRepositoryNotFound
+from foxops.errors import CommitConflictError, IncarnationRepositoryNotFound
 from foxops.external.git import (
     GitRepository,
+    RevisionNotFoundError,
     add_authentication_to_git_clone_url,
     git_exec,
 )
+from foxops.hosters.http_cache import CachingTransport, HttpCache
+from foxops.hosters.rate_limit import RateLimitTransport
+from foxops.hosters.template_archive import (
+    IncompleteTemplateArchive,
+    TemplateArchiveCache,
+    find_tree_differences,
+    unpack_tar_archive,
+)
 from foxops.hosters.types import (
+    CommitAction,
     GitSha,
     Hoster,
     MergeRequestId,
     MergeRequestStatus,
     ReconciliationStatus,
     RepositoryMetadata,
+    TemplateSource,
 )
 from foxops.logger import bound, get_logger
 
 #: Holds the module logger
 logger = get_logger(__name__)
 
+T = TypeVar("T")
+
 
 class MergeRequest(TypedDict):
     iid: int
@@ -59,6 +74,42 @@ class Commit(TypedDict):
     status: str
 
 
+#: Maps GitLab merge request states (REST and GraphQL) to foxops merge request statuses
+MERGE_REQUEST_STATE_MAPPING = {
+    "opened": MergeRequestStatus.OPEN,
+    "locked": MergeRequestStatus.OPEN,  # assumed to be a transitional, internal Gitlab state
+    "closed": MergeRequestStatus.CLOSED,
+    "merged": MergeRequestStatus.MERGED,
+}
+
+#: Holds the maximum number of projects that are queried in a single GraphQL request
+GRAPHQL_PROJECTS_PER_QUERY = 20
+
+#: Holds the maximum number of merge requests that GitLab returns per project in a single GraphQL connection page
+GRAPHQL_MERGE_REQUESTS_PER_PROJECT = 100
+
+
+#: Holds the `detailed_merge_status` values for which GitLab is still checking the mergeability of a merge request
+MERGEABILITY_CHECK_PENDING_STATUSES = frozenset({"preparing", "checking", "unchecked", "approvals_syncing"})
+
+#: Holds the initial and maximum interval (in seconds) between polls of the mergeability of a merge request
+MERGEABILITY_CHECK_INITIAL_INTERVAL = 0.25
+MERGEABILITY_CHECK_MAX_INTERVAL = 4.0
+
+#: Holds the maximum number of parsed incarnation states that are kept in memory
+INCARNATION_STATE_CACHE_MAX_ENTRIES = 4096
+
+#: Holds the maximum number of template commits which are remembered as not being usable from their archive
+UNARCHIVABLE_TEMPLATES_MAX_ENTRIES = 1024
+
+#: Holds the size (in bytes) up to which downloaded repository archives are kept in memory before spilling to disk
+ARCHIVE_SPOOL_MAX_MEMORY_SIZE = 16 * 1024 * 1024
+
+
+class GraphQLError(Exception):
+    pass
+
+
 def evaluate_gitlab_address(address: str) -> tuple[str, str]:
     """Evaluate the given GitLab address and return a tuple containing the GitLab Web UI URL and the GitLab API URL."""
     if address.endswith("/api/v4"):
@@ -70,11 +121,46 @@ def evaluate_gitlab_address(address: str) -> tuple[str, str]:
 class GitlabHoster(Hoster):
     """REST API client for GitLab"""
 
-    def __init__(self, address: str, token: str):
+    def __init__(
+        self,
+        address: str,
+        token: str,
+        cache: HttpCache | None = None,
+        transport: httpx.AsyncBaseTransport | None = None,
+        max_concurrent_requests: int = 32,
+        max_retries: int = 5,
+        mergeability_check_timeout: timedelta = timedelta(seconds=30),
+        template_archives: TemplateArchiveCache | None = None,
+    ):
         self.web_address, self.api_address = evaluate_gitlab_address(address)
         self.token = token
+        self.mergeability_check_timeout = mergeability_check_timeout
+
+        # parsed incarnation states by (repository, file path, blob SHA)
+        self._incarnation_states: OrderedDict[tuple[str, str, str], IncarnationState] = OrderedDict()
+
+        # keeps references to automerge tasks running in the background, so that they aren't garbage collected
+        self._background_tasks: set[asyncio.Task] = set()
+
+        # unpacked template repository archives, shared by all users of the same template version
+        self.template_archives = template_archives or TemplateArchiveCache()
+        # template commits whose archive differs from their checkout, so that they are cloned instead
+        self._unarchivable_templates: OrderedDict[str, None] = OrderedDict()
+
+        if cache is None:
+            cache = HttpCache()
+        if transport is None:
+            transport = httpx.AsyncHTTPTransport()
+
+        # requests served from the cache don't count towards the rate limits
+        self.rate_limit = RateLimitTransport(
+            transport, max_concurrency=max_concurrent_requests, max_retries=max_retries
+        )
         self.client = httpx.AsyncClient(
-            base_url=self.api_address, headers={"Authorization": f"Bearer {self.token}"}, timeout=httpx.Timeout(120)
+            base_url=self.api_address,
+            headers={"Authorization": f"Bearer {self.token}"},
+            timeout=httpx.Timeout(120),
+            transport=CachingTransport(self.rate_limit, cache, base_path=httpx.URL(self.api_address).path),
         )
 
     async def validate(self) -> None:
@@ -87,15 +173,24 @@ class GitlabHoster(Hoster):
     async def get_incarnation_state(
         self, incarnation_repository: str, target_directory: str
     ) -> tuple[GitSha, IncarnationState] | None:
-        if not await self.__project_exists(incarnation_repository):
-            raise IncarnationRepositoryNotFound(incarnation_repository)
-
-        fengine_config_file = Path(target_directory, ".fengine.yaml")
+        try:
+            # served from the HTTP cache most of the time
+            default_branch = (await self.get_repository_metadata(incarnation_repository))["default_branch"]
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code == HTTPStatus.NOT_FOUND:
+                raise IncarnationRepositoryNotFound(incarnation_repository) from e
+            raise
+
+        fengine_config_file = str(Path(target_directory, ".fengine.yaml"))
         response = await self.client.get(
-            f"/projects/{quote_plus(incarnation_repository)}/repository/files/{quote_plus(str(fengine_config_file))}",
-            params={"ref": "main"},
+            f"/projects/{quote_plus(incarnation_repository)}/repository/files/{quote_plus(fengine_config_file)}",
+            params={"ref": default_branch},
         )
         if response.status_code == HTTPStatus.NOT_FOUND:
+            # GitLab tells apart missing projects (e.g. deleted since their metadata was cached) and missing files
+            if "Project" in response.json().get("message", ""):
+                raise IncarnationRepositoryNotFound(incarnation_repository)
+
             logger.debug(
                 f"Incarnation repository at '{incarnation_repository}' and target directory '{target_directory}' not found."
             )
@@ -105,10 +200,28 @@ class GitlabHoster(Hoster):
         response.raise_for_status()
         file_data = response.json()
 
-        return file_data["last_commit_id"], IncarnationState.from_string(
-            base64.b64decode(file_data["content"]).decode("utf-8")
+        return file_data["last_commit_id"], self._parse_incarnation_state(
+            incarnation_repository, fengine_config_file, file_data
         )
 
+    def _parse_incarnation_state(
+        self, incarnation_repository: str, file_path: str, file_data: dict[str, Any]
+    ) -> IncarnationState:
+        """Parses the incarnation state from a files API response, reusing earlier results for the same blob."""
+
+        key = (incarnation_repository, file_path, file_data["blob_id"])
+        if (incarnation_state := self._incarnation_states.get(key)) is None:
+            incarnation_state = IncarnationState.from_string(base64.b64decode(file_data["content"]).decode("utf-8"))
+
+            self._incarnation_states[key] = incarnation_state
+            if len(self._incarnation_states) > INCARNATION_STATE_CACHE_MAX_ENTRIES:
+                self._incarnation_states.popitem(last=False)
+        else:
+            self._incarnation_states.move_to_end(key)
+
+        # callers may modify the returned state
+        return incarnation_state.model_copy(deep=True)
+
     async def merge_request(
         self,
         *,
@@ -118,6 +231,7 @@ class GitlabHoster(Hoster):
         description: str,
         incarnation_sub_directory: str,
         with_automerge=False,
+        automerge_in_background=False,
     ) -> tuple[GitSha, MergeRequestId]:
         response = await self.client.get(
             f"/projects/{quote_plus(incarnation_repository)}/merge_requests",
@@ -154,36 +268,46 @@ class GitlabHoster(Hoster):
             with_automerge=with_automerge,
         )
 
-        # wait until Gitlab finished mergability checks
-        for _ in range(5):
-            if merge_request["detailed_merge_status"] not in ["preparing", "checking", "unchecked"]:
-                break
-
-            response = await self.client.get(
-                f"/projects/{quote_plus(incarnation_repository)}/merge_requests/{merge_request['iid']}"
-            )
-            response.raise_for_status()
-            merge_request = response.json()
-
-            await asyncio.sleep(5)
-        else:
-            logger.warning(
-                f"Merge request {merge_request['web_url']} is still in state 'checking' after 5 retries, "
-                f"continuing with the assumption that it is mergeable"
-            )
-
         if with_automerge:
-            logger.info(f"Triggering automerge for the new Merge Request {merge_request['web_url']}")
-
             merge_message = f"Merge branch '{source_branch}' into '{target_branch}'"
 
             if incarnation_sub_directory != ".":
                 merge_message = f"[{incarnation_sub_directory}]: {merge_message}"
 
-            merge_request = await self._automerge_merge_request(merge_request, merge_message)
+            if automerge_in_background:
+                task = asyncio.create_task(self._wait_for_mergeability_and_automerge(merge_request, merge_message))
+                self._background_tasks.add(task)
+                task.add_done_callback(self._automerge_task_done)
+            else:
+                merge_request = await self._wait_for_mergeability_and_automerge(merge_request, merge_message)
 
         return merge_request["sha"], str(merge_request["iid"])
 
+    async def commit_files(
+        self,
+        repository: str,
+        *,
+        branch: str,
+        message: str,
+        actions: list[CommitAction],
+        start_sha: GitSha | None = None,
+    ) -> GitSha:
+        data: dict[str, Any] = {
+            "branch": branch,
+            "commit_message": message,
+            "actions": [_commit_action_payload(action) for action in actions],
+        }
+        if start_sha is not None:
+            data["start_sha"] = start_sha
+
+        response = await self.client.post(f"/projects/{quote_plus(repository)}/repository/commits", json=data)
+        if response.status_code == HTTPStatus.BAD_REQUEST:
+            # e.g. the branch already exists, or files were changed in the meantime
+            raise CommitConflictError(f"GitLab rejected the commit to '{branch}': {response.json().get('message')}")
+        response.raise_for_status()
+
+        return response.json()["id"]
+
     @asynccontextmanager
     async def cloned_repository(
         self, repository: str, *, refspec: str | None = None, bare: bool = False
@@ -247,13 +371,115 @@ class GitlabHoster(Hoster):
         finally:
             shutil.rmtree(local_clone_directory)
 
+    @asynccontextmanager
+    async def template_source(self, repository: str, refspec: str) -> AsyncIterator[TemplateSource]:
+        """Provide the template at the given revision, preferably from the (cached) archive of the commit.
+
+        Updates of incarnations render the template from a git clone, so the archive is only used if it's
+        equal to the checkout of the commit (it isn't if `.gitattributes` mark files as `export-ignore` or
+        `export-subst`). Otherwise, all paths render from a clone to produce the same tree.
+        """
+
+        project_identifier = self._project_identifier(repository)
+        if project_identifier is not None:
+            commit_sha = await self._resolve_commit_sha(project_identifier, refspec)
+            key = f"{project_identifier}@{commit_sha}"
+
+            async def _download(destination: Path) -> None:
+                await self._download_archive(project_identifier, commit_sha, destination)
+
+            if key in self._unarchivable_templates:
+                self._unarchivable_templates.move_to_end(key)
+            else:
+                try:
+                    async with self.template_archives.unpacked(key, _download) as directory:
+                        yield TemplateSource(directory=directory, commit_sha=commit_sha)
+                    return
+                except IncompleteTemplateArchive as exc:
+                    logger.info(
+                        "template archive differs from its checkout, cloning it instead",
+                        repository=project_identifier,
+                        commit_sha=commit_sha,
+                        paths=exc.paths[:10],
+                    )
+                    self._unarchivable_templates[key] = None
+                    if len(self._unarchivable_templates) > UNARCHIVABLE_TEMPLATES_MAX_ENTRIES:
+                        self._unarchivable_templates.popitem(last=False)
+
+        # the template is hosted elsewhere or its archive isn't usable, so we can only fetch it with git
+        async with self.cloned_repository(repository, refspec=refspec) as repo:
+            yield TemplateSource(directory=repo.directory, commit_sha=await repo.head())
+
+    def _project_identifier(self, repository: str) -> str | None:
+        """Returns the `path_with_namespace` of the given repository, or `None` if it's not hosted on this GitLab."""
+
+        if not repository.startswith(("https://", "http://")):
+            return repository
+
+        prefix = f"{self.web_address.rstrip('/')}/"
+        if not repository.startswith(prefix):
+            return None
+        return repository.removeprefix(prefix).removesuffix("/").removesuffix(".git")
+
+    async def _resolve_commit_sha(self, project_identifier: str, refspec: str) -> GitSha:
+        response = await self.client.get(
+            f"/projects/{quote_plus(project_identifier)}/repository/commits/{quote_plus(refspec)}"
+        )
+        if response.status_code == HTTPStatus.NOT_FOUND:
+            raise RevisionNotFoundError(refspec.encode())
+        response.raise_for_status()
+
+        return response.json()["id"]
+
+    async def _download_archive(self, project_identifier: str, commit_sha: GitSha, destination: Path) -> None:
+        # `tarfile` can't consume an async stream, so the archive is spooled (to disk if it's large)
+        # while downloading and then unpacked in a worker thread
+        with SpooledTemporaryFile(max_size=ARCHIVE_SPOOL_MAX_MEMORY_SIZE) as archive:
+            async with self.client.stream(
+                "GET",
+                f"/projects/{quote_plus(project_identifier)}/repository/archive.tar.gz",
+                params={"sha": commit_sha},
+            ) as response:
+                response.raise_for_status()
+                async for chunk in response.aiter_bytes():
+                    archive.write(chunk)
+
+            archive.seek(0)
+            await asyncio.to_thread(unpack_tar_archive, archive, destination)
+
+        blobs = await self._list_tree_blobs(project_identifier, commit_sha)
+        if differences := await asyncio.to_thread(find_tree_differences, destination, blobs):
+            raise IncompleteTemplateArchive(differences)
+
+        logger.debug("unpacked template archive", repository=project_identifier, commit_sha=commit_sha)
+
+    async def _list_tree_blobs(self, project_identifier: str, commit_sha: GitSha) -> dict[str, GitSha]:
+        """Return the paths of all files (including symlinks) of the given commit, mapped to their blob SHAs."""
+
+        blobs: dict[str, GitSha] = {}
+        url: str | None = f"/projects/{quote_plus(project_identifier)}/repository/tree"
+        params: dict[str, Any] | None = {"ref": commit_sha, "recursive": True, "per_page": 100, "pagination": "keyset"}
+        while url is not None:
+            response = await self.client.get(url, params=params)
+            response.raise_for_status()
+            blobs |= {entry["path"]: entry["id"] for entry in response.json() if entry["type"] == "blob"}
+
+            # the link to the next page already contains all query parameters
+            url, params = response.links.get("next", {}).get("url"), None
+
+        return blobs
+
     async def has_pending_incarnation_branch(self, project_identifier: str, branch: str) -> GitSha | None:
+        return await self.get_branch_head(project_identifier, branch)
+
+    async def get_branch_head(self, project_identifier: str, branch: str) -> GitSha | None:
         response = await self.client.get(
             f"/projects/{quote_plus(project_identifier)}/repository/branches/{quote_plus(branch)}"
         )
-        if response.status_code == HTTPStatus.OK:
-            return response.json()["commit"]["id"]
-        return None
+        if response.status_code == HTTPStatus.NOT_FOUND:
+            return None
+        response.raise_for_status()
+        return response.json()["commit"]["id"]
 
     async def has_pending_incarnation_merge_request(
         self, project_identifier: str, branch: str
@@ -278,6 +504,48 @@ class GitlabHoster(Hoster):
             "http_url": data["http_url_to_repo"],
         }
 
+    async def _wait_for_mergeability_and_automerge(
+        self, merge_request: MergeRequest, merge_commit_message: str
+    ) -> MergeRequest:
+        merge_request = await self._wait_for_mergeability_check(merge_request)
+
+        logger.info(f"Triggering automerge for the new Merge Request {merge_request['web_url']}")
+        return await self._automerge_merge_request(merge_request, merge_commit_message)
+
+    def _automerge_task_done(self, task: asyncio.Task) -> None:
+        self._background_tasks.discard(task)
+        if not task.cancelled() and (exc := task.exception()) is not None:
+            logger.error("automerge of merge request failed", exc_info=exc)
+
+    async def _wait_for_mergeability_check(self, merge_request: MergeRequest) -> MergeRequest:
+        """Wait until GitLab finished checking the mergeability of the given merge request.
+
+        The merge request is polled with an exponentially increasing interval until the
+        `mergeability_check_timeout` is reached.
+        """
+        deadline = time.monotonic() + self.mergeability_check_timeout.total_seconds()
+        interval = MERGEABILITY_CHECK_INITIAL_INTERVAL
+
+        while merge_request["detailed_merge_status"] in MERGEABILITY_CHECK_PENDING_STATUSES:
+            if (remaining := deadline - time.monotonic()) <= 0:
+                logger.warning(
+                    f"Merge request {merge_request['web_url']} is still in state "
+                    f"'{merge_request['detailed_merge_status']}' after {self.mergeability_check_timeout}, "
+                    f"continuing with the assumption that it is mergeable"
+                )
+                break
+
+            await asyncio.sleep(min(interval, remaining))
+            interval = min(interval * 2, MERGEABILITY_CHECK_MAX_INTERVAL)
+
+            response = await self.client.get(
+                f"/projects/{merge_request['project_id']}/merge_requests/{merge_request['iid']}"
+            )
+            response.raise_for_status()
+            merge_request = response.json()
+
+        return merge_request
+
     async def _automerge_merge_request(
         self, merge_request: MergeRequest, merge_commit_message: str, timeout: timedelta | None = None
     ) -> MergeRequest:
@@ -450,10 +718,10 @@ class GitlabHoster(Hoster):
         response.raise_for_status()
         return True
 
-    async def get_commit_url(self, incarnation_repository: str, commit_sha: GitSha) -> str:
+    def get_commit_url(self, incarnation_repository: str, commit_sha: GitSha) -> str:
         return f"{self.web_address}/{incarnation_repository}/-/commit/{commit_sha}"
 
-    async def get_merge_request_url(self, incarnation_repository: str, merge_request_id: str) -> str:
+    def get_merge_request_url(self, incarnation_repository: str, merge_request_id: str) -> str:
         return f"{self.web_address}/{incarnation_repository}/-/merge_requests/{merge_request_id}"
 
     async def get_merge_request_status(self, incarnation_repository: str, merge_request_id: str) -> MergeRequestStatus:
@@ -470,22 +738,103 @@ class GitlabHoster(Hoster):
 
         merge_request: MergeRequest = response.json()
 
-        mapping = {
-            "opened": MergeRequestStatus.OPEN,
-            "locked": MergeRequestStatus.OPEN,  # assumed to be a transitional, internal Gitlab state
-            "closed": MergeRequestStatus.CLOSED,
-            "merged": MergeRequestStatus.MERGED,
-        }
-        state = merge_request["state"]
-        try:
-            return mapping[state]
-        except KeyError:
-            logger.warning(
-                f"unknown merge request state '{state}'",
-                incarnation_repository=incarnation_repository,
-                merge_request_id=merge_request_id,
+        return _merge_request_status_from_state(merge_request["state"], incarnation_repository, merge_request_id)
+
+    async def get_merge_request_statuses(
+        self, merge_requests: list[tuple[str, MergeRequestId]]
+    ) -> dict[tuple[str, MergeRequestId], MergeRequestStatus]:
+        """Returns the status of many merge requests at once.
+
+        The statuses are fetched using the GitLab GraphQL API, with one query per page of projects.
+        If the GraphQL API is not usable, it falls back to fetching them one by one from the REST API.
+
+        Merge requests of projects which don't exist (anymore) are reported as `UNKNOWN`, instead of failing the
+        lookup of all others.
+        """
+        merge_request_ids_by_project: dict[str, set[MergeRequestId]] = {}
+        for incarnation_repository, merge_request_id in merge_requests:
+            merge_request_ids_by_project.setdefault(incarnation_repository, set()).add(merge_request_id)
+
+        # GraphQL only knows projects by their full path, numeric project IDs are handled via the REST API
+        graphql_units = [
+            (project, chunk)
+            for project, ids in merge_request_ids_by_project.items()
+            if not project.isdigit()
+            for chunk in _chunks(sorted(ids), GRAPHQL_MERGE_REQUESTS_PER_PROJECT)
+        ]
+        rest_merge_requests = [
+            (project, merge_request_id)
+            for project, ids in merge_request_ids_by_project.items()
+            if project.isdigit()
+            for merge_request_id in ids
+        ]
+
+        statuses: dict[tuple[str, MergeRequestId], MergeRequestStatus] = {}
+        for page in _chunks(graphql_units, GRAPHQL_PROJECTS_PER_QUERY):
+            try:
+                statuses.update(await self._get_merge_request_statuses_via_graphql(page))
+            except (GraphQLError, httpx.HTTPStatusError) as e:
+                logger.warning("failed to query merge request statuses via GraphQL, using REST API", error=str(e))
+                rest_merge_requests.extend((project, mr_id) for project, ids in page for mr_id in ids)
+
+        for incarnation_repository, merge_request_id in rest_merge_requests:
+            try:
+                status = await self.get_merge_request_status(incarnation_repository, merge_request_id)
+            except IncarnationRepositoryNotFound:
+                logger.warning(
+                    "incarnation repository of merge request not found", incarnation_repository=incarnation_repository
+                )
+                status = MergeRequestStatus.UNKNOWN
+            statuses[(incarnation_repository, merge_request_id)] = status
+
+        return statuses
+
+    async def _get_merge_request_statuses_via_graphql(
+        self, units: list[tuple[str, list[MergeRequestId]]]
+    ) -> dict[tuple[str, MergeRequestId], MergeRequestStatus]:
+        variable_definitions = []
+        fields = []
+        variables: dict[str, Any] = {}
+        for index, (project, merge_request_ids) in enumerate(units):
+            variable_definitions.append(f"$path{index}: ID!, $iids{index}: [String!]")
+            fields.append(
+                f"p{index}: project(fullPath: $path{index}) "
+                f"{{ mergeRequests(iids: $iids{index}) {{ nodes {{ iid state }} }} }}"
             )
-            return MergeRequestStatus.UNKNOWN
+            variables[f"path{index}"] = project
+            variables[f"iids{index}"] = merge_request_ids
+
+        query = f"query({', '.join(variable_definitions)}) {{ {' '.join(fields)} }}"
+
+        response = await self.client.post(
+            f"{self.web_address}/api/graphql", json={"query": query, "variables": variables}
+        )
+        response.raise_for_status()
+        body = response.json()
+        if body.get("errors"):
+            raise GraphQLError(body["errors"])
+
+        statuses: dict[tuple[str, MergeRequestId], MergeRequestStatus] = {}
+        for index, (project, merge_request_ids) in enumerate(units):
+            if (project_data := body["data"][f"p{index}"]) is None:
+                logger.warning("incarnation repository of merge request not found", incarnation_repository=project)
+                statuses |= {
+                    (project, merge_request_id): MergeRequestStatus.UNKNOWN for merge_request_id in merge_request_ids
+                }
+                continue
+
+            states = {node["iid"]: node["state"] for node in project_data["mergeRequests"]["nodes"]}
+            for merge_request_id in merge_request_ids:
+                if merge_request_id not in states:
+                    # if the merge request does not exist, we assume it has been closed (because it was deleted)
+                    statuses[(project, merge_request_id)] = MergeRequestStatus.CLOSED
+                    continue
+
+                statuses[(project, merge_request_id)] = _merge_request_status_from_state(
+                    states[merge_request_id], project, merge_request_id
+                )
+
+        return statuses
 
     async def _has_gitlab_ci_configuration(self, incarnation_repository: str, ref: str) -> bool:
         response = await self.client.head(
@@ -493,3 +842,34 @@ class GitlabHoster(Hoster):
             params={"ref": ref},
         )
         return response.status_code == HTTPStatus.OK
+
+
+def _merge_request_status_from_state(
+    state: str, incarnation_repository: str, merge_request_id: str
+) -> MergeRequestStatus:
+    try:
+        return MERGE_REQUEST_STATE_MAPPING[state]
+    except KeyError:
+        logger.warning(
+            f"unknown merge request state '{state}'",
+            incarnation_repository=incarnation_repository,
+            merge_request_id=merge_request_id,
+        )
+        return MergeRequestStatus.UNKNOWN
+
+
+def _commit_action_payload(action: CommitAction) -> dict[str, Any]:
+    payload: dict[str, Any] = {"action": action.action, "file_path": action.file_path}
+    if action.content is not None:
+        payload["content"] = base64.b64encode(action.content).decode("ascii")
+        payload["encoding"] = "base64"
+    if action.previous_path is not None:
+        payload["previous_path"] = action.previous_path
+    if action.action != "delete":
+        payload["execute_filemode"] = action.executable
+
+    return payload
+
+
+def _chunks(items: list[T], size: int) -> list[list[T]]:
+    return [items[i : i + size] for i in range(0, len(items), size)]
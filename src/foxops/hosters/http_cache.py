@@ -0,0 +1,307 @@
+import hashlib
+import json
+import os
+import re
+import time
+from base64 import b64decode, b64encode
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+import httpx
+
+from foxops.logger import get_logger
+
+#: Holds the module logger
+logger = get_logger(__name__)
+
+#: Default time-to-live (in seconds) per API endpoint, matched against the request path relative to the API base URL.
+#  Within the TTL, responses are served from the cache without contacting the server at all.
+#  Afterward (and always for endpoints with a TTL of 0), a conditional request is sent to revalidate the entry.
+#  Endpoints not matching any of the patterns are not cached.
+DEFAULT_ENDPOINT_TTLS: list[tuple[str, float]] = [
+    (r"^/version$", 3600),
+    # project metadata (default branch, clone URL) rarely changes
+    (r"^/projects/[^/]+$", 300),
+    (r"^/projects/[^/]+/repository/files/[^/]+$", 0),
+    (r"^/projects/[^/]+/repository/commits/[^/]+$", 0),
+    (r"^/projects/[^/]+/repository/branches/[^/]+$", 0),
+    (r"^/projects/[^/]+/merge_requests(/[^/]+)?$", 0),
+]
+
+
+@dataclass
+class CachedResponse:
+    key: str
+    status_code: int
+    headers: list[tuple[str, str]]
+    content: bytes
+    stored_at: float
+
+    @property
+    def etag(self) -> str | None:
+        return self._header("etag")
+
+    @property
+    def last_modified(self) -> str | None:
+        return self._header("last-modified")
+
+    def _header(self, name: str) -> str | None:
+        return next((v for k, v in self.headers if k.lower() == name), None)
+
+    def to_json(self) -> str:
+        data = asdict(self)
+        data["content"] = b64encode(self.content).decode()
+        return json.dumps(data)
+
+    @classmethod
+    def from_json(cls, text: str) -> "CachedResponse":
+        data = json.loads(text)
+        data["headers"] = [tuple(h) for h in data["headers"]]
+        data["content"] = b64decode(data["content"])
+        return cls(**data)
+
+
+class HttpCache:
+    """Storage for cached HTTP responses.
+
+    Responses are kept in a bounded in-memory LRU store. If a directory is given, entries are additionally
+    written to (and read back from) that directory, so that they survive restarts. The disk store is bounded
+    separately (by `max_disk_entries`) and its keys are tracked in memory, so that invalidations also reach entries
+    which are only on disk. Be aware that the cached responses contain repository content, so the directory must
+    not be readable by others.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        directory: Path | None = None,
+        endpoint_ttls: list[tuple[str, float]] | None = None,
+        max_disk_entries: int = 16384,
+    ) -> None:
+        if endpoint_ttls is None:
+            endpoint_ttls = DEFAULT_ENDPOINT_TTLS
+
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.directory = directory
+        self.endpoint_ttls = [(re.compile(pattern), ttl) for pattern, ttl in endpoint_ttls]
+
+        self._memory: OrderedDict[str, CachedResponse] = OrderedDict()
+        # keys of the entries on disk, in least recently used order
+        self._disk: OrderedDict[str, None] = OrderedDict()
+
+        if self.directory is not None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self._load_disk_index()
+
+    def ttl(self, path: str) -> float | None:
+        """Returns the TTL for the given request path or None if responses for it must not be cached."""
+        return next((ttl for pattern, ttl in self.endpoint_ttls if pattern.match(path)), None)
+
+    def get(self, key: str) -> CachedResponse | None:
+        if (entry := self._memory.get(key)) is not None:
+            self._memory.move_to_end(key)
+            return entry
+
+        if key not in self._disk:
+            return None
+
+        path = self._disk_path(key)
+        try:
+            entry = CachedResponse.from_json(path.read_text())
+        except (OSError, ValueError, TypeError, KeyError):
+            logger.warning("ignoring unreadable HTTP cache entry", path=str(path))
+            self._forget_on_disk(key)
+            return None
+
+        self._disk.move_to_end(key)
+        self._remember(entry)
+        return entry
+
+    def set(self, entry: CachedResponse) -> None:
+        self._remember(entry)
+
+        if self.directory is not None:
+            path = self._disk_path(entry.key)
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w") as f:
+                f.write(entry.to_json())
+
+            self._disk[entry.key] = None
+            self._disk.move_to_end(entry.key)
+            while len(self._disk) > self.max_disk_entries:
+                self._forget_on_disk(next(iter(self._disk)))
+
+    def invalidate(self, path: str, base_path: str = "") -> None:
+        """Removes all entries for the resource at the given path, its sub-resources and its parent collections.
+
+        The project resource itself (`/projects/:id`) is never affected by modifications of its sub-resources.
+        """
+        for key in [k for k in self._memory if _is_related_path(_path_of_key(k, base_path), path)]:
+            del self._memory[key]
+        for key in [k for k in self._disk if _is_related_path(_path_of_key(k, base_path), path)]:
+            self._forget_on_disk(key)
+
+    def __len__(self) -> int:
+        return len(self._memory)
+
+    def _remember(self, entry: CachedResponse) -> None:
+        self._memory[entry.key] = entry
+        self._memory.move_to_end(entry.key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _forget_on_disk(self, key: str) -> None:
+        self._disk.pop(key, None)
+        self._disk_path(key).unlink(missing_ok=True)
+
+    def _load_disk_index(self) -> None:
+        assert self.directory is not None
+
+        paths = sorted(self.directory.glob("*.json"), key=lambda p: p.stat().st_mtime)
+        for path in paths:
+            try:
+                self._disk[CachedResponse.from_json(path.read_text()).key] = None
+            except (OSError, ValueError, TypeError, KeyError):
+                logger.warning("removing unreadable HTTP cache entry", path=str(path))
+                path.unlink(missing_ok=True)
+
+        while len(self._disk) > self.max_disk_entries:
+            self._forget_on_disk(next(iter(self._disk)))
+
+    def _disk_path(self, key: str) -> Path:
+        assert self.directory is not None
+        return self.directory / f"{hashlib.sha256(key.encode()).hexdigest()}.json"
+
+
+def _path_of_key(key: str, base_path: str) -> str:
+    return _relative_path(httpx.URL(key.split(" ", 1)[1]), base_path)
+
+
+def _relative_path(url: httpx.URL, base_path: str) -> str:
+    # NOTE: the raw path is used, because project and file identifiers contain URL-encoded slashes
+    return url.raw_path.decode("ascii").split("?", 1)[0].removeprefix(base_path)
+
+
+def _is_related_path(cached_path: str, modified_path: str) -> bool:
+    # the resource itself and its sub-resources (matching whole path segments only)
+    if cached_path == modified_path or cached_path.startswith(f"{modified_path}/"):
+        return True
+
+    # parent collections (e.g. `/projects/:id/merge_requests`), but not the project itself
+    return modified_path.startswith(f"{cached_path}/") and cached_path.count("/") > 2
+
+
+class CachingTransport(httpx.AsyncBaseTransport):
+    """HTTP transport which caches responses of GET requests and revalidates them with conditional requests.
+
+    Cached entries are revalidated using the `ETag` and `Last-Modified` validators of the stored response
+    (`If-None-Match` / `If-Modified-Since`). A `304 Not Modified` answer is transparently turned into the
+    cached response.
+
+    Successful non-GET requests invalidate all cached entries for the same resource.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, cache: HttpCache, base_path: str = "") -> None:
+        self.transport = transport
+        self.cache = cache
+        self.base_path = base_path.rstrip("/")
+
+        self.hits = 0
+        self.revalidations = 0
+        self.misses = 0
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        path = _relative_path(request.url, self.base_path)
+
+        if request.method != "GET":
+            response = await self.transport.handle_async_request(request)
+            if request.method != "HEAD" and response.is_success:
+                self.cache.invalidate(path, self.base_path)
+            return response
+
+        ttl = self.cache.ttl(path)
+        if ttl is None:
+            return await self.transport.handle_async_request(request)
+
+        key = self._key(request)
+        cached = self.cache.get(key)
+        if cached is not None:
+            if time.time() - cached.stored_at < ttl:
+                self.hits += 1
+                return self._response_from_cache(cached, request)
+
+            if cached.etag is not None:
+                request.headers["If-None-Match"] = cached.etag
+            if cached.last_modified is not None:
+                request.headers["If-Modified-Since"] = cached.last_modified
+
+        response = await self.transport.handle_async_request(request)
+
+        if cached is not None and response.status_code == httpx.codes.NOT_MODIFIED:
+            await response.aclose()
+            self.revalidations += 1
+
+            cached.stored_at = time.time()
+            if (etag := response.headers.get("etag")) is not None:
+                cached.headers = [(k, v) for k, v in cached.headers if k.lower() != "etag"] + [("etag", etag)]
+            self.cache.set(cached)
+
+            return self._response_from_cache(cached, request)
+
+        self.misses += 1
+        if response.status_code != httpx.codes.OK or "no-store" in response.headers.get("cache-control", ""):
+            return response
+        if ttl == 0 and "etag" not in response.headers and "last-modified" not in response.headers:
+            # nothing we could revalidate with
+            return response
+
+        headers, content = await _read_raw_response(response)
+        entry = CachedResponse(
+            key=key,
+            status_code=response.status_code,
+            headers=headers,
+            content=content,
+            stored_at=time.time(),
+        )
+        self.cache.set(entry)
+
+        return self._response_from_cache(entry, request)
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+    @staticmethod
+    def _key(request: httpx.Request) -> str:
+        # responses are only valid for the credentials they were requested with
+        authorization = hashlib.sha256(request.headers.get("authorization", "").encode()).hexdigest()[:16]
+        return f"{authorization} {request.url}"
+
+    @staticmethod
+    def _response_from_cache(entry: CachedResponse, request: httpx.Request) -> httpx.Response:
+        return httpx.Response(
+            status_code=entry.status_code,
+            headers=entry.headers,
+            content=entry.content,
+            request=request,
+        )
+
+
+async def _read_raw_response(response: httpx.Response) -> tuple[list[tuple[str, str]], bytes]:
+    """Reads the body of the given response as it was sent by the server (still content-encoded).
+
+    This keeps the stored headers consistent with the stored body.
+    """
+    try:
+        content = b"".join([chunk async for chunk in response.aiter_raw()])
+    except httpx.StreamConsumed:
+        # the body was already read (and decoded) by the underlying transport
+        headers = [
+            (k, v) for k, v in response.headers.multi_items() if k.lower() not in {"content-encoding", "content-length"}
+        ]
+        return headers, response.content
+    finally:
+        await response.aclose()
+
+    return list(response.headers.multi_items()), content
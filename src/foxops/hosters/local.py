@@ -8,9 +8,15 @@ from typing import AsyncIterator, Iterator
 from pydantic import BaseModel
 
 from foxops.engine import IncarnationState
+from foxops.errors import CommitConflictError
 from foxops.external.git import GitError, GitRepository, git_exec
 from foxops.hosters import GitSha, Hoster, MergeRequestId, ReconciliationStatus
-from foxops.hosters.types import MergeRequestStatus, RepositoryMetadata
+from foxops.hosters.types import (
+    CommitAction,
+    MergeRequestStatus,
+    RepositoryMetadata,
+    TemplateSource,
+)
 
 
 class MergeRequest(BaseModel):
@@ -114,10 +120,12 @@ class LocalHoster(Hoster):
         description: str,
         incarnation_sub_directory: str,
         with_automerge=False,
+        automerge_in_background=False,
     ) -> tuple[GitSha, MergeRequestId]:
+        # merging is instantaneous for the local hoster, so it's always done in the foreground
         mr_manager = self._mr_manager(incarnation_repository)
 
-        commit_id = await self.has_pending_incarnation_branch(incarnation_repository, source_branch)
+        commit_id = await self.get_branch_head(incarnation_repository, source_branch)
         if commit_id is None:
             raise ValueError("Branch does not exist")
 
@@ -180,11 +188,64 @@ class LocalHoster(Hoster):
 
             yield GitRepository(Path(tmpdir), push_delay_seconds=self.push_delay_seconds)
 
+    @asynccontextmanager
+    async def template_source(self, repository: str, refspec: str) -> AsyncIterator[TemplateSource]:
+        async with self.cloned_repository(repository, refspec=refspec) as repo:
+            yield TemplateSource(directory=repo.directory, commit_sha=await repo.head())
+
+    async def commit_files(
+        self,
+        repository: str,
+        *,
+        branch: str,
+        message: str,
+        actions: list[CommitAction],
+        start_sha: GitSha | None = None,
+    ) -> GitSha:
+        """Fake of the GitLab commits API, applying the actions in a temporary clone and pushing the result."""
+
+        if start_sha is not None and await self.get_branch_head(repository, branch) is not None:
+            raise CommitConflictError(f"branch '{branch}' already exists")
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            await git_exec("clone", self._repo_path(repository), ".", cwd=tmpdir)
+            await git_exec("config", "user.name", "foxops", cwd=tmpdir)
+            await git_exec("config", "user.email", "noreply@foxops.io", cwd=tmpdir)
+            repo = GitRepository(Path(tmpdir))
+
+            if start_sha is None:
+                await repo.checkout_branch(branch)
+            else:
+                await git_exec("checkout", "-b", branch, start_sha, cwd=tmpdir)
+
+            for action in actions:
+                path = repo.directory / action.file_path
+                if action.action == "delete":
+                    path.unlink()
+                    continue
+
+                if action.action == "move":
+                    path.parent.mkdir(parents=True, exist_ok=True)
+                    (repo.directory / action.previous_path).rename(path)  # type: ignore
+                if action.content is not None:
+                    path.parent.mkdir(parents=True, exist_ok=True)
+                    path.write_bytes(action.content)
+                path.chmod(0o755 if action.executable else 0o644)
+
+            await repo.commit_all(message)
+            try:
+                return await repo.push()
+            except GitError as e:
+                raise CommitConflictError(str(e)) from e
+
     async def has_pending_incarnation_branch(self, project_identifier: str, branch: str) -> GitSha | None:
+        return await self.get_branch_head(project_identifier, branch)
+
+    async def get_branch_head(self, project_identifier: str, branch: str) -> GitSha | None:
         try:
             result = await git_exec("rev-parse", f"refs/heads/{branch}", cwd=self._repo_path(project_identifier))
         except GitError as e:
-            if e.message.index("unknown revision or path not in the working tree") >= 0:
+            if "unknown revision or path not in the working tree" in e.message:
                 return None
 
             raise
@@ -233,15 +294,25 @@ class LocalHoster(Hoster):
             return True
         raise RuntimeError(f"Unexpected return code from git cat-file: {result.returncode}")
 
-    async def get_commit_url(self, incarnation_repository: str, commit_sha: GitSha) -> str:
+    def get_commit_url(self, incarnation_repository: str, commit_sha: GitSha) -> str:
         return f"file://{self._repo_path(incarnation_repository)}:commit/{commit_sha}"
 
-    async def get_merge_request_url(self, incarnation_repository: str, merge_request_id: str) -> str:
+    def get_merge_request_url(self, incarnation_repository: str, merge_request_id: str) -> str:
         return f"file://{self._repo_path(incarnation_repository)}:merge_requests/{merge_request_id}"
 
     async def get_merge_request_status(self, incarnation_repository: str, merge_request_id: str) -> MergeRequestStatus:
         return self.get_merge_request(incarnation_repository, merge_request_id).status
 
+    async def get_merge_request_statuses(
+        self, merge_requests: list[tuple[str, MergeRequestId]]
+    ) -> dict[tuple[str, MergeRequestId], MergeRequestStatus]:
+        return {
+            (incarnation_repository, merge_request_id): await self.get_merge_request_status(
+                incarnation_repository, merge_request_id
+            )
+            for incarnation_repository, merge_request_id in merge_requests
+        }
+
     def _repo_path(self, repository: str) -> Path:
         return (self.directory / repository / self.GIT_PATH).absolute()
 
@@ -0,0 +1,209 @@
+import asyncio
+import random
+import time
+from contextlib import asynccontextmanager
+from dataclasses import asdict, dataclass
+from email.utils import parsedate_to_datetime
+from typing import AsyncIterator
+
+import httpx
+
+from foxops.logger import get_logger
+
+#: Holds the module logger
+logger = get_logger(__name__)
+
+#: Holds the HTTP methods which are safe to be retried after server errors or connection failures
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD"})
+
+#: Holds the status codes for which idempotent requests are retried
+RETRYABLE_STATUS_CODES = frozenset({502, 503, 504})
+
+#: Never pause longer than this (in seconds) because of rate limit headers sent by the server
+MAX_RATE_LIMIT_PAUSE = 60.0
+
+
+@dataclass
+class RateLimitMetrics:
+    """Counters describing how the client interacted with the rate limits of the server."""
+
+    requests: int = 0
+    throttled: int = 0
+    retries: int = 0
+    paused_seconds: float = 0.0
+    concurrency_limit: float = 0.0
+    in_flight: int = 0
+
+
+class AdaptiveConcurrencyLimiter:
+    """Limits the number of concurrent requests, adapting the limit with AIMD.
+
+    The limit increases additively (by one per "round" of successful requests) and is halved whenever
+    the server signals that it is overloaded.
+    """
+
+    def __init__(self, initial_limit: int, max_limit: int, min_limit: int = 1) -> None:
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.limit = float(min(max(initial_limit, min_limit), max_limit))
+
+        self.in_flight = 0
+        self._condition = asyncio.Condition()
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+        try:
+            yield
+        finally:
+            async with self._condition:
+                self.in_flight -= 1
+                self._condition.notify_all()
+
+    def increase(self) -> None:
+        self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+    def decrease(self) -> None:
+        self.limit = max(self.min_limit, self.limit / 2)
+
+
+class RateLimitTransport(httpx.AsyncBaseTransport):
+    """HTTP transport which respects the rate limits of the server.
+
+    * `429 Too Many Requests` responses are retried (for all methods, as the server did not process the request)
+      after the time given in the `Retry-After` header, or after a jittered exponential backoff.
+    * Idempotent requests (GET/HEAD) are additionally retried on connection errors and on 502/503/504 responses.
+    * When the `RateLimit-Remaining` header indicates that the budget is (almost) used up, new requests are paused
+      until the time given in the `RateLimit-Reset` header.
+    * The number of concurrent requests is limited by an `AdaptiveConcurrencyLimiter`.
+
+    Every back-off (retry or pause) is logged together with the current `metrics`.
+    """
+
+    def __init__(
+        self,
+        transport: httpx.AsyncBaseTransport,
+        max_concurrency: int = 32,
+        max_retries: int = 5,
+        backoff_base: float = 0.5,
+        backoff_max: float = 30.0,
+    ) -> None:
+        self.transport = transport
+        self.limiter = AdaptiveConcurrencyLimiter(initial_limit=max(1, max_concurrency // 4), max_limit=max_concurrency)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self._paused_until = 0.0
+        self._metrics = RateLimitMetrics()
+
+    @property
+    def metrics(self) -> RateLimitMetrics:
+        self._metrics.concurrency_limit = self.limiter.limit
+        self._metrics.in_flight = self.limiter.in_flight
+        return self._metrics
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        idempotent = request.method in IDEMPOTENT_METHODS
+
+        for attempt in range(self.max_retries + 1):
+            await self._wait_while_paused()
+
+            can_retry = attempt < self.max_retries
+            async with self.limiter.slot():
+                self._metrics.requests += 1
+                try:
+                    response = await self.transport.handle_async_request(request)
+                except httpx.TransportError as e:
+                    if not (idempotent and can_retry):
+                        raise
+                    delay = self._backoff(attempt)
+                    reason = f"transport error: {e}"
+                else:
+                    self._observe_rate_limit_headers(response)
+
+                    if response.status_code == httpx.codes.TOO_MANY_REQUESTS:
+                        self._metrics.throttled += 1
+                        self.limiter.decrease()
+                        if not can_retry:
+                            logger.warning(
+                                "GitLab rate limit hit, giving up", url=str(request.url), **asdict(self.metrics)
+                            )
+                            return response
+                        retry_after = _retry_after(response)
+                        delay = retry_after if retry_after is not None else self._backoff(attempt)
+                        reason = "rate limit hit"
+                    elif response.status_code in RETRYABLE_STATUS_CODES and idempotent and can_retry:
+                        self.limiter.decrease()
+                        delay = self._backoff(attempt)
+                        reason = f"server error {response.status_code}"
+                    else:
+                        self.limiter.increase()
+                        return response
+
+                    await response.aclose()
+
+            self._metrics.retries += 1
+            logger.warning(
+                "backing off before retrying GitLab request",
+                url=str(request.url),
+                reason=reason,
+                delay_seconds=round(delay, 2),
+                **asdict(self.metrics),
+            )
+            await asyncio.sleep(delay)
+
+        raise AssertionError("unreachable")  # pragma: no cover
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2**attempt))
+
+    def _observe_rate_limit_headers(self, response: httpx.Response) -> None:
+        try:
+            remaining = int(response.headers["ratelimit-remaining"])
+            limit = int(response.headers.get("ratelimit-limit", "0"))
+            reset = float(response.headers["ratelimit-reset"])
+        except (KeyError, ValueError):
+            return
+
+        # keep a small safety margin for requests that are already in flight
+        if remaining > max(1, limit // 20):
+            return
+
+        pause_until = min(reset, time.time() + MAX_RATE_LIMIT_PAUSE)
+        if pause_until > self._paused_until:
+            logger.warning(
+                "GitLab rate limit almost exhausted, pausing requests",
+                remaining=remaining,
+                limit=limit,
+                pause_seconds=round(pause_until - time.time(), 1),
+                **asdict(self.metrics),
+            )
+            self._paused_until = pause_until
+
+    async def _wait_while_paused(self) -> None:
+        if (pause := self._paused_until - time.time()) > 0:
+            self._metrics.paused_seconds += pause
+            await asyncio.sleep(pause)
+
+
+def _retry_after(response: httpx.Response) -> float | None:
+    value = response.headers.get("retry-after")
+    if value is None:
+        return None
+
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+
+    return min(max(seconds, 0.0), MAX_RATE_LIMIT_PAUSE)
@@ -0,0 +1,127 @@
+import asyncio
+import hashlib
+import os
+import shutil
+import tarfile
+import tempfile
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import IO, AsyncIterator, Awaitable, Callable
+
+from foxops.logger import get_logger
+
+#: Holds the module logger
+logger = get_logger(__name__)
+
+
+class IncompleteTemplateArchive(Exception):
+    """Raised if the archive of a template repository differs from the checkout of the same commit."""
+
+    def __init__(self, paths: list[str]) -> None:
+        super().__init__(f"archive differs from the checkout at {len(paths)} path(s)")
+        self.paths = paths
+
+
+class TemplateArchiveCache:
+    """Keeps the unpacked contents of template repository archives on disk, one directory per commit.
+
+    Directories are handed out read-only to callers and are only evicted (least recently used first)
+    while nobody is using them.
+    """
+
+    def __init__(self, directory: Path | None = None, max_entries: int = 32) -> None:
+        if directory is None:
+            directory = Path(tempfile.mkdtemp(prefix="foxops-templates-"))
+        directory.mkdir(parents=True, exist_ok=True)
+
+        self.directory = directory
+        self.max_entries = max_entries
+
+        self._entries: OrderedDict[str, Path] = OrderedDict()
+        self._users: dict[str, int] = {}
+        self._locks: dict[str, asyncio.Lock] = {}
+
+    @asynccontextmanager
+    async def unpacked(self, key: str, download: Callable[[Path], Awaitable[None]]) -> AsyncIterator[Path]:
+        """Yield the directory for the given key, calling `download` to fill it if it isn't cached yet."""
+
+        async with self._locks.setdefault(key, asyncio.Lock()):
+            if (path := self._entries.get(key)) is None:
+                path = Path(tempfile.mkdtemp(dir=self.directory))
+                try:
+                    await download(path)
+                except BaseException:
+                    shutil.rmtree(path, ignore_errors=True)
+                    raise
+
+                self._entries[key] = path
+            self._entries.move_to_end(key)
+            self._users[key] = self._users.get(key, 0) + 1
+
+        try:
+            yield path
+        finally:
+            self._users[key] -= 1
+            self._evict()
+
+    def _evict(self) -> None:
+        for key in list(self._entries):
+            if len(self._entries) <= self.max_entries:
+                break
+            if self._users.get(key, 0) > 0:
+                continue
+
+            shutil.rmtree(self._entries.pop(key), ignore_errors=True)
+            self._users.pop(key, None)
+            self._locks.pop(key, None)
+
+
+def unpack_tar_archive(fileobj: IO[bytes], destination: Path) -> None:
+    """Unpack a (gzipped) tar archive as returned by GitLab, stripping the top-level directory."""
+
+    with tarfile.open(fileobj=fileobj, mode="r|*") as archive:
+        for member in archive:
+            parts = Path(member.name).parts
+            if len(parts) < 2:
+                continue
+
+            member.name = str(Path(*parts[1:]))
+            archive.extract(member, destination, filter=_template_member_filter)
+
+
+def _template_member_filter(member: tarfile.TarInfo, path: str) -> tarfile.TarInfo | None:
+    # git (and thus a clone of the template) allows symlinks to absolute paths or outside of the repository,
+    # which the `data` filter rejects. They are only created, never followed: members which would be written
+    # through such a symlink are still rejected, because the target path is resolved before extracting.
+    if member.issym():
+        return tarfile.tar_filter(member, path)
+    return tarfile.data_filter(member, path)
+
+
+def git_blob_sha(content: bytes) -> str:
+    """Return the SHA-1 git uses to identify a blob with the given content."""
+
+    return hashlib.sha1(b"blob %d\0" % len(content) + content).hexdigest()
+
+
+def find_tree_differences(directory: Path, blobs: dict[str, str]) -> list[str]:
+    """Return the paths where the files in `directory` differ from the given blobs (paths mapped to blob SHAs).
+
+    Archives of a repository aren't necessarily equal to its checkout: git leaves out files marked as
+    `export-ignore` and rewrites the contents of files marked as `export-subst` in its `.gitattributes`.
+    """
+
+    unpacked: dict[str, str] = {}
+    for root, dirnames, filenames in os.walk(directory):
+        for name in dirnames + filenames:
+            path = Path(root, name)
+            if path.is_symlink():
+                content = os.fsencode(os.readlink(path))
+            elif path.is_file():
+                content = path.read_bytes()
+            else:
+                continue
+            unpacked[path.relative_to(directory).as_posix()] = git_blob_sha(content)
+
+    return sorted(path for path in unpacked.keys() | blobs.keys() if unpacked.get(path) != blobs.get(path))
@@ -1,6 +1,8 @@
+from dataclasses import dataclass
 from datetime import timedelta
 from enum import Enum
-from typing import AsyncContextManager, Protocol, TypedDict
+from pathlib import Path
+from typing import AsyncContextManager, Literal, Protocol, TypedDict
 
 from foxops.engine import IncarnationState
 from foxops.external.git import GitRepository
@@ -29,6 +31,25 @@ class MergeRequestStatus(Enum):
     UNKNOWN = "unknown"
 
 
+@dataclass(frozen=True)
+class CommitAction:
+    """A single file operation of a commit that is created through the API of the hoster."""
+
+    action: Literal["create", "update", "delete", "move"]
+    file_path: str
+    content: bytes | None = None
+    previous_path: str | None = None
+    executable: bool = False
+
+
+@dataclass(frozen=True)
+class TemplateSource:
+    """The (read-only) file tree of a template repository at a specific commit."""
+
+    directory: Path
+    commit_sha: GitSha
+
+
 class Hoster(Protocol):
     async def validate(self) -> None: ...
 
@@ -44,15 +65,27 @@ class Hoster(Protocol):
         title: str,
         description: str,
         incarnation_sub_directory: str,
-        with_automerge=False
+        with_automerge=False,
+        automerge_in_background=False,
     ) -> tuple[GitSha, MergeRequestId]: ...
 
     def cloned_repository(
         self, repository: str, *, refspec: str | None = None, bare: bool = False
     ) -> AsyncContextManager[GitRepository]: ...
 
+    def template_source(self, repository: str, refspec: str) -> AsyncContextManager[TemplateSource]:
+        """Provides the files of the given template repository version, without any git metadata.
+
+        The directory may be shared with concurrent users and must not be modified.
+        """
+        ...
+
     async def has_pending_incarnation_branch(self, project_identifier: str, branch: str) -> GitSha | None: ...
 
+    async def get_branch_head(self, project_identifier: str, branch: str) -> GitSha | None:
+        """Returns the commit the given branch points to, or `None` if the branch doesn't exist."""
+        ...
+
     async def has_pending_incarnation_merge_request(
         self, project_identifier: str, branch: str
     ) -> MergeRequestId | None: ...
@@ -70,10 +103,33 @@ class Hoster(Protocol):
 
     async def does_commit_exist(self, incarnation_repository: str, commit_sha: GitSha) -> bool: ...
 
-    async def get_commit_url(self, incarnation_repository: str, commit_sha: GitSha) -> str: ...
+    # URLs are derived locally (without requests to the hoster), so they can be built for many incarnations at once
+    def get_commit_url(self, incarnation_repository: str, commit_sha: GitSha) -> str: ...
 
-    async def get_merge_request_url(self, incarnation_repository: str, merge_request_id: str) -> str: ...
+    def get_merge_request_url(self, incarnation_repository: str, merge_request_id: str) -> str: ...
 
     async def get_merge_request_status(
         self, incarnation_repository: str, merge_request_id: str
     ) -> MergeRequestStatus: ...
+
+    async def get_merge_request_statuses(
+        self, merge_requests: list[tuple[str, MergeRequestId]]
+    ) -> dict[tuple[str, MergeRequestId], MergeRequestStatus]:
+        """Returns the status of many merge requests at once, given as (incarnation repository, MR id) pairs."""
+        ...
+
+    async def commit_files(
+        self,
+        repository: str,
+        *,
+        branch: str,
+        message: str,
+        actions: list[CommitAction],
+        start_sha: GitSha | None = None,
+    ) -> GitSha:
+        """Creates a commit with the given file actions, without a local clone of the repository.
+
+        If `start_sha` is given, `branch` is created from that commit and must not exist yet.
+        Raises `CommitConflictError` if the commit cannot be created on top of the expected state.
+        """
+        ...
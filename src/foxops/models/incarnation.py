@@ -1,3 +1,5 @@
+from datetime import datetime
+
 from pydantic import BaseModel, ConfigDict, Field
 
 from foxops.engine import TemplateData
@@ -34,6 +36,9 @@ class IncarnationBasic(BaseModel):
 
 class IncarnationWithDetails(IncarnationBasic):
     status: ReconciliationStatus = Field(description="DEPRECATED. Use the 'merge_request_status' field instead.")
+    status_refreshed_at: datetime | None = Field(
+        default=None, description="Point in time at which the 'status' was last determined."
+    )
     merge_request_status: MergeRequestStatus | None
     revision: int | None
 
@@ -2,16 +2,25 @@ import enum
 from datetime import datetime
 from typing import Annotated, Self
 
-from fastapi import APIRouter, Depends, HTTPException, Path, status
+from fastapi import APIRouter, Depends, HTTPException, Path, Response, status
 from pydantic import BaseModel
 
 from foxops.database.repositories.change.errors import ChangeNotFoundError
 from foxops.database.repositories.change.model import ChangeType as DatabaseChangeType
-from foxops.dependencies import get_change_service
+from foxops.database.repositories.incarnation.errors import IncarnationNotFoundError
+from foxops.dependencies import get_change_service, get_job_service
 from foxops.engine import TemplateData
+from foxops.engine.errors import ProvidedTemplateDataInvalidError
 from foxops.hosters.types import MergeRequestStatus
 from foxops.models.change import Change, ChangeWithMergeRequest
-from foxops.services.change import CannotRepairChangeException, ChangeService
+from foxops.routers.jobs import JobDetails, accepted_job, respond_async
+from foxops.services.change import (
+    CannotRepairChangeException,
+    ChangePreview,
+    ChangeRejectedDueToPreviousUnfinishedChange,
+    ChangeService,
+)
+from foxops.services.job import ChangeJobArguments, JobService
 
 router = APIRouter()
 
@@ -50,6 +59,15 @@ class CreateChangeRequest(BaseModel):
     requested_version: str
     requested_data: TemplateData
     change_type: CreateChangeType = CreateChangeType.DIRECT
+    # respond right after creating the merge request, without waiting for the automerge to be accepted
+    automerge_in_background: bool = False
+
+
+class PreviewChangeRequest(BaseModel):
+    requested_version: str | None = None
+    requested_data: TemplateData = {}
+    # only update the given template data (and keep the current version if no version is requested)
+    patch: bool = False
 
 
 class ChangeType(enum.Enum):
@@ -88,12 +106,41 @@ class ChangeDetails(BaseModel):
                 raise NotImplementedError(f"Unknown change type {type(obj)}")
 
 
-@router.post("", status_code=status.HTTP_201_CREATED)
+@router.post(
+    "",
+    status_code=status.HTTP_201_CREATED,
+    responses={
+        status.HTTP_202_ACCEPTED: {
+            "description": "The change will be executed in the background (see the `Prefer` header)",
+            "model": JobDetails,
+        },
+    },
+)
 async def create_change(
     incarnation_id: int,
     request: CreateChangeRequest,
+    response: Response,
+    asynchronous: bool = Depends(respond_async),
     change_service: ChangeService = Depends(get_change_service),
-) -> ChangeDetails:
+    job_service: JobService = Depends(get_job_service),
+) -> ChangeDetails | JobDetails:
+    if asynchronous:
+        try:
+            job = await job_service.enqueue_change(
+                incarnation_id,
+                ChangeJobArguments(
+                    requested_version=request.requested_version,
+                    requested_data=request.requested_data,
+                    merge_request=request.change_type != CreateChangeType.DIRECT,
+                    automerge=request.change_type == CreateChangeType.MERGE_REQUEST_AUTOMERGE,
+                    automerge_in_background=request.automerge_in_background,
+                ),
+            )
+        except IncarnationNotFoundError:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Incarnation not found")
+
+        return accepted_job(job, response)
+
     match request.change_type:
         case CreateChangeType.DIRECT:
             change = await change_service.create_change_direct(
@@ -105,7 +152,11 @@ async def create_change(
             )
         case CreateChangeType.MERGE_REQUEST_AUTOMERGE:
             change = await change_service.create_change_merge_request(
-                incarnation_id, request.requested_version, request.requested_data, automerge=True
+                incarnation_id,
+                request.requested_version,
+                request.requested_data,
+                automerge=True,
+                automerge_in_background=request.automerge_in_background,
             )
         case _:
             raise NotImplementedError(f"Unknown change type {request.change_type}")
@@ -113,6 +164,45 @@ async def create_change(
     return ChangeDetails.from_service_object(change)
 
 
+@router.post(
+    "/preview",
+    responses={
+        status.HTTP_400_BAD_REQUEST: {"description": "The requested version or template data is invalid"},
+        status.HTTP_404_NOT_FOUND: {"description": "Incarnation not found"},
+        status.HTTP_409_CONFLICT: {"description": "A previous change of the incarnation is still open"},
+    },
+)
+async def preview_change(
+    incarnation_id: int,
+    request: PreviewChangeRequest,
+    change_service: ChangeService = Depends(get_change_service),
+) -> ChangePreview:
+    """Returns the changes to the incarnation repository which the requested change would make (without making them).
+
+    Creating the same change right afterwards reuses the update computed for the preview."""
+    if request.requested_version is None and not request.patch:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="requested_version must be set if patch is false"
+        )
+
+    try:
+        return await change_service.preview_change(
+            incarnation_id, request.requested_version, request.requested_data, patch=request.patch
+        )
+    except IncarnationNotFoundError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Incarnation not found")
+    except ProvidedTemplateDataInvalidError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"the provided template data is invalid: {'; '.join(e.get_readable_error_messages())}",
+        )
+    except ChangeRejectedDueToPreviousUnfinishedChange:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="There is a previous change that is still open. Please merge/close it first.",
+        )
+
+
 @router.get("")
 async def list_changes(
     incarnation_id: int,
@@ -1,10 +1,21 @@
-from typing import Self
+from typing import Literal, Self
 
-from fastapi import APIRouter, Depends, Response, status
-from pydantic import BaseModel, model_validator
+from fastapi import APIRouter, Depends, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field, model_validator
 
+from foxops.database.repositories.change.model import (
+    ChangeType,
+    IncarnationSummaryFilter,
+    TemplateDataCondition,
+)
 from foxops.database.repositories.incarnation.errors import IncarnationNotFoundError
-from foxops.dependencies import get_change_service, get_hoster, get_incarnation_service
+from foxops.dependencies import (
+    get_change_service,
+    get_hoster,
+    get_incarnation_service,
+    get_job_service,
+)
 from foxops.engine import TemplateData
 from foxops.engine.errors import ProvidedTemplateDataInvalidError
 from foxops.errors import IncarnationNotFoundError as IncarnationNotFoundLegacyError
@@ -13,13 +24,16 @@ from foxops.logger import bind, get_logger
 from foxops.models import IncarnationBasic, IncarnationWithDetails
 from foxops.models.errors import ApiError
 from foxops.routers import changes
+from foxops.routers.jobs import JobDetails, accepted_job, respond_async
 from foxops.services.change import (
+    BulkChangeResult,
     ChangeRejectedDueToNoChanges,
     ChangeRejectedDueToPreviousUnfinishedChange,
     ChangeService,
     IncarnationAlreadyExists,
 )
 from foxops.services.incarnation import IncarnationService
+from foxops.services.job import ChangeJobArguments, JobService, ResetJobArguments
 
 #: Holds the router for the incarnations API endpoints
 router = APIRouter(prefix="/api/incarnations", tags=["incarnations"])
@@ -28,6 +42,12 @@ router.include_router(changes.router, prefix="/{incarnation_id}/changes", tags=[
 #: Holds the logger for these routes
 logger = get_logger(__name__)
 
+#: Holds the maximum number of incarnations which can be requested per page
+MAX_PAGE_SIZE = 1000
+
+#: Holds the maximum number of incarnations which are updated concurrently by a bulk change
+MAX_BULK_CHANGE_CONCURRENCY = 32
+
 
 @router.get(
     "",
@@ -37,7 +57,8 @@ logger = get_logger(__name__)
             "model": list[IncarnationBasic],
         },
         status.HTTP_400_BAD_REQUEST: {
-            "description": "The `incarnation_repository` and `target_directory` settings where inconsistent",
+            "description": "The `incarnation_repository` and `target_directory` settings where inconsistent, "
+            "or a `template_data` condition was invalid",
             "model": ApiError,
         },
         status.HTTP_404_NOT_FOUND: {
@@ -47,19 +68,66 @@ logger = get_logger(__name__)
     },
 )
 async def list_incarnations(
+    request: Request,
     response: Response,
     incarnation_repository: str | None = None,
     target_directory: str = ".",
+    incarnation_repository_prefix: str | None = None,
+    template_repository: str | None = None,
+    requested_version: str | None = Query(
+        default=None, description="Only return incarnations whose latest change requested this template version"
+    ),
+    change_type: ChangeType | None = Query(
+        default=None, alias="type", description="Only return incarnations whose latest change is of this type"
+    ),
+    merge_request_open: bool | None = Query(
+        default=None,
+        description="Only return incarnations whose latest change has (`true`) or has not (`false`) an open MR",
+    ),
+    template_data: list[str] = Query(
+        default=[],
+        description="Only return incarnations whose template data matches all of the given conditions, "
+        "in the form `<path>:<operator>:<value>` (e.g. `java_version:lt:21`). "
+        "Supported operators are `eq`, `ne`, `lt`, `le`, `gt` and `ge`. The value is interpreted as JSON "
+        'if possible and only matches variables of the same type (e.g. `21` doesn\'t match `"21"`).',
+    ),
+    after: int | None = Query(default=None, description="ID of the last incarnation of the previous page"),
+    limit: int | None = Query(default=None, ge=1, le=MAX_PAGE_SIZE, description="Maximum number of incarnations"),
+    order: Literal["asc", "desc"] = "asc",
     change_service: ChangeService = Depends(get_change_service),
 ):
     """Returns a list of all known incarnations.
 
-    The list is sorted by incarnartion ID, with the oldest incarnation first.
+    The list is sorted by incarnation ID, with the oldest incarnation first (unless `order=desc` is given).
 
-    TODO: implement pagination
+    If a `limit` is given, only a single page is returned. The URL of the next page (if any) is
+    provided in the `Link` response header (with `rel="next"`).
     """
     if incarnation_repository is None:
-        return await change_service.list_incarnations()
+        try:
+            template_data_conditions = [TemplateDataCondition.parse(condition) for condition in template_data]
+        except ValueError as exc:
+            response.status_code = status.HTTP_400_BAD_REQUEST
+            return ApiError(message=str(exc))
+
+        incarnations = await change_service.list_incarnations(
+            IncarnationSummaryFilter(
+                incarnation_repository_prefix=incarnation_repository_prefix,
+                template_repository=template_repository,
+                requested_version=requested_version,
+                type=change_type,
+                template_data=template_data_conditions,
+            ),
+            merge_request_open=merge_request_open,
+            after=after,
+            limit=limit,
+            descending=order == "desc",
+        )
+        if limit is not None and len(incarnations) == limit:
+            next_page_url = request.url.include_query_params(after=incarnations[-1].id)
+            response.headers["Link"] = f'<{next_page_url}>; rel="next"'
+
+        return incarnations
 
     try:
         return [
@@ -143,6 +211,77 @@ async def create_incarnation(
     return await change_service.get_incarnation_with_details(change.incarnation_id)
 
 
+class BulkChangeRequest(BaseModel):
+    template_repository: str
+    requested_version: str
+    # patched into the template data of every incarnation
+    requested_data: TemplateData = Field(default_factory=dict)
+    automerge: bool = False
+    # don't wait for the automerge of each merge request to be accepted
+    automerge_in_background: bool = False
+
+    # only update the incarnations matching these filters (see the list endpoint)
+    incarnation_repository_prefix: str | None = None
+    current_version: str | None = None
+    template_data: list[str] = Field(default_factory=list)
+
+    concurrency: int = Field(default=8, ge=1, le=MAX_BULK_CHANGE_CONCURRENCY)
+    # update incarnations which live in the same repository with a single merge request
+    group_by_repository: bool = False
+
+
+@router.post(
+    "/bulk-changes",
+    responses={
+        status.HTTP_200_OK: {
+            "description": "The result of each incarnation, as a stream of JSON objects (one per line)",
+            "model": BulkChangeResult,
+            "content": {"application/x-ndjson": {}},
+        },
+        status.HTTP_400_BAD_REQUEST: {
+            "description": "A `template_data` condition was invalid",
+            "model": ApiError,
+        },
+    },
+)
+async def create_bulk_change(
+    response: Response,
+    request: BulkChangeRequest,
+    change_service: ChangeService = Depends(get_change_service),
+):
+    """Updates all incarnations of a template (optionally filtered) to the given version, with merge requests.
+
+    The template is fetched only once for all incarnations. The result of every incarnation (merge request created,
+    merge request created with conflicts, unchanged or failed) is streamed back as soon as it is available.
+    """
+    try:
+        template_data_conditions = [TemplateDataCondition.parse(condition) for condition in request.template_data]
+    except ValueError as exc:
+        response.status_code = status.HTTP_400_BAD_REQUEST
+        return ApiError(message=str(exc))
+
+    results = change_service.update_incarnations_of_template(
+        template_repository=request.template_repository,
+        requested_version=request.requested_version,
+        requested_data=request.requested_data,
+        automerge=request.automerge,
+        filter_=IncarnationSummaryFilter(
+            incarnation_repository_prefix=request.incarnation_repository_prefix,
+            requested_version=request.current_version,
+            template_data=template_data_conditions,
+        ),
+        concurrency=request.concurrency,
+        group_by_repository=request.group_by_repository,
+        automerge_in_background=request.automerge_in_background,
+    )
+
+    async def _ndjson():
+        async for result in results:
+            yield result.model_dump_json() + "\n"
+
+    return StreamingResponse(_ndjson(), media_type="application/x-ndjson")
+
+
 @router.get(
     "/{incarnation_id}",
     responses={
@@ -187,6 +326,10 @@ class IncarnationResetResponse(BaseModel):
             "description": "The incarnation was successfully reset",
             "model": IncarnationResetResponse,
         },
+        status.HTTP_202_ACCEPTED: {
+            "description": "The incarnation will be reset in the background (see the `Prefer` header)",
+            "model": JobDetails,
+        },
         status.HTTP_404_NOT_FOUND: {
             "description": "The incarnation was not found in the inventory",
             "model": ApiError,
@@ -201,10 +344,24 @@ async def reset_incarnation(
     incarnation_id: int,
     response: Response,
     request: IncarnationResetRequest,
+    asynchronous: bool = Depends(respond_async),
     incarnation_service: IncarnationService = Depends(get_incarnation_service),
     change_service: ChangeService = Depends(get_change_service),
+    job_service: JobService = Depends(get_job_service),
     hoster: Hoster = Depends(get_hoster),
 ):
+    if asynchronous:
+        try:
+            job = await job_service.enqueue_reset(
+                incarnation_id,
+                ResetJobArguments(requested_version=request.requested_version, requested_data=request.requested_data),
+            )
+        except IncarnationNotFoundError:
+            response.status_code = status.HTTP_404_NOT_FOUND
+            return ApiError(message="The incarnation was not found in the inventory")
+
+        return accepted_job(job, response)
+
     try:
         change = await change_service.reset_incarnation(
             incarnation_id, request.requested_version, request.requested_data
@@ -227,9 +384,7 @@ async def reset_incarnation(
     return IncarnationResetResponse(
         incarnation_id=incarnation_id,
         merge_request_id=change.merge_request_id,
-        merge_request_url=await hoster.get_merge_request_url(
-            incarnation.incarnation_repository, change.merge_request_id
-        ),
+        merge_request_url=hoster.get_merge_request_url(incarnation.incarnation_repository, change.merge_request_id),
     )
 
 
@@ -238,10 +393,31 @@ async def _create_change(
     requested_version: str | None,
     requested_data: TemplateData,
     automerge: bool,
+    automerge_in_background: bool,
     patch: bool,
     response: Response,
+    asynchronous: bool,
     change_service: ChangeService,
-) -> IncarnationWithDetails | ApiError:
+    job_service: JobService,
+) -> IncarnationWithDetails | JobDetails | ApiError:
+    if asynchronous:
+        try:
+            job = await job_service.enqueue_change(
+                incarnation_id,
+                ChangeJobArguments(
+                    requested_version=requested_version,
+                    requested_data=requested_data,
+                    automerge=automerge,
+                    patch=patch,
+                    automerge_in_background=automerge_in_background,
+                ),
+            )
+        except IncarnationNotFoundError as exc:
+            response.status_code = status.HTTP_404_NOT_FOUND
+            return ApiError(message=str(exc))
+
+        return accepted_job(job, response)
+
     try:
         await change_service.create_change_merge_request(
             incarnation_id=incarnation_id,
@@ -249,6 +425,7 @@ async def _create_change(
             requested_data=requested_data,
             automerge=automerge,
             patch=patch,
+            automerge_in_background=automerge_in_background,
         )
     except ProvidedTemplateDataInvalidError as e:
         response.status_code = status.HTTP_400_BAD_REQUEST
@@ -281,6 +458,8 @@ class UpdateIncarnationRequest(BaseModel):
     template_data: TemplateData
 
     automerge: bool
+    # respond right after creating the merge request, without waiting for the automerge to be accepted
+    automerge_in_background: bool = False
 
 
 @router.put(
@@ -290,6 +469,10 @@ class UpdateIncarnationRequest(BaseModel):
             "description": "The incarnation was successfully updated",
             "model": IncarnationWithDetails,
         },
+        status.HTTP_202_ACCEPTED: {
+            "description": "The incarnation will be updated in the background (see the `Prefer` header)",
+            "model": JobDetails,
+        },
         status.HTTP_400_BAD_REQUEST: {
             "description": "The desired incarnation state was not valid",
             "model": ApiError,
@@ -312,7 +495,9 @@ async def update_incarnation(
     response: Response,
     incarnation_id: int,
     request: UpdateIncarnationRequest,
+    asynchronous: bool = Depends(respond_async),
     change_service: ChangeService = Depends(get_change_service),
+    job_service: JobService = Depends(get_job_service),
 ):
     """Updates the incarnation to the given version and data.
 
@@ -326,9 +511,12 @@ async def update_incarnation(
         requested_version=request.template_repository_version,
         requested_data=request.template_data,
         automerge=request.automerge,
+        automerge_in_background=request.automerge_in_background,
         patch=False,
         response=response,
+        asynchronous=asynchronous,
         change_service=change_service,
+        job_service=job_service,
     )
 
 
@@ -339,6 +527,8 @@ class PatchIncarnationRequest(BaseModel):
     requested_data: TemplateData | None = None
 
     automerge: bool
+    # respond right after creating the merge request, without waiting for the automerge to be accepted
+    automerge_in_background: bool = False
 
     @model_validator(mode="after")
     def check_either_version_or_data_change_requested(self) -> Self:
@@ -355,6 +545,10 @@ class PatchIncarnationRequest(BaseModel):
             "description": "The incarnation was successfully updated",
             "model": IncarnationWithDetails,
         },
+        status.HTTP_202_ACCEPTED: {
+            "description": "The incarnation will be updated in the background (see the `Prefer` header)",
+            "model": JobDetails,
+        },
         status.HTTP_400_BAD_REQUEST: {
             "description": "The desired incarnation state was not valid",
             "model": ApiError,
@@ -377,7 +571,9 @@ async def patch_incarnation(
     response: Response,
     incarnation_id: int,
     request: PatchIncarnationRequest,
+    asynchronous: bool = Depends(respond_async),
     change_service: ChangeService = Depends(get_change_service),
+    job_service: JobService = Depends(get_job_service),
 ):
     """Updates the incarnation to the given version and data.
 
@@ -392,9 +588,12 @@ async def patch_incarnation(
         requested_version=request.requested_version,
         requested_data=requested_data,
         automerge=request.automerge,
+        automerge_in_background=request.automerge_in_background,
         patch=True,
         response=response,
+        asynchronous=asynchronous,
         change_service=change_service,
+        job_service=job_service,
     )
 
 
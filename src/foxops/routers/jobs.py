@@ -0,0 +1,83 @@
+from datetime import datetime
+from typing import Self
+
+from fastapi import APIRouter, Depends, Header, Response, status
+from pydantic import BaseModel
+
+from foxops.database.repositories.job.errors import JobNotFoundError
+from foxops.database.repositories.job.model import JobInDB, JobStatus, JobType
+from foxops.dependencies import get_job_service
+from foxops.models.errors import ApiError
+from foxops.services.job import JobService
+
+#: Holds the router for the jobs API endpoints
+router = APIRouter(prefix="/api/jobs", tags=["jobs"])
+
+
+class JobDetails(BaseModel):
+    id: int
+    type: JobType
+    incarnation_id: int
+
+    status: JobStatus
+    progress: str | None
+    error: str | None
+    # revision of the change which was created by the job (if any)
+    change_revision: int | None
+
+    created_at: datetime
+    started_at: datetime | None
+    finished_at: datetime | None
+
+    @classmethod
+    def from_database_object(cls, obj: JobInDB) -> Self:
+        return cls.model_validate(obj.model_dump())
+
+
+def respond_async(
+    prefer: str | None = Header(
+        default=None,
+        description="Set to `respond-async` to execute the change in the background. The response is then a "
+        "`202 Accepted` with the job that executes the change (its URL is given in the `Location` header).",
+    ),
+) -> bool:
+    if prefer is None:
+        return False
+
+    return "respond-async" in (preference.strip() for preference in prefer.split(","))
+
+
+def accepted_job(job: JobInDB, response: Response) -> JobDetails:
+    response.status_code = status.HTTP_202_ACCEPTED
+    response.headers["Location"] = f"{router.prefix}/{job.id}"
+    response.headers["Preference-Applied"] = "respond-async"
+
+    return JobDetails.from_database_object(job)
+
+
+@router.get(
+    "/{job_id}",
+    responses={
+        status.HTTP_200_OK: {
+            "description": "The status of the job",
+            "model": JobDetails,
+        },
+        status.HTTP_404_NOT_FOUND: {
+            "description": "The job was not found",
+            "model": ApiError,
+        },
+    },
+)
+async def get_job(
+    response: Response,
+    job_id: int,
+    job_service: JobService = Depends(get_job_service),
+):
+    """Returns the status and progress of an asynchronously executed change."""
+    try:
+        job = await job_service.get(job_id)
+    except JobNotFoundError as exc:
+        response.status_code = status.HTTP_404_NOT_FOUND
+        return ApiError(message=str(exc))
+
+    return JobDetails.from_database_object(job)
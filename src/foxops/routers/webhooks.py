@@ -0,0 +1,59 @@
+import secrets
+from typing import Annotated, Any
+
+from fastapi import APIRouter, Body, Depends, Header, HTTPException, Response, status
+
+from foxops.dependencies import get_hoster_state_service, get_settings
+from foxops.logger import get_logger
+from foxops.services.hoster_state import (
+    HosterStateService,
+    InvalidWebhookEvent,
+    UnsupportedWebhookEvent,
+)
+from foxops.settings import Settings
+
+#: Holds the router for the webhook endpoints
+router = APIRouter(prefix="/api/webhooks", tags=["webhooks"])
+
+#: Holds the logger for these routes
+logger = get_logger(__name__)
+
+
+def verify_gitlab_token(
+    settings: Annotated[Settings, Depends(get_settings)],
+    x_gitlab_token: Annotated[str | None, Header()] = None,
+) -> None:
+    if settings.webhook_secret_token is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Webhooks are not enabled")
+
+    if x_gitlab_token is None or not secrets.compare_digest(
+        x_gitlab_token, settings.webhook_secret_token.get_secret_value()
+    ):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Webhook token is invalid")
+
+
+@router.post(
+    "/gitlab",
+    status_code=status.HTTP_204_NO_CONTENT,
+    response_class=Response,
+    dependencies=[Depends(verify_gitlab_token)],
+    responses={
+        status.HTTP_422_UNPROCESSABLE_ENTITY: {"description": "The event doesn't contain the expected attributes"},
+    },
+)
+async def receive_gitlab_event(
+    payload: Annotated[dict[str, Any], Body()],
+    hoster_state_service: HosterStateService = Depends(get_hoster_state_service),
+):
+    """Receive merge request, pipeline and push events from GitLab.
+
+    The webhook must be configured with the secret token set in `FOXOPS_WEBHOOK_SECRET_TOKEN`.
+    """
+    try:
+        await hoster_state_service.process_gitlab_event(payload)
+    except UnsupportedWebhookEvent as e:
+        # GitLab disables webhooks that keep failing, so unsupported events are only logged
+        logger.info(str(e))
+    except InvalidWebhookEvent as e:
+        logger.warning(str(e))
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
@@ -1,33 +1,59 @@
 import asyncio
+import enum
 import hashlib
 import inspect
-import json
-import shutil
 import uuid
-from contextlib import asynccontextmanager
+from contextlib import (
+    AbstractAsyncContextManager,
+    AsyncExitStack,
+    asynccontextmanager,
+    nullcontext,
+)
 from dataclasses import dataclass
 from datetime import datetime, timedelta
 from pathlib import Path
 from tempfile import TemporaryDirectory
-from typing import AsyncIterator
+from typing import AsyncGenerator, AsyncIterator, Awaitable, Callable
 
 from pydantic import BaseModel
 
 import foxops.engine as fengine
 from foxops.database.repositories.change.model import (
+    ChangeInDB,
     ChangeType,
+    ChangeWithIncarnationInDB,
+    IncarnationSummaryFilter,
     IncarnationWithChangesSummary,
 )
-from foxops.database.repositories.change.repository import ChangeRepository
+from foxops.database.repositories.change.repository import (
+    ChangeRepository,
+    template_data_hash,
+)
+from foxops.database.repositories.incarnation.model import IncarnationInDB
 from foxops.database.repositories.incarnation.repository import IncarnationRepository
-from foxops.engine import TemplateData
+from foxops.engine import IncarnationState, TemplateData
 from foxops.engine.patching.git_diff_patch import PatchResult
-from foxops.errors import RetryableError
+from foxops.errors import CommitConflictError, RetryableError
 from foxops.external.git import GitError, GitRepository
 from foxops.hosters import Hoster
+from foxops.hosters.commit_actions import (
+    UnsupportedCommitAction,
+    compute_commit_actions,
+)
 from foxops.hosters.types import MergeRequestStatus, ReconciliationStatus
 from foxops.models import IncarnationWithDetails
 from foxops.models.change import Change, ChangeWithMergeRequest
+from foxops.services.diff_cache import (
+    ChangePreviewCache,
+    IncarnationDiffCache,
+    PreparedUpdate,
+)
+from foxops.services.hoster_state import HosterStateService
+from foxops.services.reconciliation_status import (
+    ReconciliationStatusKey,
+    ReconciliationStatusTracker,
+)
+from foxops.services.repository_lock import RepositoryLocks
 from foxops.utils import get_logger
 
 
@@ -71,6 +97,37 @@ class IncarnationWithLatestChangeDetails(BaseModel):
     merge_request_url: str | None
 
 
+class ChangePreview(BaseModel):
+    """The change that would be applied to an incarnation, without actually applying it."""
+
+    # the diff of the incarnation repository
+    diff: str
+    # files (relative to the incarnation) which couldn't be updated, because they were modified in the incarnation
+    conflicts: list[Path]
+    # files (relative to the incarnation) which couldn't be updated, because they were deleted in the incarnation
+    deleted: list[Path]
+
+
+class BulkChangeStatus(enum.Enum):
+    MERGE_REQUEST = "merge_request"
+    CONFLICT = "conflict"
+    UNCHANGED = "unchanged"
+    FAILED = "failed"
+
+
+class BulkChangeResult(BaseModel):
+    """The outcome of a bulk change for a single incarnation."""
+
+    incarnation_id: int
+    incarnation_repository: str
+    target_directory: str
+
+    status: BulkChangeStatus
+    merge_request_id: str | None = None
+    merge_request_url: str | None = None
+    error: str | None = None
+
+
 class ChangeFailed(Exception):
     pass
 
@@ -103,34 +160,73 @@ class _PreparedChangeEnvironment:
 
     branch_name: str
     commit_sha: str
+    commit_message: str
     patch_result: PatchResult
 
 
-@asynccontextmanager
-async def tmp_empty_dir():
-    with TemporaryDirectory() as tempdir:
-        yield Path(tempdir)
+@dataclass
+class _IncarnationUpdate:
+    """The update of one of several incarnations, which are changed together in a single commit."""
+
+    incarnation: IncarnationInDB
+    expected_revision: int
+    incarnation_state: IncarnationState
+    patch_result: PatchResult
+
+
+#: Paths in diffs are shown relative to this directory (instead of the temporary directories they were computed in)
+DIFF_PATH_PREFIX = "home/foxops/templating/"
+
+#: Holds references to the bulk changes running in the background, so that they aren't garbage collected
+_background_tasks: set[asyncio.Task] = set()
+
+#: Is called with a description of each step while a change is being executed (e.g. to show the progress of jobs)
+ProgressCallback = Callable[[str], Awaitable[None]]
 
 
 class ChangeService:
     def __init__(
-        self, hoster: Hoster, incarnation_repository: IncarnationRepository, change_repository: ChangeRepository
+        self,
+        hoster: Hoster,
+        incarnation_repository: IncarnationRepository,
+        change_repository: ChangeRepository,
+        hoster_state_service: HosterStateService | None = None,
+        reconciliation_status_tracker: ReconciliationStatusTracker | None = None,
+        commit_via_hoster_api: bool = False,
+        progress: ProgressCallback | None = None,
+        repository_locks: RepositoryLocks | None = None,
+        diff_cache: IncarnationDiffCache | None = None,
+        preview_cache: ChangePreviewCache | None = None,
     ):
         self._hoster = hoster
+        # merge request and pipeline states are preferably served from what webhooks stored in the database
+        self._hoster_state: Hoster | HosterStateService = hoster_state_service or hoster
+        self._reconciliation_status_tracker = reconciliation_status_tracker
+        # create merge request branches with the commits API of the hoster instead of pushing them
+        self._commit_via_hoster_api = commit_via_hoster_api
+        self._progress = progress
+        # serializes changes which push to the default branch of the same incarnation repository
+        self._repository_locks = repository_locks
+        # without a cache, diffs are computed from scratch every time
+        self._diff_cache = diff_cache
+        # updates computed for previews, which are reused when the change is actually created
+        self._preview_cache = preview_cache
 
         self._incarnation_repository = incarnation_repository
         self._change_repository = change_repository
 
         self._log = get_logger("change_service")
 
-    async def _incarnation_with_latest_change_details_from_dbobj(
+    async def _report_progress(self, step: str) -> None:
+        if self._progress is not None:
+            await self._progress(step)
+
+    def _incarnation_with_latest_change_details_from_dbobj(
         self, dbobj: IncarnationWithChangesSummary
     ) -> IncarnationWithLatestChangeDetails:
         merge_request_url = None
         if dbobj.merge_request_id is not None:
-            merge_request_url = await self._hoster.get_merge_request_url(
-                dbobj.incarnation_repository, dbobj.merge_request_id
-            )
+            merge_request_url = self._hoster.get_merge_request_url(dbobj.incarnation_repository, dbobj.merge_request_id)
 
         return IncarnationWithLatestChangeDetails(
             id=dbobj.id,
@@ -142,21 +238,73 @@ class ChangeService:
             requested_version=dbobj.requested_version,
             created_at=dbobj.created_at,
             commit_sha=dbobj.commit_sha,
-            commit_url=await self._hoster.get_commit_url(dbobj.incarnation_repository, dbobj.commit_sha),
+            commit_url=self._hoster.get_commit_url(dbobj.incarnation_repository, dbobj.commit_sha),
             merge_request_id=dbobj.merge_request_id,
             merge_request_url=merge_request_url,
         )
 
-    async def list_incarnations(self) -> list[IncarnationWithLatestChangeDetails]:
-        return [
-            await self._incarnation_with_latest_change_details_from_dbobj(inc)
-            async for inc in self._change_repository.list_incarnations_with_changes_summary()
-        ]
+    async def list_incarnations(
+        self,
+        filter_: IncarnationSummaryFilter | None = None,
+        merge_request_open: bool | None = None,
+        after: int | None = None,
+        limit: int | None = None,
+        descending: bool = False,
+    ) -> list[IncarnationWithLatestChangeDetails]:
+        """List (a page of) the incarnations in the inventory, sorted by their ID.
+
+        `after` is the ID of the last incarnation of the previous page.
+        If `merge_request_open` is given, only incarnations whose latest change has (or has not) an open
+        merge request are returned.
+        """
+
+        if merge_request_open is None:
+            # the hoster URLs are derived locally, so the whole list is assembled without any hoster calls
+            return [
+                self._incarnation_with_latest_change_details_from_dbobj(inc)
+                async for inc in self._change_repository.list_incarnations_with_changes_summary(
+                    filter_, after=after, limit=limit, descending=descending
+                )
+            ]
+
+        filter_ = filter_ or IncarnationSummaryFilter()
+        if merge_request_open and filter_.type is None:
+            filter_ = filter_.model_copy(update={"type": ChangeType.MERGE_REQUEST})
+
+        # merge request states are not (reliably) known to the database. Therefore, that filter is applied
+        # here - reading further pages until enough matching incarnations were found.
+        incarnations: list[IncarnationWithLatestChangeDetails] = []
+        while limit is None or len(incarnations) < limit:
+            page = [
+                inc
+                async for inc in self._change_repository.list_incarnations_with_changes_summary(
+                    filter_, after=after, limit=limit, descending=descending
+                )
+            ]
+            merge_requests = [
+                (inc.incarnation_repository, inc.merge_request_id)
+                for inc in page
+                if inc.type == ChangeType.MERGE_REQUEST and inc.merge_request_id is not None
+            ]
+            statuses = await self._hoster_state.get_merge_request_statuses(merge_requests) if merge_requests else {}
+
+            incarnations.extend(
+                self._incarnation_with_latest_change_details_from_dbobj(inc)
+                for inc in page
+                if (statuses.get((inc.incarnation_repository, inc.merge_request_id or "")) == MergeRequestStatus.OPEN)
+                == merge_request_open
+            )
+
+            if limit is None or len(page) < limit:
+                break
+            after = page[-1].id
+
+        return incarnations[:limit]
 
     async def get_incarnation_by_repo_and_target_directory(
         self, repo: str, target_directory: str
     ) -> IncarnationWithLatestChangeDetails:
-        return await self._incarnation_with_latest_change_details_from_dbobj(
+        return self._incarnation_with_latest_change_details_from_dbobj(
             await self._change_repository.get_incarnation_by_repo_and_target_dir(repo, target_directory)
         )
 
@@ -172,15 +320,17 @@ class ChangeService:
             raise IncarnationAlreadyExists("Cannot create incarnation because it already exists")
 
         async with (
-            self._hoster.cloned_repository(template_repository, refspec=template_repository_version) as template_git,
+            self._locked_repository(incarnation_repository),
+            self._hoster.template_source(template_repository, template_repository_version) as template_source,
             self._hoster.cloned_repository(incarnation_repository) as incarnation_git,
         ):
             incarnation_state = await fengine.initialize_incarnation(
-                template_root_dir=template_git.directory,
+                template_root_dir=template_source.directory,
                 template_repository=template_repository,
                 template_repository_version=template_repository_version,
                 template_data=template_data,
                 incarnation_root_dir=incarnation_git.directory / target_directory,
+                template_repository_version_hash=template_source.commit_sha,
             )
 
             await incarnation_git.commit_all(
@@ -196,12 +346,12 @@ class ChangeService:
                 commit_sha=commit_sha,
                 requested_version_hash=incarnation_state.template_repository_version_hash,
                 requested_version=template_repository_version,
-                requested_data=json.dumps(incarnation_state.template_data),
-                template_data_full=json.dumps(incarnation_state.template_data_full),
+                requested_data=incarnation_state.template_data,
+                template_data_full=incarnation_state.template_data_full,
             )
 
             try:
-                await self._push_change_commit_and_update_database(incarnation_git, change.id)
+                await self._push_change_commit_and_update_database(incarnation_git, [change.id])
             except ChangeFailed:
                 await self._change_repository.delete_incarnation(change.incarnation_id)
                 raise
@@ -226,19 +376,21 @@ class ChangeService:
 
         reset_branch_name = f"foxops-reset-{str(uuid.uuid4())[:8]}"
 
+        await self._report_progress("rendering the template")
         async with (
-            self._hoster.cloned_repository(incarnation.template_repository, refspec=version) as template_git,
+            self._hoster.template_source(incarnation.template_repository, version) as template_source,
             self._hoster.cloned_repository(incarnation.incarnation_repository) as incarnation_git,
         ):
             await incarnation_git.create_and_checkout_branch(reset_branch_name)
             delete_all_files_in_local_git_repository(incarnation_git.directory / incarnation.target_directory)
 
             incarnation_state = await fengine.initialize_incarnation(
-                template_root_dir=template_git.directory,
+                template_root_dir=template_source.directory,
                 template_repository=incarnation.template_repository,
                 template_repository_version=version,
                 template_data=data,
                 incarnation_root_dir=incarnation_git.directory / incarnation.target_directory,
+                template_repository_version_hash=template_source.commit_sha,
             )
 
             if not await incarnation_git.has_uncommitted_changes():
@@ -255,13 +407,14 @@ class ChangeService:
                 commit_pushed=False,
                 requested_version_hash=incarnation_state.template_repository_version_hash,
                 requested_version=incarnation_state.template_repository_version,
-                requested_data=json.dumps(incarnation_state.template_data),
-                template_data_full=json.dumps(incarnation_state.template_data_full),
+                requested_data=incarnation_state.template_data,
+                template_data_full=incarnation_state.template_data_full,
                 merge_request_branch_name=reset_branch_name,
             )
 
-            await self._push_change_commit_and_update_database(incarnation_git, change_in_db.id)
+            await self._push_change_commit_and_update_database(incarnation_git, [change_in_db.id])
 
+        await self._report_progress("creating the merge request")
         title = f"↩️ - RESET: To version {version}"
         description = (
             "This MR helps to bring back the incarnation to a 'pristine' state, as if it was "
@@ -294,11 +447,14 @@ class ChangeService:
         that are not recorded in the foxops database.
         """
 
+        incarnation = await self._incarnation_repository.get_by_id(incarnation_id)
+
         # https://youtrack.jetbrains.com/issue/PY-36444
         env: _PreparedChangeEnvironment
-        async with self._prepared_change_environment(
-            incarnation_id, requested_version, requested_data, patch=False
-        ) as env:
+        async with (
+            self._locked_repository(incarnation.incarnation_repository),
+            self._prepared_change_environment(incarnation_id, requested_version, requested_data, patch=False) as env,
+        ):
             # because we want to apply the change without an MR
             # ... let's merge the change directly into the default branch
             await env.incarnation_repository.checkout_branch(env.incarnation_repository_default_branch)
@@ -315,13 +471,13 @@ class ChangeService:
                 commit_pushed=False,
                 requested_version_hash=env.to_version_hash,
                 requested_version=env.to_version,
-                requested_data=json.dumps(env.to_data),
-                template_data_full=json.dumps(env.to_data_full),
+                requested_data=env.to_data,
+                template_data_full=env.to_data_full,
             )
 
             # if some failure happens after this point, the database object can be cleaned
             # by the update_incomplete_change() method.
-            await self._push_change_commit_and_update_database(env.incarnation_repository, change_in_db.id)
+            await self._push_change_commit_and_update_database(env.incarnation_repository, [change_in_db.id])
 
         return await self.get_change(change_in_db.id)
 
@@ -332,18 +488,216 @@ class ChangeService:
         requested_data: TemplateData,
         automerge: bool = False,
         patch: bool = False,
+        automerge_in_background: bool = False,
     ) -> ChangeWithMergeRequest:
         """
         Perform a MERGE_REQUEST change on the given incarnation.
 
         Such a change will result in a merge request being created on the incarnation repository. The merge request
         can be merged manually or automatically (if the `automerge` parameter is set to `True`).
+
+        With `automerge_in_background`, this returns right after creating the merge request, without waiting for
+        the hoster to accept the automerge.
         """
 
+        change, _ = await self._create_change_merge_request(
+            incarnation_id,
+            requested_version,
+            requested_data,
+            automerge=automerge,
+            patch=patch,
+            automerge_in_background=automerge_in_background,
+        )
+        return change
+
+    async def preview_change(
+        self,
+        incarnation_id: int,
+        requested_version: str | None,
+        requested_data: TemplateData,
+        patch: bool = False,
+    ) -> ChangePreview:
+        """
+        Compute the change which would be created for the given request, without pushing or recording it.
+
+        The computed update is cached, so that creating the same change afterwards (while neither the incarnation
+        nor the template version changed in the meantime) doesn't have to render the template again.
+        """
+
+        env: _PreparedChangeEnvironment
+        try:
+            async with self._prepared_change_environment(
+                incarnation_id, requested_version, requested_data, patch=patch, preview=True
+            ) as env:
+                diff = await env.incarnation_repository.diff(f"{env.commit_sha}~1", env.commit_sha)
+        except ChangeRejectedDueToNoChanges:
+            return ChangePreview(diff="", conflicts=[], deleted=[])
+
+        return ChangePreview(diff=diff, conflicts=env.patch_result.conflicts, deleted=env.patch_result.deleted)
+
+    async def update_incarnations_of_template(
+        self,
+        template_repository: str,
+        requested_version: str,
+        requested_data: TemplateData,
+        automerge: bool = False,
+        filter_: IncarnationSummaryFilter | None = None,
+        concurrency: int = 8,
+        group_by_repository: bool = False,
+        automerge_in_background: bool = False,
+    ) -> AsyncGenerator[BulkChangeResult, None]:
+        """
+        Create merge requests which update all (matching) incarnations of the given template to the given version.
+
+        The `requested_data` is patched into the template data of every incarnation. The template repository is
+        only cloned once and shared by all changes, which are executed with the given concurrency.
+        Results are yielded as soon as the change of an incarnation finished. The changes continue in the background
+        if the caller stops consuming the results.
+
+        With `group_by_repository`, incarnations which live in the same repository are updated together with a
+        single merge request (see `create_change_merge_request_for_repository`). `automerge_in_background` is
+        passed on to every change (see `create_change_merge_request`).
+        """
+
+        filter_ = (filter_ or IncarnationSummaryFilter()).model_copy(
+            update={"template_repository": template_repository}
+        )
+        incarnation_groups: dict[str, list[IncarnationWithChangesSummary]] = {}
+        async for incarnation in self._change_repository.list_incarnations_with_changes_summary(filter_):
+            key = incarnation.incarnation_repository if group_by_repository else str(incarnation.id)
+            incarnation_groups.setdefault(key, []).append(incarnation)
+        semaphore = asyncio.Semaphore(concurrency)
+        results: asyncio.Queue[BulkChangeResult | None] = asyncio.Queue()
+
+        # the changes run independently of the caller, which might stop consuming the results early (e.g. because
+        # the client disconnected). Cancelling them could leave changes behind which were not pushed yet,
+        # or branches without a merge request.
+        exit_stack = AsyncExitStack()
+        template_git = await exit_stack.enter_async_context(
+            self._hoster.cloned_repository(template_repository, bare=True)
+        )
+
+        async def _update(incarnations: list[IncarnationWithChangesSummary]) -> None:
+            async with semaphore:
+                for result in await self._update_incarnations_of_template(
+                    incarnations, requested_version, requested_data, automerge, automerge_in_background, template_git
+                ):
+                    results.put_nowait(result)
+
+        async def _update_all() -> None:
+            try:
+                async with exit_stack:
+                    updates = [_update(incarnations) for incarnations in incarnation_groups.values()]
+                    for error in await asyncio.gather(*updates, return_exceptions=True):
+                        if error is not None:
+                            self._log.error("failed to update incarnations of template", exc_info=error)
+            finally:
+                results.put_nowait(None)
+
+        task = asyncio.create_task(_update_all())
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+
+        while (result := await results.get()) is not None:
+            yield result
+        await task
+
+    async def _update_incarnations_of_template(
+        self,
+        incarnations: list[IncarnationWithChangesSummary],
+        requested_version: str,
+        requested_data: TemplateData,
+        automerge: bool,
+        automerge_in_background: bool,
+        template_git: GitRepository,
+    ) -> list[BulkChangeResult]:
+        """Update the given incarnations (which live in the same repository, if there are several) together."""
+
+        def result(incarnation: IncarnationWithChangesSummary, status: BulkChangeStatus, **kwargs) -> BulkChangeResult:
+            return BulkChangeResult(
+                incarnation_id=incarnation.id,
+                incarnation_repository=incarnation.incarnation_repository,
+                target_directory=incarnation.target_directory,
+                status=status,
+                **kwargs,
+            )
+
+        # no need to clone the incarnation if there is nothing to change
+        unchanged = [i for i in incarnations if i.requested_version == requested_version and not requested_data]
+        results = [result(incarnation, BulkChangeStatus.UNCHANGED) for incarnation in unchanged]
+        incarnations = [incarnation for incarnation in incarnations if incarnation not in unchanged]
+        if not incarnations:
+            return results
+
+        try:
+            if len(incarnations) == 1:
+                changes = [
+                    await self._create_change_merge_request(
+                        incarnations[0].id,
+                        requested_version,
+                        requested_data,
+                        automerge=automerge,
+                        patch=True,
+                        automerge_in_background=automerge_in_background,
+                        template_git=template_git,
+                    )
+                ]
+            else:
+                changes = await self._create_change_merge_request_for_repository(
+                    [incarnation.id for incarnation in incarnations],
+                    requested_version,
+                    requested_data,
+                    automerge=automerge,
+                    automerge_in_background=automerge_in_background,
+                    template_git=template_git,
+                )
+        except ChangeRejectedDueToNoChanges:
+            return results + [result(incarnation, BulkChangeStatus.UNCHANGED) for incarnation in incarnations]
+        except ChangeRejectedDueToPreviousUnfinishedChange:
+            error = "There is a previous change that is still open"
+            return results + [result(incarnation, BulkChangeStatus.FAILED, error=error) for incarnation in incarnations]
+        except Exception as e:
+            self._log.exception("failed to update incarnations", incarnation_ids=[i.id for i in incarnations])
+            error = str(e) or type(e).__name__
+            return results + [result(incarnation, BulkChangeStatus.FAILED, error=error) for incarnation in incarnations]
+
+        changes_by_incarnation = {change.incarnation_id: (change, has_conflicts) for change, has_conflicts in changes}
+        for incarnation in incarnations:
+            if incarnation.id not in changes_by_incarnation:
+                # not affected by the update of the other incarnations in the same repository
+                results.append(result(incarnation, BulkChangeStatus.UNCHANGED))
+                continue
+
+            change, has_conflicts = changes_by_incarnation[incarnation.id]
+            results.append(
+                result(
+                    incarnation,
+                    BulkChangeStatus.CONFLICT if has_conflicts else BulkChangeStatus.MERGE_REQUEST,
+                    merge_request_id=change.merge_request_id,
+                    merge_request_url=self._hoster.get_merge_request_url(
+                        incarnation.incarnation_repository, change.merge_request_id
+                    ),
+                )
+            )
+
+        return results
+
+    async def _create_change_merge_request(
+        self,
+        incarnation_id: int,
+        requested_version: str | None,
+        requested_data: TemplateData,
+        automerge: bool = False,
+        patch: bool = False,
+        automerge_in_background: bool = False,
+        template_git: GitRepository | None = None,
+    ) -> tuple[ChangeWithMergeRequest, bool]:
+        """Returns the change, and whether applying it to the incarnation resulted in conflicts."""
+
         # https://youtrack.jetbrains.com/issue/PY-36444
         env: _PreparedChangeEnvironment
         async with self._prepared_change_environment(
-            incarnation_id, requested_version, requested_data, patch=patch
+            incarnation_id, requested_version, requested_data, patch=patch, template_git=template_git
         ) as env:
             change_in_db = await self._change_repository.create_change(
                 incarnation_id=incarnation_id,
@@ -353,12 +707,21 @@ class ChangeService:
                 commit_pushed=False,
                 requested_version_hash=env.to_version_hash,
                 requested_version=env.to_version,
-                requested_data=json.dumps(env.to_data),
-                template_data_full=json.dumps(env.to_data_full),
+                requested_data=env.to_data,
+                template_data_full=env.to_data_full,
                 merge_request_branch_name=env.branch_name,
             )
 
-            await self._push_change_commit_and_update_database(env.incarnation_repository, change_in_db.id)
+            if self._commit_via_hoster_api:
+                await self._commit_change_via_hoster_api_and_update_database(
+                    env.incarnation_repository,
+                    env.incarnation_repository_identifier,
+                    env.branch_name,
+                    env.commit_message,
+                    [change_in_db.id],
+                )
+            else:
+                await self._push_change_commit_and_update_database(env.incarnation_repository, [change_in_db.id])
 
         if env.patch_result.has_errors():
             title = f"🚧 - CONFLICT: Update to {env.to_version}"
@@ -371,6 +734,7 @@ class ChangeService:
             title = f"Update to {env.to_version}"
             description = "Foxops detected no conflicts when applying this change."
 
+        await self._report_progress("creating the merge request")
         _, merge_request_id = await self._hoster.merge_request(
             incarnation_repository=env.incarnation_repository_identifier,
             source_branch=env.branch_name,
@@ -378,19 +742,211 @@ class ChangeService:
             description=description,
             incarnation_sub_directory=env.incarnation_target_directory,
             with_automerge=automerge,
+            automerge_in_background=automerge_in_background,
         )
 
         await self._change_repository.update_merge_request_id(change_in_db.id, merge_request_id)
 
-        return await self.get_change_with_merge_request(change_in_db.id)
+        return await self.get_change_with_merge_request(change_in_db.id), env.patch_result.has_errors()
+
+    async def create_change_merge_request_for_repository(
+        self,
+        incarnation_ids: list[int],
+        requested_version: str,
+        requested_data: TemplateData,
+        automerge: bool = False,
+        automerge_in_background: bool = False,
+    ) -> list[ChangeWithMergeRequest]:
+        """
+        Perform a single MERGE_REQUEST change on several incarnations which live in the same repository.
+
+        The incarnations must use the same template. The repository is cloned only once and all incarnations
+        are updated in a single commit, which is proposed in a single merge request. A change is still recorded for
+        every incarnation (all of them referencing the same merge request). Like for a `patch` change, the
+        `requested_data` is merged into the template data of every incarnation.
+
+        Incarnations which are not affected by the update are skipped (and don't get a change).
+        `automerge_in_background` works like for `create_change_merge_request`.
+        """
+
+        changes = await self._create_change_merge_request_for_repository(
+            incarnation_ids,
+            requested_version,
+            requested_data,
+            automerge=automerge,
+            automerge_in_background=automerge_in_background,
+        )
+        return [change for change, _ in changes]
+
+    async def _create_change_merge_request_for_repository(
+        self,
+        incarnation_ids: list[int],
+        requested_version: str,
+        requested_data: TemplateData,
+        automerge: bool = False,
+        automerge_in_background: bool = False,
+        template_git: GitRepository | None = None,
+    ) -> list[tuple[ChangeWithMergeRequest, bool]]:
+        """Returns the changes, and whether applying each of them to its incarnation resulted in conflicts."""
+
+        # a single query for all incarnations and their latest changes
+        last_changes = await self._change_repository.list_latest_changes_with_incarnation(incarnation_ids)
+        if len({(c.incarnation_repository, c.template_repository) for c in last_changes}) != 1:
+            raise ValueError("all incarnations must live in the same repository and use the same template")
+        incarnation_repository = last_changes[0].incarnation_repository
+        incarnations = [
+            IncarnationInDB(
+                id=c.incarnation_id,
+                incarnation_repository=c.incarnation_repository,
+                target_directory=c.target_directory,
+                template_repository=c.template_repository,
+            )
+            for c in last_changes
+        ]
+
+        # if the previous change of any incarnation is still open, we dont want to continue
+        await self._ensure_changes_are_completed(last_changes)
+
+        branch_name = generate_foxops_branch_name(
+            prefix="update-to",
+            target_directory=",".join(sorted(i.target_directory for i in incarnations)),
+            template_repository_version=requested_version,
+        )
+
+        await self._report_progress("cloning the incarnation and template repositories")
+        async with (
+            self._hoster.cloned_repository(incarnation_repository) as local_incarnation_repository,
+            self._cloned_template_repository(
+                incarnations[0].template_repository, template_git
+            ) as local_template_repository,
+        ):
+            await local_incarnation_repository.create_and_checkout_branch(branch_name, exist_ok=False)
+
+            await self._report_progress("rendering the template")
+            updates: list[_IncarnationUpdate] = []
+            for incarnation, last_change in zip(incarnations, last_changes):
+                (
+                    update_performed,
+                    incarnation_state,
+                    patch_result,
+                ) = await fengine.update_incarnation_from_git_template_repository(
+                    template_git_repository=local_template_repository.directory,
+                    update_template_repository_version=requested_version,
+                    update_template_data=requested_data,
+                    incarnation_root_dir=(local_incarnation_repository.directory / incarnation.target_directory),
+                    diff_patch_func=fengine.diff_and_patch,
+                    patch_data=True,
+                )
+                if not update_performed:
+                    continue
+                if patch_result is None:
+                    raise ChangeFailed("Patch result was None. That is unexpected at this stage.")
+
+                updates.append(
+                    _IncarnationUpdate(incarnation, last_change.revision + 1, incarnation_state, patch_result)
+                )
+
+            if not updates:
+                raise ChangeRejectedDueToNoChanges()
+
+            target_directories = [update.incarnation.target_directory for update in updates]
+            commit_message = (
+                f"foxops: updating incarnations in {', '.join(target_directories)} to version {requested_version}"
+            )
+            await local_incarnation_repository.commit_all(commit_message)
+            commit_sha = await local_incarnation_repository.head()
+            to_version_hash = await local_template_repository.head()
+
+            change_ids: list[int] = []
+            try:
+                for update in updates:
+                    change_in_db = await self._change_repository.create_change(
+                        incarnation_id=update.incarnation.id,
+                        revision=update.expected_revision,
+                        change_type=ChangeType.MERGE_REQUEST,
+                        commit_sha=commit_sha,
+                        commit_pushed=False,
+                        requested_version_hash=to_version_hash,
+                        requested_version=requested_version,
+                        requested_data=update.incarnation_state.template_data,
+                        template_data_full=update.incarnation_state.template_data_full,
+                        merge_request_branch_name=branch_name,
+                    )
+                    change_ids.append(change_in_db.id)
+            except Exception:
+                # the commit is only pushed if the changes of all incarnations could be recorded,
+                # so the changes which were already created would never be completed
+                for change_id in change_ids:
+                    await self._change_repository.delete_change(change_id)
+                raise
+
+            if self._commit_via_hoster_api:
+                await self._commit_change_via_hoster_api_and_update_database(
+                    local_incarnation_repository, incarnation_repository, branch_name, commit_message, change_ids
+                )
+            else:
+                await self._push_change_commit_and_update_database(local_incarnation_repository, change_ids)
+
+        updated_directories_text = "\n".join(f"- {directory}" for directory in target_directories)
+        description_paragraphs = [f"This merge request updates the incarnations in:\n\n{updated_directories_text}"]
+        if any(update.patch_result.has_errors() for update in updates):
+            title = f"🚧 - CONFLICT: Update {len(updates)} incarnations to {requested_version}"
+            description_paragraphs.append(
+                _construct_merge_request_conflict_description(
+                    conflict_files=[
+                        Path(update.incarnation.target_directory) / path
+                        for update in updates
+                        for path in update.patch_result.conflicts
+                    ],
+                    deleted_files=[
+                        Path(update.incarnation.target_directory) / path
+                        for update in updates
+                        for path in update.patch_result.deleted
+                    ],
+                )
+            )
+            automerge = False
+        else:
+            title = f"Update {len(updates)} incarnations to {requested_version}"
+            description_paragraphs.append("Foxops detected no conflicts when applying this change.")
+
+        await self._report_progress("creating the merge request")
+        _, merge_request_id = await self._hoster.merge_request(
+            incarnation_repository=incarnation_repository,
+            source_branch=branch_name,
+            title=title,
+            description="\n\n".join(description_paragraphs),
+            incarnation_sub_directory=".",
+            with_automerge=automerge,
+            automerge_in_background=automerge_in_background,
+        )
+
+        for change_id in change_ids:
+            await self._change_repository.update_merge_request_id(change_id, merge_request_id)
+
+        return [
+            (await self.get_change_with_merge_request(change_id), update.patch_result.has_errors())
+            for change_id, update in zip(change_ids, updates)
+        ]
 
     async def list_changes(self, incarnation_id: int) -> list[Change | ChangeWithMergeRequest]:
-        changes = []
-        for change_in_db in await self._change_repository.list_changes(incarnation_id):
+        # a single query, which also returns the repository of the incarnation with every change
+        changes_in_db = await self._change_repository.list_changes(incarnation_id)
+
+        # fetch the status of all merge requests at once
+        merge_request_statuses: dict[str, MergeRequestStatus] = {}
+        merge_requests = [(c.incarnation_repository, c.merge_request_id) for c in changes_in_db if c.merge_request_id]
+        if merge_requests:
+            statuses = await self._hoster_state.get_merge_request_statuses(merge_requests)
+            merge_request_statuses = {merge_request_id: status for (_, merge_request_id), status in statuses.items()}
+
+        changes: list[Change | ChangeWithMergeRequest] = []
+        for change_in_db in changes_in_db:
             if change_in_db.type == ChangeType.DIRECT:
-                changes.append(await self.get_change(change_in_db.id))
+                changes.append(_change_from_dbobj(change_in_db))
             elif change_in_db.type == ChangeType.MERGE_REQUEST:
-                changes.append(await self.get_change_with_merge_request(change_in_db.id))
+                status = merge_request_statuses.get(change_in_db.merge_request_id or "", MergeRequestStatus.UNKNOWN)
+                changes.append(_change_with_merge_request_from_dbobj(change_in_db, status))
             else:
                 raise ValueError(f"Unknown change type {change_in_db.type}")
 
@@ -456,49 +1012,49 @@ class ChangeService:
         """
 
         change = await self._change_repository.get_change(change_id)
-        if not change.commit_pushed:
-            raise IncompleteChange(
-                "the given change is in an incomplete state (commit_pushed=False). "
-                f"Try 'POST /api/incarnations/{change.incarnation_id}/changes/{change.revision}/fix'"
-            )
-
-        return Change(
-            id=change.id,
-            incarnation_id=change.incarnation_id,
-            revision=change.revision,
-            requested_version_hash=change.requested_version_hash,
-            requested_version=change.requested_version,
-            requested_data=json.loads(change.requested_data),
-            template_data_full=json.loads(change.template_data_full),
-            created_at=change.created_at,
-            commit_sha=change.commit_sha,
-        )
+        return _change_from_dbobj(change)
 
     async def get_change_with_merge_request(self, change_id: int) -> ChangeWithMergeRequest:
-        change_basic = await self.get_change(change_id)
+        return await self._get_change_with_merge_request(change_id, self._hoster_state)
 
+    async def _get_change_with_merge_request(
+        self, change_id: int, merge_request_statuses: Hoster | HosterStateService
+    ) -> ChangeWithMergeRequest:
         change_in_db = await self._change_repository.get_change(change_id)
-        incarnation_in_db = await self._incarnation_repository.get_by_id(change_in_db.incarnation_id)
 
         if change_in_db.type != ChangeType.MERGE_REQUEST:
             raise ValueError(f"Change {change_id} is not a merge request change.")
-        if change_in_db.merge_request_id is None or change_in_db.merge_request_branch_name is None:
-            raise IncompleteChange(
-                "the given change is in an incomplete state (MR ID/Branch = null). "
-                f"Try 'POST /api/incarnations/{change_in_db.incarnation_id}/changes/{change_in_db.revision}/fix'"
-            )
+        if change_in_db.merge_request_id is None:
+            raise _incomplete_change_error(change_in_db)
 
-        status = await self._hoster.get_merge_request_status(
+        incarnation_in_db = await self._incarnation_repository.get_by_id(change_in_db.incarnation_id)
+        status = await merge_request_statuses.get_merge_request_status(
             incarnation_repository=incarnation_in_db.incarnation_repository,
             merge_request_id=change_in_db.merge_request_id,
         )
 
-        return ChangeWithMergeRequest(
-            **change_basic.model_dump(),
-            merge_request_id=change_in_db.merge_request_id,
-            merge_request_branch_name=change_in_db.merge_request_branch_name,
-            merge_request_status=status,
-        )
+        return _change_with_merge_request_from_dbobj(change_in_db, status)
+
+    async def _ensure_changes_are_completed(self, changes: list[ChangeWithIncarnationInDB]) -> None:
+        """Like `get_latest_change_for_incarnation_if_completed`, but looks up all merge requests at once."""
+
+        merge_requests = []
+        for change in changes:
+            _change_from_dbobj(change)  # raises if the commit of the change wasn't pushed
+            if change.type != ChangeType.MERGE_REQUEST:
+                continue
+            if change.merge_request_id is None:
+                raise _incomplete_change_error(change)
+            merge_requests.append((change.incarnation_repository, change.merge_request_id))
+
+        # new changes are only allowed once the previous merge requests are finished, which might have happened
+        # just now, so the (possibly outdated) stored states are not used here
+        statuses = await self._hoster.get_merge_request_statuses(merge_requests) if merge_requests else {}
+        for merge_request in merge_requests:
+            if statuses.get(merge_request) not in (MergeRequestStatus.CLOSED, MergeRequestStatus.MERGED):
+                raise ChangeRejectedDueToPreviousUnfinishedChange(
+                    "There is still an open MR for the previous change. Please close it first."
+                )
 
     async def get_latest_change_id_for_incarnation(self, incarnation_id: int) -> int:
         """
@@ -518,7 +1074,8 @@ class ChangeService:
 
         change_type = await self.get_change_type(change_id)
         if change_type == ChangeType.MERGE_REQUEST:
-            change = await self.get_change_with_merge_request(change_id)
+            # like in `_ensure_changes_are_completed`, the status is requested from the hoster directly
+            change = await self._get_change_with_merge_request(change_id, self._hoster)
             if change.merge_request_status not in (MergeRequestStatus.CLOSED, MergeRequestStatus.MERGED):
                 raise ChangeRejectedDueToPreviousUnfinishedChange(
                     "There is still an open MR for the previous change. Please close it first."
@@ -533,128 +1090,178 @@ class ChangeService:
     async def get_incarnation_with_details(self, incarnation_id: int) -> IncarnationWithDetails:
         """
         Returns an IncarnationWithDetails object for the given incarnation ID.
+
+        The incarnation and its latest change are loaded with a single database query,
+        the remaining hoster lookups (merge request and reconciliation status) are done concurrently.
         """
 
-        incarnation = await self._incarnation_repository.get_by_id(incarnation_id)
+        change = await self._change_repository.get_latest_change_with_incarnation(incarnation_id)
 
-        change_id = await self.get_latest_change_id_for_incarnation(incarnation_id)
-        change_type = await self.get_change_type(change_id)
+        merge_request_id = change.merge_request_id if change.type == ChangeType.MERGE_REQUEST else None
+        incomplete = not change.commit_pushed or (
+            change.type == ChangeType.MERGE_REQUEST
+            and (change.merge_request_id is None or change.merge_request_branch_name is None)
+        )
 
-        merge_request_id: str | None = None
         merge_request_url: str | None = None
         merge_request_status: MergeRequestStatus | None = None
-
-        change: Change | ChangeWithMergeRequest
-        try:
-            if change_type == ChangeType.MERGE_REQUEST:
-                change = await self.get_change_with_merge_request(change_id)
-
-                merge_request_id = change.merge_request_id
-                merge_request_status = await self._hoster.get_merge_request_status(
-                    incarnation.incarnation_repository, merge_request_id
-                )
-                merge_request_url = await self._hoster.get_merge_request_url(
-                    incarnation.incarnation_repository, merge_request_id
-                )
-            elif change_type == ChangeType.DIRECT:
-                change = await self.get_change(change_id)
-            else:
-                raise ValueError(f"Unknown change type {change_type}")
-        except IncompleteChange:
+        status_refreshed_at: datetime | None = None
+        if incomplete:
             # The latest change has not been fully committed/pushed yet. Return what is known
             # from the database so that the incarnation remains readable and deletable.
             # Use the fix endpoint to repair the change before attempting further updates.
-            change_in_db = await self._change_repository.get_change(change_id)
-            return IncarnationWithDetails(
-                id=incarnation.id,
-                incarnation_repository=incarnation.incarnation_repository,
-                target_directory=incarnation.target_directory,
-                commit_sha=change_in_db.commit_sha,
-                commit_url=await self._hoster.get_commit_url(
-                    incarnation.incarnation_repository, change_in_db.commit_sha
-                ),
-                merge_request_id=change_in_db.merge_request_id,
-                merge_request_url=None,
-                merge_request_status=None,
-                status=ReconciliationStatus.UNKNOWN,
-                revision=change_in_db.revision,
-                template_repository=incarnation.template_repository,
-                template_repository_version=change_in_db.requested_version,
-                template_repository_version_hash=change_in_db.requested_version_hash,
-                template_data=json.loads(change_in_db.requested_data),
-                template_data_full=json.loads(change_in_db.template_data_full),
-            )
+            merge_request_id = change.merge_request_id
+            status = ReconciliationStatus.UNKNOWN
+        else:
+            if merge_request_id is not None:
+                merge_request_url = self._hoster.get_merge_request_url(change.incarnation_repository, merge_request_id)
 
-        status = await self._hoster.get_reconciliation_status(
-            incarnation_repository=incarnation.incarnation_repository,
-            target_directory=incarnation.target_directory,
-            commit_sha=change.commit_sha,
-            merge_request_id=merge_request_id,
-            pipeline_timeout=timedelta(seconds=10),
-        )
+            merge_request_status, (status, status_refreshed_at) = await asyncio.gather(
+                self._get_merge_request_status(change.incarnation_repository, merge_request_id),
+                self._get_reconciliation_status(change, merge_request_id),
+            )
 
         return IncarnationWithDetails(
-            id=incarnation.id,
-            incarnation_repository=incarnation.incarnation_repository,
-            target_directory=incarnation.target_directory,
+            id=change.incarnation_id,
+            incarnation_repository=change.incarnation_repository,
+            target_directory=change.target_directory,
             commit_sha=change.commit_sha,
-            commit_url=await self._hoster.get_commit_url(incarnation.incarnation_repository, change.commit_sha),
+            commit_url=self._hoster.get_commit_url(change.incarnation_repository, change.commit_sha),
             merge_request_id=merge_request_id,
             merge_request_url=merge_request_url,
             merge_request_status=merge_request_status,
             status=status,
+            status_refreshed_at=status_refreshed_at,
             revision=change.revision,
-            template_repository=incarnation.template_repository,
+            template_repository=change.template_repository,
             template_repository_version=change.requested_version,
             template_repository_version_hash=change.requested_version_hash,
             template_data=change.requested_data,
             template_data_full=change.template_data_full,
         )
 
-    async def diff_incarnation(self, incarnation_id: int) -> str:
-        incarnation = await self._incarnation_repository.get_by_id(incarnation_id)
-        latest_change = await self._change_repository.get_latest_change_for_incarnation(incarnation_id)
-
-        async with (
-            self._hoster.cloned_repository(incarnation.incarnation_repository) as incarnation_git,
-            self._hoster.cloned_repository(
-                incarnation.template_repository, refspec=latest_change.requested_version
-            ) as template_git,
-            tmp_empty_dir() as target_dir,
-        ):
-            await fengine.initialize_incarnation(
-                template_root_dir=template_git.directory,
-                template_repository=incarnation.template_repository,
-                template_repository_version=latest_change.requested_version,
-                template_data=json.loads(latest_change.requested_data),
-                incarnation_root_dir=target_dir,
+    async def _get_merge_request_status(
+        self, incarnation_repository: str, merge_request_id: str | None
+    ) -> MergeRequestStatus | None:
+        if merge_request_id is None:
+            return None
+
+        return await self._hoster_state.get_merge_request_status(incarnation_repository, merge_request_id)
+
+    async def _get_reconciliation_status(
+        self, change: ChangeWithIncarnationInDB, merge_request_id: str | None
+    ) -> tuple[ReconciliationStatus, datetime | None]:
+        if self._reconciliation_status_tracker is not None:
+            tracked_status = await self._reconciliation_status_tracker.get(
+                ReconciliationStatusKey(
+                    incarnation_repository=change.incarnation_repository,
+                    target_directory=change.target_directory,
+                    commit_sha=change.commit_sha,
+                    merge_request_id=merge_request_id,
+                )
             )
+            return tracked_status.status, tracked_status.refreshed_at
 
-            _incarnation_git_dir = incarnation_git.directory / incarnation.target_directory / ".git"
+        status = await self._hoster_state.get_reconciliation_status(
+            incarnation_repository=change.incarnation_repository,
+            target_directory=change.target_directory,
+            commit_sha=change.commit_sha,
+            merge_request_id=merge_request_id,
+            pipeline_timeout=timedelta(seconds=10),
+        )
+        return status, None
 
-            # Checks if a .git directory exists in the incarnation directory and removes it
-            # This is needed to avoid the diff command to compare the .git directories
-            if _incarnation_git_dir.exists():
-                shutil.rmtree(_incarnation_git_dir)
+    async def diff_incarnation(self, incarnation_id: int) -> str:
+        """Returns the diff between the pristine rendering of the latest change and the incarnation."""
 
-            diff = await GitRepository.diff_directory(
-                target_dir,
-                incarnation_git.directory / incarnation.target_directory,
+        incarnation = await self._incarnation_repository.get_by_id(incarnation_id)
+        latest_change = await self._change_repository.get_latest_change_for_incarnation(incarnation_id)
+        rendering_key = hashlib.sha256(
+            "\0".join(
+                [
+                    incarnation.template_repository,
+                    latest_change.requested_version,
+                    latest_change.requested_version_hash,
+                    latest_change.requested_data_hash,
+                ]
+            ).encode()
+        ).hexdigest()
+
+        # the diff doesn't change as long as the incarnation repository doesn't (which is cheap to check)
+        if self._diff_cache is not None:
+            metadata = await self._hoster.get_repository_metadata(incarnation.incarnation_repository)
+            commit_sha = await self._hoster.get_branch_head(
+                incarnation.incarnation_repository, metadata["default_branch"]
             )
+            if commit_sha is not None:
+                diff = self._diff_cache.get_by_commit(
+                    rendering_key, incarnation.incarnation_repository, incarnation.target_directory, commit_sha
+                )
+                if diff is not None:
+                    return diff
+
+        async with self._hoster.cloned_repository(incarnation.incarnation_repository) as incarnation_git:
+            # paths are resolved relative to the working directory, so that "." is the root of the repository
+            tree_sha = await incarnation_git.rev_parse(f"HEAD:./{incarnation.target_directory}")
+
+            # ... and the diff of the target directory doesn't change either if only other incarnations changed
+            diff = None if self._diff_cache is None else self._diff_cache.get_by_tree(rendering_key, tree_sha)
+            if diff is None:
+                async with self._rendered_incarnation(incarnation, latest_change, rendering_key) as rendering:
+                    pristine_tree_sha = await incarnation_git.write_tree(rendering)
+                # only blobs whose hashes differ are compared
+                diff = await incarnation_git.diff_trees(pristine_tree_sha, tree_sha, path_prefix=DIFF_PATH_PREFIX)
+
+            if self._diff_cache is not None:
+                self._diff_cache.put(
+                    diff,
+                    rendering_key,
+                    incarnation.incarnation_repository,
+                    incarnation.target_directory,
+                    await incarnation_git.head(),
+                    tree_sha,
+                )
 
-        return self._sanitize_diff(diff, str(incarnation_git.directory / incarnation.target_directory), str(target_dir))
+        return diff
 
-    def _sanitize_diff(self, diff: str, *paths) -> str:
-        shadow_dir = "/home/foxops/templating"
+    @asynccontextmanager
+    async def _rendered_incarnation(
+        self, incarnation: IncarnationInDB, change: ChangeInDB, rendering_key: str
+    ) -> AsyncIterator[Path]:
+        """Yields a (read-only) directory with the pristine rendering of the given change of the incarnation."""
+
+        async def _render(directory: Path) -> None:
+            # the rendering is cached by the commit, but `requested_version` might be a branch which moved since
+            async with self._hoster.template_source(
+                incarnation.template_repository, change.requested_version_hash
+            ) as template_source:
+                await fengine.initialize_incarnation(
+                    template_root_dir=template_source.directory,
+                    template_repository=incarnation.template_repository,
+                    template_repository_version=change.requested_version,
+                    template_data=change.requested_data,
+                    incarnation_root_dir=directory,
+                    template_repository_version_hash=template_source.commit_sha,
+                )
 
-        for path in paths:
-            diff = diff.replace(str(path), shadow_dir)
+        if self._diff_cache is not None:
+            async with self._diff_cache.renderings.unpacked(rendering_key, _render) as directory:
+                yield directory
+            return
 
-        return diff
+        with TemporaryDirectory() as tmpdir:
+            await _render(Path(tmpdir))
+            yield Path(tmpdir)
 
     @asynccontextmanager
     async def _prepared_change_environment(
-        self, incarnation_id: int, requested_version: str | None, requested_data: TemplateData, patch: bool
+        self,
+        incarnation_id: int,
+        requested_version: str | None,
+        requested_data: TemplateData,
+        patch: bool,
+        template_git: GitRepository | None = None,
+        preview: bool = False,
     ) -> AsyncIterator[_PreparedChangeEnvironment]:
         """
         This method checks out the incarnation repository, prepares a branch that contains the update and commits.
@@ -663,6 +1270,10 @@ class ChangeService:
         - the requested_version can be None, which results in using the same version that is currently applied
         - the requested_data can be a subset of the required template variables. The provided values
           will then be added to those that are currently already in use when rendering the incarnation.
+
+        A (bare) clone of the template repository can be passed as `template_git` to share it between changes.
+
+        With `preview`, the computed update is cached for a later change with the same request.
         """
 
         incarnation = await self._incarnation_repository.get_by_id(incarnation_id)
@@ -679,9 +1290,12 @@ class ChangeService:
 
         incarnation_repo_metadata = await self._hoster.get_repository_metadata(incarnation.incarnation_repository)
 
+        await self._report_progress("cloning the incarnation and template repositories")
         async with (
             self._hoster.cloned_repository(incarnation.incarnation_repository) as local_incarnation_repository,
-            self._hoster.cloned_repository(incarnation.template_repository, bare=True) as local_template_repository,
+            self._cloned_template_repository(
+                incarnation.template_repository, template_git
+            ) as local_template_repository,
         ):
             branch_name = generate_foxops_branch_name(
                 prefix="update-to",
@@ -690,27 +1304,59 @@ class ChangeService:
             )
             await local_incarnation_repository.create_and_checkout_branch(branch_name, exist_ok=False)
 
-            (
-                update_performed,
-                incarnation_state,
-                patch_result,
-            ) = await fengine.update_incarnation_from_git_template_repository(
-                template_git_repository=local_template_repository.directory,
-                update_template_repository_version=to_version,
-                update_template_data=requested_data,
-                incarnation_root_dir=(local_incarnation_repository.directory / incarnation.target_directory),
-                diff_patch_func=fengine.diff_and_patch,
-                patch_data=patch,
-            )
+            preview_key = None
+            prepared_update = None
+            if self._preview_cache is not None:
+                preview_key = await self._preview_key(
+                    incarnation,
+                    local_incarnation_repository,
+                    local_template_repository,
+                    to_version,
+                    requested_data,
+                    patch,
+                )
+                if preview_key is not None and not preview:
+                    prepared_update = self._preview_cache.get(preview_key)
 
-            if not update_performed:
-                raise ChangeRejectedDueToNoChanges()
-            if patch_result is None:
-                raise ChangeFailed("Patch result was None. That is unexpected at this stage.")
+            if prepared_update is not None:
+                await local_incarnation_repository.apply_patch(prepared_update.patch)
+                incarnation_state = prepared_update.incarnation_state
+                patch_result = prepared_update.patch_result
+            else:
+                await self._report_progress("rendering the template")
+                (
+                    update_performed,
+                    incarnation_state,
+                    optional_patch_result,
+                ) = await fengine.update_incarnation_from_git_template_repository(
+                    template_git_repository=local_template_repository.directory,
+                    update_template_repository_version=to_version,
+                    update_template_data=requested_data,
+                    incarnation_root_dir=(local_incarnation_repository.directory / incarnation.target_directory),
+                    diff_patch_func=fengine.diff_and_patch,
+                    patch_data=patch,
+                )
 
-            await local_incarnation_repository.commit_all(f"foxops: updating incarnation to version {to_version}")
+                if not update_performed:
+                    raise ChangeRejectedDueToNoChanges()
+                if optional_patch_result is None:
+                    raise ChangeFailed("Patch result was None. That is unexpected at this stage.")
+                patch_result = optional_patch_result
+
+            commit_message = f"foxops: updating incarnation to version {to_version}"
+            await local_incarnation_repository.commit_all(commit_message)
             commit_sha = await local_incarnation_repository.head()
 
+            if self._preview_cache is not None and preview_key is not None and preview:
+                self._preview_cache.put(
+                    preview_key,
+                    PreparedUpdate(
+                        patch=await local_incarnation_repository.create_patch(f"{commit_sha}~1", commit_sha),
+                        incarnation_state=incarnation_state,
+                        patch_result=patch_result,
+                    ),
+                )
+
             yield _PreparedChangeEnvironment(
                 incarnation_repository=local_incarnation_repository,
                 incarnation_target_directory=incarnation.target_directory,
@@ -723,14 +1369,110 @@ class ChangeService:
                 expected_revision=last_change.revision + 1,
                 branch_name=branch_name,
                 commit_sha=commit_sha,
+                commit_message=commit_message,
                 patch_result=patch_result,
             )
 
-    async def _push_change_commit_and_update_database(self, incarnation_git: GitRepository, change_id: int) -> None:
-        # the push might fail when other changes are pushed in the meantime. We need to rebase/retry in that case
+    async def _preview_key(
+        self,
+        incarnation: IncarnationInDB,
+        incarnation_git: GitRepository,
+        template_git: GitRepository,
+        to_version: str,
+        requested_data: TemplateData,
+        patch: bool,
+    ) -> tuple[str | bool, ...] | None:
+        """Identifies everything that the update of the incarnation depends on (`None` if it can't be determined)."""
+
+        try:
+            template_sha = await template_git.rev_parse(f"{to_version}^{{commit}}")
+        except GitError:
+            # the update itself reports invalid versions
+            return None
+
+        return (
+            incarnation.incarnation_repository,
+            incarnation.target_directory,
+            await incarnation_git.head(),
+            template_sha,
+            to_version,
+            template_data_hash(requested_data),
+            patch,
+        )
+
+    @asynccontextmanager
+    async def _cloned_template_repository(
+        self, template_repository: str, shared_clone: GitRepository | None
+    ) -> AsyncIterator[GitRepository]:
+        if shared_clone is not None:
+            yield shared_clone
+            return
+
+        async with self._hoster.cloned_repository(template_repository, bare=True) as clone:
+            yield clone
+
+    async def _commit_change_via_hoster_api_and_update_database(
+        self,
+        incarnation_git: GitRepository,
+        incarnation_repository: str,
+        branch_name: str,
+        commit_message: str,
+        change_ids: list[int],
+    ) -> None:
+        """Recreate the locally prepared commit (at HEAD) on a new branch through the commits API of the hoster.
+
+        The branch is created from the commit that the change was prepared on, so that the
+        computed file actions are guaranteed to apply. Changes which can't be expressed as file actions
+        (e.g. of symlinks) are pushed instead.
+        """
+        log = self._log.bind(change_ids=change_ids)
+        await self._report_progress("committing the change via the hoster API")
+
+        base_sha = await incarnation_git.rev_parse("HEAD~1")
+        try:
+            actions = await compute_commit_actions(incarnation_git, base_sha, "HEAD")
+        except UnsupportedCommitAction as e:
+            log.info("cannot commit the change via the hoster API, pushing it instead", reason=str(e))
+            await self._push_change_commit_and_update_database(incarnation_git, change_ids)
+            return
+
+        try:
+            commit_sha = await self._hoster.commit_files(
+                incarnation_repository,
+                branch=branch_name,
+                message=commit_message,
+                actions=actions,
+                start_sha=base_sha,
+            )
+        except CommitConflictError as e:
+            log.exception("Failed to create commit via the hoster API. Removing change from database.")
+            for change_id in change_ids:
+                await self._change_repository.delete_change(change_id)
+
+            raise ChangeFailed from e
+
+        for change_id in change_ids:
+            await self._change_repository.update_commit_sha(change_id, commit_sha)
+            await self._change_repository.update_commit_pushed(change_id, True)
+
+    def _locked_repository(self, incarnation_repository: str) -> AbstractAsyncContextManager[None]:
+        if self._repository_locks is None:
+            return nullcontext()
+
+        return self._repository_locks.locked(incarnation_repository)
+
+    async def _push_change_commit_and_update_database(
+        self, incarnation_git: GitRepository, change_ids: list[int]
+    ) -> None:
+        """Push the commit (at HEAD) of the given changes, which all share that commit."""
+
+        await self._report_progress("pushing the change")
+
+        # the push might fail when other changes are pushed in the meantime (e.g. by somebody else than foxops,
+        # or without repository locks). We need to rebase/retry in that case
         last_exception = None
         for attempt in range(10):
-            log = self._log.bind(change_id=change_id, attempt=attempt)
+            log = self._log.bind(change_ids=change_ids, attempt=attempt)
 
             try:
                 await incarnation_git.push()
@@ -744,25 +1486,72 @@ class ChangeService:
                 await incarnation_git.pull(rebase=True)
 
                 new_commit_sha = await incarnation_git.head()
-                await self._change_repository.update_commit_sha(change_id, new_commit_sha)
+                for change_id in change_ids:
+                    await self._change_repository.update_commit_sha(change_id, new_commit_sha)
 
-                await asyncio.sleep(3)
+                await asyncio.sleep(min(0.5 * 2**attempt, 5))
                 continue
             except GitError as e:
                 log.exception("Failed to push commit to incarnation repository. Removing change from database.")
-                await self._change_repository.delete_change(change_id)
+                for change_id in change_ids:
+                    await self._change_repository.delete_change(change_id)
 
                 raise ChangeFailed from e
 
-            await self._change_repository.update_commit_pushed(change_id, True)
+            for change_id in change_ids:
+                await self._change_repository.update_commit_pushed(change_id, True)
             return
         else:
             if last_exception:
                 self._log.error("last exception", last_exception=last_exception)
-            await self._change_repository.delete_change(change_id)
+            for change_id in change_ids:
+                await self._change_repository.delete_change(change_id)
             raise ChangeFailed("Failed to push commit to incarnation repository. Retries exceeded.") from last_exception
 
 
+def _change_from_dbobj(change: ChangeInDB) -> Change:
+    if not change.commit_pushed:
+        raise IncompleteChange(
+            "the given change is in an incomplete state (commit_pushed=False). "
+            f"Try 'POST /api/incarnations/{change.incarnation_id}/changes/{change.revision}/fix'"
+        )
+
+    return Change(
+        id=change.id,
+        incarnation_id=change.incarnation_id,
+        revision=change.revision,
+        requested_version_hash=change.requested_version_hash,
+        requested_version=change.requested_version,
+        requested_data=change.requested_data,
+        template_data_full=change.template_data_full,
+        created_at=change.created_at,
+        commit_sha=change.commit_sha,
+    )
+
+
+def _change_with_merge_request_from_dbobj(
+    change: ChangeInDB, merge_request_status: MergeRequestStatus
+) -> ChangeWithMergeRequest:
+    change_basic = _change_from_dbobj(change)
+
+    if change.merge_request_id is None or change.merge_request_branch_name is None:
+        raise _incomplete_change_error(change)
+
+    return ChangeWithMergeRequest(
+        **change_basic.model_dump(),
+        merge_request_id=change.merge_request_id,
+        merge_request_branch_name=change.merge_request_branch_name,
+        merge_request_status=merge_request_status,
+    )
+
+
+def _incomplete_change_error(change: ChangeInDB) -> IncompleteChange:
+    return IncompleteChange(
+        "the given change is in an incomplete state (MR ID/Branch = null). "
+        f"Try 'POST /api/incarnations/{change.incarnation_id}/changes/{change.revision}/fix'"
+    )
+
+
 def _construct_merge_request_conflict_description(
     conflict_files: list[Path] | None, deleted_files: list[Path] | None
 ) -> str:
@@ -0,0 +1,83 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Generic, Hashable, TypeVar
+
+from foxops.engine import IncarnationState
+from foxops.engine.patching.git_diff_patch import PatchResult
+from foxops.hosters.template_archive import TemplateArchiveCache
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class _LeastRecentlyUsed(Generic[K, V]):
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self._entries: OrderedDict[K, V] = OrderedDict()
+
+    def get(self, key: K) -> V | None:
+        if (value := self._entries.get(key)) is not None:
+            self._entries.move_to_end(key)
+        return value
+
+    def put(self, key: K, value: V) -> None:
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+class IncarnationDiffCache:
+    """Caches the diffs between incarnations and their pristine renderings, and the renderings themselves.
+
+    Diffs are looked up by what they were computed from: the rendering (template version and data) and either the
+    commit of the incarnation repository, or the tree of the target directory. The latter still matches after
+    commits which only touched other incarnations in the same repository.
+    """
+
+    def __init__(
+        self, max_entries: int = 1024, max_renderings: int = 32, renderings_directory: Path | None = None
+    ) -> None:
+        # the pristine renderings of incarnations, which are shared by concurrent requests and must not be modified
+        self.renderings = TemplateArchiveCache(renderings_directory, max_entries=max_renderings)
+        self._diffs: _LeastRecentlyUsed[tuple[str, ...], str] = _LeastRecentlyUsed(max_entries)
+
+    def get_by_commit(self, rendering_key: str, repository: str, target_directory: str, commit_sha: str) -> str | None:
+        return self._diffs.get(("commit", rendering_key, repository, target_directory, commit_sha))
+
+    def get_by_tree(self, rendering_key: str, tree_sha: str) -> str | None:
+        return self._diffs.get(("tree", rendering_key, tree_sha))
+
+    def put(
+        self, diff: str, rendering_key: str, repository: str, target_directory: str, commit_sha: str, tree_sha: str
+    ) -> None:
+        self._diffs.put(("commit", rendering_key, repository, target_directory, commit_sha), diff)
+        self._diffs.put(("tree", rendering_key, tree_sha), diff)
+
+
+@dataclass(frozen=True)
+class PreparedUpdate:
+    """The result of rendering and patching the template into an incarnation."""
+
+    # the changes to the incarnation repository (a binary git diff)
+    patch: bytes
+    incarnation_state: IncarnationState
+    patch_result: PatchResult
+
+
+class ChangePreviewCache:
+    """Caches the updates computed for change previews, so that the change itself can reuse them.
+
+    Updates are looked up by the commit of the incarnation repository, the commit of the template version and the
+    requested template data, so a cached update is exactly what rendering the template again would result in.
+    """
+
+    def __init__(self, max_entries: int = 256) -> None:
+        self._updates: _LeastRecentlyUsed[tuple[str | bool, ...], PreparedUpdate] = _LeastRecentlyUsed(max_entries)
+
+    def get(self, key: tuple[str | bool, ...]) -> PreparedUpdate | None:
+        return self._updates.get(key)
+
+    def put(self, key: tuple[str | bool, ...], update: PreparedUpdate) -> None:
+        self._updates.put(key, update)
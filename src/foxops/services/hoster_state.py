@@ -0,0 +1,252 @@
+from datetime import datetime, timedelta, timezone
+from typing import Annotated, Any
+
+from pydantic import BaseModel, BeforeValidator, ValidationError
+
+from foxops.database.repositories.hoster_state.model import (
+    CommitStatusInDB,
+    MergeRequestStateInDB,
+)
+from foxops.database.repositories.hoster_state.repository import HosterStateRepository
+from foxops.hosters import GitSha, Hoster, ReconciliationStatus
+from foxops.hosters.gitlab import MERGE_REQUEST_STATE_MAPPING
+from foxops.hosters.types import MergeRequestId, MergeRequestStatus
+from foxops.logger import get_logger
+
+#: Holds the module logger
+logger = get_logger(__name__)
+
+#: Maps GitLab pipeline/commit statuses to reconciliation statuses.
+#  Statuses which are missing here (e.g. `manual` or `skipped`) are resolved by asking the hoster directly.
+COMMIT_STATUS_MAPPING = {
+    "success": ReconciliationStatus.SUCCESS,
+    "created": ReconciliationStatus.PENDING,
+    "waiting_for_resource": ReconciliationStatus.PENDING,
+    "preparing": ReconciliationStatus.PENDING,
+    "pending": ReconciliationStatus.PENDING,
+    "running": ReconciliationStatus.PENDING,
+    "failed": ReconciliationStatus.FAILED,
+    "canceled": ReconciliationStatus.FAILED,
+}
+
+
+class UnsupportedWebhookEvent(Exception):
+    pass
+
+
+class InvalidWebhookEvent(Exception):
+    pass
+
+
+def _parse_gitlab_timestamp(value: Any) -> Any:
+    # some GitLab events use timestamps like `2026-10-19 09:01:10 UTC`
+    if isinstance(value, str) and value.endswith(" UTC"):
+        return value.removesuffix(" UTC") + "+00:00"
+    return value
+
+
+GitlabTimestamp = Annotated[datetime, BeforeValidator(_parse_gitlab_timestamp)]
+
+
+class _GitlabProject(BaseModel):
+    path_with_namespace: str
+
+
+class _GitlabCommit(BaseModel):
+    id: str
+
+
+class _GitlabMergeRequestAttributes(BaseModel):
+    iid: int
+    state: str
+    merge_status: str | None = None
+    merge_commit_sha: str | None = None
+    last_commit: _GitlabCommit | None = None
+    updated_at: GitlabTimestamp | None = None
+
+
+class _GitlabMergeRequestEvent(BaseModel):
+    project: _GitlabProject
+    object_attributes: _GitlabMergeRequestAttributes
+
+
+class _GitlabPipelineAttributes(BaseModel):
+    id: int
+    sha: str
+    status: str
+
+
+class _GitlabPipelineEvent(BaseModel):
+    project: _GitlabProject
+    object_attributes: _GitlabPipelineAttributes
+
+
+class HosterStateService:
+    """Serves merge request and pipeline states from the database, where they are stored by webhooks.
+
+    Whenever no state was reported for a merge request or commit within `max_age`, the hoster is asked directly.
+    Only states reported by webhooks are stored, so without webhooks (`webhooks_enabled=False`) the hoster is
+    always asked directly.
+    """
+
+    def __init__(
+        self,
+        hoster: Hoster,
+        hoster_state_repository: HosterStateRepository,
+        max_age: timedelta,
+        webhooks_enabled: bool = True,
+    ) -> None:
+        self._hoster = hoster
+        self._hoster_state_repository = hoster_state_repository
+        self._max_age = max_age
+        self._webhooks_enabled = webhooks_enabled
+
+    async def process_gitlab_event(self, payload: dict[str, Any]) -> None:
+        """Store the state contained in the given GitLab webhook event.
+
+        Supported are merge request, pipeline and push events. Raises `InvalidWebhookEvent` if a supported event
+        doesn't contain the expected attributes.
+        """
+
+        try:
+            match payload.get("object_kind"):
+                case "merge_request":
+                    await self._process_gitlab_merge_request_event(_GitlabMergeRequestEvent.model_validate(payload))
+                case "pipeline":
+                    await self._process_gitlab_pipeline_event(_GitlabPipelineEvent.model_validate(payload))
+                case "push":
+                    # the state of the pushed commits is reported by the subsequent pipeline events
+                    # (or the lack of a pipeline is detected when asking GitLab directly)
+                    logger.debug(
+                        "ignoring push event", repository=(payload.get("project") or {}).get("path_with_namespace")
+                    )
+                case object_kind:
+                    raise UnsupportedWebhookEvent(f"unsupported GitLab webhook event '{object_kind}'")
+        except ValidationError as e:
+            raise InvalidWebhookEvent(f"invalid GitLab webhook event: {e}") from e
+
+    async def _process_gitlab_merge_request_event(self, event: _GitlabMergeRequestEvent) -> None:
+        attributes = event.object_attributes
+
+        await self._hoster_state_repository.upsert_merge_request_state(
+            repository=event.project.path_with_namespace,
+            merge_request_id=str(attributes.iid),
+            state=attributes.state,
+            merge_status=attributes.merge_status,
+            sha=attributes.last_commit.id if attributes.last_commit is not None else None,
+            merge_commit_sha=attributes.merge_commit_sha,
+            hoster_updated_at=(
+                attributes.updated_at.astimezone(timezone.utc) if attributes.updated_at is not None else None
+            ),
+        )
+
+    async def _process_gitlab_pipeline_event(self, event: _GitlabPipelineEvent) -> None:
+        attributes = event.object_attributes
+
+        await self._hoster_state_repository.upsert_commit_status(
+            repository=event.project.path_with_namespace,
+            commit_sha=attributes.sha,
+            status=attributes.status,
+            pipeline_id=attributes.id,
+        )
+
+    async def get_merge_request_status(
+        self, incarnation_repository: str, merge_request_id: MergeRequestId
+    ) -> MergeRequestStatus:
+        if self._webhooks_enabled:
+            states = await self._hoster_state_repository.get_merge_request_states(
+                [(incarnation_repository, merge_request_id)]
+            )
+            state = states.get((incarnation_repository, merge_request_id))
+            if state is not None and self._is_fresh(state) and state.state in MERGE_REQUEST_STATE_MAPPING:
+                return MERGE_REQUEST_STATE_MAPPING[state.state]
+
+        # unlike batch lookups, single lookups fail if the repository doesn't exist
+        return await self._hoster.get_merge_request_status(incarnation_repository, merge_request_id)
+
+    async def get_merge_request_statuses(
+        self, merge_requests: list[tuple[str, MergeRequestId]]
+    ) -> dict[tuple[str, MergeRequestId], MergeRequestStatus]:
+        if not self._webhooks_enabled:
+            return await self._hoster.get_merge_request_statuses(merge_requests)
+
+        states = await self._hoster_state_repository.get_merge_request_states(merge_requests)
+
+        statuses = {
+            key: MERGE_REQUEST_STATE_MAPPING[state.state]
+            for key, state in states.items()
+            if self._is_fresh(state) and state.state in MERGE_REQUEST_STATE_MAPPING
+        }
+        if missing := [key for key in merge_requests if key not in statuses]:
+            statuses |= await self._hoster.get_merge_request_statuses(missing)
+
+        return statuses
+
+    async def get_reconciliation_status(
+        self,
+        incarnation_repository: str,
+        target_directory: str,
+        commit_sha: GitSha,
+        merge_request_id: str | None,
+        pipeline_timeout: timedelta | None = None,
+    ) -> ReconciliationStatus:
+        if self._webhooks_enabled:
+            status = await self._get_stored_reconciliation_status(incarnation_repository, commit_sha, merge_request_id)
+            if status is not None:
+                return status
+
+        return await self._hoster.get_reconciliation_status(
+            incarnation_repository=incarnation_repository,
+            target_directory=target_directory,
+            commit_sha=commit_sha,
+            merge_request_id=merge_request_id,
+            pipeline_timeout=pipeline_timeout,
+        )
+
+    async def _get_stored_reconciliation_status(
+        self, incarnation_repository: str, commit_sha: GitSha, merge_request_id: str | None
+    ) -> ReconciliationStatus | None:
+        """Derive the reconciliation status from the stored state (like `GitlabHoster.get_reconciliation_status`).
+
+        Returns `None` if the stored state is not sufficient to do so.
+        """
+
+        if merge_request_id is not None:
+            merge_request = await self._hoster_state_repository.get_merge_request_state(
+                incarnation_repository, merge_request_id
+            )
+            if merge_request is None or not self._is_fresh(merge_request):
+                return None
+
+            match merge_request.state:
+                case "closed":
+                    return ReconciliationStatus.FAILED
+                case "opened":
+                    if merge_request.merge_status in {"cannot_be_merged", "cannot_be_merged_recheck"}:
+                        return ReconciliationStatus.FAILED
+
+                    if merge_request.sha is not None:
+                        head_pipeline = await self._hoster_state_repository.get_commit_status(
+                            incarnation_repository, merge_request.sha
+                        )
+                        if (
+                            head_pipeline is not None
+                            and self._is_fresh(head_pipeline)
+                            and head_pipeline.status in {"failed", "canceled"}
+                        ):
+                            return ReconciliationStatus.FAILED
+
+                    return ReconciliationStatus.PENDING
+                case "merged" if merge_request.merge_commit_sha is not None or merge_request.sha is not None:
+                    commit_sha = merge_request.merge_commit_sha or merge_request.sha  # type: ignore
+                case _:
+                    return None
+
+        commit = await self._hoster_state_repository.get_commit_status(incarnation_repository, commit_sha)
+        if commit is None or not self._is_fresh(commit):
+            return None
+
+        return COMMIT_STATUS_MAPPING.get(commit.status)
+
+    def _is_fresh(self, state: MergeRequestStateInDB | CommitStatusInDB) -> bool:
+        return datetime.now(timezone.utc) - state.updated_at <= self._max_age
@@ -0,0 +1,261 @@
+import asyncio
+from contextlib import suppress
+from datetime import datetime, timedelta, timezone
+from functools import partial
+from typing import Callable
+
+from pydantic import BaseModel
+
+from foxops.database.repositories.incarnation.repository import IncarnationRepository
+from foxops.database.repositories.job.model import JobInDB, JobStatus, JobType
+from foxops.database.repositories.job.repository import JobRepository
+from foxops.engine import TemplateData
+from foxops.engine.errors import ProvidedTemplateDataInvalidError
+from foxops.logger import get_logger
+from foxops.models.change import Change
+from foxops.services.change import (
+    ChangeRejectedDueToNoChanges,
+    ChangeRejectedDueToPreviousUnfinishedChange,
+    ChangeService,
+    ProgressCallback,
+)
+
+#: Holds the module logger
+logger = get_logger(__name__)
+
+
+class ChangeJobArguments(BaseModel):
+    requested_version: str | None
+    requested_data: TemplateData
+    merge_request: bool = True
+    automerge: bool = False
+    patch: bool = False
+    automerge_in_background: bool = False
+
+
+class ResetJobArguments(BaseModel):
+    requested_version: str
+    requested_data: TemplateData
+
+
+class JobService:
+    def __init__(
+        self,
+        job_repository: JobRepository,
+        incarnation_repository: IncarnationRepository,
+        worker_pool: "JobWorkerPool | None" = None,
+    ) -> None:
+        self._job_repository = job_repository
+        self._incarnation_repository = incarnation_repository
+        # without a worker pool in this process, jobs are executed by separate worker processes
+        self._worker_pool = worker_pool
+
+    async def enqueue_change(self, incarnation_id: int, arguments: ChangeJobArguments) -> JobInDB:
+        return await self._enqueue(JobType.CHANGE, incarnation_id, arguments)
+
+    async def enqueue_reset(self, incarnation_id: int, arguments: ResetJobArguments) -> JobInDB:
+        return await self._enqueue(JobType.RESET, incarnation_id, arguments)
+
+    async def get(self, id_: int) -> JobInDB:
+        return await self._job_repository.get(id_)
+
+    async def _enqueue(self, type_: JobType, incarnation_id: int, arguments: BaseModel) -> JobInDB:
+        # fail early (instead of in the worker) if the incarnation doesn't exist
+        await self._incarnation_repository.get_by_id(incarnation_id)
+
+        job = await self._job_repository.create(type_, incarnation_id, arguments.model_dump(mode="json"))
+        if self._worker_pool is not None:
+            self._worker_pool.notify()
+
+        return job
+
+
+class JobWorkerPool:
+    """Executes queued jobs with a bounded number of workers.
+
+    Workers poll the database for pending jobs every `poll_interval` (and are woken up immediately when a job is
+    enqueued in the same process), so the pools of several processes can share the queue. Running jobs regularly
+    send a heartbeat. Jobs without a heartbeat for `heartbeat_timeout` are failed, because their worker stopped
+    unexpectedly. They are not retried, as the change might already have been partially applied
+    (see the `fix` endpoint of changes). For the same reason, stopping the pool waits up to `shutdown_timeout` for
+    running jobs to finish, and jobs which are cancelled after that are failed as well.
+    """
+
+    def __init__(
+        self,
+        job_repository: JobRepository,
+        change_service_factory: Callable[[ProgressCallback], ChangeService],
+        workers: int = 4,
+        poll_interval: timedelta = timedelta(seconds=1),
+        heartbeat_timeout: timedelta = timedelta(minutes=2),
+        shutdown_timeout: timedelta = timedelta(seconds=30),
+    ) -> None:
+        self._job_repository = job_repository
+        self._change_service_factory = change_service_factory
+        self._workers = workers
+        self._poll_interval = poll_interval
+        self._heartbeat_timeout = heartbeat_timeout
+        self._shutdown_timeout = shutdown_timeout
+
+        self._job_available = asyncio.Event()
+        self._stopping = False
+        self._tasks: list[asyncio.Task] = []
+        self._stale_jobs_task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        """Starts the workers in the background (if they aren't running yet)."""
+
+        if self._stale_jobs_task is not None:
+            return
+
+        self._stopping = False
+        self._stale_jobs_task = asyncio.create_task(self._fail_stale_jobs())
+        self._tasks.extend(asyncio.create_task(self._work()) for _ in range(self._workers))
+
+    def notify(self) -> None:
+        """Wakes up the workers, because a new job was enqueued."""
+
+        self.start()
+        self._job_available.set()
+
+    async def run(self) -> None:
+        """Executes jobs until cancelled, and then stops like `stop`."""
+
+        self.start()
+        assert self._stale_jobs_task is not None
+        try:
+            # shielded, so that the running jobs get the chance to finish when this is cancelled
+            await asyncio.gather(*map(asyncio.shield, [self._stale_jobs_task, *self._tasks]))
+        finally:
+            await self.stop()
+
+    async def stop(self) -> None:
+        """Stops claiming jobs and waits up to `shutdown_timeout` for the running ones, before cancelling them."""
+
+        if self._stale_jobs_task is None:
+            return
+
+        self._stopping = True
+        self._job_available.set()
+        self._stale_jobs_task.cancel()
+
+        if self._tasks:
+            _, pending = await asyncio.wait(self._tasks, timeout=self._shutdown_timeout.total_seconds())
+            for task in pending:
+                task.cancel()
+        await asyncio.gather(self._stale_jobs_task, *self._tasks, return_exceptions=True)
+        self._tasks.clear()
+        self._stale_jobs_task = None
+
+    async def _work(self) -> None:
+        while not self._stopping:
+            # cleared before claiming, so that jobs enqueued in the meantime aren't missed
+            self._job_available.clear()
+            try:
+                job = await self._job_repository.claim_next()
+            except Exception:
+                logger.exception("failed to claim the next job")
+                job = None
+
+            if job is None:
+                with suppress(TimeoutError):
+                    await asyncio.wait_for(self._job_available.wait(), self._poll_interval.total_seconds())
+                continue
+
+            await self._execute(job)
+
+    async def _execute(self, job: JobInDB) -> None:
+        log = logger.bind(job_id=job.id, incarnation_id=job.incarnation_id, job_type=job.type.value)
+        log.info("executing job")
+
+        heartbeats = asyncio.create_task(self._send_heartbeats(job.id))
+        try:
+            change_service = self._change_service_factory(partial(self._job_repository.update_progress, job.id))
+            change_id = await execute_job(change_service, job)
+        except asyncio.CancelledError:
+            log.warning("job cancelled, because the worker pool was stopped")
+            await self._job_repository.finish(
+                job.id, JobStatus.FAILED, error="The job was cancelled, because its worker was stopped"
+            )
+            raise
+        except Exception as exc:
+            log.exception("job failed")
+            await self._job_repository.finish(job.id, JobStatus.FAILED, error=_describe_error(job, exc))
+        else:
+            log.info("job succeeded", change_id=change_id)
+            await self._job_repository.finish(job.id, JobStatus.SUCCEEDED, change_id=change_id)
+        finally:
+            heartbeats.cancel()
+
+    async def _send_heartbeats(self, job_id: int) -> None:
+        while True:
+            await asyncio.sleep(self._heartbeat_timeout.total_seconds() / 4)
+            try:
+                await self._job_repository.heartbeat(job_id)
+            except Exception:
+                logger.exception("failed to send job heartbeat", job_id=job_id)
+
+    async def _fail_stale_jobs(self) -> None:
+        while True:
+            try:
+                stale_jobs = await self._job_repository.fail_stale_jobs(
+                    heartbeat_before=datetime.now(timezone.utc) - self._heartbeat_timeout,
+                    error="The worker executing the job stopped unexpectedly",
+                )
+            except Exception:
+                logger.exception("failed to look for stale jobs")
+            else:
+                for job in stale_jobs:
+                    logger.warning("failed job of stopped worker", job_id=job.id, incarnation_id=job.incarnation_id)
+
+            await asyncio.sleep(self._heartbeat_timeout.total_seconds())
+
+
+async def execute_job(change_service: ChangeService, job: JobInDB) -> int | None:
+    """Executes the given job and returns the ID of the change it created (if any)."""
+
+    change: Change
+    match job.type:
+        case JobType.CHANGE:
+            change_arguments = ChangeJobArguments.model_validate(job.arguments)
+            try:
+                if change_arguments.merge_request:
+                    change = await change_service.create_change_merge_request(
+                        job.incarnation_id,
+                        change_arguments.requested_version,
+                        change_arguments.requested_data,
+                        automerge=change_arguments.automerge,
+                        patch=change_arguments.patch,
+                        automerge_in_background=change_arguments.automerge_in_background,
+                    )
+                else:
+                    if change_arguments.requested_version is None:
+                        raise ValueError("requested_version must be set for direct changes")
+
+                    change = await change_service.create_change_direct(
+                        job.incarnation_id, change_arguments.requested_version, change_arguments.requested_data
+                    )
+            except ChangeRejectedDueToNoChanges:
+                # like for synchronous requests, a change without any effect is not an error
+                return None
+        case JobType.RESET:
+            reset_arguments = ResetJobArguments.model_validate(job.arguments)
+            change = await change_service.reset_incarnation(
+                job.incarnation_id, reset_arguments.requested_version, reset_arguments.requested_data
+            )
+        case _:
+            raise NotImplementedError(f"Unknown job type {job.type}")
+
+    return change.id
+
+
+def _describe_error(job: JobInDB, exc: Exception) -> str:
+    match exc:
+        case ProvidedTemplateDataInvalidError():
+            return f"the provided template data is invalid: {'; '.join(exc.get_readable_error_messages())}"
+        case ChangeRejectedDueToPreviousUnfinishedChange():
+            return "There is a previous change that is still open. Please merge/close it first."
+        case ChangeRejectedDueToNoChanges() if job.type == JobType.RESET:
+            return "The incarnation does not have any customizations. Nothing to reset."
+        case _:
+            return str(exc) or type(exc).__name__
@@ -0,0 +1,156 @@
+import asyncio
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import NamedTuple, Protocol
+
+from foxops.hosters import GitSha, ReconciliationStatus
+from foxops.logger import get_logger
+
+#: Holds the module logger
+logger = get_logger(__name__)
+
+#: Holds the statuses which are expected to change without any action from foxops and are therefore refreshed
+PENDING_STATUSES = frozenset({ReconciliationStatus.PENDING, ReconciliationStatus.UNKNOWN})
+
+
+class ReconciliationStatusSource(Protocol):
+    """Anything that can determine the reconciliation status (e.g. a `Hoster` or the `HosterStateService`)."""
+
+    async def get_reconciliation_status(
+        self,
+        incarnation_repository: str,
+        target_directory: str,
+        commit_sha: GitSha,
+        merge_request_id: str | None,
+        pipeline_timeout: timedelta | None = None,
+    ) -> ReconciliationStatus: ...
+
+
+class ReconciliationStatusKey(NamedTuple):
+    incarnation_repository: str
+    target_directory: str
+    commit_sha: GitSha
+    merge_request_id: str | None
+
+
+@dataclass(frozen=True)
+class TrackedReconciliationStatus:
+    status: ReconciliationStatus
+    refreshed_at: datetime
+
+
+class ReconciliationStatusTracker:
+    """Keeps the reconciliation status of incarnations up-to-date in the background.
+
+    Statuses are looked up once without waiting for pipelines to appear. As a commit without a pipeline looks
+    successful then, even if its pipeline just wasn't created yet, successful statuses are confirmed once in the
+    background (waiting for a pipeline to appear). From then on, a bounded pool of workers refreshes pending statuses
+    every `refresh_interval` (allowing them to wait up to `pipeline_timeout` for a pipeline) and all other statuses
+    once they are older than `max_age`. Readers always get the cached status immediately. Statuses which weren't read
+    for `idle_timeout` are no longer tracked.
+    """
+
+    def __init__(
+        self,
+        source: ReconciliationStatusSource,
+        workers: int = 4,
+        refresh_interval: timedelta = timedelta(seconds=15),
+        max_age: timedelta = timedelta(minutes=10),
+        pipeline_timeout: timedelta = timedelta(seconds=10),
+        max_entries: int = 10_000,
+        idle_timeout: timedelta = timedelta(minutes=10),
+    ) -> None:
+        self._source = source
+        self._workers = workers
+        self._refresh_interval = refresh_interval
+        self._max_age = max_age
+        self._pipeline_timeout = pipeline_timeout
+        self._max_entries = max_entries
+        self._idle_timeout = idle_timeout
+
+        self._statuses: OrderedDict[ReconciliationStatusKey, TrackedReconciliationStatus] = OrderedDict()
+        self._read_at: dict[ReconciliationStatusKey, datetime] = {}
+        self._queue: asyncio.Queue[ReconciliationStatusKey] = asyncio.Queue()
+        self._queued: set[ReconciliationStatusKey] = set()
+        self._tasks: list[asyncio.Task] = []
+
+    async def get(self, key: ReconciliationStatusKey) -> TrackedReconciliationStatus:
+        self._ensure_started()
+
+        if (tracked := self._statuses.get(key)) is None:
+            tracked = await self._refresh(key, pipeline_timeout=timedelta())
+            if tracked.status == ReconciliationStatus.SUCCESS:
+                self._enqueue(key)
+        else:
+            self._statuses.move_to_end(key)
+            if datetime.now(timezone.utc) - tracked.refreshed_at > self._max_age:
+                self._enqueue(key)
+
+        self._read_at[key] = datetime.now(timezone.utc)
+        return tracked
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    def _ensure_started(self) -> None:
+        if self._tasks:
+            return
+
+        self._tasks.append(asyncio.create_task(self._schedule_refreshes()))
+        self._tasks.extend(asyncio.create_task(self._work()) for _ in range(self._workers))
+
+    def _enqueue(self, key: ReconciliationStatusKey) -> None:
+        if key not in self._queued:
+            self._queued.add(key)
+            self._queue.put_nowait(key)
+
+    async def _schedule_refreshes(self) -> None:
+        while True:
+            await asyncio.sleep(self._refresh_interval.total_seconds())
+
+            now = datetime.now(timezone.utc)
+            for key, tracked in list(self._statuses.items()):
+                if now - self._read_at.get(key, tracked.refreshed_at) > self._idle_timeout:
+                    self._forget(key)
+                elif tracked.status in PENDING_STATUSES:
+                    self._enqueue(key)
+
+    async def _work(self) -> None:
+        while True:
+            key = await self._queue.get()
+            try:
+                if key in self._statuses:
+                    await self._refresh(key, pipeline_timeout=self._pipeline_timeout)
+            except Exception:
+                logger.exception("failed to refresh reconciliation status", key=key)
+            finally:
+                self._queued.discard(key)
+                self._queue.task_done()
+
+    async def _refresh(self, key: ReconciliationStatusKey, pipeline_timeout: timedelta) -> TrackedReconciliationStatus:
+        status = await self._source.get_reconciliation_status(
+            incarnation_repository=key.incarnation_repository,
+            target_directory=key.target_directory,
+            commit_sha=key.commit_sha,
+            merge_request_id=key.merge_request_id,
+            pipeline_timeout=pipeline_timeout,
+        )
+        return self._store(key, status)
+
+    def _store(self, key: ReconciliationStatusKey, status: ReconciliationStatus) -> TrackedReconciliationStatus:
+        tracked = TrackedReconciliationStatus(status=status, refreshed_at=datetime.now(timezone.utc))
+
+        self._statuses[key] = tracked
+        self._statuses.move_to_end(key)
+        while len(self._statuses) > self._max_entries:
+            self._forget(next(iter(self._statuses)))
+
+        return tracked
+
+    def _forget(self, key: ReconciliationStatusKey) -> None:
+        self._statuses.pop(key, None)
+        self._read_at.pop(key, None)
@@ -0,0 +1,78 @@
+import asyncio
+import uuid
+from contextlib import asynccontextmanager
+from datetime import timedelta
+from typing import AsyncIterator
+
+from foxops.database.repositories.repository_lock.repository import (
+    RepositoryLockRepository,
+)
+from foxops.logger import get_logger
+
+#: Holds the module logger
+logger = get_logger(__name__)
+
+
+class RepositoryLocks:
+    """Serializes changes which push to the same repository, so that their pushes don't have to be retried.
+
+    Within a process, changes wait for a lock per repository. With a `lock_repository`, the holder of that lock
+    additionally takes a lease in the database, which serializes the changes of all processes (API servers and
+    workers) sharing the database. The lease is renewed while it's held and expires if its process stops unexpectedly.
+    """
+
+    def __init__(
+        self,
+        lock_repository: RepositoryLockRepository | None = None,
+        lease: timedelta = timedelta(minutes=1),
+        poll_interval: timedelta = timedelta(milliseconds=250),
+    ) -> None:
+        self._lock_repository = lock_repository
+        self._lease = lease
+        self._poll_interval = poll_interval
+
+        self._locks: dict[str, asyncio.Lock] = {}
+        self._users: dict[str, int] = {}
+
+    @asynccontextmanager
+    async def locked(self, repository: str) -> AsyncIterator[None]:
+        lock = self._locks.setdefault(repository, asyncio.Lock())
+        self._users[repository] = self._users.get(repository, 0) + 1
+        try:
+            async with lock, self._leased(repository):
+                yield
+        finally:
+            self._users[repository] -= 1
+            if self._users[repository] == 0:
+                del self._users[repository]
+                del self._locks[repository]
+
+    @asynccontextmanager
+    async def _leased(self, repository: str) -> AsyncIterator[None]:
+        if self._lock_repository is None:
+            yield
+            return
+
+        holder = uuid.uuid4().hex
+        while not await self._lock_repository.acquire(repository, holder, self._lease):
+            await asyncio.sleep(self._poll_interval.total_seconds())
+
+        renewals = asyncio.create_task(self._renew(repository, holder))
+        try:
+            yield
+        finally:
+            renewals.cancel()
+            await self._lock_repository.release(repository, holder)
+
+    async def _renew(self, repository: str, holder: str) -> None:
+        assert self._lock_repository is not None
+
+        while True:
+            await asyncio.sleep(self._lease.total_seconds() / 3)
+            try:
+                if not await self._lock_repository.renew(repository, holder, self._lease):
+                    # the push is then (as without a lease) retried if it's rejected
+                    logger.warning("lost the lease on the repository", repository=repository)
+                    return
+            except Exception:
+                logger.exception("failed to renew the lease on the repository", repository=repository)
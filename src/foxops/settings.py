@@ -1,5 +1,7 @@
+from datetime import timedelta
 from enum import Enum
 from pathlib import Path
+from typing import Literal
 
 from pydantic import DirectoryPath, SecretStr
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -9,6 +11,24 @@ from pydantic_settings import BaseSettings, SettingsConfigDict
 # for generating migrations
 class DatabaseSettings(BaseSettings):
     url: SecretStr = SecretStr("sqlite+aiosqlite:///./test.db")
+    # read replicas of the database at `url`, queried instead of it by requests that only read (see `EngineRouter`)
+    read_replica_urls: list[SecretStr] = []
+
+    # connection pool (see https://docs.sqlalchemy.org/en/20/core/pooling.html)
+    pool_size: int = 5
+    max_overflow: int = 10
+    pool_timeout: timedelta = timedelta(seconds=30)
+    pool_recycle: timedelta | None = None
+
+    # maximum duration of a single statement (PostgreSQL only)
+    statement_timeout: timedelta | None = None
+
+    # pragmas applied to every SQLite connection (see https://www.sqlite.org/pragma.html)
+    sqlite_journal_mode: Literal["DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF"] = "WAL"
+    sqlite_synchronous: Literal["OFF", "NORMAL", "FULL", "EXTRA"] = "NORMAL"
+    sqlite_busy_timeout: timedelta = timedelta(seconds=5)
+    sqlite_cache_size_kib: int = 64 * 1024
+    sqlite_mmap_size_bytes: int = 256 * 1024 * 1024
 
     model_config = SettingsConfigDict(env_prefix="foxops_database_", secrets_dir="/var/run/secrets/foxops")
 
@@ -22,6 +42,21 @@ class GitlabHosterSettings(BaseSettings):
     address: str
     token: SecretStr
 
+    # caching of GitLab API responses (see `foxops.hosters.http_cache`)
+    cache_max_entries: int = 1024
+    cache_directory: Path | None = None
+    cache_max_disk_entries: int = 16384
+
+    # adaptive client-side rate limiting (see `foxops.hosters.rate_limit`)
+    max_concurrent_requests: int = 32
+    max_retries: int = 5
+
+    # maximum time to wait for GitLab to check the mergeability of a new merge request before automerging it
+    mergeability_check_timeout: timedelta = timedelta(seconds=30)
+
+    # number of template versions which are kept unpacked on disk (see `foxops.hosters.template_archive`)
+    template_archive_cache_max_entries: int = 32
+
     model_config = SettingsConfigDict(env_prefix="foxops_hoster_gitlab_", secrets_dir="/var/run/secrets/foxops")
 
 
@@ -38,4 +73,24 @@ class Settings(BaseSettings):
 
     hoster_type: HosterType = HosterType.LOCAL
 
+    # secret token which the hoster must send along with webhook events (webhooks are disabled if not set)
+    webhook_secret_token: SecretStr | None = None
+    # merge request and pipeline states received via webhooks are used for at most this long
+    hoster_state_max_age: timedelta = timedelta(minutes=10)
+
+    # background refreshing of the reconciliation status of incarnations
+    # (see `foxops.services.reconciliation_status`)
+    reconciliation_status_workers: int = 4
+    reconciliation_status_refresh_interval: timedelta = timedelta(seconds=15)
+
+    # create merge request branches through the commits API of the hoster instead of pushing them with git
+    commit_via_hoster_api: bool = False
+
+    # asynchronous execution of changes (see `foxops.services.job`).
+    # With 0 workers, jobs are only executed by separate `foxops-worker` processes.
+    job_workers: int = 4
+    job_poll_interval: timedelta = timedelta(seconds=1)
+    job_heartbeat_timeout: timedelta = timedelta(minutes=2)
+    job_shutdown_timeout: timedelta = timedelta(seconds=30)
+
     model_config = SettingsConfigDict(env_prefix="foxops_", secrets_dir="/var/run/secrets/foxops")
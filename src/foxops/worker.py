@@ -0,0 +1,81 @@
+"""Executes asynchronously requested changes in a separate process (next to, or instead of, the API server).
+
+The API server and all worker processes share the job queue in the database.
+"""
+
+import asyncio
+
+import typer
+
+from foxops.database.engine import create_engine
+from foxops.database.repositories.change.repository import ChangeRepository
+from foxops.database.repositories.hoster_state.repository import HosterStateRepository
+from foxops.database.repositories.incarnation.repository import IncarnationRepository
+from foxops.database.repositories.job.repository import JobRepository
+from foxops.database.repositories.repository_lock.repository import (
+    RepositoryLockRepository,
+)
+from foxops.dependencies import create_hoster, get_database_settings, get_settings
+from foxops.logger import get_logger, setup_logging
+from foxops.services.change import ChangeService, ProgressCallback
+from foxops.services.hoster_state import HosterStateService
+from foxops.services.job import JobWorkerPool
+from foxops.services.repository_lock import RepositoryLocks
+
+app = typer.Typer()
+
+#: Holds the module logger
+logger = get_logger(__name__)
+
+
+async def run_workers(workers: int) -> None:
+    settings = get_settings()
+    database_settings = get_database_settings()
+
+    engine = create_engine(database_settings.url.get_secret_value(), database_settings)
+    hoster = create_hoster(settings)
+    hoster_state_service = HosterStateService(
+        hoster=hoster,
+        hoster_state_repository=HosterStateRepository(engine),
+        max_age=settings.hoster_state_max_age,
+        webhooks_enabled=settings.webhook_secret_token is not None,
+    )
+    repository_locks = RepositoryLocks(RepositoryLockRepository(engine))
+
+    def create_change_service(progress: ProgressCallback) -> ChangeService:
+        return ChangeService(
+            hoster=hoster,
+            incarnation_repository=IncarnationRepository(engine),
+            change_repository=ChangeRepository(engine),
+            hoster_state_service=hoster_state_service,
+            commit_via_hoster_api=settings.commit_via_hoster_api,
+            progress=progress,
+            repository_locks=repository_locks,
+        )
+
+    worker_pool = JobWorkerPool(
+        JobRepository(engine),
+        create_change_service,
+        workers=workers,
+        poll_interval=settings.job_poll_interval,
+        heartbeat_timeout=settings.job_heartbeat_timeout,
+        shutdown_timeout=settings.job_shutdown_timeout,
+    )
+
+    logger.info("starting job workers", workers=workers)
+    try:
+        await worker_pool.run()
+    finally:
+        await worker_pool.stop()
+        await engine.dispose()
+
+
+@app.command(help="Executes the jobs of asynchronously requested changes")
+def main(workers: int = typer.Option(4, help="Number of jobs which are executed concurrently")):
+    setup_logging(level=get_settings().log_level)
+
+    asyncio.run(run_workers(workers))
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,21 @@
+from pathlib import Path
+from typing import Iterator
+
+import pytest
+
+from foxops.hosters.gitlab import GitlabHoster
+from tests._plugins.gitlab_simulator import GitlabSimulator
+
+
+@pytest.fixture
+def gitlab_simulator(tmp_path: Path) -> Iterator[GitlabSimulator]:
+    """Runs a GitLab simulator for the test. Its `config` can be changed at any time."""
+
+    simulator = GitlabSimulator(tmp_path / "gitlab")
+    with simulator.serve():
+        yield simulator
+
+
+@pytest.fixture
+def simulated_gitlab_hoster(gitlab_simulator: GitlabSimulator) -> GitlabHoster:
+    return GitlabHoster(gitlab_simulator.address, gitlab_simulator.config.token)
@@ -0,0 +1,782 @@
+"""In-process simulator of the parts of the GitLab API (and git smart HTTP) that are used by `GitlabHoster`.
+
+Projects are backed by bare git repositories in a local directory. Merge requests and pipelines are kept in memory.
+Response latencies, rate limiting, server errors, mergeability checks and pipeline durations are configurable,
+which makes the simulator usable for offline load testing (see `benchmarks/`), as well as for tests.
+
+Start it with `GitlabSimulator.serve()`, which runs it in a background thread and yields its address.
+"""
+
+import asyncio
+import base64
+import math
+import os
+import random
+import re
+import subprocess
+import tempfile
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Iterator
+from urllib.parse import unquote_plus
+
+import uvicorn
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.types import Receive, Scope, Send
+
+ZERO_SHA = "0" * 40
+
+
+@dataclass(frozen=True)
+class Latency:
+    """Log-normal distributed duration (in seconds), given by its median and the standard deviation of its log."""
+
+    median: float = 0.0
+    sigma: float = 0.0
+
+    def sample(self, rng: random.Random) -> float:
+        if self.median <= 0:
+            return 0.0
+        if self.sigma <= 0:
+            return self.median
+        return rng.lognormvariate(math.log(self.median), self.sigma)
+
+
+@dataclass
+class SimulatorConfig:
+    #: latency of all API and git requests, unless overridden per endpoint (by the names used in `GitlabSimulator`)
+    latency: Latency = field(default_factory=Latency)
+    endpoint_latency: dict[str, Latency] = field(default_factory=dict)
+
+    #: maximum number of API requests per second (like the GitLab rate limits), `None` for no limit
+    rate_limit: int | None = None
+    #: probability with which API requests are randomly rejected with `429 Too Many Requests` / a `5xx` error
+    rate_limit_probability: float = 0.0
+    server_error_probability: float = 0.0
+    server_error_status_codes: tuple[int, ...] = (502, 503, 504)
+    retry_after: int = 1
+
+    #: time it takes GitLab to check the mergeability of a merge request after its source branch changed
+    mergeability_check_duration: float = 0.0
+
+    #: duration and failure probability of the pipelines started for commits that contain a `.gitlab-ci.yml`
+    pipeline_duration: Latency = field(default_factory=Latency)
+    pipeline_failure_probability: float = 0.0
+
+    token: str = "simulator-token"
+    seed: int | None = None
+
+
+class GitlabApiError(Exception):
+    def __init__(self, status_code: int, message: str) -> None:
+        super().__init__(status_code, message)
+        self.status_code = status_code
+        self.message = message
+
+
+@dataclass
+class Pipeline:
+    id: int
+    sha: str
+    ref: str
+    created_at: float
+    duration: float
+    fails: bool
+
+    @property
+    def status(self) -> str:
+        if time.monotonic() < self.created_at + self.duration:
+            return "running"
+        return "failed" if self.fails else "success"
+
+
+@dataclass
+class MergeRequest:
+    iid: int
+    source_branch: str
+    target_branch: str
+    title: str
+    description: str
+    remove_source_branch: bool
+    checked_at: float
+    state: str = "opened"
+    sha: str | None = None
+    merge_commit_sha: str | None = None
+    merge_commit_message: str | None = None
+    merge_when_pipeline_succeeds: bool = False
+
+
+@dataclass
+class Project:
+    id: int
+    path: str
+    directory: Path
+    default_branch: str = "main"
+    merge_requests: dict[int, MergeRequest] = field(default_factory=dict)
+    pipelines: dict[str, Pipeline] = field(default_factory=dict)
+
+
+Handler = Callable[..., Awaitable[Response]]
+
+
+class GitlabSimulator:
+    def __init__(self, directory: Path, config: SimulatorConfig | None = None) -> None:
+        self.directory = directory
+        self.config = config or SimulatorConfig()
+        self.address = "http://127.0.0.1"
+
+        #: number of handled requests per endpoint (including rejected ones)
+        self.requests: Counter[str] = Counter()
+
+        self._rng = random.Random(self.config.seed)
+        self._projects: dict[str, Project] = {}
+        self._lock = threading.RLock()
+        self._ids = iter(range(1, 2**31))
+        self._rate_limit_window = 0
+        self._rate_limit_count = 0
+
+        project = r"/api/v4/projects/(?P<project>[^/]+)"
+        routes: list[tuple[str, str, str, Handler]] = [
+            ("version", "GET", r"/api/v4/version", self._get_version),
+            ("projects", "GET", project, self._get_project),
+            ("files", "GET", project + r"/repository/files/(?P<file_path>[^/]+)", self._get_file),
+            ("branches", "GET", project + r"/repository/branches/(?P<branch>[^/]+)", self._get_branch),
+            ("commits", "GET", project + r"/repository/commits/(?P<ref>[^/]+)", self._get_commit),
+            ("commits", "POST", project + r"/repository/commits", self._create_commit),
+            ("archive", "GET", project + r"/repository/archive\.tar\.gz", self._get_archive),
+            ("tree", "GET", project + r"/repository/tree", self._get_tree),
+            ("pipelines", "GET", project + r"/pipelines", self._list_pipelines),
+            ("merge_requests", "GET", project + r"/merge_requests", self._list_merge_requests),
+            ("merge_requests", "POST", project + r"/merge_requests", self._create_merge_request),
+            ("merge_requests", "GET", project + r"/merge_requests/(?P<iid>\d+)", self._get_merge_request),
+            ("merge_requests", "PUT", project + r"/merge_requests/(?P<iid>\d+)", self._update_merge_request),
+            ("merge", "PUT", project + r"/merge_requests/(?P<iid>\d+)/merge", self._merge_merge_request),
+            ("graphql", "POST", r"/api/graphql", self._graphql),
+        ]
+        self._routes = [(name, method, re.compile(pattern), handler) for name, method, pattern, handler in routes]
+
+    ######
+    # Setup
+    ######
+
+    @contextmanager
+    def serve(self) -> Iterator[str]:
+        """Serves the simulator on a random local port in a background thread and yields its address."""
+
+        server = uvicorn.Server(uvicorn.Config(self, host="127.0.0.1", port=0, log_level="warning", lifespan="off"))
+        thread = threading.Thread(target=server.run, daemon=True)
+        thread.start()
+        while not server.started:
+            if not thread.is_alive():
+                raise RuntimeError("failed to start the GitLab simulator")
+            time.sleep(0.01)
+
+        port = server.servers[0].sockets[0].getsockname()[1]
+        self.address = f"http://127.0.0.1:{port}"
+        try:
+            yield self.address
+        finally:
+            server.should_exit = True
+            thread.join()
+
+    def create_project(self, path: str, files: dict[str, bytes] | None = None, default_branch: str = "main") -> int:
+        """Creates a project (with an initial commit containing the given files, if any) and returns its ID."""
+
+        directory = self.directory / f"{path}.git"
+        directory.mkdir(parents=True)
+        _git(directory, "init", "--bare", f"--initial-branch={default_branch}")
+        _git(directory, "config", "http.receivepack", "true")
+
+        with self._lock:
+            project = Project(id=next(self._ids), path=path, directory=directory, default_branch=default_branch)
+            self._projects[path] = project
+
+        if files is not None:
+            self.commit_files(path, files, message="Initial commit")
+        return project.id
+
+    def commit_files(self, path: str, files: dict[str, bytes], branch: str | None = None, message: str = "") -> str:
+        """Creates (or overwrites) the given files on a branch (the default branch if not given)."""
+
+        project = self._project(path)
+        actions = [
+            {"action": "upsert", "file_path": file_path, "content": base64.b64encode(content).decode()}
+            for file_path, content in files.items()
+        ]
+        return self._commit(project, branch or project.default_branch, message or "update files", actions)
+
+    def create_tag(self, path: str, tag: str, ref: str | None = None) -> None:
+        project = self._project(path)
+        _git(project.directory, "tag", tag, ref or project.default_branch)
+
+    ######
+    # ASGI
+    ######
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            return
+
+        request = Request(scope, receive)
+        response = await self._handle(request)
+        await response(scope, receive, send)
+
+    async def _handle(self, request: Request) -> Response:
+        path = request.scope["raw_path"].decode().split("?")[0]
+        if not path.startswith("/api/"):
+            self.requests["git"] += 1
+            await self._delay("git")
+            return await self._git_http_backend(request, path)
+
+        for name, method, pattern, handler in self._routes:
+            if (match := pattern.fullmatch(path)) is None:
+                continue
+            if method != request.method and not (method == "GET" and request.method == "HEAD"):
+                continue
+
+            self.requests[name] += 1
+            await self._delay(name)
+            if (rejection := self._reject(request)) is not None:
+                return rejection
+
+            try:
+                response = await handler(request, **{k: unquote_plus(v) for k, v in match.groupdict().items()})
+            except GitlabApiError as e:
+                response = JSONResponse({"message": e.message}, status_code=e.status_code)
+            response.headers.update(self._rate_limit_headers())
+            return response
+
+        return JSONResponse({"message": "404 Not Found"}, status_code=404)
+
+    async def _delay(self, endpoint: str) -> None:
+        latency = self.config.endpoint_latency.get(endpoint, self.config.latency)
+        if (seconds := latency.sample(self._rng)) > 0:
+            await asyncio.sleep(seconds)
+
+    def _reject(self, request: Request) -> Response | None:
+        authorization = request.headers.get("authorization", "").removeprefix("Bearer ")
+        if request.headers.get("private-token", authorization) != self.config.token:
+            return JSONResponse({"message": "401 Unauthorized"}, status_code=401)
+
+        retry_after = {"Retry-After": str(self.config.retry_after)}
+        if self._rng.random() < self.config.rate_limit_probability:
+            return JSONResponse({"message": "Retry later"}, status_code=429, headers=retry_after)
+        if self._rng.random() < self.config.server_error_probability:
+            status_code = self._rng.choice(self.config.server_error_status_codes)
+            return JSONResponse({"message": "simulated server error"}, status_code=status_code)
+
+        if self.config.rate_limit is not None:
+            window = int(time.time())
+            if window != self._rate_limit_window:
+                self._rate_limit_window, self._rate_limit_count = window, 0
+            self._rate_limit_count += 1
+            if self._rate_limit_count > self.config.rate_limit:
+                return JSONResponse(
+                    {"message": "Retry later"},
+                    status_code=429,
+                    headers={"Retry-After": "1"} | self._rate_limit_headers(),
+                )
+
+        return None
+
+    def _rate_limit_headers(self) -> dict[str, str]:
+        if self.config.rate_limit is None:
+            return {}
+        return {
+            "RateLimit-Limit": str(self.config.rate_limit),
+            "RateLimit-Remaining": str(max(self.config.rate_limit - self._rate_limit_count, 0)),
+            "RateLimit-Reset": str(self._rate_limit_window + 1),
+        }
+
+    ######
+    # Git Smart HTTP
+    ######
+
+    async def _git_http_backend(self, request: Request, path: str) -> Response:
+        if (match := re.fullmatch(r"/(?P<project>.+?)\.git(?P<path_info>/.*)", path)) is None:
+            return Response(status_code=404)
+        project = self._projects.get(unquote_plus(match["project"]))
+        if project is None:
+            return Response(status_code=404)
+
+        env = os.environ | {
+            "GIT_PROJECT_ROOT": str(self.directory),
+            "GIT_HTTP_EXPORT_ALL": "1",
+            "PATH_INFO": f"/{project.path}.git{match['path_info']}",
+            "REQUEST_METHOD": request.method,
+            "QUERY_STRING": request.url.query,
+            "CONTENT_TYPE": request.headers.get("content-type", ""),
+            "HTTP_CONTENT_ENCODING": request.headers.get("content-encoding", ""),
+            "GIT_PROTOCOL": request.headers.get("git-protocol", ""),
+        }
+        body = await request.body()
+        refs_before = await asyncio.to_thread(_refs, project.directory)
+
+        process = await asyncio.create_subprocess_exec(
+            "git", "http-backend", env=env, stdin=subprocess.PIPE, stdout=subprocess.PIPE
+        )
+        output, _ = await process.communicate(body)
+
+        refs_after = await asyncio.to_thread(_refs, project.directory)
+        for ref, sha in refs_after.items():
+            if refs_before.get(ref) != sha and ref.startswith("refs/heads/"):
+                self._on_branch_updated(project, ref.removeprefix("refs/heads/"), sha)
+
+        raw_headers, _, content = output.partition(b"\r\n\r\n")
+        headers = dict(line.split(": ", 1) for line in raw_headers.decode().split("\r\n") if line)
+        status_code = int(headers.pop("Status", "200").split()[0])
+        return Response(content, status_code=status_code, headers=headers)
+
+    ######
+    # REST API
+    ######
+
+    async def _get_version(self, request: Request) -> Response:
+        return JSONResponse({"version": "17.0.0-simulator", "revision": "simulator"})
+
+    async def _get_project(self, request: Request, project: str) -> Response:
+        return JSONResponse(self._project_json(self._project(project)))
+
+    async def _get_file(self, request: Request, project: str, file_path: str) -> Response:
+        p = self._project(project)
+        ref = request.query_params.get("ref", p.default_branch)
+        commit = await asyncio.to_thread(self._resolve, p, ref)
+        if commit is None:
+            raise GitlabApiError(404, "404 Commit Not Found")
+
+        content = await asyncio.to_thread(_git_or_none, p.directory, "cat-file", "blob", f"{commit}:{file_path}")
+        if content is None:
+            raise GitlabApiError(404, "404 File Not Found")
+        last_commit_id = await asyncio.to_thread(_git, p.directory, "log", "-1", "--format=%H", commit, "--", file_path)
+        blob_id = await asyncio.to_thread(_git, p.directory, "rev-parse", f"{commit}:{file_path}")
+
+        return JSONResponse(
+            {
+                "file_name": file_path.rsplit("/", 1)[-1],
+                "file_path": file_path,
+                "size": len(content),
+                "encoding": "base64",
+                "content": base64.b64encode(content).decode(),
+                "ref": ref,
+                "blob_id": blob_id.decode().strip(),
+                "commit_id": commit,
+                "last_commit_id": last_commit_id.decode().strip(),
+            }
+        )
+
+    async def _get_branch(self, request: Request, project: str, branch: str) -> Response:
+        p = self._project(project)
+        commit = await asyncio.to_thread(self._resolve, p, f"refs/heads/{branch}")
+        if commit is None:
+            raise GitlabApiError(404, "404 Branch Not Found")
+
+        return JSONResponse({"name": branch, "commit": {"id": commit}, "default": branch == p.default_branch})
+
+    async def _get_commit(self, request: Request, project: str, ref: str) -> Response:
+        p = self._project(project)
+        commit = await asyncio.to_thread(self._resolve, p, ref)
+        if commit is None:
+            raise GitlabApiError(404, "404 Commit Not Found")
+
+        pipeline = p.pipelines.get(commit)
+        return JSONResponse(
+            {
+                "id": commit,
+                "short_id": commit[:8],
+                "status": pipeline.status if pipeline is not None else None,
+                "last_pipeline": self._pipeline_json(p, pipeline) if pipeline is not None else None,
+            }
+        )
+
+    async def _create_commit(self, request: Request, project: str) -> Response:
+        p = self._project(project)
+        data = await request.json()
+
+        sha = await asyncio.to_thread(
+            self._commit, p, data["branch"], data["commit_message"], data["actions"], data.get("start_sha")
+        )
+        return JSONResponse({"id": sha, "short_id": sha[:8], "message": data["commit_message"]}, status_code=201)
+
+    async def _get_archive(self, request: Request, project: str) -> Response:
+        p = self._project(project)
+        commit = await asyncio.to_thread(self._resolve, p, request.query_params.get("sha", p.default_branch))
+        if commit is None:
+            raise GitlabApiError(404, "404 Commit Not Found")
+
+        prefix = f"{p.path.rsplit('/', 1)[-1]}-{commit}/"
+        archive = await asyncio.to_thread(_git, p.directory, "archive", "--format=tar.gz", f"--prefix={prefix}", commit)
+        return Response(archive, media_type="application/octet-stream")
+
+    async def _get_tree(self, request: Request, project: str) -> Response:
+        """Lists the whole tree on a single page (only recursive listings are supported)."""
+        p = self._project(project)
+        commit = await asyncio.to_thread(self._resolve, p, request.query_params.get("ref", p.default_branch))
+        if commit is None:
+            raise GitlabApiError(404, "404 Tree Not Found")
+
+        output = await asyncio.to_thread(_git, p.directory, "ls-tree", "-r", "-z", commit)
+        entries = []
+        for line in output.decode().split("\0"):
+            if not line:
+                continue
+            meta, path = line.split("\t", 1)
+            mode, type_, sha = meta.split(" ")
+            entries.append({"id": sha, "name": path.rsplit("/", 1)[-1], "type": type_, "path": path, "mode": mode})
+        return JSONResponse(entries)
+
+    async def _list_pipelines(self, request: Request, project: str) -> Response:
+        p = self._project(project)
+        sha = request.query_params.get("sha")
+        pipelines = [pipeline for pipeline in p.pipelines.values() if sha is None or pipeline.sha == sha]
+        return JSONResponse([self._pipeline_json(p, pipeline) for pipeline in sorted(pipelines, key=lambda x: -x.id)])
+
+    async def _list_merge_requests(self, request: Request, project: str) -> Response:
+        p = self._project(project)
+        state = request.query_params.get("state")
+        source_branch = request.query_params.get("source_branch")
+
+        merge_requests = []
+        for merge_request in list(p.merge_requests.values()):
+            await asyncio.to_thread(self._settle, p, merge_request)
+            if state not in (None, "all", merge_request.state):
+                continue
+            if source_branch is not None and merge_request.source_branch != source_branch:
+                continue
+            merge_requests.append(await asyncio.to_thread(self._merge_request_json, p, merge_request))
+
+        return JSONResponse(merge_requests)
+
+    async def _create_merge_request(self, request: Request, project: str) -> Response:
+        p = self._project(project)
+        data = await request.json()
+
+        if await asyncio.to_thread(self._resolve, p, f"refs/heads/{data['source_branch']}") is None:
+            raise GitlabApiError(400, "Source branch does not exist")
+        if any(mr.state == "opened" and mr.source_branch == data["source_branch"] for mr in p.merge_requests.values()):
+            raise GitlabApiError(409, "Another open merge request already exists for this source branch")
+
+        with self._lock:
+            merge_request = MergeRequest(
+                iid=len(p.merge_requests) + 1,
+                source_branch=data["source_branch"],
+                target_branch=data.get("target_branch", p.default_branch),
+                title=data["title"],
+                description=data.get("description", ""),
+                remove_source_branch=str(data.get("remove_source_branch", False)).lower() == "true",
+                checked_at=time.monotonic() + self.config.mergeability_check_duration,
+            )
+            p.merge_requests[merge_request.iid] = merge_request
+
+        return JSONResponse(await asyncio.to_thread(self._merge_request_json, p, merge_request), status_code=201)
+
+    async def _get_merge_request(self, request: Request, project: str, iid: str) -> Response:
+        p = self._project(project)
+        merge_request = self._merge_request(p, iid)
+
+        await asyncio.to_thread(self._settle, p, merge_request)
+        return JSONResponse(await asyncio.to_thread(self._merge_request_json, p, merge_request))
+
+    async def _update_merge_request(self, request: Request, project: str, iid: str) -> Response:
+        p = self._project(project)
+        merge_request = self._merge_request(p, iid)
+        data = await request.json()
+
+        match data.get("state_event"):
+            case "close" if merge_request.state == "opened":
+                merge_request.state = "closed"
+            case "reopen" if merge_request.state == "closed":
+                merge_request.state = "opened"
+
+        return JSONResponse(await asyncio.to_thread(self._merge_request_json, p, merge_request))
+
+    async def _merge_merge_request(self, request: Request, project: str, iid: str) -> Response:
+        p = self._project(project)
+        merge_request = self._merge_request(p, iid)
+        data = await request.json()
+
+        if merge_request.state != "opened":
+            raise GitlabApiError(405, "405 Method Not Allowed")
+        if time.monotonic() < merge_request.checked_at:
+            raise GitlabApiError(405, "405 Method Not Allowed")
+
+        merge_request.merge_commit_message = data.get("merge_commit_message")
+        source_sha = await asyncio.to_thread(self._source_sha, p, merge_request)
+        head_pipeline = p.pipelines.get(source_sha or "")
+        if data.get("merge_when_pipeline_succeeds") and head_pipeline is not None and head_pipeline.status != "success":
+            merge_request.merge_when_pipeline_succeeds = True
+        else:
+            await asyncio.to_thread(self._merge, p, merge_request)
+
+        return JSONResponse(await asyncio.to_thread(self._merge_request_json, p, merge_request))
+
+    async def _graphql(self, request: Request) -> Response:
+        # only the aliased `project(fullPath:) { mergeRequests(iids:) { nodes { iid state } } }` queries
+        # of `GitlabHoster.get_merge_request_statuses` are supported, so the variables contain all we need
+        variables = (await request.json())["variables"]
+
+        data: dict[str, Any] = {}
+        for name, path in variables.items():
+            if not name.startswith("path"):
+                continue
+            index = name.removeprefix("path")
+            if (project := self._projects.get(path)) is None:
+                data[f"p{index}"] = None
+                continue
+
+            nodes = []
+            for iid in variables[f"iids{index}"]:
+                if (merge_request := project.merge_requests.get(int(iid))) is not None:
+                    await asyncio.to_thread(self._settle, project, merge_request)
+                    nodes.append({"iid": iid, "state": merge_request.state})
+            data[f"p{index}"] = {"mergeRequests": {"nodes": nodes}}
+
+        return JSONResponse({"data": data})
+
+    ######
+    # State
+    ######
+
+    def _project(self, identifier: str) -> Project:
+        if identifier.isdigit():
+            project = next((p for p in self._projects.values() if p.id == int(identifier)), None)
+        else:
+            project = self._projects.get(identifier)
+        if project is None:
+            raise GitlabApiError(404, "404 Project Not Found")
+        return project
+
+    def _merge_request(self, project: Project, iid: str) -> MergeRequest:
+        if (merge_request := project.merge_requests.get(int(iid))) is None:
+            raise GitlabApiError(404, "404 Not found")
+        return merge_request
+
+    def _resolve(self, project: Project, ref: str) -> str | None:
+        output = _git_or_none(project.directory, "rev-parse", "--verify", "--quiet", f"{ref}^{{commit}}")
+        return output.decode().strip() if output is not None else None
+
+    def _source_sha(self, project: Project, merge_request: MergeRequest) -> str | None:
+        if merge_request.state == "merged":
+            return merge_request.sha
+        return self._resolve(project, f"refs/heads/{merge_request.source_branch}")
+
+    def _commit(
+        self, project: Project, branch: str, message: str, actions: list[dict[str, Any]], start_sha: str | None = None
+    ) -> str:
+        """Applies the actions of a GitLab commits API request to the repository, without a working tree."""
+
+        with self._lock:
+            current = self._resolve(project, f"refs/heads/{branch}")
+            if start_sha is not None:
+                if current is not None:
+                    raise GitlabApiError(400, f"A branch called '{branch}' already exists")
+                if (parent := self._resolve(project, start_sha)) is None:
+                    raise GitlabApiError(400, "Invalid start_sha")
+            else:
+                parent = current
+                if parent is None and _refs(project.directory):
+                    raise GitlabApiError(400, "You can only create or edit files when you are on a branch")
+
+            with tempfile.NamedTemporaryFile() as index:
+                env = {"GIT_INDEX_FILE": index.name}
+                _git(project.directory, "read-tree", *([parent] if parent else ["--empty"]), env=env)
+                for action in actions:
+                    self._apply_commit_action(project, action, env)
+                tree = _git(project.directory, "write-tree", env=env).decode().strip()
+
+            commit = _commit_tree(project.directory, tree, [parent] if parent else [], message)
+            _git(project.directory, "update-ref", f"refs/heads/{branch}", commit, current or ZERO_SHA)
+
+        self._on_branch_updated(project, branch, commit)
+        return commit
+
+    def _apply_commit_action(self, project: Project, action: dict[str, Any], env: dict[str, str]) -> None:
+        def _entry(path: str) -> tuple[str, str] | None:
+            output = _git(project.directory, "ls-files", "--stage", "--", path, env=env).decode()
+            if not output:
+                return None
+            mode, blob, _ = output.split(" ", 2)
+            return mode, blob
+
+        file_path = action["file_path"]
+        existing = _entry(file_path)
+        match action["action"]:
+            case "create" if existing is not None:
+                raise GitlabApiError(400, "A file with this name already exists")
+            case "update" | "delete" if existing is None:
+                raise GitlabApiError(400, "A file with this name doesn't exist")
+            case "delete":
+                _git(project.directory, "update-index", "--force-remove", "--", file_path, env=env)
+                return
+            case "move":
+                if (existing := _entry(action["previous_path"])) is None:
+                    raise GitlabApiError(400, "A file with this name doesn't exist")
+                _git(project.directory, "update-index", "--force-remove", "--", action["previous_path"], env=env)
+
+        if (content := action.get("content")) is not None:
+            data = base64.b64decode(content) if action.get("encoding", "base64") == "base64" else content.encode()
+            blob = _git(project.directory, "hash-object", "-w", "--stdin", input=data).decode().strip()
+        elif existing is not None:
+            blob = existing[1]
+        else:
+            raise GitlabApiError(400, "content is missing")
+
+        mode = existing[0] if existing is not None else "100644"
+        if "execute_filemode" in action:
+            mode = "100755" if action["execute_filemode"] else "100644"
+        _git(project.directory, "update-index", "--add", "--cacheinfo", f"{mode},{blob},{file_path}", env=env)
+
+    def _on_branch_updated(self, project: Project, branch: str, sha: str) -> None:
+        if _git_or_none(project.directory, "cat-file", "-e", f"{sha}:.gitlab-ci.yml") is not None:
+            with self._lock:
+                project.pipelines[sha] = Pipeline(
+                    id=next(self._ids),
+                    sha=sha,
+                    ref=branch,
+                    created_at=time.monotonic(),
+                    duration=self.config.pipeline_duration.sample(self._rng),
+                    fails=self._rng.random() < self.config.pipeline_failure_probability,
+                )
+
+        for merge_request in project.merge_requests.values():
+            if merge_request.state == "opened" and branch in (merge_request.source_branch, merge_request.target_branch):
+                merge_request.checked_at = time.monotonic() + self.config.mergeability_check_duration
+
+    def _has_conflicts(self, project: Project, merge_request: MergeRequest) -> bool:
+        result = subprocess.run(
+            ["git", "merge-tree", "--write-tree", merge_request.target_branch, merge_request.source_branch],
+            cwd=project.directory,
+            capture_output=True,
+        )
+        return result.returncode != 0
+
+    def _settle(self, project: Project, merge_request: MergeRequest) -> None:
+        """Merges the merge request if it was set to be merged when its pipeline succeeds and that happened."""
+
+        if merge_request.state != "opened" or not merge_request.merge_when_pipeline_succeeds:
+            return
+
+        pipeline = project.pipelines.get(self._source_sha(project, merge_request) or "")
+        if (pipeline is None or pipeline.status == "success") and not self._has_conflicts(project, merge_request):
+            self._merge(project, merge_request)
+
+    def _merge(self, project: Project, merge_request: MergeRequest) -> None:
+        with self._lock:
+            if merge_request.state != "opened":
+                return
+            if self._has_conflicts(project, merge_request):
+                raise GitlabApiError(406, "Branch cannot be merged")
+
+            target = self._resolve(project, f"refs/heads/{merge_request.target_branch}")
+            source = self._resolve(project, f"refs/heads/{merge_request.source_branch}")
+            assert target is not None and source is not None
+
+            tree = (
+                _git(project.directory, "merge-tree", "--write-tree", target, source).decode().splitlines()[0].strip()
+            )
+            message = merge_request.merge_commit_message or (
+                f"Merge branch '{merge_request.source_branch}' into '{merge_request.target_branch}'"
+            )
+            commit = _commit_tree(project.directory, tree, [target, source], message)
+            _git(project.directory, "update-ref", f"refs/heads/{merge_request.target_branch}", commit, target)
+
+            merge_request.state = "merged"
+            merge_request.sha = source
+            merge_request.merge_commit_sha = commit
+            merge_request.merge_when_pipeline_succeeds = False
+            if merge_request.remove_source_branch:
+                _git(project.directory, "update-ref", "-d", f"refs/heads/{merge_request.source_branch}", source)
+
+        self._on_branch_updated(project, merge_request.target_branch, commit)
+
+    ######
+    # Serialization
+    ######
+
+    def _project_json(self, project: Project) -> dict[str, Any]:
+        return {
+            "id": project.id,
+            "path_with_namespace": project.path,
+            "default_branch": project.default_branch,
+            "http_url_to_repo": f"{self.address}/{project.path}.git",
+            "web_url": f"{self.address}/{project.path}",
+        }
+
+    def _pipeline_json(self, project: Project, pipeline: Pipeline) -> dict[str, Any]:
+        return {
+            "id": pipeline.id,
+            "sha": pipeline.sha,
+            "ref": pipeline.ref,
+            "status": pipeline.status,
+            "web_url": f"{self.address}/{project.path}/-/pipelines/{pipeline.id}",
+        }
+
+    def _merge_request_json(self, project: Project, merge_request: MergeRequest) -> dict[str, Any]:
+        sha = self._source_sha(project, merge_request)
+        head_pipeline = project.pipelines.get(sha or "")
+
+        if merge_request.state != "opened":
+            merge_status, detailed_merge_status = "can_be_merged", "not_open"
+        elif time.monotonic() < merge_request.checked_at:
+            merge_status, detailed_merge_status = "checking", "checking"
+        elif self._has_conflicts(project, merge_request):
+            merge_status, detailed_merge_status = "cannot_be_merged", "conflict"
+        else:
+            merge_status, detailed_merge_status = "can_be_merged", "mergeable"
+
+        return {
+            "iid": merge_request.iid,
+            "project_id": project.id,
+            "web_url": f"{self.address}/{project.path}/-/merge_requests/{merge_request.iid}",
+            "title": merge_request.title,
+            "description": merge_request.description,
+            "source_branch": merge_request.source_branch,
+            "target_branch": merge_request.target_branch,
+            "state": merge_request.state,
+            "sha": sha,
+            "merge_status": merge_status,
+            "detailed_merge_status": detailed_merge_status,
+            "merge_commit_sha": merge_request.merge_commit_sha,
+            "merge_when_pipeline_succeeds": merge_request.merge_when_pipeline_succeeds,
+            "head_pipeline": self._pipeline_json(project, head_pipeline) if head_pipeline is not None else None,
+        }
+
+
+def _git(directory: Path, *args: str, input: bytes | None = None, env: dict[str, str] | None = None) -> bytes:
+    result = subprocess.run(
+        ["git", *args],
+        cwd=directory,
+        input=input,
+        env=os.environ | (env or {}),
+        capture_output=True,
+    )
+    if result.returncode != 0:
+        raise GitlabApiError(500, f"git {args[0]} failed: {result.stderr.decode()}")
+    return result.stdout
+
+
+def _git_or_none(directory: Path, *args: str) -> bytes | None:
+    try:
+        return _git(directory, *args)
+    except GitlabApiError:
+        return None
+
+
+def _refs(directory: Path) -> dict[str, str]:
+    output = _git(directory, "for-each-ref", "--format=%(refname) %(objectname)").decode()
+    return dict(line.split(" ", 1) for line in output.splitlines())
+
+
+def _commit_tree(directory: Path, tree: str, parents: list[str], message: str) -> str:
+    author = {
+        "GIT_AUTHOR_NAME": "GitLab Simulator",
+        "GIT_AUTHOR_EMAIL": "simulator@gitlab.example.com",
+        "GIT_COMMITTER_NAME": "GitLab Simulator",
+        "GIT_COMMITTER_EMAIL": "simulator@gitlab.example.com",
+    }
+    parent_args = [arg for parent in parents for arg in ("-p", parent)]
+    return _git(directory, "commit-tree", tree, *parent_args, "-m", message, env=author).decode().strip()
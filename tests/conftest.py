@@ -14,11 +14,13 @@ from sqlalchemy.ext.asyncio import AsyncEngine
 from foxops.__main__ import create_app
 from foxops.database.engine import create_engine
 from foxops.database.repositories.change.repository import ChangeRepository
+from foxops.database.repositories.hoster_state.repository import HosterStateRepository
 from foxops.database.repositories.incarnation.repository import IncarnationRepository
 from foxops.database.schema import meta
 from foxops.dependencies import (
     get_change_repository,
     get_hoster,
+    get_hoster_state_repository,
     get_incarnation_repository,
 )
 from foxops.hosters.local import LocalHoster
@@ -27,6 +29,7 @@ from foxops.logger import setup_logging
 pytest_plugins = [
     "tests._plugins.fixtures_database",
     "tests._plugins.fixtures_gitlab",
+    "tests._plugins.fixtures_gitlab_simulator",
 ]
 
 
@@ -68,6 +71,18 @@ async def test_async_engine() -> AsyncGenerator[AsyncEngine, None]:
     yield async_engine
 
 
+@pytest.fixture(name="test_file_async_engine")
+async def test_file_async_engine(tmp_path: Path) -> AsyncGenerator[AsyncEngine, None]:
+    # in-memory databases use a single connection, which can't be used by concurrent tasks
+    async_engine = create_engine(f"sqlite+aiosqlite:///{tmp_path}/foxops.db")
+
+    async with async_engine.begin() as conn:
+        await conn.run_sync(meta.create_all)
+
+    yield async_engine
+    await async_engine.dispose()
+
+
 @pytest.fixture(name="app")
 def create_foxops_app(static_api_token: str, monkeypatch) -> FastAPI:
     monkeypatch.setenv("FOXOPS_STATIC_TOKEN", static_api_token)
@@ -85,6 +100,11 @@ async def change_repository(test_async_engine: AsyncEngine) -> ChangeRepository:
     return ChangeRepository(test_async_engine)
 
 
+@pytest.fixture
+async def hoster_state_repository(test_async_engine: AsyncEngine) -> HosterStateRepository:
+    return HosterStateRepository(test_async_engine)
+
+
 @pytest.fixture
 def local_hoster(tmp_path: Path) -> LocalHoster:
     return LocalHoster(tmp_path)
@@ -100,10 +120,12 @@ async def create_unauthenticated_client(
     app: FastAPI,
     incarnation_repository: IncarnationRepository,
     change_repository: ChangeRepository,
+    hoster_state_repository: HosterStateRepository,
     local_hoster: LocalHoster,
 ) -> AsyncGenerator[AsyncClient, None]:
     app.dependency_overrides[get_incarnation_repository] = lambda: incarnation_repository
     app.dependency_overrides[get_change_repository] = lambda: change_repository
+    app.dependency_overrides[get_hoster_state_repository] = lambda: hoster_state_repository
     app.dependency_overrides[get_hoster] = lambda: local_hoster
 
     async with AsyncClient(
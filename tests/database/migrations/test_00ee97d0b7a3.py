@@ -4,7 +4,6 @@ from sqlalchemy import text
 
 from alembic.command import upgrade
 from alembic.script import ScriptDirectory
-from foxops.database.repositories.change.repository import ChangeRepository
 
 INSERT_INCARNAION = text("""
     INSERT INTO incarnation (
@@ -44,7 +43,7 @@ INSERT_LEGACY_CHANGE = text("""
     """)
 
 
-async def test_database_upgrade(alembic_config, database_engine, async_database_engine):
+def test_database_upgrade(alembic_config, database_engine):
     # GIVEN
     # ... the migration script
     TARGET_REVISION = "00ee97d0b7a3"
@@ -70,12 +69,10 @@ async def test_database_upgrade(alembic_config, database_engine, async_database_
 
     # THEN
     # ... the change table should have the new column and all the legacy template data copied to the full data column
-    cr = ChangeRepository(async_database_engine)
-
-    change = await cr.get_change_by_revision(1, 1)
-    assert change.template_data_full == json.dumps({"dummydata": "yes"})
-    assert change.requested_data == json.dumps({"dummydata": "yes"})
+    with database_engine.connect() as connection:
+        changes = connection.execute(
+            text("SELECT requested_data, template_data_full FROM change ORDER BY revision")
+        ).all()
 
-    change = await cr.get_change_by_revision(1, 2)
-    assert change.template_data_full == json.dumps({"dummydata": "no"})
-    assert change.requested_data == json.dumps({"dummydata": "no"})
+    assert [json.loads(change.template_data_full) for change in changes] == [{"dummydata": "yes"}, {"dummydata": "no"}]
+    assert [json.loads(change.requested_data) for change in changes] == [{"dummydata": "yes"}, {"dummydata": "no"}]
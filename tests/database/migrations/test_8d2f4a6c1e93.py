@@ -0,0 +1,78 @@
+from sqlalchemy import text
+
+from alembic.command import upgrade
+from alembic.script import ScriptDirectory
+
+INSERT_INCARNATION = text("""
+    INSERT INTO incarnation (
+        id,
+        incarnation_repository,
+        target_directory,
+        template_repository
+    ) VALUES (
+        :id,
+        :incarnation_repository,
+        '.',
+        'https://example.com/template.git'
+    )
+    """)
+INSERT_CHANGE = text("""
+    INSERT INTO change (
+        incarnation_id,
+        revision,
+        type,
+        created_at,
+        requested_version_hash,
+        requested_version,
+        requested_data,
+        template_data_full,
+        commit_sha,
+        commit_pushed
+    ) VALUES (
+        :incarnation_id,
+        :revision,
+        'direct',
+        '2021-01-01 00:00:00',
+        '1234567890abcdef',
+        '1.0.0',
+        '{}',
+        '{}',
+        '1234567890abcdef',
+        1
+    )
+    """)
+
+
+def test_database_upgrade_backfills_latest_change_id(alembic_config, database_engine):
+    # GIVEN
+    # ... the migration script
+    TARGET_REVISION = "8d2f4a6c1e93"
+    sd = ScriptDirectory.from_config(alembic_config)
+    previous_revision = sd.get_revision(TARGET_REVISION).down_revision
+
+    # ... a database with the previous schema version and incarnations with multiple changes
+    upgrade(alembic_config, previous_revision)
+
+    with database_engine.connect() as connection:
+        connection.execute(INSERT_INCARNATION, parameters={"id": 1, "incarnation_repository": "test/one"})
+        connection.execute(INSERT_INCARNATION, parameters={"id": 2, "incarnation_repository": "test/two"})
+        for revision in (1, 3, 2):
+            connection.execute(INSERT_CHANGE, parameters={"incarnation_id": 1, "revision": revision})
+        connection.execute(INSERT_CHANGE, parameters={"incarnation_id": 2, "revision": 1})
+        connection.commit()
+
+    # WHEN
+    # ... running the migration to the target version
+    upgrade(alembic_config, TARGET_REVISION)
+
+    # THEN
+    # ... every incarnation points to its change with the highest revision
+    with database_engine.connect() as connection:
+        latest_revisions = connection.execute(
+            text(
+                "SELECT incarnation.id, change.revision FROM incarnation "
+                "JOIN change ON change.id = incarnation.latest_change_id ORDER BY incarnation.id"
+            )
+        ).all()
+
+    assert [tuple(row) for row in latest_revisions] == [(1, 3), (2, 1)]
@@ -0,0 +1,80 @@
+import json
+
+from sqlalchemy import text
+
+from alembic.command import upgrade
+from alembic.script import ScriptDirectory
+
+INSERT_INCARNATION = text("""
+    INSERT INTO incarnation (
+        id,
+        incarnation_repository,
+        target_directory,
+        template_repository
+    ) VALUES (
+        1,
+        'test/incarnation',
+        '.',
+        'https://example.com/template.git'
+    )
+    """)
+INSERT_CHANGE = text("""
+    INSERT INTO change (
+        incarnation_id,
+        revision,
+        type,
+        created_at,
+        requested_version_hash,
+        requested_version,
+        requested_data,
+        template_data_full,
+        commit_sha,
+        commit_pushed
+    ) VALUES (
+        1,
+        1,
+        'direct',
+        '2021-01-01 00:00:00',
+        '1234567890abcdef',
+        '1.0.0',
+        :requested_data,
+        :template_data_full,
+        '1234567890abcdef',
+        1
+    )
+    """)
+
+
+def test_database_upgrade_keeps_template_data(alembic_config, database_engine):
+    # GIVEN
+    # ... the migration script
+    TARGET_REVISION = "c41b7e9d2a58"
+    sd = ScriptDirectory.from_config(alembic_config)
+    previous_revision = sd.get_revision(TARGET_REVISION).down_revision
+
+    # ... a database with the previous schema version and template data stored as strings
+    upgrade(alembic_config, previous_revision)
+
+    with database_engine.connect() as connection:
+        connection.execute(INSERT_INCARNATION)
+        connection.execute(
+            INSERT_CHANGE,
+            parameters={
+                "requested_data": json.dumps({"name": "test"}),
+                "template_data_full": json.dumps({"name": "test", "java_version": 21}),
+            },
+        )
+        connection.commit()
+
+    # WHEN
+    # ... running the migration to the target version
+    upgrade(alembic_config, TARGET_REVISION)
+
+    # THEN
+    # ... the template data can be read as JSON documents
+    with database_engine.connect() as connection:
+        change = connection.execute(
+            text("SELECT json_extract(template_data_full, '$.java_version') AS java_version FROM change")
+        ).one()
+
+    assert change.java_version == 21
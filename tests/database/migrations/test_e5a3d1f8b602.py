@@ -0,0 +1,100 @@
+import json
+
+from sqlalchemy import text
+
+from alembic.command import downgrade, upgrade
+from alembic.script import ScriptDirectory
+from foxops.database.repositories.change.repository import template_data_hash
+
+INSERT_INCARNATION = text("""
+    INSERT INTO incarnation (
+        id,
+        incarnation_repository,
+        target_directory,
+        template_repository
+    ) VALUES (
+        1,
+        'test/incarnation',
+        '.',
+        'https://example.com/template.git'
+    )
+    """)
+INSERT_CHANGE = text("""
+    INSERT INTO change (
+        incarnation_id,
+        revision,
+        type,
+        created_at,
+        requested_version_hash,
+        requested_version,
+        requested_data,
+        template_data_full,
+        commit_sha,
+        commit_pushed
+    ) VALUES (
+        1,
+        :revision,
+        'direct',
+        '2021-01-01 00:00:00',
+        '1234567890abcdef',
+        '1.0.0',
+        :requested_data,
+        :template_data_full,
+        '1234567890abcdef',
+        1
+    )
+    """)
+
+
+def test_database_upgrade_moves_template_data_into_deduplicated_blobs(alembic_config, database_engine):
+    # GIVEN
+    # ... the migration script
+    TARGET_REVISION = "e5a3d1f8b602"
+    sd = ScriptDirectory.from_config(alembic_config)
+    previous_revision = sd.get_revision(TARGET_REVISION).down_revision
+
+    # ... a database with the previous schema version and changes which share template data
+    upgrade(alembic_config, previous_revision)
+
+    with database_engine.connect() as connection:
+        connection.execute(INSERT_INCARNATION)
+        for revision, requested_data in [(1, {"name": "test"}), (2, {"name": "test"}), (3, {"name": "other"})]:
+            connection.execute(
+                INSERT_CHANGE,
+                parameters={
+                    "revision": revision,
+                    "requested_data": json.dumps(requested_data),
+                    "template_data_full": json.dumps(requested_data),
+                },
+            )
+        connection.commit()
+
+    # WHEN
+    # ... running the migration to the target version
+    upgrade(alembic_config, TARGET_REVISION)
+
+    # THEN
+    # ... every distinct template data document is stored once and referenced by its hash
+    with database_engine.connect() as connection:
+        blobs = connection.execute(text("SELECT hash, data FROM template_data_blob")).all()
+        changes = connection.execute(
+            text("SELECT requested_data_hash, template_data_full_hash FROM change ORDER BY revision")
+        ).all()
+
+    assert {hash_: json.loads(data) for hash_, data in blobs} == {
+        template_data_hash({"name": "test"}): {"name": "test"},
+        template_data_hash({"name": "other"}): {"name": "other"},
+    }
+    assert [change.requested_data_hash for change in changes] == [
+        template_data_hash({"name": "test"}),
+        template_data_hash({"name": "test"}),
+        template_data_hash({"name": "other"}),
+    ]
+    assert [change.template_data_full_hash for change in changes] == [change.requested_data_hash for change in changes]
+
+    # ... and the migration can be reverted without losing data
+    downgrade(alembic_config, previous_revision)
+    with database_engine.connect() as connection:
+        requested_data = connection.execute(text("SELECT requested_data FROM change ORDER BY revision")).scalars()
+
+        assert [json.loads(data) for data in requested_data] == [{"name": "test"}, {"name": "test"}, {"name": "other"}]
@@ -1,18 +1,31 @@
-import json
+from typing import Any
 
 import pytest
 from pytest import fixture
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import AsyncEngine
 
+from foxops.database.engine import EngineRouter, create_engine
+from foxops.database.repositories.change import repository as change_repository_module
 from foxops.database.repositories.change.errors import (
     ChangeCommitAlreadyPushedError,
     ChangeConflictError,
     ChangeNotFoundError,
     IncarnationHasNoChangesError,
 )
-from foxops.database.repositories.change.model import ChangeType
-from foxops.database.repositories.change.repository import ChangeRepository
+from foxops.database.repositories.change.model import (
+    ChangeType,
+    IncarnationSummaryFilter,
+    TemplateDataCondition,
+)
+from foxops.database.repositories.change.repository import (
+    ChangeRepository,
+    template_data_hash,
+)
+from foxops.database.repositories.incarnation.errors import IncarnationNotFoundError
 from foxops.database.repositories.incarnation.model import IncarnationInDB
 from foxops.database.repositories.incarnation.repository import IncarnationRepository
+from foxops.database.schema import meta, template_data_blob
 
 
 @fixture(scope="function")
@@ -34,15 +47,157 @@ async def test_create_change_persists_all_data(change_repository: ChangeReposito
         commit_pushed=True,
         requested_version_hash="dummy template sha",
         requested_version="v99",
-        requested_data="dummy data (should be json)",
-        template_data_full="dummy data (should be json)",
+        requested_data={"dummy": "data"},
+        template_data_full={"dummy": "data"},
         merge_request_id="123",
         merge_request_branch_name="mybranch",
     )
 
     assert change.id is not None
     assert change.type == ChangeType.DIRECT
-    assert change.template_data_full == "dummy data (should be json)"
+    assert change.template_data_full == {"dummy": "data"}
+
+
+async def test_reads_are_routed_to_the_primary_after_a_write(
+    test_async_engine: AsyncEngine, incarnation: IncarnationInDB
+):
+    # GIVEN
+    # an empty replica, which didn't yet receive any of the primary's data
+    replica_engine = create_engine("sqlite+aiosqlite://")
+    async with replica_engine.begin() as conn:
+        await conn.run_sync(meta.create_all)
+    change_repository = ChangeRepository(test_async_engine, EngineRouter(test_async_engine, [replica_engine]))
+
+    # WHEN
+    summaries_before_write = [s async for s in change_repository.list_incarnations_with_changes_summary()]
+    change = await change_repository.create_change(
+        incarnation_id=incarnation.id,
+        revision=1,
+        change_type=ChangeType.DIRECT,
+        commit_sha="dummy sha",
+        commit_pushed=True,
+        requested_version_hash="dummy template sha",
+        requested_version="v1",
+        requested_data={},
+        template_data_full={},
+    )
+
+    # THEN
+    assert summaries_before_write == []
+    assert (await change_repository.get_change(change.id)).id == change.id
+    assert [s.id async for s in change_repository.list_incarnations_with_changes_summary()] == [incarnation.id]
+    await replica_engine.dispose()
+
+
+async def test_create_change_stores_identical_template_data_only_once(
+    change_repository: ChangeRepository, incarnation: IncarnationInDB, test_async_engine: AsyncEngine
+):
+    # WHEN
+    changes = [
+        await change_repository.create_change(
+            incarnation_id=incarnation.id,
+            revision=revision,
+            change_type=ChangeType.DIRECT,
+            commit_sha="dummy sha",
+            commit_pushed=True,
+            requested_version_hash="dummy template sha",
+            requested_version="v1",
+            requested_data={"name": "test"},
+            template_data_full={"name": "test", "version": revision},
+        )
+        for revision in (1, 2)
+    ]
+
+    # THEN
+    assert changes[0].requested_data_hash == changes[1].requested_data_hash
+    assert changes[0].template_data_full_hash != changes[1].template_data_full_hash
+    async with test_async_engine.connect() as conn:
+        assert (await conn.execute(select(func.count()).select_from(template_data_blob))).scalar_one() == 3
+
+
+async def test_delete_change_removes_unreferenced_template_data(
+    change_repository: ChangeRepository, incarnation: IncarnationInDB, test_async_engine: AsyncEngine
+):
+    # GIVEN
+    for revision in (1, 2):
+        change = await change_repository.create_change(
+            incarnation_id=incarnation.id,
+            revision=revision,
+            change_type=ChangeType.DIRECT,
+            commit_sha="dummy sha",
+            commit_pushed=True,
+            requested_version_hash="dummy template sha",
+            requested_version="v1",
+            requested_data={"name": "test"},
+            template_data_full={"name": "test", "version": revision},
+        )
+
+    # WHEN
+    await change_repository.delete_change(change.id)
+
+    # THEN
+    async with test_async_engine.connect() as conn:
+        hashes = set((await conn.execute(select(template_data_blob.c.hash))).scalars())
+    assert hashes == {template_data_hash({"name": "test"}), template_data_hash({"name": "test", "version": 1})}
+
+
+async def test_delete_incarnation_removes_its_template_data(
+    change_repository: ChangeRepository, incarnation: IncarnationInDB, test_async_engine: AsyncEngine
+):
+    # GIVEN
+    await change_repository.create_change(
+        incarnation_id=incarnation.id,
+        revision=1,
+        change_type=ChangeType.DIRECT,
+        commit_sha="dummy sha",
+        commit_pushed=True,
+        requested_version_hash="dummy template sha",
+        requested_version="v1",
+        requested_data={"name": "test"},
+        template_data_full={"name": "test", "version": 1},
+    )
+
+    # WHEN
+    await change_repository.delete_incarnation(incarnation.id)
+
+    # THEN
+    async with test_async_engine.connect() as conn:
+        assert (await conn.execute(select(func.count()).select_from(template_data_blob))).scalar_one() == 0
+
+
+async def test_create_change_stores_template_data_again_if_it_was_deleted_concurrently(
+    change_repository: ChangeRepository, incarnation: IncarnationInDB, mocker
+):
+    # GIVEN
+    store_template_data = change_repository_module._store_template_data
+    deleted: list[str] = []
+
+    async def store_and_delete_once(conn, data):
+        hash_ = await store_template_data(conn, data)
+        if not deleted:
+            # what a concurrent deletion of the last change referencing the data does
+            await conn.execute(delete(template_data_blob).where(template_data_blob.c.hash == hash_))
+            deleted.append(hash_)
+        return hash_
+
+    mocker.patch.object(change_repository_module, "_store_template_data", store_and_delete_once)
+
+    # WHEN
+    change = await change_repository.create_change(
+        incarnation_id=incarnation.id,
+        revision=1,
+        change_type=ChangeType.DIRECT,
+        commit_sha="dummy sha",
+        commit_pushed=True,
+        requested_version_hash="dummy template sha",
+        requested_version="v1",
+        requested_data={"name": "test"},
+        template_data_full={"name": "test"},
+    )
+
+    # THEN
+    assert deleted == [change.requested_data_hash]
+    assert (await change_repository.get_change(change.id)).requested_data == {"name": "test"}
 
 
 async def test_create_change_rejects_double_revision(change_repository: ChangeRepository, incarnation: IncarnationInDB):
@@ -53,8 +208,8 @@ async def test_create_change_rejects_double_revision(change_repository: ChangeRe
         change_type=ChangeType.DIRECT,
         requested_version_hash="dummy template sha",
         requested_version="v2",
-        requested_data=json.dumps({"foo": "bar"}),
-        template_data_full=json.dumps({"foo": "bar"}),
+        requested_data={"foo": "bar"},
+        template_data_full={"foo": "bar"},
         commit_sha="dummy sha",
         commit_pushed=False,
     )
@@ -67,8 +222,8 @@ async def test_create_change_rejects_double_revision(change_repository: ChangeRe
             change_type=ChangeType.DIRECT,
             requested_version_hash="dummy template sha2",
             requested_version="v3",
-            requested_data=json.dumps({"foo": "bar"}),
-            template_data_full=json.dumps({"foo": "bar"}),
+            requested_data={"foo": "bar"},
+            template_data_full={"foo": "bar"},
             commit_sha="dummy sha",
             commit_pushed=False,
         )
@@ -92,8 +247,8 @@ async def test_get_latest_change_for_incarnation_succeeds(
         commit_pushed=True,
         requested_version_hash="dummy template sha",
         requested_version="v1",
-        requested_data=json.dumps({"foo": "bar"}),
-        template_data_full=json.dumps({"foo": "bar"}),
+        requested_data={"foo": "bar"},
+        template_data_full={"foo": "bar"},
     )
     await change_repository.create_change(
         incarnation_id=incarnation.id,
@@ -103,8 +258,8 @@ async def test_get_latest_change_for_incarnation_succeeds(
         commit_pushed=False,
         requested_version_hash="dummy template sha2",
         requested_version="v2",
-        requested_data=json.dumps({"foo": "bar"}),
-        template_data_full=json.dumps({"foo": "bar"}),
+        requested_data={"foo": "bar"},
+        template_data_full={"foo": "bar"},
     )
 
     # WHEN
@@ -124,8 +279,8 @@ async def test_list_changes(change_repository: ChangeRepository, incarnation: In
         commit_pushed=True,
         requested_version_hash="dummy template sha",
         requested_version="v1",
-        requested_data=json.dumps({"foo": "bar"}),
-        template_data_full=json.dumps({"foo": "bar"}),
+        requested_data={"foo": "bar"},
+        template_data_full={"foo": "bar"},
     )
     await change_repository.create_change(
         incarnation_id=incarnation.id,
@@ -135,8 +290,8 @@ async def test_list_changes(change_repository: ChangeRepository, incarnation: In
         commit_pushed=False,
         requested_version_hash="dummy template sha2",
         requested_version="v2",
-        requested_data=json.dumps({"foo": "bar"}),
-        template_data_full=json.dumps({"foo": "bar"}),
+        requested_data={"foo": "bar"},
+        template_data_full={"foo": "bar"},
     )
 
     # WHEN
@@ -146,6 +301,7 @@ async def test_list_changes(change_repository: ChangeRepository, incarnation: In
     assert len(changes) == 2
     assert changes[0].revision == 2
     assert changes[1].revision == 1
+    assert all(c.incarnation_repository == incarnation.incarnation_repository for c in changes)
 
 
 async def test_get_change_by_revision(change_repository: ChangeRepository, incarnation: IncarnationInDB):
@@ -158,8 +314,8 @@ async def test_get_change_by_revision(change_repository: ChangeRepository, incar
         commit_pushed=True,
         requested_version_hash="dummy template sha",
         requested_version="v1",
-        requested_data=json.dumps({"foo": "bar"}),
-        template_data_full=json.dumps({"foo": "bar"}),
+        requested_data={"foo": "bar"},
+        template_data_full={"foo": "bar"},
     )
 
     # WHEN
@@ -178,6 +334,100 @@ async def test_get_latest_change_for_incarnation_throws_exception_when_no_change
         await change_repository.get_latest_change_for_incarnation(incarnation.id)
 
 
+async def test_get_latest_change_with_incarnation_succeeds(
+    change_repository: ChangeRepository, incarnation: IncarnationInDB
+):
+    # GIVEN
+    for revision in (1, 2):
+        await change_repository.create_change(
+            incarnation_id=incarnation.id,
+            revision=revision,
+            change_type=ChangeType.DIRECT,
+            commit_sha=f"dummy sha{revision}",
+            commit_pushed=True,
+            requested_version_hash="dummy template sha",
+            requested_version=f"v{revision}",
+            requested_data={"foo": "bar"},
+            template_data_full={"foo": "bar"},
+        )
+
+    # WHEN
+    change = await change_repository.get_latest_change_with_incarnation(incarnation.id)
+
+    # THEN
+    assert change.incarnation_id == incarnation.id
+    assert change.revision == 2
+    assert change.commit_sha == "dummy sha2"
+    assert change.incarnation_repository == incarnation.incarnation_repository
+    assert change.target_directory == incarnation.target_directory
+    assert change.template_repository == incarnation.template_repository
+
+
+async def test_get_latest_change_with_incarnation_throws_exception_when_no_change_exists(
+    change_repository: ChangeRepository, incarnation: IncarnationInDB
+):
+    # WHEN
+    with pytest.raises(IncarnationHasNoChangesError):
+        await change_repository.get_latest_change_with_incarnation(incarnation.id)
+
+
+async def test_get_latest_change_with_incarnation_throws_exception_when_incarnation_does_not_exist(
+    change_repository: ChangeRepository,
+):
+    # WHEN
+    with pytest.raises(IncarnationNotFoundError):
+        await change_repository.get_latest_change_with_incarnation(123)
+
+
+async def test_list_latest_changes_with_incarnation_returns_the_changes_in_the_given_order(
+    change_repository: ChangeRepository,
+):
+    # GIVEN
+    first_changes = [
+        await change_repository.create_incarnation_with_first_change(
+            incarnation_repository="test",
+            target_directory=target_directory,
+            template_repository="test-template",
+            commit_sha="dummy sha",
+            requested_version_hash="dummy template sha",
+            requested_version="v1",
+            requested_data={"foo": target_directory},
+            template_data_full={"foo": target_directory},
+        )
+        for target_directory in ("inc1", "inc2")
+    ]
+    await change_repository.create_change(
+        incarnation_id=first_changes[1].incarnation_id,
+        revision=2,
+        change_type=ChangeType.DIRECT,
+        commit_sha="dummy sha2",
+        commit_pushed=True,
+        requested_version_hash="dummy template sha",
+        requested_version="v2",
+        requested_data={"foo": "inc2"},
+        template_data_full={"foo": "inc2"},
+    )
+
+    # WHEN
+    changes = await change_repository.list_latest_changes_with_incarnation(
+        [first_changes[1].incarnation_id, first_changes[0].incarnation_id]
+    )
+
+    # THEN
+    assert [(c.target_directory, c.revision, c.requested_data) for c in changes] == [
+        ("inc2", 2, {"foo": "inc2"}),
+        ("inc1", 1, {"foo": "inc1"}),
+    ]
+
+
+async def test_list_latest_changes_with_incarnation_throws_exception_when_incarnation_does_not_exist(
+    change_repository: ChangeRepository,
+):
+    # WHEN
+    with pytest.raises(IncarnationNotFoundError):
+        await change_repository.list_latest_changes_with_incarnation([123])
+
+
 async def test_list_incarnations_with_change_summary_returns_all_incarnations_with_latest_change_data(
     change_repository: ChangeRepository,
 ):
@@ -189,8 +439,8 @@ async def test_list_incarnations_with_change_summary_returns_all_incarnations_wi
         commit_sha="dummy sha",
         requested_version_hash="dummy template sha",
         requested_version="v1",
-        requested_data=json.dumps({"foo": "bar"}),
-        template_data_full=json.dumps({"foo": "bar"}),
+        requested_data={"foo": "bar"},
+        template_data_full={"foo": "bar"},
     )
     incarnation1_change2 = await change_repository.create_change(
         incarnation_id=incarnation1_change1.id,
@@ -200,8 +450,8 @@ async def test_list_incarnations_with_change_summary_returns_all_incarnations_wi
         commit_pushed=True,
         requested_version_hash="dummy template sha2",
         requested_version="v2",
-        requested_data=json.dumps({"foo": "bar"}),
-        template_data_full=json.dumps({"foo": "bar"}),
+        requested_data={"foo": "bar"},
+        template_data_full={"foo": "bar"},
         merge_request_id="123",
         merge_request_branch_name="mybranch",
     )
@@ -213,8 +463,8 @@ async def test_list_incarnations_with_change_summary_returns_all_incarnations_wi
         commit_sha="dummy sha",
         requested_version_hash="dummy template sha",
         requested_version="v1",
-        requested_data=json.dumps({"foo": "bar"}),
-        template_data_full=json.dumps({"foo": "bar"}),
+        requested_data={"foo": "bar"},
+        template_data_full={"foo": "bar"},
     )
 
     # WHEN
@@ -235,6 +485,97 @@ async def test_list_incarnations_with_change_summary_returns_all_incarnations_wi
     assert incarnations[1].commit_sha == incarnation2_change1.commit_sha
 
 
+async def test_list_incarnations_with_change_summary_applies_filter_and_keyset_pagination(
+    change_repository: ChangeRepository,
+):
+    # GIVEN
+    for name, template_repository, version in [
+        ("group/a", "template1", "v1"),
+        ("other/b", "template1", "v1"),
+        ("group/c", "template1", "v2"),
+        ("group/d", "template2", "v1"),
+        ("group/e", "template1", "v1"),
+        ("group/f", "template1", "v1"),
+    ]:
+        await change_repository.create_incarnation_with_first_change(
+            incarnation_repository=name,
+            target_directory=".",
+            template_repository=template_repository,
+            commit_sha="commit_sha",
+            requested_version=version,
+            requested_version_hash="template_commit_sha",
+            requested_data={},
+            template_data_full={},
+        )
+    filter_ = IncarnationSummaryFilter(
+        incarnation_repository_prefix="group/", template_repository="template1", requested_version="v1"
+    )
+
+    # WHEN
+    first_page = [
+        inc.incarnation_repository
+        async for inc in change_repository.list_incarnations_with_changes_summary(filter_, limit=2)
+    ]
+    second_page = [
+        inc.incarnation_repository
+        async for inc in change_repository.list_incarnations_with_changes_summary(filter_, after=5, limit=2)
+    ]
+    descending = [
+        inc.incarnation_repository
+        async for inc in change_repository.list_incarnations_with_changes_summary(filter_, after=6, descending=True)
+    ]
+
+    # THEN
+    assert first_page == ["group/a", "group/e"]
+    assert second_page == ["group/f"]
+    assert descending == ["group/e", "group/a"]
+
+
+@fixture(params=["test_async_engine", "postgresql_async_engine"])
+def any_database_change_repository(request: pytest.FixtureRequest) -> ChangeRepository:
+    return ChangeRepository(request.getfixturevalue(request.param))
+
+
+async def test_list_incarnations_with_change_summary_filters_by_template_data(
+    any_database_change_repository: ChangeRepository,
+):
+    # GIVEN
+    incarnations: list[tuple[str, dict[str, Any]]] = [
+        ("a", {"java_version": 17, "team": {"name": "platform"}}),
+        ("b", {"java_version": "21", "team": {"name": "platform"}}),
+        ("c", {"java_version": 11, "team": {"name": "data"}}),
+        ("d", {"java_version": "latest", "team": "data"}),
+    ]
+    for name, template_data in incarnations:
+        await any_database_change_repository.create_incarnation_with_first_change(
+            incarnation_repository=name,
+            target_directory=".",
+            template_repository="template",
+            commit_sha="commit_sha",
+            requested_version="v1",
+            requested_version_hash="template_commit_sha",
+            requested_data=template_data,
+            template_data_full=template_data,
+        )
+
+    async def _list(*conditions: str) -> list[str]:
+        filter_ = IncarnationSummaryFilter(template_data=[TemplateDataCondition.parse(c) for c in conditions])
+        return [
+            inc.incarnation_repository
+            async for inc in any_database_change_repository.list_incarnations_with_changes_summary(filter_)
+        ]
+
+    # THEN
+    assert await _list("java_version:lt:21") == ["a", "c"]
+    assert await _list("java_version:ge:17", "team.name:eq:platform") == ["a"]
+    assert await _list("team.name:ne:platform") == ["c"]
+    # values only match variables of the same type
+    assert await _list("java_version:eq:21") == []
+    assert await _list('java_version:eq:"21"') == ["b"]
+    assert await _list("java_version:ne:17") == ["c"]
+    assert await _list("java_version:gt:latest") == []
+
+
 async def test_update_change_commit_pushed_succeeds(change_repository: ChangeRepository, incarnation: IncarnationInDB):
     # GIVEN
     change = await change_repository.create_change(
@@ -245,8 +586,8 @@ async def test_update_change_commit_pushed_succeeds(change_repository: ChangeRep
         commit_pushed=False,
         requested_version_hash="dummy template sha",
         requested_version="v1",
-        requested_data=json.dumps({"foo": "bar"}),
-        template_data_full=json.dumps({"foo": "bar"}),
+        requested_data={"foo": "bar"},
+        template_data_full={"foo": "bar"},
     )
 
     # WHEN
@@ -267,8 +608,8 @@ async def test_update_change_commit_sha_succeeds(change_repository: ChangeReposi
         commit_pushed=False,
         requested_version_hash="dummy template sha",
         requested_version="v1",
-        requested_data=json.dumps({"foo": "bar"}),
-        template_data_full=json.dumps({"foo": "bar"}),
+        requested_data={"foo": "bar"},
+        template_data_full={"foo": "bar"},
     )
 
     # WHEN
@@ -291,8 +632,8 @@ async def test_update_change_commit_sha_fails_when_commit_is_already_pushed(
         commit_pushed=True,
         requested_version_hash="dummy template sha",
         requested_version="v1",
-        requested_data=json.dumps({"foo": "bar"}),
-        template_data_full=json.dumps({"foo": "bar"}),
+        requested_data={"foo": "bar"},
+        template_data_full={"foo": "bar"},
     )
 
     # WHEN
@@ -310,8 +651,8 @@ async def test_delete_change_succeeds_in_deleting(change_repository: ChangeRepos
         commit_pushed=False,
         requested_version_hash="dummy template sha",
         requested_version="v1",
-        requested_data=json.dumps({"foo": "bar"}),
-        template_data_full=json.dumps({"foo": "bar"}),
+        requested_data={"foo": "bar"},
+        template_data_full={"foo": "bar"},
     )
 
     # WHEN
@@ -322,6 +663,35 @@ async def test_delete_change_succeeds_in_deleting(change_repository: ChangeRepos
         await change_repository.get_change(change.id)
 
 
+async def test_delete_change_of_latest_revision_points_incarnation_to_previous_change(
+    change_repository: ChangeRepository, incarnation: IncarnationInDB
+):
+    # GIVEN
+    changes = [
+        await change_repository.create_change(
+            incarnation_id=incarnation.id,
+            revision=revision,
+            change_type=ChangeType.DIRECT,
+            commit_sha=f"dummy sha{revision}",
+            commit_pushed=True,
+            requested_version_hash="dummy template sha",
+            requested_version=f"v{revision}",
+            requested_data={"foo": "bar"},
+            template_data_full={"foo": "bar"},
+        )
+        for revision in (1, 2)
+    ]
+
+    # WHEN
+    await change_repository.delete_change(changes[1].id)
+
+    # THEN
+    latest_change = await change_repository.get_latest_change_with_incarnation(incarnation.id)
+    assert latest_change.id == changes[0].id
+    summaries = [summary async for summary in change_repository.list_incarnations_with_changes_summary()]
+    assert [summary.revision for summary in summaries] == [1]
+
+
 async def test_delete_change_raises_exception_when_not_found(change_repository: ChangeRepository):
     # WHEN
     with pytest.raises(ChangeNotFoundError):
@@ -337,8 +707,8 @@ async def test_create_incarnation_with_first_change(change_repository: ChangeRep
         commit_sha="commit_sha",
         requested_version_hash="dummy template sha",
         requested_version="v1",
-        requested_data=json.dumps({"foo": "bar"}),
-        template_data_full=json.dumps({"foo": "bar"}),
+        requested_data={"foo": "bar"},
+        template_data_full={"foo": "bar"},
     )
 
     # THEN
@@ -347,8 +717,8 @@ async def test_create_incarnation_with_first_change(change_repository: ChangeRep
     assert change.type == ChangeType.DIRECT
     assert change.revision == 1
     assert change.requested_version == "v1"
-    assert json.loads(change.requested_data) == {"foo": "bar"}
-    assert json.loads(change.template_data_full) == {"foo": "bar"}
+    assert change.requested_data == {"foo": "bar"}
+    assert change.template_data_full == {"foo": "bar"}
     assert change.commit_sha == "commit_sha"
     assert change.commit_pushed is False
 
@@ -362,8 +732,8 @@ async def test_delete_incarnation_also_deletes_associated_changes(change_reposit
         commit_sha="commit_sha",
         requested_version_hash="dummy template sha",
         requested_version="v1",
-        requested_data=json.dumps({"foo": "bar"}),
-        template_data_full=json.dumps({"foo": "bar"}),
+        requested_data={"foo": "bar"},
+        template_data_full={"foo": "bar"},
     )
     incarnation_id = change.incarnation_id
 
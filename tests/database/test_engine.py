@@ -0,0 +1,69 @@
+from datetime import timedelta
+from pathlib import Path
+
+from pydantic import SecretStr
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import QueuePool
+
+from foxops.database import engine as engine_module
+from foxops.database.engine import create_engine
+from foxops.settings import DatabaseSettings
+
+
+async def test_create_engine_applies_sqlite_pragmas(tmp_path: Path):
+    # GIVEN
+    url = f"sqlite+aiosqlite:///{tmp_path}/foxops.db"
+    settings = DatabaseSettings(url=SecretStr(url), sqlite_synchronous="FULL", sqlite_cache_size_kib=1024)
+
+    # WHEN
+    engine = create_engine(url, settings)
+
+    # THEN
+    async with engine.connect() as conn:
+        assert (await conn.execute(text("PRAGMA journal_mode"))).scalar_one() == "wal"
+        assert (await conn.execute(text("PRAGMA synchronous"))).scalar_one() == 2
+        assert (await conn.execute(text("PRAGMA cache_size"))).scalar_one() == -1024
+        assert (await conn.execute(text("PRAGMA foreign_keys"))).scalar_one() == 1
+    await engine.dispose()
+
+
+async def test_create_engine_scopes_sqlite_pragmas_to_its_own_connections(tmp_path: Path):
+    # GIVEN
+    foxops_engine = create_engine(f"sqlite+aiosqlite:///{tmp_path}/foxops.db")
+    other_engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/other.db")
+
+    # WHEN
+    async with other_engine.connect() as conn:
+        foreign_keys = (await conn.execute(text("PRAGMA foreign_keys"))).scalar_one()
+
+    # THEN
+    assert foreign_keys == 0
+    await foxops_engine.dispose()
+    await other_engine.dispose()
+
+
+async def test_create_engine_configures_the_connection_pool(tmp_path: Path, mocker):
+    # GIVEN
+    url = f"sqlite+aiosqlite:///{tmp_path}/foxops.db"
+    settings = DatabaseSettings(
+        url=SecretStr(url),
+        pool_size=3,
+        max_overflow=7,
+        pool_timeout=timedelta(seconds=2),
+        pool_recycle=timedelta(hours=1),
+    )
+
+    create_async_engine_spy = mocker.spy(engine_module, "create_async_engine")
+
+    # WHEN
+    engine = create_engine(url, settings)
+
+    # THEN
+    assert isinstance(engine.pool, QueuePool)
+    assert engine.pool.size() == 3
+    assert engine.pool.timeout() == 2
+    # neither the maximum overflow nor the recycle time are exposed by the pool
+    assert create_async_engine_spy.call_args.kwargs["max_overflow"] == 7
+    assert create_async_engine_spy.call_args.kwargs["pool_recycle"] == 3600
+    await engine.dispose()
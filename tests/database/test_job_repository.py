@@ -0,0 +1,59 @@
+from datetime import datetime, timedelta, timezone
+
+from pytest import fixture
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from foxops.database.repositories.incarnation.repository import IncarnationRepository
+from foxops.database.repositories.job.model import JobStatus, JobType
+from foxops.database.repositories.job.repository import JobRepository
+
+
+@fixture
+def job_repository(test_async_engine: AsyncEngine) -> JobRepository:
+    return JobRepository(test_async_engine)
+
+
+@fixture
+async def incarnation_ids(incarnation_repository: IncarnationRepository) -> list[int]:
+    return [(await incarnation_repository.create(f"test/{name}", ".", "template")).id for name in ("first", "second")]
+
+
+async def test_claim_next_runs_only_one_job_per_incarnation(job_repository: JobRepository, incarnation_ids: list[int]):
+    # GIVEN
+    first_job = await job_repository.create(JobType.CHANGE, incarnation_ids[0], {})
+    second_job = await job_repository.create(JobType.CHANGE, incarnation_ids[0], {})
+    other_incarnation_job = await job_repository.create(JobType.RESET, incarnation_ids[1], {})
+
+    # WHEN
+    claimed_while_first_job_runs = [await job_repository.claim_next() for _ in range(3)]
+    await job_repository.finish(first_job.id, JobStatus.SUCCEEDED)
+    claimed_after_first_job = await job_repository.claim_next()
+
+    # THEN
+    assert [job.id if job else None for job in claimed_while_first_job_runs] == [
+        first_job.id,
+        other_incarnation_job.id,
+        None,
+    ]
+    assert claimed_after_first_job is not None
+    assert claimed_after_first_job.id == second_job.id
+    assert claimed_after_first_job.status == JobStatus.RUNNING
+
+
+async def test_fail_stale_jobs_only_fails_running_jobs_without_recent_heartbeat(
+    job_repository: JobRepository, incarnation_ids: list[int]
+):
+    # GIVEN
+    stale_job = await job_repository.create(JobType.CHANGE, incarnation_ids[0], {})
+    await job_repository.claim_next()
+    pending_job = await job_repository.create(JobType.CHANGE, incarnation_ids[0], {})
+
+    # WHEN
+    not_yet_stale = await job_repository.fail_stale_jobs(datetime.now(timezone.utc) - timedelta(minutes=1), "stale")
+    stale = await job_repository.fail_stale_jobs(datetime.now(timezone.utc) + timedelta(minutes=1), "stale")
+
+    # THEN
+    assert not_yet_stale == []
+    assert [job.id for job in stale] == [stale_job.id]
+    assert (await job_repository.get(stale_job.id)).error == "stale"
+    assert (await job_repository.get(pending_job.id)).status == JobStatus.PENDING
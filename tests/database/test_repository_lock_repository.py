@@ -0,0 +1,44 @@
+from datetime import timedelta
+
+from pytest import fixture
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from foxops.database.repositories.repository_lock.repository import (
+    RepositoryLockRepository,
+)
+
+
+@fixture
+def repository_lock_repository(test_async_engine: AsyncEngine) -> RepositoryLockRepository:
+    return RepositoryLockRepository(test_async_engine)
+
+
+async def test_acquire_fails_while_another_holder_has_an_unexpired_lease(
+    repository_lock_repository: RepositoryLockRepository,
+):
+    # GIVEN
+    assert await repository_lock_repository.acquire("test/monorepo", "first", timedelta(minutes=1))
+
+    # WHEN
+    acquired_while_held = await repository_lock_repository.acquire("test/monorepo", "second", timedelta(minutes=1))
+    acquired_other_repository = await repository_lock_repository.acquire("test/other", "second", timedelta(minutes=1))
+    await repository_lock_repository.release("test/monorepo", "first")
+    acquired_after_release = await repository_lock_repository.acquire("test/monorepo", "second", timedelta(minutes=1))
+
+    # THEN
+    assert not acquired_while_held
+    assert acquired_other_repository
+    assert acquired_after_release
+
+
+async def test_acquire_takes_over_an_expired_lease(repository_lock_repository: RepositoryLockRepository):
+    # GIVEN
+    assert await repository_lock_repository.acquire("test/monorepo", "stopped", timedelta(seconds=-1))
+
+    # WHEN
+    acquired = await repository_lock_repository.acquire("test/monorepo", "second", timedelta(minutes=1))
+
+    # THEN
+    assert acquired
+    assert not await repository_lock_repository.renew("test/monorepo", "stopped", timedelta(minutes=1))
+    assert await repository_lock_repository.renew("test/monorepo", "second", timedelta(minutes=1))
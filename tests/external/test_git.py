@@ -156,3 +156,37 @@ index b45ef6f..0000000
 """
 
         assert diff == EXPECTED_GIT_DIFF
+
+
+async def test_diff_trees_shows_differences_between_a_directory_and_the_repository(tmp_path):
+    # GIVEN
+    repo_dir = tmp_path / "repo"
+    repo_dir.mkdir()
+    _write_to_file(repo_dir / "file1", "Hallo, Welt!")
+    _write_to_file(repo_dir / "file2", "Hello, World!")
+    repo = await GitRepository.from_empty_directory(repo_dir)
+    await repo._run("config", "user.name", "Test User")
+    await repo._run("config", "user.email", "testuser@local")
+    await repo.commit_all("initial commit")
+
+    other_dir = tmp_path / "other"
+    other_dir.mkdir()
+    _write_to_file(other_dir / "file1", "Hello, World!")
+    _write_to_file(other_dir / "file2", "Hello, World!")
+
+    # WHEN
+    tree_sha = await repo.write_tree(other_dir)
+    diff = await repo.diff_trees(tree_sha, "HEAD:", path_prefix="shadow/")
+
+    # THEN
+    assert not await repo.has_uncommitted_changes()
+    assert diff == """diff --git a/shadow/file1 b/shadow/file1
+index b45ef6f..33607d0 100644
+--- a/shadow/file1
++++ b/shadow/file1
+@@ -1 +1 @@
+-Hello, World!
+\\ No newline at end of file
++Hallo, Welt!
+\\ No newline at end of file
+"""
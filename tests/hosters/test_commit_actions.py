@@ -0,0 +1,79 @@
+from pathlib import Path
+
+import pytest
+
+from foxops.external.git import GitRepository
+from foxops.hosters.commit_actions import (
+    UnsupportedCommitAction,
+    compute_commit_actions,
+)
+from foxops.hosters.types import CommitAction
+
+
+@pytest.fixture
+async def repo(tmp_path: Path) -> GitRepository:
+    repo = GitRepository(tmp_path)
+    await repo._run("init")
+    await repo._run("config", "user.name", "Test User")
+    await repo._run("config", "user.email", "testuser@local")
+
+    (tmp_path / "docs").mkdir()
+    (tmp_path / "unchanged.txt").write_text("unchanged")
+    (tmp_path / "updated.txt").write_text("old")
+    (tmp_path / "deleted.txt").write_text("deleted")
+    (tmp_path / "docs" / "old-name.md").write_text("moved\n" * 10)
+    await repo.commit_all("initial commit")
+
+    return repo
+
+
+async def test_compute_commit_actions_detects_all_kinds_of_changes(repo: GitRepository):
+    # GIVEN
+    (repo.directory / "updated.txt").write_text("new")
+    (repo.directory / "deleted.txt").unlink()
+    (repo.directory / "docs" / "old-name.md").rename(repo.directory / "docs" / "new-name.md")
+    (repo.directory / "created.sh").write_text("#!/bin/sh")
+    (repo.directory / "created.sh").chmod(0o755)
+    await repo.commit_all("change")
+
+    # WHEN
+    actions = await compute_commit_actions(repo, "HEAD~1", "HEAD", path_prefix="sub")
+
+    # THEN
+    assert actions == [
+        CommitAction(action="create", file_path="sub/created.sh", content=b"#!/bin/sh", executable=True),
+        CommitAction(action="delete", file_path="sub/deleted.txt"),
+        CommitAction(action="move", file_path="sub/docs/new-name.md", previous_path="sub/docs/old-name.md"),
+        CommitAction(action="update", file_path="sub/updated.txt", content=b"new"),
+    ]
+
+
+async def test_compute_commit_actions_includes_the_content_of_renamed_and_modified_files(repo: GitRepository):
+    # GIVEN
+    (repo.directory / "docs" / "old-name.md").rename(repo.directory / "docs" / "new-name.md")
+    (repo.directory / "docs" / "new-name.md").write_text("moved\n" * 10 + "and modified\n")
+    await repo.commit_all("change")
+
+    # WHEN
+    actions = await compute_commit_actions(repo, "HEAD~1", "HEAD")
+
+    # THEN
+    assert actions == [
+        CommitAction(
+            action="move",
+            file_path="docs/new-name.md",
+            previous_path="docs/old-name.md",
+            content=b"moved\n" * 10 + b"and modified\n",
+        ),
+    ]
+
+
+async def test_compute_commit_actions_rejects_symlinks(repo: GitRepository):
+    # GIVEN
+    (repo.directory / "link.txt").symlink_to("unchanged.txt")
+    await repo.commit_all("add symlink")
+
+    # THEN
+    with pytest.raises(UnsupportedCommitAction):
+        # WHEN
+        await compute_commit_actions(repo, "HEAD~1", "HEAD")
@@ -0,0 +1,484 @@
+import asyncio
+import base64
+import io
+import json
+import tarfile
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, AsyncIterator
+
+import httpx
+import pytest
+
+from foxops.engine import IncarnationState
+from foxops.errors import IncarnationRepositoryNotFound
+from foxops.external.git import GitRepository, RevisionNotFoundError
+from foxops.hosters import gitlab as gitlab_module
+from foxops.hosters.gitlab import GitlabHoster
+from foxops.hosters.template_archive import git_blob_sha
+from foxops.hosters.types import CommitAction, MergeRequestStatus
+
+
+class FakeGitlabApi:
+    """Minimal stand-in for the GitLab REST API, answering from a dict of paths to JSON payloads.
+
+    Payloads can also be callables, which are invoked with the request, or complete responses.
+    """
+
+    def __init__(self, routes: dict[str, Any]) -> None:
+        self.routes = routes
+        self.requests: list[httpx.Request] = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+
+        path = request.url.raw_path.decode().split("?")[0].removeprefix("/api/v4")
+        if (payload := self.routes.get(f"{request.method} {path}")) is None:
+            return httpx.Response(404, json={"message": "404 Not Found"})
+        if callable(payload):
+            payload = payload(request)
+        if isinstance(payload, httpx.Response):
+            return payload
+
+        return httpx.Response(200, headers={"etag": f'W/"{hash(path)}"'}, json=payload)
+
+
+@pytest.fixture
+def gitlab_api() -> FakeGitlabApi:
+    return FakeGitlabApi(
+        {
+            "GET /projects/group%2Fincarnation": {
+                "default_branch": "main",
+                "http_url_to_repo": "https://gitlab.example.com/group/incarnation.git",
+            },
+        }
+    )
+
+
+@pytest.fixture
+def gitlab_hoster(gitlab_api: FakeGitlabApi) -> GitlabHoster:
+    return GitlabHoster("https://gitlab.example.com", "token", transport=httpx.MockTransport(gitlab_api))
+
+
+async def test_get_repository_metadata_is_served_from_cache(gitlab_hoster: GitlabHoster, gitlab_api: FakeGitlabApi):
+    # GIVEN
+    await gitlab_hoster.get_repository_metadata("group/incarnation")
+
+    # WHEN
+    metadata = await gitlab_hoster.get_repository_metadata("group/incarnation")
+
+    # THEN
+    assert metadata == {"default_branch": "main", "http_url": "https://gitlab.example.com/group/incarnation.git"}
+    assert len(gitlab_api.requests) == 1
+
+
+async def test_get_branch_head_returns_the_commit_of_the_branch(gitlab_hoster: GitlabHoster, gitlab_api: FakeGitlabApi):
+    # GIVEN
+    gitlab_api.routes["GET /projects/group%2Fincarnation/repository/branches/main"] = {
+        "name": "main",
+        "commit": {"id": "abc"},
+    }
+
+    # THEN
+    assert await gitlab_hoster.get_branch_head("group/incarnation", "main") == "abc"
+    assert await gitlab_hoster.get_branch_head("group/incarnation", "missing") is None
+
+
+async def test_get_branch_head_raises_for_server_errors(gitlab_hoster: GitlabHoster, gitlab_api: FakeGitlabApi):
+    # GIVEN
+    gitlab_api.routes["GET /projects/group%2Fincarnation/repository/branches/main"] = httpx.Response(500)
+
+    # THEN
+    with pytest.raises(httpx.HTTPStatusError):
+        # WHEN
+        await gitlab_hoster.get_branch_head("group/incarnation", "main")
+
+
+INCARNATION_STATE = b"""
+template_repository: group/template
+template_repository_version: v1.0.0
+template_repository_version_hash: abc
+template_data: {name: foo}
+"""
+
+
+@pytest.fixture
+def incarnation_state_api(gitlab_api: FakeGitlabApi) -> FakeGitlabApi:
+    gitlab_api.routes["GET /projects/group%2Fincarnation/repository/files/.fengine.yaml"] = {
+        "blob_id": "blob1",
+        "last_commit_id": "def",
+        "content": base64.b64encode(INCARNATION_STATE).decode(),
+    }
+    return gitlab_api
+
+
+async def test_get_incarnation_state_reads_the_file_from_the_default_branch(
+    gitlab_hoster: GitlabHoster, incarnation_state_api: FakeGitlabApi
+):
+    # WHEN
+    result = await gitlab_hoster.get_incarnation_state("group/incarnation", ".")
+
+    # THEN
+    assert result is not None
+    commit_sha, incarnation_state = result
+    assert commit_sha == "def"
+    assert incarnation_state.template_data == {"name": "foo"}
+    assert [r.method for r in incarnation_state_api.requests] == ["GET", "GET"]
+    assert incarnation_state_api.requests[-1].url.params["ref"] == "main"
+
+
+async def test_get_incarnation_state_parses_each_blob_only_once(
+    gitlab_hoster: GitlabHoster, incarnation_state_api: FakeGitlabApi, mocker
+):
+    # GIVEN
+    from_string = mocker.spy(IncarnationState, "from_string")
+    await gitlab_hoster.get_incarnation_state("group/incarnation", ".")
+
+    # WHEN
+    result = await gitlab_hoster.get_incarnation_state("group/incarnation", ".")
+
+    # THEN
+    assert result is not None
+    assert result[1].template_repository == "group/template"
+    assert from_string.call_count == 1
+
+
+async def test_get_incarnation_state_returns_none_if_file_does_not_exist(
+    gitlab_hoster: GitlabHoster, gitlab_api: FakeGitlabApi
+):
+    # THEN
+    assert await gitlab_hoster.get_incarnation_state("group/incarnation", "subdir") is None
+
+
+async def test_get_incarnation_state_raises_for_unknown_project(gitlab_hoster: GitlabHoster):
+    # THEN
+    with pytest.raises(IncarnationRepositoryNotFound):
+        # WHEN
+        await gitlab_hoster.get_incarnation_state("group/unknown", ".")
+
+
+def graphql_merge_requests(projects: dict[str, dict[str, str]]):
+    """Answers aliased `project(fullPath:) { mergeRequests(iids:) }` queries from the given MR states per project."""
+
+    def _handler(request: httpx.Request) -> dict:
+        variables = json.loads(request.content)["variables"]
+        data: dict[str, Any] = {}
+        for name, path in variables.items():
+            if not name.startswith("path"):
+                continue
+            index = name.removeprefix("path")
+            if path not in projects:
+                data[f"p{index}"] = None
+                continue
+
+            iids = variables[f"iids{index}"]
+            nodes = [{"iid": iid, "state": state} for iid, state in projects[path].items() if iid in iids]
+            data[f"p{index}"] = {"mergeRequests": {"nodes": nodes}}
+
+        return {"data": data}
+
+    return _handler
+
+
+async def test_get_merge_request_statuses_uses_a_single_graphql_query(
+    gitlab_hoster: GitlabHoster, gitlab_api: FakeGitlabApi
+):
+    # GIVEN
+    gitlab_api.routes["POST /api/graphql"] = graphql_merge_requests(
+        {
+            "group/a": {"1": "opened", "2": "merged"},
+            "group/b": {"7": "closed", "8": "locked"},
+        }
+    )
+
+    # WHEN
+    statuses = await gitlab_hoster.get_merge_request_statuses(
+        [("group/a", "1"), ("group/a", "2"), ("group/b", "7"), ("group/b", "8"), ("group/b", "9")]
+    )
+
+    # THEN
+    assert statuses == {
+        ("group/a", "1"): MergeRequestStatus.OPEN,
+        ("group/a", "2"): MergeRequestStatus.MERGED,
+        ("group/b", "7"): MergeRequestStatus.CLOSED,
+        ("group/b", "8"): MergeRequestStatus.OPEN,
+        ("group/b", "9"): MergeRequestStatus.CLOSED,
+    }
+    assert len(gitlab_api.requests) == 1
+
+
+async def test_get_merge_request_statuses_reports_merge_requests_of_unknown_projects_as_unknown(
+    gitlab_hoster: GitlabHoster, gitlab_api: FakeGitlabApi
+):
+    # GIVEN
+    gitlab_api.routes["POST /api/graphql"] = graphql_merge_requests({"group/a": {"1": "opened"}})
+
+    # WHEN
+    statuses = await gitlab_hoster.get_merge_request_statuses([("group/a", "1"), ("group/unknown", "1")])
+
+    # THEN
+    assert statuses == {
+        ("group/a", "1"): MergeRequestStatus.OPEN,
+        ("group/unknown", "1"): MergeRequestStatus.UNKNOWN,
+    }
+
+
+async def test_get_merge_request_statuses_falls_back_to_rest_api_on_graphql_errors(
+    gitlab_hoster: GitlabHoster, gitlab_api: FakeGitlabApi
+):
+    # GIVEN
+    gitlab_api.routes["POST /api/graphql"] = {"errors": [{"message": "Query has complexity of 300"}]}
+    gitlab_api.routes["GET /projects/group%2Fa/merge_requests/1"] = {"state": "merged"}
+
+    # WHEN
+    statuses = await gitlab_hoster.get_merge_request_statuses([("group/a", "1")])
+
+    # THEN
+    assert statuses == {("group/a", "1"): MergeRequestStatus.MERGED}
+
+
+@pytest.fixture
+def merge_request_api(gitlab_api: FakeGitlabApi) -> FakeGitlabApi:
+    merge_request = {
+        "iid": 5,
+        "project_id": 1,
+        "web_url": "https://gitlab.example.com/group/incarnation/-/merge_requests/5",
+        "sha": "abc",
+        "detailed_merge_status": "checking",
+        "head_pipeline": None,
+    }
+    detailed_merge_statuses = iter(["checking", "mergeable"])
+
+    gitlab_api.routes["GET /projects/group%2Fincarnation/merge_requests"] = []
+    gitlab_api.routes["POST /projects/group%2Fincarnation/merge_requests"] = merge_request
+    gitlab_api.routes["GET /projects/1/merge_requests/5"] = lambda _: merge_request | {
+        "detailed_merge_status": next(detailed_merge_statuses, "mergeable")
+    }
+    gitlab_api.routes["PUT /projects/1/merge_requests/5/merge"] = merge_request | {"state": "merged"}
+    return gitlab_api
+
+
+def requested_paths(gitlab_api: FakeGitlabApi) -> list[str]:
+    return [f"{r.method} {r.url.raw_path.decode().split('?')[0].removeprefix('/api/v4')}" for r in gitlab_api.requests]
+
+
+async def test_merge_request_without_automerge_does_not_wait_for_mergeability_check(
+    gitlab_hoster: GitlabHoster, merge_request_api: FakeGitlabApi
+):
+    # WHEN
+    _, merge_request_id = await gitlab_hoster.merge_request(
+        incarnation_repository="group/incarnation",
+        source_branch="update",
+        title="Update",
+        description="",
+        incarnation_sub_directory=".",
+    )
+
+    # THEN
+    assert merge_request_id == "5"
+    assert "GET /projects/1/merge_requests/5" not in requested_paths(merge_request_api)
+
+
+async def test_merge_request_with_automerge_waits_for_mergeability_check(
+    gitlab_hoster: GitlabHoster, merge_request_api: FakeGitlabApi
+):
+    # WHEN
+    await gitlab_hoster.merge_request(
+        incarnation_repository="group/incarnation",
+        source_branch="update",
+        title="Update",
+        description="",
+        incarnation_sub_directory=".",
+        with_automerge=True,
+    )
+
+    # THEN
+    assert requested_paths(merge_request_api)[-4:] == [
+        "GET /projects/1/merge_requests/5",
+        "GET /projects/1/merge_requests/5",
+        "GET /projects/1/merge_requests/5",
+        "PUT /projects/1/merge_requests/5/merge",
+    ]
+
+
+async def test_merge_request_with_automerge_in_background_returns_before_merging(
+    gitlab_hoster: GitlabHoster, merge_request_api: FakeGitlabApi
+):
+    # WHEN
+    await gitlab_hoster.merge_request(
+        incarnation_repository="group/incarnation",
+        source_branch="update",
+        title="Update",
+        description="",
+        incarnation_sub_directory=".",
+        with_automerge=True,
+        automerge_in_background=True,
+    )
+
+    # THEN
+    assert "PUT /projects/1/merge_requests/5/merge" not in requested_paths(merge_request_api)
+
+    await asyncio.gather(*gitlab_hoster._background_tasks)
+    assert "PUT /projects/1/merge_requests/5/merge" in requested_paths(merge_request_api)
+
+
+async def test_commit_files_sends_all_actions_in_a_single_request(
+    gitlab_hoster: GitlabHoster, gitlab_api: FakeGitlabApi
+):
+    # GIVEN
+    gitlab_api.routes["POST /projects/group%2Fincarnation/repository/commits"] = {"id": "def"}
+
+    # WHEN
+    commit_sha = await gitlab_hoster.commit_files(
+        "group/incarnation",
+        branch="update",
+        message="update",
+        actions=[
+            CommitAction(action="update", file_path="README.md", content=b"Hello"),
+            CommitAction(action="move", file_path="b.txt", previous_path="a.txt"),
+            CommitAction(action="delete", file_path="c.txt"),
+        ],
+        start_sha="abc",
+    )
+
+    # THEN
+    assert commit_sha == "def"
+    assert json.loads(gitlab_api.requests[-1].content) == {
+        "branch": "update",
+        "commit_message": "update",
+        "start_sha": "abc",
+        "actions": [
+            {
+                "action": "update",
+                "file_path": "README.md",
+                "content": "SGVsbG8=",
+                "encoding": "base64",
+                "execute_filemode": False,
+            },
+            {"action": "move", "file_path": "b.txt", "previous_path": "a.txt", "execute_filemode": False},
+            {"action": "delete", "file_path": "c.txt"},
+        ],
+    }
+
+
+def tar_gz_archive(files: dict[str, bytes], prefix: str) -> bytes:
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as archive:
+        for name, content in files.items():
+            info = tarfile.TarInfo(f"{prefix}/{name}")
+            info.size = len(content)
+            archive.addfile(info, io.BytesIO(content))
+    return buffer.getvalue()
+
+
+def tree_entries(files: dict[str, bytes]) -> list[dict[str, str]]:
+    return [{"id": git_blob_sha(content), "type": "blob", "path": name} for name, content in files.items()]
+
+
+TEMPLATE_FILES = {"fengine.yaml": b"variables: {}\n", "template/README.md": b"Hello"}
+
+
+@pytest.fixture
+def template_api(gitlab_api: FakeGitlabApi) -> FakeGitlabApi:
+    archive = tar_gz_archive(TEMPLATE_FILES, "template-abc")
+    gitlab_api.routes |= {
+        "GET /projects/group%2Ftemplate/repository/commits/v1.0.0": {"id": "abc"},
+        "GET /projects/group%2Ftemplate/repository/archive.tar.gz": httpx.Response(200, content=archive),
+        "GET /projects/group%2Ftemplate/repository/tree": tree_entries(TEMPLATE_FILES),
+    }
+    return gitlab_api
+
+
+async def test_template_source_is_unpacked_from_repository_archive(
+    gitlab_hoster: GitlabHoster, template_api: FakeGitlabApi
+):
+    # WHEN
+    async with gitlab_hoster.template_source("https://gitlab.example.com/group/template.git", "v1.0.0") as source:
+        # THEN
+        assert source.commit_sha == "abc"
+        assert (source.directory / "fengine.yaml").read_text() == "variables: {}\n"
+        assert (source.directory / "template" / "README.md").read_text() == "Hello"
+
+    archive_request = next(r for r in template_api.requests if r.url.path.endswith("/archive.tar.gz"))
+    assert archive_request.url.params["sha"] == "abc"
+
+
+async def test_template_source_downloads_each_commit_only_once(
+    gitlab_hoster: GitlabHoster, template_api: FakeGitlabApi
+):
+    # GIVEN
+    async with gitlab_hoster.template_source("group/template", "v1.0.0"):
+        pass
+
+    # WHEN
+    async with gitlab_hoster.template_source("group/template", "v1.0.0") as source:
+        assert (source.directory / "template" / "README.md").exists()
+
+    # THEN
+    assert requested_paths(template_api).count("GET /projects/group%2Ftemplate/repository/archive.tar.gz") == 1
+
+
+async def test_template_source_raises_for_unknown_revision(gitlab_hoster: GitlabHoster, template_api: FakeGitlabApi):
+    # THEN
+    with pytest.raises(RevisionNotFoundError):
+        # WHEN
+        async with gitlab_hoster.template_source("group/template", "v2.0.0"):
+            pass
+
+
+@pytest.fixture
+def template_clones(gitlab_hoster: GitlabHoster, template_api: FakeGitlabApi, tmp_path: Path) -> list[str]:
+    """Lets the template archive lack a file marked as `export-ignore`, and records the clones of the template."""
+
+    template_api.routes["GET /projects/group%2Ftemplate/repository/tree"] = tree_entries(
+        TEMPLATE_FILES | {".ci.yml": b"test: true"}
+    )
+
+    clones: list[str] = []
+
+    @asynccontextmanager
+    async def cloned_repository(
+        repository: str, *, refspec: str | None = None, bare: bool = False
+    ) -> AsyncIterator[GitRepository]:
+        clones.append(f"{repository}@{refspec}")
+        directory = tmp_path / str(len(clones))
+        directory.mkdir()
+        repo = GitRepository(directory)
+        await repo._run("init")
+        await repo._run("config", "user.name", "Test User")
+        await repo._run("config", "user.email", "testuser@local")
+        (directory / ".ci.yml").write_text("test: true")
+        await repo.commit_all("initial commit")
+        yield repo
+
+    gitlab_hoster.cloned_repository = cloned_repository  # type: ignore
+    return clones
+
+
+async def test_template_source_clones_templates_whose_archive_differs_from_the_checkout(
+    gitlab_hoster: GitlabHoster, template_api: FakeGitlabApi, template_clones: list[str]
+):
+    # WHEN
+    for _ in range(2):
+        async with gitlab_hoster.template_source("group/template", "v1.0.0") as source:
+            # THEN
+            assert (source.directory / ".ci.yml").read_text() == "test: true"
+
+    assert template_clones == ["group/template@v1.0.0", "group/template@v1.0.0"]
+    assert requested_paths(template_api).count("GET /projects/group%2Ftemplate/repository/archive.tar.gz") == 1
+
+
+async def test_template_source_remembers_a_bounded_number_of_unarchivable_templates(
+    gitlab_hoster: GitlabHoster, template_api: FakeGitlabApi, template_clones: list[str], mocker
+):
+    # GIVEN
+    mocker.patch.object(gitlab_module, "UNARCHIVABLE_TEMPLATES_MAX_ENTRIES", 0)
+
+    # WHEN
+    for _ in range(2):
+        async with gitlab_hoster.template_source("group/template", "v1.0.0"):
+            pass
+
+    # THEN
+    assert len(template_clones) == 2
+    assert requested_paths(template_api).count("GET /projects/group%2Ftemplate/repository/archive.tar.gz") == 2
@@ -0,0 +1,155 @@
+import asyncio
+
+from foxops.hosters import ReconciliationStatus
+from foxops.hosters.gitlab import GitlabHoster
+from foxops.hosters.types import CommitAction, MergeRequestStatus
+from tests._plugins.gitlab_simulator import GitlabSimulator, Latency
+
+GITLAB_CI_CONFIG = b"build:\n  script: [echo hello]\n"
+
+
+async def test_pushed_branch_can_be_automerged(
+    gitlab_simulator: GitlabSimulator, simulated_gitlab_hoster: GitlabHoster
+):
+    # GIVEN
+    gitlab_simulator.create_project("group/incarnation", {"README.md": b"Hello"})
+    async with simulated_gitlab_hoster.cloned_repository("group/incarnation") as repo:
+        await repo.create_and_checkout_branch("update")
+        (repo.directory / "README.md").write_text("Hello World")
+        await repo.commit_all("update README")
+        await repo.push()
+
+    # WHEN
+    commit_sha, merge_request_id = await simulated_gitlab_hoster.merge_request(
+        incarnation_repository="group/incarnation",
+        source_branch="update",
+        title="update",
+        description="",
+        incarnation_sub_directory=".",
+        with_automerge=True,
+    )
+
+    # THEN
+    assert (
+        await simulated_gitlab_hoster.get_merge_request_status("group/incarnation", merge_request_id)
+        == MergeRequestStatus.MERGED
+    )
+    async with simulated_gitlab_hoster.cloned_repository("group/incarnation") as repo:
+        assert (repo.directory / "README.md").read_text() == "Hello World"
+
+
+async def test_reconciliation_status_follows_the_pipeline(
+    gitlab_simulator: GitlabSimulator, simulated_gitlab_hoster: GitlabHoster
+):
+    # GIVEN
+    gitlab_simulator.config.pipeline_duration = Latency(median=0.3)
+    gitlab_simulator.create_project("group/incarnation", {".gitlab-ci.yml": GITLAB_CI_CONFIG})
+    commit_sha = await simulated_gitlab_hoster.commit_files(
+        "group/incarnation",
+        branch="main",
+        message="add file",
+        actions=[CommitAction(action="create", file_path="README.md", content=b"Hello")],
+    )
+
+    # WHEN
+    status_while_running = await simulated_gitlab_hoster.get_reconciliation_status(
+        "group/incarnation", ".", commit_sha, None
+    )
+    await asyncio.sleep(0.3)
+    status_after_pipeline = await simulated_gitlab_hoster.get_reconciliation_status(
+        "group/incarnation", ".", commit_sha, None
+    )
+
+    # THEN
+    assert status_while_running == ReconciliationStatus.PENDING
+    assert status_after_pipeline == ReconciliationStatus.SUCCESS
+
+
+async def test_automerge_waits_for_mergeability_check(
+    gitlab_simulator: GitlabSimulator, simulated_gitlab_hoster: GitlabHoster
+):
+    # GIVEN
+    gitlab_simulator.config.mergeability_check_duration = 0.2
+    gitlab_simulator.create_project("group/incarnation", {"README.md": b"Hello"})
+    await simulated_gitlab_hoster.commit_files(
+        "group/incarnation",
+        branch="update",
+        message="update",
+        actions=[CommitAction(action="update", file_path="README.md", content=b"Hello World")],
+        start_sha=(await simulated_gitlab_hoster.has_pending_incarnation_branch("group/incarnation", "main")),
+    )
+
+    # WHEN
+    _, merge_request_id = await simulated_gitlab_hoster.merge_request(
+        incarnation_repository="group/incarnation",
+        source_branch="update",
+        title="update",
+        description="",
+        incarnation_sub_directory=".",
+        with_automerge=True,
+    )
+
+    # THEN
+    assert (
+        await simulated_gitlab_hoster.get_merge_request_status("group/incarnation", merge_request_id)
+        == MergeRequestStatus.MERGED
+    )
+    assert gitlab_simulator.requests["merge"] == 1
+
+
+async def test_injected_faults_are_retried(gitlab_simulator: GitlabSimulator):
+    # GIVEN
+    gitlab_simulator.config.server_error_probability = 0.05
+    gitlab_simulator.config.rate_limit_probability = 0.3
+    gitlab_simulator.config.retry_after = 0
+    gitlab_simulator.create_project("group/incarnation", {"README.md": b"Hello"})
+    hoster = GitlabHoster(gitlab_simulator.address, gitlab_simulator.config.token, max_retries=20)
+
+    # WHEN
+    results = await asyncio.gather(
+        *[hoster.has_pending_incarnation_branch("group/incarnation", "main") for _ in range(20)]
+    )
+
+    # THEN
+    assert all(result is not None for result in results)
+    assert hoster.rate_limit.metrics.retries > 0
+
+
+async def test_requests_are_throttled_by_the_rate_limit(gitlab_simulator: GitlabSimulator):
+    # GIVEN
+    gitlab_simulator.config.rate_limit = 10
+    gitlab_simulator.create_project("group/incarnation", {"README.md": b"Hello"})
+    hoster = GitlabHoster(gitlab_simulator.address, gitlab_simulator.config.token)
+
+    # WHEN
+    # more than twice the limit, as the requests might be spread over two rate limit windows
+    await asyncio.gather(*[hoster.does_commit_exist("group/incarnation", "main") for _ in range(30)])
+
+    # THEN
+    assert hoster.rate_limit.metrics.paused_seconds > 0 or hoster.rate_limit.metrics.throttled > 0
+
+
+async def test_template_source_is_served_from_archive(
+    gitlab_simulator: GitlabSimulator, simulated_gitlab_hoster: GitlabHoster
+):
+    # GIVEN
+    gitlab_simulator.create_project("group/template", {"fengine.yaml": b"", "template/README.md": b"Hello"})
+    gitlab_simulator.create_tag("group/template", "v1.0.0")
+
+    # WHEN
+    async with simulated_gitlab_hoster.template_source("group/template", "v1.0.0") as source:
+        # THEN
+        assert (source.directory / "template" / "README.md").read_text() == "Hello"
+    assert gitlab_simulator.requests["git"] == 0
+
+
+async def test_latency_is_injected(gitlab_simulator: GitlabSimulator, simulated_gitlab_hoster: GitlabHoster):
+    # GIVEN
+    gitlab_simulator.config.endpoint_latency["version"] = Latency(median=0.2)
+
+    # WHEN
+    started_at = asyncio.get_running_loop().time()
+    await simulated_gitlab_hoster.validate()
+
+    # THEN
+    assert asyncio.get_running_loop().time() - started_at >= 0.2
@@ -0,0 +1,172 @@
+import httpx
+import pytest
+
+from foxops.hosters.http_cache import CachingTransport, HttpCache
+
+
+class RecordingServer:
+    """Fake server answering with a fixed ETag and honoring `If-None-Match`."""
+
+    def __init__(self, etag: str = '"v1"') -> None:
+        self.etag = etag
+        self.requests: list[httpx.Request] = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+
+        if request.method != "GET":
+            return httpx.Response(201, json={})
+        if request.headers.get("if-none-match") == self.etag:
+            return httpx.Response(304, headers={"etag": self.etag})
+
+        return httpx.Response(200, headers={"etag": self.etag}, json={"path": request.url.path})
+
+
+@pytest.fixture
+def server() -> RecordingServer:
+    return RecordingServer()
+
+
+def client_for(server: RecordingServer, cache: HttpCache) -> httpx.AsyncClient:
+    transport = CachingTransport(httpx.MockTransport(server), cache, base_path="/api/v4")
+    return httpx.AsyncClient(base_url="https://gitlab.example.com/api/v4", transport=transport)
+
+
+async def test_cached_response_is_revalidated_with_a_conditional_request(server: RecordingServer):
+    # GIVEN
+    client = client_for(server, HttpCache())
+    await client.get("/projects/1/merge_requests/5")
+
+    # WHEN
+    response = await client.get("/projects/1/merge_requests/5")
+
+    # THEN
+    assert response.status_code == 200
+    assert response.json() == {"path": "/api/v4/projects/1/merge_requests/5"}
+    assert server.requests[1].headers["if-none-match"] == '"v1"'
+
+
+async def test_response_within_ttl_is_served_without_request(server: RecordingServer):
+    # GIVEN
+    client = client_for(server, HttpCache(endpoint_ttls=[(r"^/projects/[^/]+$", 60)]))
+    await client.get("/projects/group%2Fproject")
+
+    # WHEN
+    response = await client.get("/projects/group%2Fproject")
+
+    # THEN
+    assert response.status_code == 200
+    assert len(server.requests) == 1
+
+
+async def test_endpoints_without_ttl_are_not_cached(server: RecordingServer):
+    # GIVEN
+    client = client_for(server, HttpCache(endpoint_ttls=[]))
+    await client.get("/projects/1/repository/archive")
+
+    # WHEN
+    await client.get("/projects/1/repository/archive")
+
+    # THEN
+    assert "if-none-match" not in server.requests[1].headers
+
+
+async def test_modifying_request_invalidates_cached_collection_but_not_project(server: RecordingServer):
+    # GIVEN
+    cache = HttpCache(endpoint_ttls=[(r"^/projects/[^/]+$", 60), (r"^/projects/[^/]+/merge_requests$", 60)])
+    client = client_for(server, cache)
+    await client.get("/projects/1")
+    await client.get("/projects/1/merge_requests")
+
+    # WHEN
+    await client.post("/projects/1/merge_requests/5/notes")
+    await client.get("/projects/1")
+    await client.get("/projects/1/merge_requests")
+
+    # THEN
+    assert [r.url.path for r in server.requests if r.method == "GET"] == [
+        "/api/v4/projects/1",
+        "/api/v4/projects/1/merge_requests",
+        "/api/v4/projects/1/merge_requests",
+    ]
+
+
+async def test_modifying_request_does_not_invalidate_resources_with_the_same_prefix(server: RecordingServer):
+    # GIVEN
+    cache = HttpCache(endpoint_ttls=[(r"^/projects/[^/]+/merge_requests$", 60)])
+    client = client_for(server, cache)
+    await client.get("/projects/12/merge_requests")
+
+    # WHEN
+    await client.post("/projects/1/merge_requests")
+    await client.get("/projects/12/merge_requests")
+
+    # THEN
+    assert len([r for r in server.requests if r.method == "GET"]) == 1
+
+
+async def test_memory_store_is_bounded():
+    # GIVEN
+    server = RecordingServer()
+    cache = HttpCache(max_entries=2)
+    client = client_for(server, cache)
+
+    # WHEN
+    for mr in range(5):
+        await client.get(f"/projects/1/merge_requests/{mr}")
+
+    # THEN
+    assert len(cache) == 2
+
+
+async def test_disk_store_survives_a_new_cache_instance(server: RecordingServer, tmp_path):
+    # GIVEN
+    await client_for(server, HttpCache(directory=tmp_path)).get("/projects/1/merge_requests/5")
+
+    # WHEN
+    response = await client_for(server, HttpCache(directory=tmp_path)).get("/projects/1/merge_requests/5")
+
+    # THEN
+    assert response.json() == {"path": "/api/v4/projects/1/merge_requests/5"}
+    assert server.requests[1].headers["if-none-match"] == '"v1"'
+
+
+async def test_responses_are_not_shared_between_credentials(server: RecordingServer):
+    # GIVEN
+    client = client_for(server, HttpCache())
+    await client.get("/projects/1/merge_requests/5", headers={"Authorization": "Bearer a"})
+
+    # WHEN
+    await client.get("/projects/1/merge_requests/5", headers={"Authorization": "Bearer b"})
+
+    # THEN
+    assert "if-none-match" not in server.requests[1].headers
+
+
+async def test_modifying_request_invalidates_entries_which_are_only_on_disk(server: RecordingServer, tmp_path):
+    # GIVEN
+    endpoint_ttls: list[tuple[str, float]] = [(r"^/projects/[^/]+/merge_requests$", 60)]
+    await client_for(server, HttpCache(directory=tmp_path, endpoint_ttls=endpoint_ttls)).get(
+        "/projects/1/merge_requests"
+    )
+    client = client_for(server, HttpCache(directory=tmp_path, endpoint_ttls=endpoint_ttls))
+
+    # WHEN
+    await client.post("/projects/1/merge_requests")
+    await client.get("/projects/1/merge_requests")
+
+    # THEN
+    assert len([r for r in server.requests if r.method == "GET"]) == 2
+    assert "if-none-match" not in server.requests[-1].headers
+
+
+async def test_disk_store_is_bounded(server: RecordingServer, tmp_path):
+    # GIVEN
+    client = client_for(server, HttpCache(max_entries=1, directory=tmp_path, max_disk_entries=2))
+
+    # WHEN
+    for mr in range(5):
+        await client.get(f"/projects/1/merge_requests/{mr}")
+
+    # THEN
+    assert len(list(tmp_path.glob("*.json"))) == 2
@@ -4,8 +4,9 @@ import pytest
 from pytest import fixture
 
 from foxops.engine import IncarnationState
+from foxops.errors import CommitConflictError
 from foxops.hosters.local import LocalHoster
-from foxops.hosters.types import MergeRequestStatus
+from foxops.hosters.types import CommitAction, MergeRequestStatus
 
 
 @fixture(scope="function")
@@ -99,6 +100,21 @@ async def test_does_commit_exist_returns_false_for_non_existing_commit(local_hos
     assert not exists
 
 
+async def test_get_branch_head_returns_the_commit_of_existing_branches_only(local_hoster):
+    # GIVEN
+    repo_name = "test-repository"
+    await local_hoster.create_repository(repo_name)
+    async with local_hoster.cloned_repository(repo_name) as repo:
+        (repo.directory / "README.md").write_text("Hello, world!")
+        await repo.commit_all("Initial commit")
+        await repo.push()
+        commit_sha = await repo.head()
+
+    # THEN
+    assert await local_hoster.get_branch_head(repo_name, "main") == commit_sha
+    assert await local_hoster.get_branch_head(repo_name, "dummy-branch") is None
+
+
 async def test_has_pending_incarnation_branch_returns_commit_id_for_existing_branch(local_hoster):
     # GIVEN
     repo_name = "test-repository"
@@ -271,3 +287,84 @@ async def test_get_incarnation_state_returns_none_if_incarnation_does_not_exist(
 
     # THEN
     assert state is None
+
+
+async def test_get_merge_request_statuses_returns_status_of_all_merge_requests(local_hoster):
+    # GIVEN
+    repo_name = "test-repository"
+    await local_hoster.create_repository(repo_name)
+    async with local_hoster.cloned_repository(repo_name) as repo:
+        (repo.directory / "README.md").write_text("Hello, world!")
+        await repo.commit_all("Initial commit")
+        await repo.push()
+
+        for branch in ["branch-1", "branch-2"]:
+            await repo.create_and_checkout_branch(branch)
+            await repo.push()
+
+    _, mr_id_1 = await local_hoster.merge_request(
+        incarnation_repository=repo_name,
+        source_branch="branch-1",
+        title="Dummy title",
+        description="Dummy description",
+        incarnation_sub_directory=".",
+    )
+    _, mr_id_2 = await local_hoster.merge_request(
+        incarnation_repository=repo_name,
+        source_branch="branch-2",
+        title="Dummy title",
+        description="Dummy description",
+        incarnation_sub_directory=".",
+    )
+    local_hoster.close_merge_request(repo_name, mr_id_2)
+
+    # WHEN
+    statuses = await local_hoster.get_merge_request_statuses([(repo_name, mr_id_1), (repo_name, mr_id_2)])
+
+    # THEN
+    assert statuses == {
+        (repo_name, mr_id_1): MergeRequestStatus.OPEN,
+        (repo_name, mr_id_2): MergeRequestStatus.CLOSED,
+    }
+
+
+async def test_commit_files_creates_branch_from_start_sha(local_hoster):
+    # GIVEN
+    repo_name = "test-repository"
+    await local_hoster.create_repository(repo_name)
+    async with local_hoster.cloned_repository(repo_name) as repo:
+        (repo.directory / "README.md").write_text("Hello, world!")
+        await repo.commit_all("Initial commit")
+        start_sha = await repo.push()
+
+    # WHEN
+    commit_sha = await local_hoster.commit_files(
+        repo_name,
+        branch="update",
+        message="update",
+        actions=[
+            CommitAction(action="update", file_path="README.md", content=b"Hello, update!"),
+            CommitAction(action="create", file_path="docs/index.md", content=b"# Docs"),
+        ],
+        start_sha=start_sha,
+    )
+
+    # THEN
+    assert await local_hoster.has_pending_incarnation_branch(repo_name, "update") == commit_sha
+    async with local_hoster.cloned_repository(repo_name, refspec="update") as repo:
+        assert (repo.directory / "README.md").read_text() == "Hello, update!"
+        assert (repo.directory / "docs" / "index.md").read_text() == "# Docs"
+
+
+async def test_commit_files_fails_if_branch_to_create_already_exists(local_hoster):
+    # GIVEN
+    repo_name = "test-repository"
+    await local_hoster.create_repository(repo_name)
+    async with local_hoster.cloned_repository(repo_name) as repo:
+        (repo.directory / "README.md").write_text("Hello, world!")
+        await repo.commit_all("Initial commit")
+        start_sha = await repo.push()
+
+    # THEN
+    with pytest.raises(CommitConflictError):
+        await local_hoster.commit_files(repo_name, branch="main", message="update", actions=[], start_sha=start_sha)
@@ -0,0 +1,152 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from foxops.hosters import rate_limit as rate_limit_module
+from foxops.hosters.rate_limit import AdaptiveConcurrencyLimiter, RateLimitTransport
+
+
+class ScriptedServer:
+    """Fake server answering with the given responses in order (repeating the last one)."""
+
+    def __init__(self, *responses: httpx.Response | Exception) -> None:
+        self.responses = list(responses)
+        self.requests: list[httpx.Request] = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+
+        response = self.responses.pop(0) if len(self.responses) > 1 else self.responses[0]
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+def client_for(server: ScriptedServer, **kwargs) -> tuple[httpx.AsyncClient, RateLimitTransport]:
+    transport = RateLimitTransport(httpx.MockTransport(server), backoff_base=0, **kwargs)
+    return httpx.AsyncClient(base_url="https://gitlab.example.com/api/v4", transport=transport), transport
+
+
+async def test_too_many_requests_is_retried_after_retry_after():
+    # GIVEN
+    server = ScriptedServer(httpx.Response(429, headers={"Retry-After": "0"}), httpx.Response(201))
+    client, transport = client_for(server)
+
+    # WHEN
+    response = await client.post("/projects/1/merge_requests", json={})
+
+    # THEN
+    assert response.status_code == 201
+    assert len(server.requests) == 2
+    assert transport.metrics.throttled == 1
+    assert transport.metrics.retries == 1
+
+
+async def test_back_offs_are_logged_with_the_metrics(mocker):
+    # GIVEN
+    logger = mocker.patch.object(rate_limit_module, "logger")
+    server = ScriptedServer(httpx.Response(429, headers={"Retry-After": "0"}), httpx.Response(200))
+    client, _ = client_for(server)
+
+    # WHEN
+    await client.get("/projects/1")
+
+    # THEN
+    logger.warning.assert_called_once()
+    assert logger.warning.call_args.kwargs["reason"] == "rate limit hit"
+    assert logger.warning.call_args.kwargs["throttled"] == 1
+    assert logger.warning.call_args.kwargs["retries"] == 1
+
+
+async def test_server_errors_are_only_retried_for_idempotent_requests():
+    # GIVEN
+    server = ScriptedServer(httpx.Response(503), httpx.Response(200))
+    client, _ = client_for(server)
+
+    # WHEN
+    post_response = await client.post("/projects/1/merge_requests", json={})
+    get_response = await client.get("/projects/1")
+
+    # THEN
+    assert post_response.status_code == 503
+    assert get_response.status_code == 200
+
+
+async def test_connection_errors_are_retried_for_idempotent_requests():
+    # GIVEN
+    server = ScriptedServer(httpx.ConnectError("connection refused"), httpx.Response(200))
+    client, _ = client_for(server)
+
+    # WHEN
+    response = await client.get("/projects/1")
+
+    # THEN
+    assert response.status_code == 200
+
+
+async def test_retries_are_limited():
+    # GIVEN
+    server = ScriptedServer(httpx.Response(429, headers={"Retry-After": "0"}))
+    client, _ = client_for(server, max_retries=2)
+
+    # WHEN
+    response = await client.get("/projects/1")
+
+    # THEN
+    assert response.status_code == 429
+    assert len(server.requests) == 3
+
+
+async def test_requests_are_paused_until_reset_when_rate_limit_is_exhausted():
+    # GIVEN
+    reset = time.time() + 0.3
+    server = ScriptedServer(
+        httpx.Response(
+            200, headers={"RateLimit-Limit": "100", "RateLimit-Remaining": "0", "RateLimit-Reset": str(reset)}
+        ),
+        httpx.Response(200),
+    )
+    client, transport = client_for(server)
+    await client.get("/projects/1")
+
+    # WHEN
+    await client.get("/projects/1")
+
+    # THEN
+    assert time.time() >= reset
+    assert transport.metrics.paused_seconds > 0
+
+
+async def test_concurrency_limit_decreases_multiplicatively_and_increases_additively():
+    # GIVEN
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=8, max_limit=16)
+
+    # WHEN
+    limiter.decrease()
+    limit_after_throttling = limiter.limit
+    for _ in range(4):
+        limiter.increase()
+
+    # THEN
+    assert limit_after_throttling == 4
+    assert limiter.limit == pytest.approx(5, abs=0.1)
+
+
+async def test_concurrency_limiter_bounds_requests_in_flight():
+    # GIVEN
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=2, max_limit=2)
+    max_in_flight = 0
+
+    async def request():
+        nonlocal max_in_flight
+        async with limiter.slot():
+            max_in_flight = max(max_in_flight, limiter.in_flight)
+            await asyncio.sleep(0.01)
+
+    # WHEN
+    await asyncio.gather(*[request() for _ in range(10)])
+
+    # THEN
+    assert max_in_flight == 2
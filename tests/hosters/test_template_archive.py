@@ -0,0 +1,100 @@
+import io
+import os
+import tarfile
+from pathlib import Path
+
+from foxops.hosters.template_archive import (
+    TemplateArchiveCache,
+    find_tree_differences,
+    git_blob_sha,
+    unpack_tar_archive,
+)
+
+
+def tar_archive(files: dict[str, bytes]) -> io.BytesIO:
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as archive:
+        for name, content in files.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            archive.addfile(info, io.BytesIO(content))
+    buffer.seek(0)
+    return buffer
+
+
+def test_unpack_tar_archive_strips_top_level_directory(tmp_path: Path):
+    # GIVEN
+    archive = tar_archive({"template-abc/fengine.yaml": b"", "template-abc/template/README.md": b"Hello"})
+
+    # WHEN
+    unpack_tar_archive(archive, tmp_path)
+
+    # THEN
+    assert (tmp_path / "fengine.yaml").exists()
+    assert (tmp_path / "template" / "README.md").read_text() == "Hello"
+
+
+async def test_archive_cache_evicts_least_recently_used_entries_which_are_not_in_use(tmp_path: Path):
+    # GIVEN
+    cache = TemplateArchiveCache(tmp_path, max_entries=1)
+    downloads: list[str] = []
+
+    def download(key: str):
+        async def _download(destination: Path) -> None:
+            downloads.append(key)
+            (destination / "key").write_text(key)
+
+        return _download
+
+    # WHEN
+    async with cache.unpacked("a", download("a")) as a:
+        async with cache.unpacked("b", download("b")):
+            pass
+        # "b" is evicted instead of "a", which is still in use
+        assert (a / "key").read_text() == "a"
+
+    async with cache.unpacked("a", download("a")):
+        pass
+    async with cache.unpacked("b", download("b")):
+        pass
+
+    # THEN
+    assert downloads == ["a", "b", "b"]
+
+
+def test_unpack_tar_archive_keeps_symlinks_to_absolute_paths(tmp_path: Path):
+    # GIVEN
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as tar:
+        info = tarfile.TarInfo("template-abc/link")
+        info.type = tarfile.SYMTYPE
+        info.linkname = "/etc/hostname"
+        tar.addfile(info)
+    buffer.seek(0)
+
+    # WHEN
+    unpack_tar_archive(buffer, tmp_path)
+
+    # THEN
+    assert os.readlink(tmp_path / "link") == "/etc/hostname"
+
+
+def test_find_tree_differences_reports_missing_and_changed_files(tmp_path: Path):
+    # GIVEN
+    (tmp_path / "template").mkdir()
+    (tmp_path / "template" / "README.md").write_text("Hello")
+    (tmp_path / "template" / "VERSION").write_text("$Format:%H$")
+    (tmp_path / "link").symlink_to("template/README.md")
+
+    blobs = {
+        "template/README.md": git_blob_sha(b"Hello"),
+        "template/VERSION": git_blob_sha(b"abc"),
+        "template/.ci.yml": git_blob_sha(b""),
+        "link": git_blob_sha(b"template/README.md"),
+    }
+
+    # WHEN
+    differences = find_tree_differences(tmp_path, blobs)
+
+    # THEN
+    assert differences == ["template/.ci.yml", "template/VERSION"]
@@ -1,14 +1,17 @@
 from datetime import datetime, timezone
+from pathlib import Path
 from unittest.mock import AsyncMock, Mock
 
 import pytest
 from fastapi import FastAPI, status
 from httpx import AsyncClient
 
-from foxops.dependencies import get_change_service
+from foxops.database.repositories.job.model import JobInDB, JobStatus, JobType
+from foxops.dependencies import get_change_service, get_job_service
 from foxops.hosters.types import MergeRequestStatus
 from foxops.models.change import Change, ChangeWithMergeRequest
-from foxops.services.change import ChangeService
+from foxops.services.change import ChangePreview, ChangeService
+from foxops.services.job import ChangeJobArguments, JobService
 
 
 @pytest.fixture
@@ -46,6 +49,107 @@ async def test_create_change(api_client: AsyncClient, change_service_mock: Chang
     assert response.json()["revision"] == 2
 
 
+async def test_create_change_with_automerge_in_background(api_client: AsyncClient, change_service_mock: ChangeService):
+    # GIVEN
+    change_service_mock.create_change_merge_request = AsyncMock(  # type: ignore
+        return_value=ChangeWithMergeRequest(
+            id=1,
+            incarnation_id=1,
+            revision=2,
+            requested_version="1.0.0",
+            requested_version_hash="template_commit_sha",
+            requested_data={},
+            template_data_full={},
+            created_at=datetime.now(timezone.utc),
+            commit_sha="commit_sha",
+            merge_request_id="1",
+            merge_request_branch_name="update",
+            merge_request_status=MergeRequestStatus.OPEN,
+        )
+    )
+
+    # WHEN
+    response = await api_client.post(
+        "/incarnations/1/changes",
+        json={
+            "change_type": "merge_request_automerge",
+            "requested_version": "1.0.0",
+            "requested_data": {},
+            "automerge_in_background": True,
+        },
+    )
+
+    # THEN
+    assert response.status_code == status.HTTP_201_CREATED
+    change_service_mock.create_change_merge_request.assert_awaited_once_with(  # type: ignore
+        1, "1.0.0", {}, automerge=True, automerge_in_background=True
+    )
+
+
+async def test_create_change_asynchronously(api_client: AsyncClient, app: FastAPI):
+    # GIVEN
+    job_service = Mock(spec_set=JobService)
+    job_service.enqueue_change = AsyncMock(
+        return_value=JobInDB(
+            id=7,
+            type=JobType.CHANGE,
+            incarnation_id=1,
+            arguments={},
+            status=JobStatus.PENDING,
+            progress=None,
+            error=None,
+            change_id=None,
+            created_at=datetime.now(timezone.utc),
+            started_at=None,
+            finished_at=None,
+            heartbeat_at=None,
+        )
+    )
+    app.dependency_overrides[get_job_service] = lambda: job_service
+
+    # WHEN
+    response = await api_client.post(
+        "/incarnations/1/changes",
+        json={"change_type": "merge_request_automerge", "requested_version": "1.0.0", "requested_data": {}},
+        headers={"Prefer": "respond-async"},
+    )
+
+    # THEN
+    assert response.status_code == status.HTTP_202_ACCEPTED
+    assert response.headers["Location"] == "/api/jobs/7"
+    assert response.json()["status"] == "pending"
+    job_service.enqueue_change.assert_awaited_once_with(
+        1, ChangeJobArguments(requested_version="1.0.0", requested_data={}, merge_request=True, automerge=True)
+    )
+
+
+async def test_preview_change(api_client: AsyncClient, change_service_mock: ChangeService):
+    # GIVEN
+    change_service_mock.preview_change = AsyncMock(  # type: ignore
+        return_value=ChangePreview(diff="+Hello, world2!", conflicts=[Path("README.md")], deleted=[])
+    )
+
+    # WHEN
+    response = await api_client.post(
+        "/incarnations/1/changes/preview", json={"requested_version": "1.0.0", "requested_data": {}}
+    )
+
+    # THEN
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {"diff": "+Hello, world2!", "conflicts": ["README.md"], "deleted": []}
+    change_service_mock.preview_change.assert_called_once_with(1, "1.0.0", {}, patch=False)  # type: ignore
+
+
+async def test_preview_change_requires_a_version_unless_patching(
+    api_client: AsyncClient, change_service_mock: ChangeService
+):
+    # WHEN
+    response = await api_client.post("/incarnations/1/changes/preview", json={"requested_data": {}})
+
+    # THEN
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
 async def test_list_changes(api_client: AsyncClient, change_service_mock: ChangeService):
     # GIVEN
     change_service_mock.list_changes = AsyncMock(  # type: ignore
@@ -13,7 +13,12 @@ from foxops.database.repositories.incarnation.errors import IncarnationNotFoundE
 from foxops.database.repositories.incarnation.repository import IncarnationRepository
 from foxops.dependencies import get_change_service
 from foxops.models.change import Change
-from foxops.services.change import ChangeService, IncarnationAlreadyExists
+from foxops.services.change import (
+    BulkChangeResult,
+    BulkChangeStatus,
+    ChangeService,
+    IncarnationAlreadyExists,
+)
 
 pytestmark = [pytest.mark.api]
 
@@ -97,8 +102,8 @@ async def test_api_get_incarnations_returns_incarnations_from_inventory(
         commit_sha="commit_sha",
         requested_version="v1.0",
         requested_version_hash="template_commit_sha",
-        requested_data=json.dumps({"foo": "bar"}),
-        template_data_full=json.dumps({"foo": "bar"}),
+        requested_data={"foo": "bar"},
+        template_data_full={"foo": "bar"},
     )
 
     # WHEN
@@ -124,6 +129,41 @@ async def test_api_get_incarnations_returns_incarnations_from_inventory(
     ]
 
 
+async def test_api_get_incarnations_returns_link_to_next_page(
+    api_client: AsyncClient,
+    change_repository: ChangeRepository,
+):
+    # GIVEN
+    for name in ["group/a", "group/b", "other/c", "group/d"]:
+        await change_repository.create_incarnation_with_first_change(
+            incarnation_repository=name,
+            target_directory=".",
+            template_repository="template",
+            commit_sha="commit_sha",
+            requested_version="v1.0",
+            requested_version_hash="template_commit_sha",
+            requested_data={},
+            template_data_full={},
+        )
+
+    # WHEN
+    first_page = await api_client.get("/incarnations", params={"incarnation_repository_prefix": "group/", "limit": 2})
+    second_page = await api_client.get(first_page.links["next"]["url"])
+
+    # THEN
+    assert [inc["incarnation_repository"] for inc in first_page.json()] == ["group/a", "group/b"]
+    assert [inc["incarnation_repository"] for inc in second_page.json()] == ["group/d"]
+    assert "next" not in second_page.links
+
+
+async def test_api_get_incarnations_rejects_invalid_template_data_condition(api_client: AsyncClient):
+    # WHEN
+    response = await api_client.get("/incarnations", params={"template_data": "java_version<21"})
+
+    # THEN
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+
+
 async def test_api_create_incarnation(
     api_client: AsyncClient,
     app: FastAPI,
@@ -174,6 +214,38 @@ async def test_api_create_incarnation_returns_conflict_when_incarnation_already_
     assert response.status_code == HTTPStatus.CONFLICT
 
 
+async def test_api_bulk_change_streams_results_of_each_incarnation(
+    api_client: AsyncClient,
+    change_service_mock: ChangeService,
+):
+    # GIVEN
+    async def update_incarnations_of_template(**kwargs):
+        for incarnation_id, status in enumerate([BulkChangeStatus.MERGE_REQUEST, BulkChangeStatus.FAILED]):
+            yield BulkChangeResult(
+                incarnation_id=incarnation_id,
+                incarnation_repository=f"incarnation-{incarnation_id}",
+                target_directory=".",
+                status=status,
+            )
+
+    change_service_mock.update_incarnations_of_template = Mock(  # type: ignore
+        side_effect=update_incarnations_of_template
+    )
+
+    # WHEN
+    response = await api_client.post(
+        "/incarnations/bulk-changes",
+        json={"template_repository": "template", "requested_version": "v2", "template_data": ["java:lt:21"]},
+    )
+
+    # THEN
+    assert response.status_code == HTTPStatus.OK
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert [json.loads(line)["status"] for line in response.text.splitlines()] == ["merge_request", "failed"]
+    filter_ = change_service_mock.update_incarnations_of_template.call_args.kwargs["filter_"]
+    assert filter_.template_data[0].path == ["java"]
+
+
 async def test_api_delete_incarnation_removes_incarnation_from_inventory(
     api_client: AsyncClient,
     incarnation_repository: IncarnationRepository,
@@ -0,0 +1,109 @@
+import json
+from pathlib import Path
+
+import pytest
+from httpx import AsyncClient
+
+from foxops.database.repositories.hoster_state.repository import HosterStateRepository
+
+pytestmark = [pytest.mark.api]
+
+#: Holds webhook payloads as recorded from GitLab
+GITLAB_WEBHOOK_PAYLOADS = Path(__file__).parent / "gitlab_webhooks"
+
+
+def gitlab_webhook_payload(name: str) -> dict:
+    return json.loads((GITLAB_WEBHOOK_PAYLOADS / f"{name}.json").read_text())
+
+
+@pytest.fixture
+def webhook_secret_token(monkeypatch) -> str:
+    monkeypatch.setenv("FOXOPS_WEBHOOK_SECRET_TOKEN", "webhook-secret")
+    return "webhook-secret"
+
+
+async def test_gitlab_webhook_is_disabled_without_secret_token(unauthenticated_client: AsyncClient):
+    # WHEN
+    response = await unauthenticated_client.post(
+        "/api/webhooks/gitlab", json=gitlab_webhook_payload("push"), headers={"X-Gitlab-Token": "anything"}
+    )
+
+    # THEN
+    assert response.status_code == 404
+
+
+async def test_gitlab_webhook_rejects_invalid_token(unauthenticated_client: AsyncClient, webhook_secret_token: str):
+    # WHEN
+    response = await unauthenticated_client.post(
+        "/api/webhooks/gitlab", json=gitlab_webhook_payload("push"), headers={"X-Gitlab-Token": "wrong"}
+    )
+
+    # THEN
+    assert response.status_code == 401
+
+
+async def test_gitlab_webhook_stores_merge_request_state(
+    unauthenticated_client: AsyncClient, webhook_secret_token: str, hoster_state_repository: HosterStateRepository
+):
+    # WHEN
+    response = await unauthenticated_client.post(
+        "/api/webhooks/gitlab",
+        json=gitlab_webhook_payload("merge_request_merged"),
+        headers={"X-Gitlab-Token": webhook_secret_token},
+    )
+
+    # THEN
+    assert response.status_code == 204
+
+    state = await hoster_state_repository.get_merge_request_state("group/incarnation", "5")
+    assert state is not None
+    assert state.state == "merged"
+    assert state.merge_commit_sha == "7a7d0b53f6f1d2ea5c3c0e3cda7bfa5a1f0e6c61"
+
+
+async def test_gitlab_webhook_stores_pipeline_status(
+    unauthenticated_client: AsyncClient, webhook_secret_token: str, hoster_state_repository: HosterStateRepository
+):
+    # WHEN
+    response = await unauthenticated_client.post(
+        "/api/webhooks/gitlab",
+        json=gitlab_webhook_payload("pipeline_success"),
+        headers={"X-Gitlab-Token": webhook_secret_token},
+    )
+
+    # THEN
+    assert response.status_code == 204
+
+    status = await hoster_state_repository.get_commit_status(
+        "group/incarnation", "7a7d0b53f6f1d2ea5c3c0e3cda7bfa5a1f0e6c61"
+    )
+    assert status is not None
+    assert status.status == "success"
+
+
+async def test_gitlab_webhook_rejects_malformed_events(unauthenticated_client: AsyncClient, webhook_secret_token: str):
+    # GIVEN
+    payload = gitlab_webhook_payload("merge_request_merged")
+    del payload["object_attributes"]["iid"]
+
+    # WHEN
+    response = await unauthenticated_client.post(
+        "/api/webhooks/gitlab", json=payload, headers={"X-Gitlab-Token": webhook_secret_token}
+    )
+
+    # THEN
+    assert response.status_code == 422
+
+
+async def test_gitlab_webhook_accepts_unsupported_events(
+    unauthenticated_client: AsyncClient, webhook_secret_token: str
+):
+    # WHEN
+    response = await unauthenticated_client.post(
+        "/api/webhooks/gitlab",
+        json={"object_kind": "issue", "project": {"path_with_namespace": "group/incarnation"}},
+        headers={"X-Gitlab-Token": webhook_secret_token},
+    )
+
+    # THEN
+    assert response.status_code == 204
@@ -1,27 +1,41 @@
 import asyncio
+from contextlib import aclosing
+from datetime import timedelta
 from pathlib import Path
 
 import pytest
 from pytest import fixture
 from sqlalchemy.ext.asyncio import AsyncEngine
 
-from foxops.database.repositories.change.errors import ChangeNotFoundError
+import foxops.engine as fengine
+from foxops.database.repositories.change.errors import (
+    ChangeConflictError,
+    ChangeNotFoundError,
+)
 from foxops.database.repositories.change.repository import ChangeRepository
+from foxops.database.repositories.hoster_state.repository import HosterStateRepository
 from foxops.database.repositories.incarnation.errors import IncarnationNotFoundError
 from foxops.database.repositories.incarnation.repository import IncarnationRepository
+from foxops.database.repositories.repository_lock.repository import (
+    RepositoryLockRepository,
+)
 from foxops.engine import IncarnationState
 from foxops.engine.models.template_config import (
     StringVariableDefinition,
     TemplateConfig,
 )
-from foxops.external.git import git_exec
+from foxops.external.git import GitRepository, git_exec
+from foxops.hosters.commit_actions import UnsupportedCommitAction
 from foxops.hosters.local import LocalHoster
 from foxops.hosters.types import MergeRequestStatus, ReconciliationStatus
 from foxops.models import Incarnation
 from foxops.models.change import Change, ChangeWithMergeRequest
+from foxops.services import change as change_module
 from foxops.services.change import (
+    BulkChangeStatus,
     CannotRepairChangeException,
     ChangeRejectedDueToNoChanges,
+    ChangeRejectedDueToPreviousUnfinishedChange,
     ChangeService,
     IncarnationAlreadyExists,
     _construct_merge_request_conflict_description,
@@ -29,6 +43,9 @@ from foxops.services.change import (
     _load_fengine_reset_ignore,
     delete_all_files_in_local_git_repository,
 )
+from foxops.services.diff_cache import ChangePreviewCache, IncarnationDiffCache
+from foxops.services.hoster_state import HosterStateService
+from foxops.services.repository_lock import RepositoryLocks
 
 
 @fixture(scope="function")
@@ -233,6 +250,48 @@ async def test_create_incarnation_succeeds_with_internal_retries_when_the_first_
         assert await repo.has_commit(change_2.commit_sha)
 
 
+async def test_create_incarnation_pushes_without_retries_when_changes_of_the_same_repository_are_locked(
+    test_file_async_engine: AsyncEngine, git_repo_template: str, tmp_path: Path, mocker
+):
+    # GIVEN
+    hoster = LocalHoster(tmp_path, push_delay_seconds=1)
+    repo_name = "monorepo"
+    await hoster.create_repository(repo_name)
+
+    # services of two processes, which share the locks through the database
+    change_services = [
+        ChangeService(
+            hoster=hoster,
+            incarnation_repository=IncarnationRepository(test_file_async_engine),
+            change_repository=ChangeRepository(test_file_async_engine),
+            repository_locks=RepositoryLocks(
+                RepositoryLockRepository(test_file_async_engine), poll_interval=timedelta(milliseconds=50)
+            ),
+        )
+        for _ in range(2)
+    ]
+    pull = mocker.spy(GitRepository, "pull")
+
+    # WHEN
+    changes = await asyncio.gather(
+        *(
+            change_service.create_incarnation(
+                incarnation_repository=repo_name,
+                target_directory=f"inc{index}",
+                template_repository=git_repo_template,
+                template_repository_version="v1.0.0",
+                template_data={},
+            )
+            for index, change_service in enumerate(change_services)
+        )
+    )
+
+    # THEN
+    pull.assert_not_called()
+    async with hoster.cloned_repository(repo_name) as repo:
+        assert all([await repo.has_commit(change.commit_sha) for change in changes])
+
+
 async def test_create_incarnation_fails_if_there_is_already_one_at_the_target(
     change_service: ChangeService, git_repo_template: str, local_hoster: LocalHoster
 ):
@@ -277,6 +336,48 @@ async def test_create_change_direct_succeeds_when_updating_the_template_version(
         assert incarnation_state.template_repository_version == "v1.1.0"
 
 
+async def test_preview_change_returns_the_diff_without_changing_the_incarnation(
+    change_service: ChangeService, initialized_incarnation: Incarnation
+):
+    # WHEN
+    preview = await change_service.preview_change(
+        initialized_incarnation.id, requested_version="v1.1.0", requested_data={}
+    )
+
+    # THEN
+    assert "+Hello, world2!" in preview.diff
+    assert preview.conflicts == []
+    assert preview.deleted == []
+    assert len(await change_service.list_changes(initialized_incarnation.id)) == 1
+
+    async with change_service._hoster.cloned_repository(initialized_incarnation.incarnation_repository) as repo:
+        assert (repo.directory / "README.md").read_text() == "Hello, world!"
+
+
+async def test_create_change_direct_reuses_the_update_computed_for_a_preview(
+    change_service: ChangeService, initialized_incarnation: Incarnation, mocker
+):
+    # GIVEN
+    change_service._preview_cache = ChangePreviewCache()
+    await change_service.preview_change(initialized_incarnation.id, requested_version="v1.1.0", requested_data={})
+
+    # WHEN
+    update = mocker.spy(fengine, "update_incarnation_from_git_template_repository")
+    change = await change_service.create_change_direct(
+        initialized_incarnation.id, requested_version="v1.1.0", requested_data={}
+    )
+
+    # THEN
+    update.assert_not_called()
+    assert change.requested_version == "v1.1.0"
+
+    async with change_service._hoster.cloned_repository(initialized_incarnation.incarnation_repository) as repo:
+        assert (repo.directory / "README.md").read_text() == "Hello, world2!"
+
+        incarnation_state = IncarnationState.from_file(repo.directory / ".fengine.yaml")
+        assert incarnation_state.template_repository_version == "v1.1.0"
+
+
 async def test_create_change_direct_succeeds_and_makes_new_template_variables_visible_in_the_foxops_api(
     change_service: ChangeService, initialized_incarnation: Incarnation
 ):
@@ -352,6 +453,42 @@ async def test_create_change_direct_succeeds_when_the_previous_change_was_not_me
     assert change.commit_sha != previous_commit_sha
 
 
+async def test_create_change_checks_the_previous_merge_request_with_the_hoster_instead_of_the_stored_state(
+    change_service: ChangeService,
+    initialized_incarnation: Incarnation,
+    local_hoster: LocalHoster,
+    hoster_state_repository: HosterStateRepository,
+):
+    # GIVEN
+    change_service._hoster_state = HosterStateService(
+        local_hoster, hoster_state_repository, max_age=timedelta(minutes=10)
+    )
+    previous_change = await change_service.create_change_merge_request(
+        incarnation_id=initialized_incarnation.id,
+        requested_version="v1.1.0",
+        requested_data={},
+    )
+    await hoster_state_repository.upsert_merge_request_state(
+        initialized_incarnation.incarnation_repository,
+        previous_change.merge_request_id,
+        state="opened",
+        merge_status="can_be_merged",
+        sha=None,
+        merge_commit_sha=None,
+    )
+    local_hoster.close_merge_request(initialized_incarnation.incarnation_repository, previous_change.merge_request_id)
+
+    # WHEN
+    change = await change_service.create_change_merge_request(
+        incarnation_id=initialized_incarnation.id,
+        requested_version="v1.2.0",
+        requested_data={},
+    )
+
+    # THEN
+    assert change.revision == previous_change.revision + 1
+
+
 async def test_create_change_direct_succeeds_with_reverting_a_variable_back_to_its_default_value_if_not_explicitly_specified(
     change_service: ChangeService,
     initialized_incarnation: Incarnation,
@@ -423,6 +560,257 @@ async def test_create_change_merge_request_succeeds_when_updating_the_template_v
         assert incarnation_state.template_repository_version == "v1.1.0"
 
 
+async def test_create_change_merge_request_succeeds_when_committing_via_hoster_api(
+    change_service: ChangeService, initialized_incarnation: Incarnation
+):
+    # GIVEN
+    change_service._commit_via_hoster_api = True
+
+    # WHEN
+    change = await change_service.create_change_merge_request(
+        initialized_incarnation.id, requested_version="v1.1.0", requested_data={}, automerge=False
+    )
+
+    # THEN
+    assert change.merge_request_status == MergeRequestStatus.OPEN
+
+    async with change_service._hoster.cloned_repository(
+        initialized_incarnation.incarnation_repository, refspec=change.merge_request_branch_name
+    ) as repo:
+        assert await repo.head() == change.commit_sha
+        assert (repo.directory / "README.md").read_text() == "Hello, world2!"
+
+        incarnation_state = IncarnationState.from_file(repo.directory / ".fengine.yaml")
+        assert incarnation_state.template_repository_version == "v1.1.0"
+
+
+async def test_create_change_merge_request_pushes_changes_which_cannot_be_committed_via_hoster_api(
+    change_service: ChangeService, initialized_incarnation: Incarnation, mocker
+):
+    # GIVEN
+    change_service._commit_via_hoster_api = True
+    mocker.patch("foxops.services.change.compute_commit_actions", side_effect=UnsupportedCommitAction("symlinks"))
+    commit_files = mocker.spy(change_service._hoster, "commit_files")
+
+    # WHEN
+    change = await change_service.create_change_merge_request(
+        initialized_incarnation.id, requested_version="v1.1.0", requested_data={}, automerge=False
+    )
+
+    # THEN
+    commit_files.assert_not_called()
+    async with change_service._hoster.cloned_repository(
+        initialized_incarnation.incarnation_repository, refspec=change.merge_request_branch_name
+    ) as repo:
+        assert await repo.head() == change.commit_sha
+        assert (repo.directory / "README.md").read_text() == "Hello, world2!"
+
+
+async def test_create_change_merge_request_for_repository_updates_all_incarnations_with_one_merge_request(
+    change_service: ChangeService, local_hoster: LocalHoster, git_repo_template: str, mocker
+):
+    # GIVEN
+    repo_name = "monorepo"
+    await local_hoster.create_repository(repo_name)
+    incarnation_ids = [
+        (
+            await change_service.create_incarnation(
+                incarnation_repository=repo_name,
+                target_directory=target_directory,
+                template_repository=git_repo_template,
+                template_repository_version="v1.0.0",
+                template_data={},
+            )
+        ).incarnation_id
+        for target_directory in ("inc1", "inc2")
+    ]
+    cloned_repository = mocker.spy(local_hoster, "cloned_repository")
+
+    # WHEN
+    changes = await change_service.create_change_merge_request_for_repository(
+        incarnation_ids, requested_version="v1.1.0", requested_data={}
+    )
+
+    # THEN
+    assert [change.incarnation_id for change in changes] == incarnation_ids
+    assert all(change.revision == 2 for change in changes)
+    assert len({(change.merge_request_id, change.commit_sha) for change in changes}) == 1
+    assert [call.args[0] for call in cloned_repository.call_args_list].count(repo_name) == 1
+
+    async with local_hoster.cloned_repository(repo_name, refspec=changes[0].merge_request_branch_name) as repo:
+        assert await repo.head() == changes[0].commit_sha
+        for target_directory in ("inc1", "inc2"):
+            assert (repo.directory / target_directory / "README.md").read_text() == "Hello, world2!"
+            incarnation_state = IncarnationState.from_file(repo.directory / target_directory / ".fengine.yaml")
+            assert incarnation_state.template_repository_version == "v1.1.0"
+
+
+async def test_create_change_merge_request_for_repository_removes_the_created_changes_on_a_conflict(
+    change_service: ChangeService, local_hoster: LocalHoster, git_repo_template: str, mocker
+):
+    # GIVEN
+    repo_name = "monorepo"
+    await local_hoster.create_repository(repo_name)
+    incarnation_ids = [
+        (
+            await change_service.create_incarnation(
+                incarnation_repository=repo_name,
+                target_directory=target_directory,
+                template_repository=git_repo_template,
+                template_repository_version="v1.0.0",
+                template_data={},
+            )
+        ).incarnation_id
+        for target_directory in ("inc1", "inc2")
+    ]
+    create_change = change_service._change_repository.create_change
+
+    async def create_change_with_conflict_for_second_incarnation(**kwargs):
+        if kwargs["incarnation_id"] == incarnation_ids[1]:
+            raise ChangeConflictError(kwargs["incarnation_id"], kwargs["revision"])
+        return await create_change(**kwargs)
+
+    mocker.patch.object(
+        change_service._change_repository,
+        "create_change",
+        side_effect=create_change_with_conflict_for_second_incarnation,
+    )
+
+    # WHEN
+    with pytest.raises(ChangeConflictError):
+        await change_service.create_change_merge_request_for_repository(
+            incarnation_ids, requested_version="v1.1.0", requested_data={}
+        )
+
+    # THEN
+    for incarnation_id in incarnation_ids:
+        assert [change.revision for change in await change_service.list_changes(incarnation_id)] == [1]
+
+
+async def test_create_change_merge_request_for_repository_fails_if_a_previous_change_is_unfinished(
+    change_service: ChangeService, local_hoster: LocalHoster, git_repo_template: str
+):
+    # GIVEN
+    repo_name = "monorepo"
+    await local_hoster.create_repository(repo_name)
+    incarnation_ids = [
+        (
+            await change_service.create_incarnation(
+                incarnation_repository=repo_name,
+                target_directory=target_directory,
+                template_repository=git_repo_template,
+                template_repository_version="v1.0.0",
+                template_data={},
+            )
+        ).incarnation_id
+        for target_directory in ("inc1", "inc2")
+    ]
+    await change_service.create_change_merge_request(incarnation_ids[1], "v1.1.0", {})
+
+    # THEN
+    with pytest.raises(ChangeRejectedDueToPreviousUnfinishedChange):
+        # WHEN
+        await change_service.create_change_merge_request_for_repository(
+            incarnation_ids, requested_version="v1.1.0", requested_data={}
+        )
+
+
+async def test_update_incarnations_of_template_shares_the_template_clone(
+    test_file_async_engine: AsyncEngine, local_hoster: LocalHoster, git_repo_template: str, mocker
+):
+    # GIVEN
+    change_service = ChangeService(
+        hoster=local_hoster,
+        incarnation_repository=IncarnationRepository(test_file_async_engine),
+        change_repository=ChangeRepository(test_file_async_engine),
+    )
+    for name in ("first", "second", "up_to_date"):
+        await local_hoster.create_repository(name)
+        await change_service.create_incarnation(
+            incarnation_repository=name,
+            template_repository=git_repo_template,
+            template_repository_version="v1.1.0" if name == "up_to_date" else "v1.0.0",
+            template_data={},
+        )
+    cloned_repository = mocker.spy(local_hoster, "cloned_repository")
+
+    # WHEN
+    results = [
+        result
+        async for result in change_service.update_incarnations_of_template(
+            git_repo_template, "v1.1.0", {}, concurrency=2
+        )
+    ]
+
+    # THEN
+    assert sorted((r.incarnation_repository, r.status) for r in results) == [
+        ("first", BulkChangeStatus.MERGE_REQUEST),
+        ("second", BulkChangeStatus.MERGE_REQUEST),
+        ("up_to_date", BulkChangeStatus.UNCHANGED),
+    ]
+    assert all(r.merge_request_url is not None for r in results if r.status == BulkChangeStatus.MERGE_REQUEST)
+    cloned_repositories = [call.args[0] for call in cloned_repository.call_args_list]
+    assert cloned_repositories.count(git_repo_template) == 1
+    assert sorted(cloned_repositories) == sorted([git_repo_template, "first", "second"])
+
+
+async def test_update_incarnations_of_template_passes_on_automerge_in_background(
+    change_service: ChangeService, local_hoster: LocalHoster, git_repo_template: str, mocker
+):
+    # GIVEN
+    await local_hoster.create_repository("incarnation")
+    await change_service.create_incarnation(
+        incarnation_repository="incarnation",
+        template_repository=git_repo_template,
+        template_repository_version="v1.0.0",
+        template_data={},
+    )
+    merge_request = mocker.spy(local_hoster, "merge_request")
+
+    # WHEN
+    results = [
+        result
+        async for result in change_service.update_incarnations_of_template(
+            git_repo_template, "v1.1.0", {}, automerge=True, automerge_in_background=True
+        )
+    ]
+
+    # THEN
+    assert [result.status for result in results] == [BulkChangeStatus.MERGE_REQUEST]
+    assert merge_request.call_args.kwargs["with_automerge"] is True
+    assert merge_request.call_args.kwargs["automerge_in_background"] is True
+
+
+async def test_update_incarnations_of_template_finishes_all_changes_if_the_caller_stops_early(
+    test_file_async_engine: AsyncEngine, local_hoster: LocalHoster, git_repo_template: str
+):
+    # GIVEN
+    change_service = ChangeService(
+        hoster=local_hoster,
+        incarnation_repository=IncarnationRepository(test_file_async_engine),
+        change_repository=ChangeRepository(test_file_async_engine),
+    )
+    for name in ("first", "second"):
+        await local_hoster.create_repository(name)
+        await change_service.create_incarnation(
+            incarnation_repository=name,
+            template_repository=git_repo_template,
+            template_repository_version="v1.0.0",
+            template_data={},
+        )
+
+    # WHEN
+    async with aclosing(
+        change_service.update_incarnations_of_template(git_repo_template, "v1.1.0", {}, concurrency=1)
+    ) as results:
+        await anext(results)
+    await asyncio.gather(*change_module._background_tasks)
+
+    # THEN
+    for incarnation in await change_service.list_incarnations():
+        assert incarnation.merge_request_url is not None
+
+
 async def test_construct_merge_request_conflict_description_with_conflicts():
     # GIVEN
     conflict_files = [Path("README.md")]
@@ -461,6 +849,44 @@ present** in this incarnation repository. Please resolve the conflicts manually:
 - CONTRIBUTING.md"""
 
 
+async def test_list_incarnations_includes_urls_of_the_latest_change(
+    change_service: ChangeService, initialized_incarnation: Incarnation, local_hoster: LocalHoster
+):
+    # GIVEN
+    change = await change_service.create_change_merge_request(
+        initialized_incarnation.id, requested_version="v1.1.0", requested_data={}
+    )
+
+    # WHEN
+    incarnations = await change_service.list_incarnations()
+
+    # THEN
+    assert len(incarnations) == 1
+    assert incarnations[0].commit_url == local_hoster.get_commit_url(
+        initialized_incarnation.incarnation_repository, change.commit_sha
+    )
+    assert incarnations[0].merge_request_url == local_hoster.get_merge_request_url(
+        initialized_incarnation.incarnation_repository, change.merge_request_id
+    )
+
+
+async def test_list_incarnations_filters_by_open_merge_request(
+    change_service: ChangeService, initialized_incarnation: Incarnation
+):
+    # GIVEN
+    await change_service.create_change_merge_request(
+        initialized_incarnation.id, requested_version="v1.1.0", requested_data={}
+    )
+
+    # WHEN
+    with_open_merge_request = await change_service.list_incarnations(merge_request_open=True, limit=10)
+    without_open_merge_request = await change_service.list_incarnations(merge_request_open=False, limit=10)
+
+    # THEN
+    assert [inc.id for inc in with_open_merge_request] == [initialized_incarnation.id]
+    assert without_open_merge_request == []
+
+
 async def test_list_changes(
     change_service: ChangeService,
     initialized_incarnation: Incarnation,
@@ -478,11 +904,37 @@ async def test_list_changes(
 
     assert isinstance(changes[0], ChangeWithMergeRequest)
     assert changes[0].revision == 2
+    assert changes[0].merge_request_status == MergeRequestStatus.OPEN
 
     assert isinstance(changes[1], Change)
     assert changes[1].revision == 1
 
 
+async def test_get_incarnation_with_details_loads_incarnation_and_latest_change_in_one_query(
+    change_service: ChangeService, initialized_incarnation: Incarnation, local_hoster: LocalHoster, mocker
+):
+    # GIVEN
+    change = await change_service.create_change_merge_request(
+        initialized_incarnation.id, requested_version="v1.1.0", requested_data={}
+    )
+    get_by_id = mocker.spy(change_service._incarnation_repository, "get_by_id")
+    get_change = mocker.spy(change_service._change_repository, "get_change")
+
+    # WHEN
+    details = await change_service.get_incarnation_with_details(initialized_incarnation.id)
+
+    # THEN
+    assert details.revision == change.revision
+    assert details.template_repository == initialized_incarnation.template_repository
+    assert details.merge_request_id == change.merge_request_id
+    assert details.merge_request_status == MergeRequestStatus.OPEN
+    assert details.merge_request_url == local_hoster.get_merge_request_url(
+        initialized_incarnation.incarnation_repository, change.merge_request_id
+    )
+    get_by_id.assert_not_called()
+    get_change.assert_not_called()
+
+
 async def test_get_incarnation_with_details_returns_unknown_status_when_change_is_incomplete(
     change_service: ChangeService, initialized_incarnation: Incarnation
 ):
@@ -731,6 +1183,74 @@ async def test_diff_should_not_include_gitrepository(
     assert diff == ""
 
 
+async def test_diff_shows_customizations_and_is_served_from_the_cache_until_the_target_directory_changes(
+    change_service: ChangeService, local_hoster: LocalHoster, git_repo_template: str, tmp_path: Path, mocker
+):
+    # GIVEN
+    change_service._diff_cache = IncarnationDiffCache(renderings_directory=tmp_path / "renderings")
+    repo_name = "monorepo"
+    await local_hoster.create_repository(repo_name)
+    changes = [
+        await change_service.create_incarnation(
+            incarnation_repository=repo_name,
+            target_directory=target_directory,
+            template_repository=git_repo_template,
+            template_repository_version="v1.0.0",
+            template_data={},
+        )
+        for target_directory in ("inc1", "inc2")
+    ]
+    async with local_hoster.cloned_repository(repo_name) as repo:
+        (repo.directory / "inc1" / "README.md").write_text("Hello, customized world!")
+        await repo.commit_all("customize")
+        await repo.push()
+
+    # WHEN
+    diff = await change_service.diff_incarnation(changes[0].incarnation_id)
+
+    cloned_repository = mocker.spy(local_hoster, "cloned_repository")
+    template_source = mocker.spy(local_hoster, "template_source")
+    diff_from_cache = await change_service.diff_incarnation(changes[0].incarnation_id)
+    clones_for_cached_diff = cloned_repository.call_count
+
+    async with local_hoster.cloned_repository(repo_name) as repo:
+        (repo.directory / "inc2" / "README.md").write_text("Hello, other world!")
+        await repo.commit_all("customize the other incarnation")
+        await repo.push()
+    diff_after_other_change = await change_service.diff_incarnation(changes[0].incarnation_id)
+
+    # THEN
+    assert "diff --git a/home/foxops/templating/README.md b/home/foxops/templating/README.md" in diff
+    assert "+Hello, customized world!" in diff
+    assert diff_from_cache == diff_after_other_change == diff
+    assert clones_for_cached_diff == 0
+    template_source.assert_not_called()
+
+
+async def test_diff_renders_the_template_at_the_commit_of_the_change_if_its_branch_moved(
+    change_service: ChangeService, local_hoster: LocalHoster, git_repo_template: str
+):
+    # GIVEN
+    repo_name = "incarnation"
+    await local_hoster.create_repository(repo_name)
+    change = await change_service.create_incarnation(
+        incarnation_repository=repo_name,
+        template_repository=git_repo_template,
+        template_repository_version="main",
+        template_data={},
+    )
+    async with local_hoster.cloned_repository(git_repo_template) as repo:
+        (repo.directory / "template" / "README.md").write_text("Hello, moved branch!")
+        await repo.commit_all("update")
+        await repo.push()
+
+    # WHEN
+    diff = await change_service.diff_incarnation(change.incarnation_id)
+
+    # THEN
+    assert diff == ""
+
+
 def test_load_fengine_reset_ignore_handles_empty_lines(tmp_path):
     # GIVEN
     (tmp_path / ".fengine-reset-ignore").write_text("keep_me.txt\n\n  \n\nkeep_me_too.md\n")
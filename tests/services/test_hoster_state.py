@@ -0,0 +1,181 @@
+from datetime import timedelta
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+
+from foxops.database.repositories.hoster_state.repository import HosterStateRepository
+from foxops.hosters import Hoster, ReconciliationStatus
+from foxops.hosters.types import MergeRequestStatus
+from foxops.services.hoster_state import HosterStateService, InvalidWebhookEvent
+
+
+@pytest.fixture
+def hoster() -> Mock:
+    hoster = Mock(spec=Hoster)
+    hoster.get_reconciliation_status = AsyncMock(return_value=ReconciliationStatus.UNKNOWN)
+    hoster.get_merge_request_statuses = AsyncMock(side_effect=lambda mrs: {mr: MergeRequestStatus.OPEN for mr in mrs})
+    return hoster
+
+
+@pytest.fixture
+def hoster_state_service(hoster: Mock, hoster_state_repository: HosterStateRepository) -> HosterStateService:
+    return HosterStateService(hoster, hoster_state_repository, max_age=timedelta(minutes=10))
+
+
+async def test_reconciliation_status_of_merged_merge_request_is_served_from_database(
+    hoster_state_service: HosterStateService, hoster_state_repository: HosterStateRepository, hoster: Mock
+):
+    # GIVEN
+    await hoster_state_repository.upsert_merge_request_state(
+        "group/incarnation", "5", state="merged", merge_status="can_be_merged", sha="head", merge_commit_sha="merge"
+    )
+    await hoster_state_repository.upsert_commit_status("group/incarnation", "merge", "success")
+
+    # WHEN
+    status = await hoster_state_service.get_reconciliation_status("group/incarnation", ".", "head", "5")
+
+    # THEN
+    assert status == ReconciliationStatus.SUCCESS
+    hoster.get_reconciliation_status.assert_not_called()
+
+
+async def test_reconciliation_status_of_open_merge_request_with_failed_pipeline_is_failed(
+    hoster_state_service: HosterStateService, hoster_state_repository: HosterStateRepository
+):
+    # GIVEN
+    await hoster_state_repository.upsert_merge_request_state(
+        "group/incarnation", "5", state="opened", merge_status="can_be_merged", sha="head", merge_commit_sha=None
+    )
+    await hoster_state_repository.upsert_commit_status("group/incarnation", "head", "failed")
+
+    # WHEN
+    status = await hoster_state_service.get_reconciliation_status("group/incarnation", ".", "head", "5")
+
+    # THEN
+    assert status == ReconciliationStatus.FAILED
+
+
+async def test_reconciliation_status_falls_back_to_hoster_for_stale_state(
+    hoster: Mock, hoster_state_repository: HosterStateRepository
+):
+    # GIVEN
+    hoster_state_service = HosterStateService(hoster, hoster_state_repository, max_age=timedelta())
+    await hoster_state_repository.upsert_commit_status("group/incarnation", "head", "success")
+
+    # WHEN
+    status = await hoster_state_service.get_reconciliation_status("group/incarnation", ".", "head", None)
+
+    # THEN
+    assert status == ReconciliationStatus.UNKNOWN
+    hoster.get_reconciliation_status.assert_called_once()
+
+
+async def test_merge_request_statuses_are_only_requested_from_hoster_if_unknown(
+    hoster_state_service: HosterStateService, hoster_state_repository: HosterStateRepository, hoster: Mock
+):
+    # GIVEN
+    await hoster_state_repository.upsert_merge_request_state(
+        "group/incarnation", "5", state="merged", merge_status=None, sha=None, merge_commit_sha=None
+    )
+
+    # WHEN
+    statuses = await hoster_state_service.get_merge_request_statuses(
+        [("group/incarnation", "5"), ("group/incarnation", "6")]
+    )
+
+    # THEN
+    assert statuses == {
+        ("group/incarnation", "5"): MergeRequestStatus.MERGED,
+        ("group/incarnation", "6"): MergeRequestStatus.OPEN,
+    }
+    hoster.get_merge_request_statuses.assert_called_once_with([("group/incarnation", "6")])
+
+
+def merge_request_event(state: str, updated_at: str) -> dict:
+    return {
+        "object_kind": "merge_request",
+        "project": {"path_with_namespace": "group/incarnation"},
+        "object_attributes": {"iid": 5, "state": state, "updated_at": updated_at},
+    }
+
+
+def pipeline_event(pipeline_id: int, status: str) -> dict:
+    return {
+        "object_kind": "pipeline",
+        "project": {"path_with_namespace": "group/incarnation"},
+        "object_attributes": {"id": pipeline_id, "sha": "head", "status": status},
+    }
+
+
+async def test_merge_request_events_which_arrive_out_of_order_are_ignored(
+    hoster_state_service: HosterStateService, hoster_state_repository: HosterStateRepository
+):
+    # GIVEN
+    await hoster_state_service.process_gitlab_event(merge_request_event("merged", "2026-10-19T09:01:04Z"))
+
+    # WHEN
+    await hoster_state_service.process_gitlab_event(merge_request_event("opened", "2026-10-19 09:00:00 UTC"))
+
+    # THEN
+    state = await hoster_state_repository.get_merge_request_state("group/incarnation", "5")
+    assert state is not None
+    assert state.state == "merged"
+
+
+async def test_pipeline_events_which_arrive_out_of_order_are_ignored(
+    hoster_state_service: HosterStateService, hoster_state_repository: HosterStateRepository
+):
+    # GIVEN
+    await hoster_state_service.process_gitlab_event(pipeline_event(2, "success"))
+
+    # WHEN
+    await hoster_state_service.process_gitlab_event(pipeline_event(2, "running"))
+    await hoster_state_service.process_gitlab_event(pipeline_event(1, "failed"))
+
+    # THEN
+    status = await hoster_state_repository.get_commit_status("group/incarnation", "head")
+    assert status is not None
+    assert status.status == "success"
+
+
+async def test_malformed_events_are_rejected(hoster_state_service: HosterStateService):
+    # THEN
+    with pytest.raises(InvalidWebhookEvent):
+        # WHEN
+        await hoster_state_service.process_gitlab_event({"object_kind": "pipeline", "object_attributes": {}})
+
+
+async def test_merge_request_statuses_requested_from_hoster_are_not_stored(
+    hoster_state_service: HosterStateService, hoster_state_repository: HosterStateRepository, hoster: Mock
+):
+    # GIVEN
+    await hoster_state_service.get_merge_request_statuses([("group/incarnation", "6")])
+
+    # WHEN
+    statuses = await hoster_state_service.get_merge_request_statuses([("group/incarnation", "6")])
+
+    # THEN
+    assert statuses == {("group/incarnation", "6"): MergeRequestStatus.OPEN}
+    assert hoster.get_merge_request_statuses.call_count == 2
+    assert await hoster_state_repository.get_merge_request_state("group/incarnation", "6") is None
+
+
+async def test_stored_states_are_not_used_without_webhooks(
+    hoster: Mock, hoster_state_repository: HosterStateRepository
+):
+    # GIVEN
+    hoster_state_service = HosterStateService(
+        hoster, hoster_state_repository, max_age=timedelta(minutes=10), webhooks_enabled=False
+    )
+    await hoster_state_repository.upsert_merge_request_state(
+        "group/incarnation", "5", state="merged", merge_status=None, sha=None, merge_commit_sha=None
+    )
+
+    # WHEN
+    statuses = await hoster_state_service.get_merge_request_statuses([("group/incarnation", "5")])
+    status = await hoster_state_service.get_reconciliation_status("group/incarnation", ".", "head", "5")
+
+    # THEN
+    assert statuses == {("group/incarnation", "5"): MergeRequestStatus.OPEN}
+    assert status == ReconciliationStatus.UNKNOWN
+    hoster.get_reconciliation_status.assert_called_once()
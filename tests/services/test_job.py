@@ -0,0 +1,209 @@
+import asyncio
+from datetime import timedelta
+from unittest.mock import Mock
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from foxops.database.repositories.change.repository import ChangeRepository
+from foxops.database.repositories.incarnation.repository import IncarnationRepository
+from foxops.database.repositories.job.model import JobInDB, JobStatus
+from foxops.database.repositories.job.repository import JobRepository
+from foxops.services.change import (
+    ChangeRejectedDueToNoChanges,
+    ChangeRejectedDueToPreviousUnfinishedChange,
+    ChangeService,
+    ProgressCallback,
+)
+from foxops.services.job import ChangeJobArguments, JobService, JobWorkerPool
+
+
+@pytest.fixture(name="test_async_engine")
+def file_async_engine(test_file_async_engine: AsyncEngine) -> AsyncEngine:
+    # the workers use the database concurrently
+    return test_file_async_engine
+
+
+@pytest.fixture
+def job_repository(test_async_engine: AsyncEngine) -> JobRepository:
+    return JobRepository(test_async_engine)
+
+
+@pytest.fixture
+def change_service() -> Mock:
+    return Mock(spec_set=ChangeService)
+
+
+@pytest.fixture
+def progress_callbacks() -> list[ProgressCallback]:
+    return []
+
+
+@pytest.fixture
+async def job_service(
+    job_repository: JobRepository,
+    incarnation_repository: IncarnationRepository,
+    change_service: Mock,
+    progress_callbacks: list[ProgressCallback],
+):
+    def create_change_service(progress: ProgressCallback) -> ChangeService:
+        progress_callbacks.append(progress)
+        return change_service
+
+    worker_pool = JobWorkerPool(job_repository, create_change_service, workers=2)
+
+    yield JobService(job_repository, incarnation_repository, worker_pool)
+    await worker_pool.stop()
+
+
+async def wait_until_finished(job_service: JobService, job: JobInDB) -> JobInDB:
+    for _ in range(100):
+        job = await job_service.get(job.id)
+        if job.status in (JobStatus.SUCCEEDED, JobStatus.FAILED):
+            return job
+        await asyncio.sleep(0.01)
+
+    raise TimeoutError(f"job {job.id} did not finish")
+
+
+async def test_enqueued_change_is_executed_in_the_background(
+    job_service: JobService,
+    change_service: Mock,
+    change_repository: ChangeRepository,
+    progress_callbacks: list[ProgressCallback],
+):
+    # GIVEN
+    change = await change_repository.create_incarnation_with_first_change(
+        "test", ".", "template", "commit", "template-commit", "v1", {}, {}
+    )
+
+    async def create_change_merge_request(
+        incarnation_id, requested_version, requested_data, automerge, patch, automerge_in_background
+    ):
+        await progress_callbacks[-1]("creating the merge request")
+        return change
+
+    change_service.create_change_merge_request.side_effect = create_change_merge_request
+
+    # WHEN
+    job = await job_service.enqueue_change(
+        change.incarnation_id,
+        ChangeJobArguments(requested_version="v2", requested_data={}, automerge=True, automerge_in_background=True),
+    )
+    finished_job = await wait_until_finished(job_service, job)
+
+    # THEN
+    assert job.status == JobStatus.PENDING
+    assert finished_job.status == JobStatus.SUCCEEDED
+    assert finished_job.progress == "creating the merge request"
+    assert finished_job.change_revision == 1
+    assert change_service.create_change_merge_request.call_args.kwargs == {
+        "automerge": True,
+        "patch": False,
+        "automerge_in_background": True,
+    }
+
+
+async def test_failed_change_is_reported_with_job(
+    job_service: JobService, change_service: Mock, incarnation_repository: IncarnationRepository
+):
+    # GIVEN
+    incarnation = await incarnation_repository.create("test", ".", "template")
+    change_service.create_change_merge_request.side_effect = ChangeRejectedDueToPreviousUnfinishedChange()
+
+    # WHEN
+    job = await job_service.enqueue_change(
+        incarnation.id, ChangeJobArguments(requested_version=None, requested_data={"name": "new"}, patch=True)
+    )
+    finished_job = await wait_until_finished(job_service, job)
+
+    # THEN
+    assert finished_job.status == JobStatus.FAILED
+    assert finished_job.error == "There is a previous change that is still open. Please merge/close it first."
+    assert finished_job.change_revision is None
+
+
+async def test_running_job_is_finished_before_the_pool_is_stopped(
+    job_repository: JobRepository, incarnation_repository: IncarnationRepository, change_service: Mock
+):
+    # GIVEN
+    incarnation = await incarnation_repository.create("test", ".", "template")
+    started = asyncio.Event()
+
+    async def create_change_merge_request(*args, **kwargs):
+        started.set()
+        await asyncio.sleep(0.1)
+        raise ChangeRejectedDueToNoChanges()
+
+    change_service.create_change_merge_request.side_effect = create_change_merge_request
+    worker_pool = JobWorkerPool(job_repository, lambda progress: change_service, workers=1)
+    job = await JobService(job_repository, incarnation_repository, worker_pool).enqueue_change(
+        incarnation.id, ChangeJobArguments(requested_version=None, requested_data={})
+    )
+    await asyncio.wait_for(started.wait(), timeout=5)
+
+    # WHEN
+    await worker_pool.stop()
+
+    # THEN
+    finished_job = await job_repository.get(job.id)
+    assert finished_job.status == JobStatus.SUCCEEDED
+
+
+async def test_running_job_is_failed_if_it_does_not_finish_before_the_pool_is_stopped(
+    job_repository: JobRepository, incarnation_repository: IncarnationRepository, change_service: Mock
+):
+    # GIVEN
+    incarnation = await incarnation_repository.create("test", ".", "template")
+    started = asyncio.Event()
+
+    async def create_change_merge_request(*args, **kwargs):
+        started.set()
+        await asyncio.sleep(60)
+
+    change_service.create_change_merge_request.side_effect = create_change_merge_request
+    worker_pool = JobWorkerPool(
+        job_repository, lambda progress: change_service, workers=1, shutdown_timeout=timedelta(milliseconds=10)
+    )
+    job = await JobService(job_repository, incarnation_repository, worker_pool).enqueue_change(
+        incarnation.id, ChangeJobArguments(requested_version=None, requested_data={})
+    )
+    await asyncio.wait_for(started.wait(), timeout=5)
+
+    # WHEN
+    await worker_pool.stop()
+
+    # THEN
+    failed_job = await job_repository.get(job.id)
+    assert failed_job.status == JobStatus.FAILED
+    assert failed_job.error == "The job was cancelled, because its worker was stopped"
+
+
+async def test_running_job_is_finished_when_the_workers_are_cancelled(
+    job_repository: JobRepository, incarnation_repository: IncarnationRepository, change_service: Mock
+):
+    # GIVEN
+    incarnation = await incarnation_repository.create("test", ".", "template")
+    started = asyncio.Event()
+
+    async def create_change_merge_request(*args, **kwargs):
+        started.set()
+        await asyncio.sleep(0.1)
+        raise ChangeRejectedDueToNoChanges()
+
+    change_service.create_change_merge_request.side_effect = create_change_merge_request
+    worker_pool = JobWorkerPool(job_repository, lambda progress: change_service, workers=1)
+    job = await JobService(job_repository, incarnation_repository, None).enqueue_change(
+        incarnation.id, ChangeJobArguments(requested_version=None, requested_data={})
+    )
+    workers = asyncio.create_task(worker_pool.run())
+    await asyncio.wait_for(started.wait(), timeout=5)
+
+    # WHEN
+    workers.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await workers
+
+    # THEN
+    finished_job = await job_repository.get(job.id)
+    assert finished_job.status == JobStatus.SUCCEEDED
@@ -0,0 +1,114 @@
+import asyncio
+from datetime import timedelta
+from unittest.mock import AsyncMock
+
+import pytest
+
+from foxops.hosters import ReconciliationStatus
+from foxops.services.reconciliation_status import (
+    ReconciliationStatusKey,
+    ReconciliationStatusTracker,
+)
+
+KEY = ReconciliationStatusKey("group/incarnation", ".", "abc", None)
+
+
+@pytest.fixture
+def source() -> AsyncMock:
+    source = AsyncMock()
+    source.get_reconciliation_status.return_value = ReconciliationStatus.PENDING
+    return source
+
+
+@pytest.fixture
+async def tracker(source: AsyncMock):
+    tracker = ReconciliationStatusTracker(source, refresh_interval=timedelta(milliseconds=10))
+    yield tracker
+    await tracker.stop()
+
+
+async def test_first_lookup_does_not_wait_for_pipelines(tracker: ReconciliationStatusTracker, source: AsyncMock):
+    # WHEN
+    tracked = await tracker.get(KEY)
+
+    # THEN
+    assert tracked.status == ReconciliationStatus.PENDING
+    assert source.get_reconciliation_status.call_args.kwargs["pipeline_timeout"] == timedelta()
+
+
+async def test_pending_status_is_refreshed_in_background(tracker: ReconciliationStatusTracker, source: AsyncMock):
+    # GIVEN
+    first = await tracker.get(KEY)
+    source.get_reconciliation_status.return_value = ReconciliationStatus.SUCCESS
+
+    # WHEN
+    await asyncio.sleep(0.05)
+    tracked = await tracker.get(KEY)
+
+    # THEN
+    assert tracked.status == ReconciliationStatus.SUCCESS
+    assert tracked.refreshed_at > first.refreshed_at
+
+
+async def test_success_is_reported_immediately_and_confirmed_with_pipeline_timeout(
+    tracker: ReconciliationStatusTracker, source: AsyncMock
+):
+    # GIVEN
+    source.get_reconciliation_status.return_value = ReconciliationStatus.SUCCESS
+
+    # WHEN
+    first = await tracker.get(KEY)
+    await asyncio.sleep(0.05)
+    tracked = await tracker.get(KEY)
+
+    # THEN
+    assert first.status == tracked.status == ReconciliationStatus.SUCCESS
+    assert source.get_reconciliation_status.call_count == 2
+    assert source.get_reconciliation_status.call_args.kwargs["pipeline_timeout"] == timedelta(seconds=10)
+
+
+async def test_pipeline_which_appears_after_the_first_lookup_is_detected(
+    tracker: ReconciliationStatusTracker, source: AsyncMock
+):
+    # GIVEN
+    source.get_reconciliation_status.return_value = ReconciliationStatus.SUCCESS
+
+    # WHEN
+    await tracker.get(KEY)
+    source.get_reconciliation_status.return_value = ReconciliationStatus.PENDING
+    await asyncio.sleep(0.05)
+    tracked = await tracker.get(KEY)
+
+    # THEN
+    assert tracked.status == ReconciliationStatus.PENDING
+
+
+async def test_final_status_is_served_from_cache(tracker: ReconciliationStatusTracker, source: AsyncMock):
+    # GIVEN
+    source.get_reconciliation_status.return_value = ReconciliationStatus.FAILED
+    await tracker.get(KEY)
+
+    # WHEN
+    await asyncio.sleep(0.05)
+    tracked = await tracker.get(KEY)
+
+    # THEN
+    assert tracked.status == ReconciliationStatus.FAILED
+    source.get_reconciliation_status.assert_called_once()
+
+
+async def test_statuses_which_are_not_read_are_no_longer_refreshed(source: AsyncMock):
+    # GIVEN
+    tracker = ReconciliationStatusTracker(
+        source, refresh_interval=timedelta(milliseconds=10), idle_timeout=timedelta(milliseconds=30)
+    )
+    await tracker.get(KEY)
+
+    # WHEN
+    await asyncio.sleep(0.1)
+    calls = source.get_reconciliation_status.call_count
+    await asyncio.sleep(0.05)
+    await tracker.stop()
+
+    # THEN
+    assert source.get_reconciliation_status.call_count == calls